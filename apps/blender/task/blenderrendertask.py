@@ -3,11 +3,10 @@ import logging
 import math
 import os
 import random
-from collections import OrderedDict
 
 
 import time
-from PIL import Image, ImageChops
+from PIL import Image
 
 from apps.core.task import coretask
 from golem.core.common import to_unicode
@@ -21,7 +20,6 @@ from apps.blender.resources.scenefileeditor import generate_blender_crop_file
 from apps.blender.task.verificator import BlenderVerificator
 from apps.core.task.coretask import CoreTaskTypeInfo, AcceptClientVerdict, CoreTask
 from apps.rendering.resources.imgrepr import load_as_pil
-from apps.rendering.resources.renderingtaskcollector import RenderingTaskCollector
 from apps.rendering.task.framerenderingtask import FrameRenderingTask, FrameRenderingTaskBuilder, FrameRendererOptions
 from apps.rendering.task.renderingtask import PREVIEW_EXT, PREVIEW_X, PREVIEW_Y
 from apps.rendering.task.renderingtaskstate import RenderingTaskDefinition, RendererDefaults
@@ -391,12 +389,9 @@ class BlenderRenderTask(FrameRenderingTask):
 
         if not self.use_frames:
             min_y, max_y = self._get_min_max_y(start_task)
-        elif parts > 1:
-            min_y = (parts - self._count_part(start_task, parts)) * (1.0 / parts)
-            max_y = (parts - self._count_part(start_task, parts) + 1) * (1.0 / parts)
         else:
-            min_y = 0.0
-            max_y = 1.0
+            min_y, max_y = self._get_part_min_max_y(
+                self._count_part(start_task, parts), parts)
 
         script_src = generate_blender_crop_file(
             resolution=(self.res_x, self.res_y),
@@ -496,6 +491,20 @@ class BlenderRenderTask(FrameRenderingTask):
             parts = self.total_tasks
         return get_min_max_y(start_task, parts, self.res_y)
 
+    def _get_part_min_max_y(self, part, parts):
+        """ Borders of a part of an image, from the bottom of the image """
+        if not self.use_frames:
+            return get_min_max_y(part, parts, self.res_y)
+        if parts > 1:
+            return (parts - part) * (1.0 / parts), \
+                (parts - part + 1) * (1.0 / parts)
+        return 0.0, 1.0
+
+    def _get_part_offsets(self, parts):
+        return [int(round((1.0 - self._get_part_min_max_y(part, parts)[1])
+                          * self.res_y))
+                for part in range(1, parts + 1)]
+
     def after_test(self, results, tmp_dir):
         return_data = dict()
         if not results or not results.get("data"):
@@ -536,19 +545,6 @@ class BlenderRenderTask(FrameRenderingTask):
             self.preview_updaters[num].update_preview(new_chunk_file_path, part)
             self._update_frame_task_preview()
 
-    def _put_image_together(self):
-        output_file_name = "{}".format(self.output_file, self.output_format)
-        logger.debug('_put_image_together() out: %r', output_file_name)
-        self.collected_file_names = OrderedDict(sorted(self.collected_file_names.items()))
-        if not self._use_outer_task_collector():
-            collector = CustomCollector(paste=True, width=self.res_x, height=self.res_y)
-            for file in self.collected_file_names.values():
-                collector.add_img_file(file)
-            collector.finalize().save(output_file_name, self.output_format)
-        else:
-            self._put_collected_files_together(os.path.join(self.tmp_dir, output_file_name),
-                                               list(self.collected_file_names.values()), "paste")
-            
     def mark_part_on_preview(self, part, img_task, color, preview_updater, frame_index=0):
         lower = preview_updater.get_offset(part)
         upper = preview_updater.get_offset(part + 1)
@@ -570,23 +566,6 @@ class BlenderRenderTask(FrameRenderingTask):
             part = (subtask['start_task'] - 1) % parts + 1
             self.mark_part_on_preview(part, img_task, color, pu)
 
-    def _put_frame_together(self, frame_num, num_start):
-        directory = os.path.dirname(self.output_file)
-        output_file_name = os.path.join(directory, self._get_output_name(frame_num))
-        frame_key = str(frame_num)
-        collected = self.frames_given[frame_key]
-        collected = OrderedDict(sorted(collected.items()))
-        if not self._use_outer_task_collector():
-            collector = CustomCollector(paste=True, width=self.res_x, height=self.res_y)
-            for file in collected.values():
-                collector.add_img_file(file)
-            collector.finalize().save(output_file_name, self.output_format)
-        else:
-            self._put_collected_files_together(output_file_name, list(collected.values()), "paste")
-        self.collected_file_names[frame_num] = output_file_name
-        self._update_frame_preview(output_file_name, frame_num, final=True)
-        self._update_frame_task_preview()
-
 
 class BlenderRenderTaskBuilder(FrameRenderingTaskBuilder):
     """ Build new Blender tasks using RenderingTaskDefintions and BlenderRendererOptions as taskdefinition
@@ -613,22 +592,6 @@ class BlenderRenderTaskBuilder(FrameRenderingTaskBuilder):
         return definition
 
 
-class CustomCollector(RenderingTaskCollector):
-    def __init__(self, paste=False, width=1, height=1):
-        RenderingTaskCollector.__init__(self, paste, width, height)
-        self.current_offset = 0
-    
-    def _paste_image(self, final_img, new_part, num):
-        img_offset = Image.new("RGB", (self.width, self.height))
-        offset = self.current_offset
-        _, new_img_res_y = new_part.size
-        self.current_offset += new_img_res_y
-        img_offset.paste(new_part, (0, offset))
-        result = ImageChops.add(final_img, img_offset)
-        img_offset.close()
-        return result
-
-
 def generate_expected_offsets(parts, res_x, res_y):
     logger.debug('generate_expected_offsets(%r, %r, %r)', parts, res_x, res_y)
     # returns expected offsets for preview; the highest value is preview's height
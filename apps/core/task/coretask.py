@@ -3,6 +3,7 @@ import copy
 import logging
 import os
 import uuid
+from collections import namedtuple
 from enum import Enum
 from typing import Type
 
@@ -18,7 +19,7 @@ from golem.core.simpleserializer import CBORSerializer
 from golem.docker.environment import DockerEnvironment
 from golem.environments.environment import Environment
 from golem.network.p2p.node import Node
-from golem.resource.resource import prepare_delta_zip, TaskResourceHeader
+from golem.resource.resource import delta_zip_cache, TaskResourceHeader
 from golem.task.taskbase import Task, TaskHeader, TaskBuilder, ResultType, \
     ResourceType, ComputeTaskDef, TaskTypeInfo
 from golem.task.taskclient import TaskClient
@@ -32,6 +33,11 @@ def log_key_error(*args, **kwargs):
     return False
 
 
+# Result of verification of subtask results, applied in results_verified
+ResultsVerdict = namedtuple('ResultsVerdict',
+                            ['state', 'files', 'stdout', 'stderr', 'verificator'])
+
+
 class AcceptClientVerdict(Enum):
     ACCEPTED = 0
     REJECTED = 1
@@ -199,15 +205,34 @@ class CoreTask(Task):
         self._mark_subtask_failed(subtask_id)
 
     def computation_finished(self, subtask_id, task_result, result_type=ResultType.DATA):
+        verdict = self.verify_results(subtask_id, task_result, result_type)
+        self.results_verified(subtask_id, task_result, result_type, verdict)
+
+    def verify_results(self, subtask_id, task_result, result_type=ResultType.DATA):
+        """ Unpack received results and verify them with a copy of the
+        verificator, which replaces the task's one in results_verified.
+        Verification of results of one task mustn't run concurrently.
+        :return ResultsVerdict: None if results are not accepted
+        """
         if not self.should_accept(subtask_id):
+            return None
+        files, stdout, stderr = self.read_task_results(subtask_id, task_result, result_type)
+        verificator = copy.deepcopy(self.verificator)
+        ver_state = verificator.verify(subtask_id, self.subtasks_given.get(subtask_id),
+                                       files, self)
+        return ResultsVerdict(ver_state, files, stdout, stderr, verificator)
+
+    def results_verified(self, subtask_id, task_result, result_type, verdict):
+        if verdict is None or not self.should_accept(subtask_id):
             logger.info("Not accepting results for {}".format(subtask_id))
             return
-        self.interpret_task_results(subtask_id, task_result, result_type)
-        result_files = self.results.get(subtask_id)
-        ver_state = self.verificator.verify(subtask_id, self.subtasks_given.get(subtask_id),
-                                            result_files, self)
-        if ver_state == SubtaskVerificationState.VERIFIED:
-            self.accept_results(subtask_id, result_files)
+        self.verificator = verdict.verificator
+        self.results[subtask_id] = verdict.files
+        self.stdout[subtask_id] = verdict.stdout
+        self.stderr[subtask_id] = verdict.stderr
+
+        if verdict.state == SubtaskVerificationState.VERIFIED:
+            self.accept_results(subtask_id, verdict.files)
         # TODO Add support for different verification states
         else:
             self.computation_failed(subtask_id)
@@ -286,7 +311,7 @@ class CoreTask(Task):
 
         if os.path.exists(dir_name):
             if resource_type == ResourceType.ZIP:
-                return prepare_delta_zip(dir_name, resource_header, tmp_dir, self.task_resources)
+                return delta_zip_cache.get(dir_name, resource_header, tmp_dir, self.task_resources)
 
             elif resource_type == ResourceType.PARTS:
                 return TaskResourceHeader.build_parts_header_delta_from_chosen(resource_header,
@@ -356,12 +381,25 @@ class CoreTask(Task):
         format
         :param bool sort: *default: True* Sort results, if set to True
         """
-        self.stdout[subtask_id] = ""
-        self.stderr[subtask_id] = ""
+        files, stdout, stderr = self.read_task_results(subtask_id, task_results,
+                                                       result_type, sort)
+        self.results[subtask_id] = files
+        self.stdout[subtask_id] = stdout
+        self.stderr[subtask_id] = stderr
+
+    def read_task_results(self, subtask_id, task_results, result_type: int, sort=True):
+        """ Same as interpret_task_results, but leaves the task's state unchanged
+        :return tuple: result files, stdout and stderr of the subtask
+        """
+        if result_type not in (ResultType.DATA, ResultType.FILES):
+            logger.error("Task result type not supported {}".format(result_type))
+            return [], "", "[GOLEM] Task result {} not supported".format(result_type)
+
         tr_files = self.load_task_results(task_results, result_type, subtask_id)
-        self.results[subtask_id] = self.filter_task_results(tr_files, subtask_id)
+        files, stdout, stderr = self.filter_task_results(tr_files, subtask_id)
         if sort:
-            self.results[subtask_id].sort()
+            files.sort()
+        return files, stdout or "", stderr or ""
 
     @handle_key_error
     def result_incoming(self, subtask_id):
@@ -391,27 +429,27 @@ class CoreTask(Task):
             return task_result
         else:
             logger.error("Task result type not supported {}".format(result_type))
-            self.stderr[subtask_id] = "[GOLEM] Task result {} not supported".format(result_type)
             return []
 
     def filter_task_results(self, task_results, subtask_id, log_ext=".log", err_log_ext="err.log"):
         """ From a list of files received in task_results, return only files that don't
-        have extension <log_ext> or <err_log_ext>. File with log_ext is saved as stdout
-        for this subtask (only one file is currently supported). File with err_log_ext is save
-        as stderr for this subtask (only one file is currently supported).
+        have extension <log_ext> or <err_log_ext>. File with log_ext is returned as stdout
+        for this subtask (only one file is currently supported). File with err_log_ext is
+        returned as stderr for this subtask (only one file is currently supported).
         :param list task_results: list of files
         :param str subtask_id: if of a given subtask
         :param str log_ext: extension that stdout files have
         :param str err_log_ext: extension that stderr files have
-        :return:
+        :return tuple: filtered files, stdout and stderr file (None if not received)
         """
 
         filtered_task_results = []
+        stdout = stderr = None
         for tr in task_results:
             if tr.endswith(err_log_ext):
-                self.stderr[subtask_id] = tr
+                stderr = tr
             elif tr.endswith(log_ext):
-                self.stdout[subtask_id] = tr
+                stdout = tr
             else:
                 try:
                     new_tr = outer_dir_path(tr)
@@ -423,7 +461,7 @@ class CoreTask(Task):
                     logger.warning("Cannot move file {} to new location: "
                                    "{}".format(tr, err))
 
-        return filtered_task_results
+        return filtered_task_results, stdout, stderr
 
     def after_test(self, results, tmp_dir):
         return {}
@@ -2,6 +2,8 @@ from __future__ import division
 import logging
 import math
 
+import numpy
+
 from apps.rendering.resources.imgrepr import (EXRImgRepr, ImgRepr, load_img,
                                               PILImgRepr)
 logger = logging.getLogger("apps.rendering")
@@ -22,6 +24,19 @@ def calculate_psnr(mse, max_=255):
     return 20 * math.log10(max_) - 10 * math.log10(mse)
 
 
+def _crop_array(img, start, box):
+    """
+    Return the (box[1], box[0], 3) slice of img data starting at start,
+    without copying pixel data.
+    """
+    (x, y), (res_x, res_y) = start, box
+    (img_x, img_y) = img.get_size()
+    if x < 0 or y < 0 or x + res_x > img_x or y + res_y > img_y:
+        raise ValueError("Box {} starting at {} does not fit in the image "
+                         "of size {}".format(box, start, (img_x, img_y)))
+    return img.to_array()[y:y + res_y, x:x + res_x]
+
+
 def calculate_mse(img1, img2, start1=(0, 0), start2=(0, 0), box=None):
     """
     :param img1:
@@ -31,7 +46,6 @@ def calculate_mse(img1, img2, start1=(0, 0), start2=(0, 0), box=None):
     :param box: describes side lengths of the box
     :return:
     """
-    mse = 0
     if not isinstance(img1, ImgRepr) or not isinstance(img2, ImgRepr):
         raise TypeError("img1 and img2 must be ImgRepr")
 
@@ -45,17 +59,14 @@ def calculate_mse(img1, img2, start1=(0, 0), start2=(0, 0), box=None):
                  'img1 and img2 are of different sizes '
                  'and there is no cropping box provided.')
 
-    for i in range(0, res_x):
-        for j in range(0, res_y):
-            [r1, g1, b1] = img1.get_pixel((start1[0] + i, start1[1] + j))
-            [r2, g2, b2] = img2.get_pixel((start2[0] + i, start2[1] + j))
-            mse += (r1 - r2) * (r1 - r2) + \
-                   (g1 - g2) * (g1 - g2) + \
-                   (b1 - b2) * (b1 - b2)
-
     if res_x <= 0 or res_y <= 0:
         raise ValueError("Image or box resolution must be greater than 0")
 
+    arr1 = _crop_array(img1, start1, (res_x, res_y))
+    arr2 = _crop_array(img2, start2, (res_x, res_y))
+    diff = arr1.astype(numpy.float64) - arr2
+    mse = float(numpy.einsum('ijk,ijk->', diff, diff))
+
     mse /= res_x * res_y * 3
     return mse
 
@@ -4,6 +4,7 @@ import logging
 from copy import deepcopy
 import OpenEXR
 import Imath
+import numpy
 from PIL import Image
 
 logger = logging.getLogger("apps.rendering")
@@ -34,6 +35,14 @@ class ImgRepr(object, metaclass=abc.ABCMeta):
     def to_pil(self):
         return
 
+    @abc.abstractmethod
+    def to_array(self):
+        """
+        Return image data as a numpy array of shape (height, width, 3),
+        indexed [y, x, channel]. The array must not be modified in place.
+        """
+        return
+
 
 class PILImgRepr(ImgRepr):
     def __init__(self):
@@ -77,6 +86,9 @@ class PILImgRepr(ImgRepr):
     def to_pil(self):
         return self.img
 
+    def to_array(self):
+        return numpy.asarray(self.img)
+
 
 class EXRImgRepr(ImgRepr):
     def __init__(self):
@@ -84,7 +96,7 @@ class EXRImgRepr(ImgRepr):
         self.type = "EXR"
         self.dw = None
         self.pt = Imath.PixelType(Imath.PixelType.FLOAT)
-        self.rgb = None
+        self.array = None
         self.min = 0.0
         self.max = 1.0
         self.file_path = None
@@ -92,28 +104,40 @@ class EXRImgRepr(ImgRepr):
     def load_from_file(self, file_):
         self.img = OpenEXR.InputFile(file_)
         self.dw = self.img.header()['dataWindow']
-        self.rgb = [Image.frombytes("F", self.get_size(),
-                                    self.img.channel(c, self.pt))
-                    for c in "RGB"]
+        res_x, res_y = self.get_size()
+        self.array = numpy.empty((res_y, res_x, 3), dtype=numpy.float32)
+        for i, c in enumerate("RGB"):
+            channel = numpy.frombuffer(self.img.channel(c, self.pt),
+                                       dtype=numpy.float32)
+            self.array[:, :, i] = channel.reshape(res_y, res_x)
         self.file_path = file_
         self.name = os.path.basename(file_)
 
+    @property
+    def rgb(self):
+        if self.array is None:
+            return None
+        return [Image.fromarray(self.array[:, :, c], mode="F")
+                for c in range(self.array.shape[2])]
+
     def get_size(self):
         return self.dw.max.x - self.dw.min.x + 1, \
                self.dw.max.y - self.dw.min.y + 1
 
     def get_pixel(self, xy):
-        return [c.getpixel(xy) for c in self.rgb]
+        x, y = xy
+        return [float(c) for c in self.array[y, x]]
 
     def set_pixel(self, xy, color):
-        for c in range(0, len(self.rgb)):
-            self.rgb[c].putpixel(xy, max(min(self.max, color[c]), self.min))
+        x, y = xy
+        for c in range(0, self.array.shape[2]):
+            self.array[y, x, c] = max(min(self.max, color[c]), self.min)
 
     def get_rgbf_extrema(self):
-        extrema = [im.getextrema() for im in self.rgb]
-        darkest = min([lo for (lo, hi) in extrema])
-        lightest = max([hi for (lo, hi) in extrema])
-        return lightest, darkest
+        return float(self.array.max()), float(self.array.min())
+
+    def to_array(self):
+        return self.array
 
     def to_pil(self, use_extremas=False):
         if use_extremas:
@@ -138,11 +162,13 @@ class EXRImgRepr(ImgRepr):
 
     def copy(self):
         e = EXRImgRepr()
-        e.load_from_file(self.file_path)
+        e.img = self.img
         e.dw = deepcopy(self.dw)
-        e.rgb = deepcopy(self.rgb)
+        e.array = self.array.copy()
         e.min = self.min
         e.max = self.max
+        e.file_path = self.file_path
+        e.name = self.name
         return e
 
 
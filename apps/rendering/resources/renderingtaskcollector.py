@@ -1,31 +1,87 @@
-
 import logging
-import math
 import os
+import tempfile
 
 from PIL import Image, ImageChops
 
 from apps.rendering.resources.imgrepr import EXRImgRepr, load_img
+from apps.rendering.resources.tilecompositor import TileCompositor
 
 logger = logging.getLogger("apps.rendering")
 
+# Images of at least this size are composed in a memory mapped file
+MMAP_MIN_SIZE = 64 * 2 ** 20
+
+
+def is_exr(img_file):
+    _, ext = os.path.splitext(img_file)
+    return ext.upper() == ".EXR"
+
+
+def load_part(img_file):
+    """
+    Load image with subtask result. EXR images are converted to 8 bits
+    per channel.
+    :param str img_file: path to the file
+    :return Image.Image:
+    """
+    if is_exr(img_file):
+        return load_img(img_file).to_pil()
+    img = Image.open(img_file)
+    img.load()
+    return img
+
 
 class RenderingTaskCollector(object):
-    def __init__(self, paste=False, width=None, height=None):
+    def __init__(self, paste=False, width=None, height=None, parts=None,
+                 mmap_dir=None, offsets=None):
+        """
+        :param bool paste: paste parts one below another instead of adding
+        them together
+        :param int width: width of the final image
+        :param int height: height of the final image
+        :param int parts: number of pasted parts. If it's given along with
+        width and height, parts are pasted into the final image as they're
+        added, so the image is ready as soon as the last part is added.
+        :param str mmap_dir: directory for memory mapped buffers of large
+        final images
+        :param list offsets: vertical offsets of pasted parts, from the top
+        of the image. If they're not given, parts are pasted one below
+        another, each one once all parts above it are added.
+        """
 
         self.accepted_img_files = []
         self.accepted_alpha_files = []
         self.paste = paste
         self.width = width
         self.height = height
+        self.parts = parts
+        self.mmap_dir = mmap_dir
+        self.offsets = offsets
+        self.compositor = None
+
+    @property
+    def complete(self):
+        """ Whether all parts have been pasted into the final image """
+        return self.compositor is not None and self.compositor.complete
 
-    def add_img_file(self, img_file):
+    def add_img_file(self, img_file, part=None):
         """
         Add file path to the image with subtask result
         :param str img_file: path to the file
+        :param int part: number of the part, from 1 at the top of the image.
+        The part is pasted into the final image right away if the layout of
+        the image is known.
         """
         self.accepted_img_files.append(img_file)
 
+        if part is None or not self._composes_parts():
+            return
+        if self.compositor is None:
+            self.compositor = self._new_compositor(self.width, self.height,
+                                                   self.parts)
+        self.compositor.add(part, load_part(img_file))
+
     def add_alpha_file(self, img_file):
         """
         Add file path to the image with alpha channel
@@ -41,12 +97,13 @@ class RenderingTaskCollector(object):
         if len(self.accepted_img_files) == 0:
             return None
 
-        img_repr = load_img(self.accepted_img_files[0])
-        if isinstance(img_repr, EXRImgRepr):
-            final_img = self.finalize_exr(img_repr)
-            self.finalize_alpha(final_img)
+        if self.paste:
+            final_img = self.finalize_paste()
         else:
-            final_img = self.finalize_pil()
+            final_img = self.finalize_add()
+
+        if is_exr(self.accepted_img_files[0]):
+            self.finalize_alpha(final_img)
         return final_img
 
     def finalize_alpha(self, final_img):
@@ -72,62 +129,63 @@ class RenderingTaskCollector(object):
         final_img.putalpha(final_alpha)
         final_alpha.close()
 
-    def finalize_exr(self, exr_repr):
-
-        final_img = exr_repr.to_pil()
+    def finalize_paste(self):
+        """
+        Paste collected parts at their offsets or one below another. Parts
+        which weren't pasted as they were added are loaded once; if the size
+        of the final image isn't known, it's computed from their sizes.
+        :return Image.Image:
+        """
+        compositor, self.compositor = self.compositor, None
+
+        if compositor is None or not compositor.complete:
+            if compositor:
+                compositor.close()
+            parts = [load_part(img_file)
+                     for img_file in self.accepted_img_files]
+            width = self.width or parts[0].size[0]
+            height = self.height or sum(img.size[1] for img in parts)
+
+            compositor = self._new_compositor(width, height, len(parts))
+            for num, img in enumerate(parts, start=1):
+                compositor.add(num, img)
+
+        try:
+            return compositor.image()
+        finally:
+            compositor.close()
+
+    def finalize_add(self):
+        """
+        Add collected parts together
+        :return Image.Image:
+        """
+        final_img = load_part(self.accepted_img_files[0])
 
-        if self.paste:
-            if not self.width or not self.height:
-                self.width, self.height = final_img.size
-                self.height *= len(self.accepted_img_files)
-            img = Image.new('RGB', (self.width, self.height))
-            final_img = self._paste_image(img, final_img, 0)
+        for img_file in self.accepted_img_files[1:]:
+            img = load_part(img_file)
+            result = ImageChops.add(final_img, img)
+            final_img.close()
             img.close()
+            final_img = result
 
-        for i, img_path in enumerate(self.accepted_img_files[1:], start=1):
-            img = load_img(img_path)
-            rgb8_im = img.to_pil()
-            if not self.paste:
-                final_img = ImageChops.add(final_img, rgb8_im)
-            else:
-                final_img = self._paste_image(final_img, rgb8_im, i)
-                
-            rgb8_im.close()
-
-        return final_img
-        
-    def finalize_pil(self):
-        res_x, res_y = 0, 0
-
-        for name in self.accepted_img_files:
-            img = Image.open(name)
-            res_x, img_y = img.size
-            res_y += img_y
-            img.close()
-        
-        self.width = res_x
-        self.height = res_y
-        img = Image.open(self.accepted_img_files[0])
-        bands = img.getbands()
-        img.close()
-        band = ""
-        for b in bands:
-            band += b
-        final_img = Image.new(band, (res_x, res_y))
-        offset = 0
-        for img_path in self.accepted_img_files:
-            img = Image.open(img_path)
-            if not self.paste:
-                final_img = ImageChops.add(final_img, img)
-            else:
-                final_img.paste(img, (0, offset))
-                _, img_y = img.size
-                offset += img_y
-                img.close()
         return final_img
 
-    def _paste_image(self, final_img, new_part, num):
-        img_offset = Image.new("RGB", (self.width, self.height))
-        offset = int(math.floor(num * float(self.height) / float(len(self.accepted_img_files))))
-        img_offset.paste(new_part, (0, offset))
-        return ImageChops.add(final_img, img_offset)
+    def close(self):
+        """ Drop the final image if it wasn't finalized """
+        if self.compositor:
+            self.compositor.close()
+            self.compositor = None
+
+    def _composes_parts(self):
+        return bool(self.paste and self.width and self.height and self.parts)
+
+    def _new_compositor(self, width, height, parts):
+        mmap_path = None
+        if self.mmap_dir and width * height * 3 >= MMAP_MIN_SIZE:
+            fd, mmap_path = tempfile.mkstemp(suffix='.raw', dir=self.mmap_dir)
+            os.close(fd)
+        offsets = self.offsets
+        if offsets is not None and len(offsets) != parts:
+            offsets = None
+        return TileCompositor(width, height, parts, mmap_path, offsets)
@@ -0,0 +1,142 @@
+import logging
+import os
+
+import numpy
+from PIL import Image
+
+logger = logging.getLogger("apps.rendering")
+
+
+class TileCompositor(object):
+    """ Composes an image of horizontal stripes rendered by subtasks,
+    numbered from 1 at the top of the image. The image buffer is allocated
+    once, when the first stripe arrives, and every stripe is pasted into it
+    as soon as its vertical offset is known. Offsets are usually given by
+    the layout of the task's parts, so every stripe is pasted as it
+    arrives. Otherwise the offset of a stripe is the total height of the
+    stripes above it, so a stripe that arrives before them waits until
+    they do. The buffer may be a memory mapped file, so that large images
+    are not kept in memory while they're collected.
+    """
+
+    MODES = ('L', 'RGB', 'RGBA')
+
+    def __init__(self, width, height, parts, mmap_path=None, offsets=None):
+        """
+        :param int width: image width
+        :param int height: image height
+        :param int parts: number of stripes
+        :param str mmap_path: file to keep the image buffer in
+        :param list offsets: vertical offsets of stripes 1 to parts, if
+        they're known before the stripes arrive
+        """
+        if offsets is not None and len(offsets) != parts:
+            raise ValueError("{} offsets given for {} parts"
+                             .format(len(offsets), parts))
+        self.width = width
+        self.height = height
+        self.parts = parts
+        self.mmap_path = mmap_path
+        self.mode = None
+        self.layout = offsets
+
+        self._array = None
+        # part number -> vertical offset of pasted stripes
+        self._offsets = {}
+        # part number -> stripes waiting for the ones above them
+        self._pending = {}
+        self._next_part = 1
+        self._next_offset = 0
+
+    @property
+    def complete(self):
+        return len(self._offsets) == self.parts
+
+    def add(self, num, img):
+        """ Paste a stripe into the image, or keep it until all stripes
+        above it are added if the layout is not known. The stripe is closed
+        once it's pasted.
+        :param int num: stripe number, from 1 to parts
+        :param Image.Image img: stripe
+        """
+        if not 1 <= num <= self.parts:
+            raise ValueError("Part number {} is not in range 1-{}"
+                             .format(num, self.parts))
+        if self._array is None:
+            self._allocate(img.mode)
+
+        if num in self._offsets:
+            # Stripe computed again, e.g. after its subtask was restarted
+            self._paste(img, self._offsets[num])
+            return
+
+        if self.layout is not None:
+            self._offsets[num] = self.layout[num - 1]
+            self._paste(img, self._offsets[num])
+            return
+
+        previous = self._pending.pop(num, None)
+        if previous:
+            previous.close()
+        self._pending[num] = img
+
+        while self._next_part in self._pending:
+            num, offset = self._next_part, self._next_offset
+            img = self._pending.pop(num)
+            self._offsets[num] = offset
+            self._next_part += 1
+            self._next_offset += img.size[1]
+            self._paste(img, offset)
+
+    def image(self):
+        """ Return composed image, independent of the image buffer. Rows of
+        stripes which weren't pasted are black.
+        :return Image.Image:
+        """
+        if self._array is None:
+            return Image.new('RGB', (self.width, self.height))
+        return Image.frombytes(self.mode, (self.width, self.height),
+                               self._array)
+
+    def close(self):
+        """ Drop the image buffer and remove its memory mapped file """
+        for img in self._pending.values():
+            img.close()
+        self._pending = {}
+
+        if self._array is None:
+            return
+        self._array = None
+        if self.mmap_path:
+            try:
+                os.remove(self.mmap_path)
+            except OSError as exc:
+                logger.warning("Cannot remove image buffer %r: %r",
+                               self.mmap_path, exc)
+
+    def _allocate(self, mode):
+        self.mode = mode if mode in self.MODES else 'RGB'
+        shape = (self.height, self.width)
+        if self.mode != 'L':
+            shape += (len(self.mode),)
+
+        if self.mmap_path:
+            self._array = numpy.memmap(self.mmap_path, dtype=numpy.uint8,
+                                       mode='w+', shape=shape)
+        else:
+            self._array = numpy.zeros(shape, dtype=numpy.uint8)
+
+    def _paste(self, img, offset):
+        try:
+            if img.mode != self.mode:
+                converted = img.convert(self.mode)
+                img.close()
+                img = converted
+            stripe = numpy.asarray(img)
+        finally:
+            img.close()
+
+        # Parts of the stripe outside of the image are dropped
+        height = max(0, min(stripe.shape[0], self.height - offset))
+        width = min(stripe.shape[1], self.width)
+        self._array[offset:offset + height, :width] = stripe[:height, :width]
@@ -19,7 +19,6 @@ from apps.rendering.task.renderingtask import (RenderingTask,
                                                PREVIEW_EXT)
 from apps.rendering.task.verificator import FrameRenderingVerificator
 from golem.core.common import update_dict, to_unicode
-from golem.task.taskbase import ResultType
 from golem.task.taskstate import SubtaskStatus, TaskStatus, SubtaskState
 
 logger = logging.getLogger("apps.rendering")
@@ -73,6 +72,10 @@ class FrameRenderingTask(RenderingTask):
             self.frames_state[frame_key] = FrameState()
             self.frames_subtasks[frame_key] = [None] * parts
 
+        # frame number (None for a single image) -> collector which pastes
+        # parts of the image as they're accepted
+        self.collectors = {}
+
         if self.use_frames:
             self.preview_file_path = [None] * len(self.frames)
             self.preview_task_file_path = [None] * len(self.frames)
@@ -81,6 +84,20 @@ class FrameRenderingTask(RenderingTask):
         self.verificator.use_frames = self.use_frames
         self.verificator.frames = self.frames
 
+    def __getstate__(self):
+        state = super(FrameRenderingTask, self).__getstate__()
+        # Images are put together from collected files after a restore
+        del state['collectors']
+        return state
+
+    def __setstate__(self, state):
+        super(FrameRenderingTask, self).__setstate__(state)
+        self.collectors = {}
+
+    def restart(self):
+        super(FrameRenderingTask, self).restart()
+        self._close_collectors()
+
     @CoreTask.handle_key_error
     def computation_failed(self, subtask_id):
         CoreTask.computation_failed(self, subtask_id)
@@ -91,10 +108,11 @@ class FrameRenderingTask(RenderingTask):
             self._update_task_preview()
 
     @CoreTask.handle_key_error
-    def computation_finished(self, subtask_id, task_result, result_type=ResultType.DATA):
-        super(FrameRenderingTask, self).computation_finished(subtask_id,
-                                                             task_result,
-                                                             result_type)
+    def results_verified(self, subtask_id, task_result, result_type, verdict):
+        super(FrameRenderingTask, self).results_verified(subtask_id,
+                                                         task_result,
+                                                         result_type,
+                                                         verdict)
         if self.use_frames:
             self._update_subtask_frame_status(subtask_id)
 
@@ -308,9 +326,8 @@ class FrameRenderingTask(RenderingTask):
         output_file_name = self.output_file
         self.collected_file_names = OrderedDict(sorted(self.collected_file_names.items()))
         if not self._use_outer_task_collector():
-            collector = RenderingTaskCollector(paste=True, width=self.res_x, height=self.res_y)
-            for file in self.collected_file_names.values():
-                collector.add_img_file(file)
+            collector = self._get_collector(
+                None, self.collected_file_names.values())
             collector.finalize().save(output_file_name, self.output_format)
         else:
             self._put_collected_files_together(os.path.join(self.tmp_dir, output_file_name),
@@ -323,9 +340,7 @@ class FrameRenderingTask(RenderingTask):
         collected = self.frames_given[frame_key]
         collected = OrderedDict(sorted(collected.items()))
         if not self._use_outer_task_collector():
-            collector = RenderingTaskCollector(paste=True, width=self.res_x, height=self.res_y)
-            for file in collected.values():
-                collector.add_img_file(file)
+            collector = self._get_collector(frame_num, collected.values())
             collector.finalize().save(output_file_name, self.output_format)
         else:
             self._put_collected_files_together(output_file_name, list(collected.values()), "paste")
@@ -336,6 +351,7 @@ class FrameRenderingTask(RenderingTask):
 
     def _collect_image_part(self, num_start, tr_file):
         self.collected_file_names[num_start] = tr_file
+        self._paste_part(None, self.total_tasks, num_start, tr_file)
         self._update_preview(tr_file, num_start)
         self._update_task_preview()
 
@@ -351,12 +367,65 @@ class FrameRenderingTask(RenderingTask):
         frame_key = str(frame_num)
         part = self._count_part(num_start, parts)
         self.frames_given[frame_key][part] = tr_file
+        self._paste_part(frame_num, parts, part, tr_file)
 
         self._update_frame_preview(tr_file, frame_num, part)
 
         if len(self.frames_given[frame_key]) == parts:
             self._put_frame_together(frame_num, num_start)
 
+    def _paste_part(self, frame_num, parts, part, tr_file):
+        """ Paste accepted part into its image right away, so that the
+        image is ready as soon as its last part is accepted """
+        if self._use_outer_task_collector():
+            return
+
+        collector = self.collectors.get(frame_num)
+        if collector is None:
+            collector = RenderingTaskCollector(
+                paste=True, width=self.res_x, height=self.res_y, parts=parts,
+                mmap_dir=self.tmp_dir, offsets=self._get_part_offsets(parts))
+            self.collectors[frame_num] = collector
+
+        try:
+            collector.add_img_file(tr_file, part)
+        except Exception as exc:
+            # The image will be put together from collected files
+            logger.warning("Cannot paste %r into the final image: %r",
+                           tr_file, exc)
+            self.collectors.pop(frame_num).close()
+
+    def _get_collector(self, frame_num, files):
+        """ Return collector with all parts of the image pasted, or a new
+        one with given files if parts weren't pasted as they were accepted
+        """
+        collector = self.collectors.pop(frame_num, None)
+        if collector is not None and collector.complete:
+            return collector
+        if collector is not None:
+            collector.close()
+
+        files = list(files)
+        collector = RenderingTaskCollector(
+            paste=True, width=self.res_x, height=self.res_y,
+            mmap_dir=self.tmp_dir, offsets=self._get_part_offsets(len(files)))
+        for file in files:
+            collector.add_img_file(file)
+        return collector
+
+    def _get_part_offsets(self, parts):
+        """ Vertical offsets of parts of an image, from the top, or None if
+        parts should be pasted one below another
+        :param int parts: number of parts of the image
+        :return list|None:
+        """
+        return None
+
+    def _close_collectors(self):
+        for collector in self.collectors.values():
+            collector.close()
+        self.collectors = {}
+
     def _count_part(self, start_num, parts):
         return ((start_num - 1) % parts) + 1
 
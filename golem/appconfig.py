@@ -32,6 +32,8 @@ OPTIMAL_PEER_NUM = 10
 USE_IP6 = 0
 ACCEPT_TASKS = 1
 SEND_PINGS = 1
+# Number of subtasks computed at the same time
+MAX_ASSIGNED_TASKS = 1
 
 PINGS_INTERVALS = 120
 GETTING_PEERS_INTERVAL = 4.0
@@ -126,6 +128,7 @@ class AppConfig:
             # flags
             accept_tasks=ACCEPT_TASKS,
             send_pings=SEND_PINGS,
+            max_assigned_tasks=MAX_ASSIGNED_TASKS,
             # hardware
             hardware_preset_name=CUSTOM_HARDWARE_PRESET_NAME,
             # price and trust
@@ -32,7 +32,7 @@ from golem.diag.vm import VMDiagnosticsProvider
 from golem.environments.environment import Environment as DefaultEnvironment
 from golem.environments.environmentsmanager import EnvironmentsManager
 from golem.manager.nodestatesnapshot import NodeStateSnapshot
-from golem.model import Database, Account
+from golem.model import Database, Account, db, db_writer
 from golem.monitor.model.nodemetadatamodel import NodeMetadataModel
 from golem.monitor.monitor import SystemMonitor
 from golem.monitorconfig import MONITOR_CONFIG
@@ -54,6 +54,7 @@ from golem.task import taskpreset
 from golem.task.taskbase import ResourceType
 from golem.task.taskserver import TaskServer
 from golem.task.taskstate import TaskTestStatus
+from golem.task.taskupdates import TaskUpdates
 from golem.task.tasktester import TaskTester
 from golem.tools import filelock
 from golem.transactions.ethereum.ethereumtransactionsystem import \
@@ -136,6 +137,7 @@ class Client(HardwarePresetsMixin):
         self.last_net_check_time = time.time()
         self.last_balance_time = time.time()
         self.last_tasks_time = time.time()
+        self.task_updates = TaskUpdates(self.get_task)
 
         self.last_node_state_snapshot = None
 
@@ -192,6 +194,7 @@ class Client(HardwarePresetsMixin):
     def configure_rpc(self, rpc_session):
         self.rpc_publisher = Publisher(rpc_session)
         StatusPublisher.set_publisher(self.rpc_publisher)
+        self.task_updates.reset()
 
     def p2p_listener(self, sender, signal, event='default', **kwargs):
         if event != 'unreachable':
@@ -201,7 +204,8 @@ class Client(HardwarePresetsMixin):
     def taskmanager_listener(self, sender, signal, event='default', **kwargs):
         if event != 'task_status_updated':
             return
-        self._publish(Task.evt_task_status, kwargs['task_id'])
+        # Published by __publish_events, once per task per tick
+        self.task_updates.mark(kwargs['task_id'])
 
     # TODO: re-enable
     def sync(self):
@@ -211,6 +215,7 @@ class Client(HardwarePresetsMixin):
     def start(self):
         if self.use_monitor and not self.monitor:
             self.init_monitor()
+        db_writer.start()
         try:
             self.start_network()
         except Exception:
@@ -229,9 +234,15 @@ class Client(HardwarePresetsMixin):
             self.publish_task.stop()
         if self.task_server:
             self.task_server.task_computer.quit()
+            self.task_server.task_manager.verification_queue.stop()
+            self.task_server.task_manager.flush_tasks(force=True)
+            self.task_server.header_verifier.stop()
+        if self.p2pservice:
+            self.p2pservice.challenge_solver.stop()
         if self.use_monitor and self.monitor:
             self.stop_monitor()
             self.monitor = None
+        db_writer.stop()
 
     def start_network(self):
         log.info("Starting network ...")
@@ -255,6 +266,9 @@ class Client(HardwarePresetsMixin):
                 use_ipv6=self.config_desc.use_ipv6,
                 use_docker_machine_manager=self.use_docker_machine_manager)
 
+        self.task_server.task_manager.verification_queue.start()
+        self.task_server.header_verifier.start()
+        self.p2pservice.challenge_solver.start()
         dir_manager = self.task_server.task_computer.dir_manager
 
         log.info("Starting resource server ...")
@@ -289,6 +303,13 @@ class Client(HardwarePresetsMixin):
             if self.monitor:
                 self.diag_service.register(self.p2pservice,
                                            self.monitor.on_peer_snapshot)
+                self.diag_service.register(
+                    self.task_server.task_manager.verification_queue)
+                self.diag_service.register(self.task_server.header_verifier)
+                self.diag_service.register(self.keys_auth.public_keys)
+                self.diag_service.register(db_writer)
+                self.diag_service.register(db.query_stats)
+                self.diag_service.register(self.environments_manager)
                 self.monitor.on_login()
 
             StatusPublisher.publish(Component.client, 'start',
@@ -395,6 +416,10 @@ class Client(HardwarePresetsMixin):
         dispatcher.send(signal='golem.monitor', event='shutdown')
 
         if self.db:
+            try:
+                Ranking.flush()
+            except Exception:
+                log.exception("Cannot save local ranks")
             self.db.close()
         self._unlock_datadir()
 
@@ -866,7 +891,8 @@ class Client(HardwarePresetsMixin):
             'id': str(env.get_id()),
             'supported': bool(env.check_support()),
             'accepted': env.is_accepted(),
-            'performance': env.get_performance(),
+            'performance': self.environments_manager.get_performance(
+                env.get_id()),
             'description': str(env.short_description)
         } for env in envs]
 
@@ -890,6 +916,7 @@ class Client(HardwarePresetsMixin):
                       'save': True}
             Thread(target=callback_wrapper, kwargs=kwargs).start()
             result = yield deferred
+            self.environments_manager.invalidate_performance(env_id)
             returnValue(result)
 
     def enable_environment(self, env_id):
@@ -1040,7 +1067,7 @@ class Client(HardwarePresetsMixin):
             self._publish(Network.evt_connection, self.connection_status())
 
         if now - self.last_tasks_time >= PUBLISH_TASKS_INTERVAL:
-            self._publish(Task.evt_task_list, self.get_tasks())
+            self.__publish_task_updates()
 
         if now - self.last_balance_time >= PUBLISH_BALANCE_INTERVAL:
             try:
@@ -1054,6 +1081,19 @@ class Client(HardwarePresetsMixin):
                     'ETH': str(eth)
                 })
 
+    def __publish_task_updates(self):
+        # Updates are kept until a client connects and gets the full list
+        if not self.rpc_publisher:
+            return
+        task_ids = list(self.task_server.task_manager.tasks)
+        updated, changes, full = self.task_updates.collect(task_ids)
+        for task_id in updated:
+            self._publish(Task.evt_task_status, task_id)
+        if changes:
+            self._publish(Task.evt_task_list_changes, changes)
+        if full:
+            self._publish(Task.evt_task_list, self.task_updates.task_list())
+
     def __make_node_state_snapshot(self, is_running=True):
         peers_num = len(self.p2pservice.peers)
         last_network_messages = self.p2pservice.get_last_messages()
@@ -38,6 +38,7 @@ class ClientConfigDescriptor(object):
         self.max_results_sending_delay = 0.0
 
         self.num_cores = 0
+        self.max_assigned_tasks = 0
         self.max_resource_size = 0
         self.max_memory_size = 0
         self.hardware_preset_name = ""
@@ -78,7 +79,8 @@ class ConfigApprover(object):
                        'use_distributed_resource_management',
                        'use_waiting_for_task_timeout', 'send_pings',
                        'use_ipv6', 'eth_account', 'accept_tasks', 'node_name']
-    to_int_opt = ['seed_port', 'num_cores', 'opt_peer_num',
+    to_int_opt = ['seed_port', 'num_cores', 'max_assigned_tasks',
+                  'opt_peer_num',
                   'waiting_for_task_timeout', 'p2p_session_timeout',
                   'task_session_timeout', 'pings_interval',
                   'max_results_sending_delay', 'min_price', 'max_price']
@@ -1,16 +1,27 @@
 import struct
-from golem.core.common import to_unicode
 
-from .variables import LONG_STANDARD_SIZE
+from .variables import LONG_STANDARD_SIZE
 
 MAX_BUFFER_SIZE = 2 * 1024 * 1024
+# Consumed data is removed from the buffer only when there's at least
+# this much of it and it takes more than a half of the buffer
+COMPACT_THRESHOLD = 64 * 1024
 
 
 class DataBuffer:
-    """ Data buffer that helps with network communication. """
+    """ Data buffer that helps with network communication. Data is kept
+    in a bytearray and reads only move a read offset; consumed data is
+    dropped from time to time, so reading many messages out of a big chunk
+    of data takes linear time. """
     def __init__(self):
         """ Create new data buffer """
-        self.buffered_data = b""
+        self._data = bytearray()
+        self._offset = 0
+
+    @property
+    def buffered_data(self):
+        """ Copy of data that hasn't been read yet """
+        return self.peek_string(self.data_size())
 
     def append_ulong(self, num):
         """
@@ -20,7 +31,7 @@ class DataBuffer:
         if num < 0:
             raise AttributeError("num must be grater than 0")
         str_num_rep = struct.pack("!L", num)
-        self.buffered_data = b"".join([self.buffered_data, str_num_rep])
+        self._data += str_num_rep
         return str_num_rep
 
     def append_string(self, data, check_size=True, overflow_prefix=None):
@@ -31,24 +42,24 @@ class DataBuffer:
         """
         new_size = self.data_size() + len(data)
         if check_size and new_size > MAX_BUFFER_SIZE:
-            self.buffered_data = b"".join([overflow_prefix or '', data])
-        else:
-            self.buffered_data = b"".join([self.buffered_data, data])
+            self._data = bytearray(overflow_prefix or b'')
+            self._offset = 0
+        self._data += data
 
     def data_size(self):
         """ Return size of data in buffer
         :return int: size of data in buffer
         """
-        return len(self.buffered_data)
+        return len(self._data) - self._offset
 
     def peek_ulong(self):
         """ Check long number that is located at the beginning of this data buffer
         :return long: number at the beginning of the buffer
         """
-        if len(self.buffered_data) < LONG_STANDARD_SIZE:
+        if self.data_size() < LONG_STANDARD_SIZE:
             raise ValueError("buffer_data is shorter than {}".format(LONG_STANDARD_SIZE))
 
-        (ret_val,) = struct.unpack("!L", self.buffered_data[0:LONG_STANDARD_SIZE])
+        (ret_val,) = struct.unpack_from("!L", self._data, self._offset)
         return ret_val
 
     def read_ulong(self):
@@ -56,7 +67,7 @@ class DataBuffer:
         :return long: long number removed from the beginning of buffer
         """
         val_ = self.peek_ulong()
-        self.buffered_data = self.buffered_data[4:]
+        self._consume(LONG_STANDARD_SIZE)
 
         return val_
 
@@ -65,10 +76,11 @@ class DataBuffer:
         :param long num_chars: how many chars should be read from buffer
         :return str: first <num_chars> chars from buffer
         """
-        if num_chars > len(self.buffered_data):
+        if num_chars > self.data_size():
             raise AttributeError("num_chars is grater than buffer length")
 
-        ret_str = self.buffered_data[:num_chars]
+        with memoryview(self._data) as view:
+            ret_str = view[self._offset:self._offset + num_chars].tobytes()
         return ret_str
 
     def read_string(self, num_chars):
@@ -77,7 +89,7 @@ class DataBuffer:
         :return str: string removed form buffer
         """
         val_ = self.peek_string(num_chars)
-        self.buffered_data = self.buffered_data[num_chars:]
+        self._consume(num_chars)
 
         return val_
 
@@ -86,7 +98,7 @@ class DataBuffer:
         :return str: all data that was in the buffer.
         """
         ret_data = self.buffered_data
-        self.buffered_data = b""
+        self.clear_buffer()
 
         return ret_data
 
@@ -119,4 +131,16 @@ class DataBuffer:
 
     def clear_buffer(self):
         """ Remove all data from the buffer """
-        self.buffered_data = b""
+        self._data = bytearray()
+        self._offset = 0
+
+    def _consume(self, num_chars):
+        """ Mark first <num_chars> chars of the buffer as read """
+        self._offset += num_chars
+
+        if self._offset == len(self._data):
+            self.clear_buffer()
+        elif (self._offset >= COMPACT_THRESHOLD and
+              self._offset * 2 >= len(self._data)):
+            del self._data[:self._offset]
+            self._offset = 0
@@ -0,0 +1,224 @@
+import logging
+import queue
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from peewee import SqliteDatabase
+from twisted.internet import defer
+from twisted.python.failure import Failure
+
+from golem.diag.service import DiagnosticsProvider
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStats(DiagnosticsProvider):
+    """ Counts executed SQL queries and their execution time, grouped by
+    the statement type and the table they concern, e.g. 'UPDATE stats'.
+    """
+
+    # Upper bounds of histogram buckets in milliseconds
+    BUCKETS = (0.1, 1.0, 10.0, 100.0, 1000.0, float('inf'))
+
+    _VERB_RE = re.compile(r'^\s*(\w+)')
+    _TABLE_RE = re.compile(
+        r'\b(?:FROM|INTO|UPDATE|TABLE|ON)\s+'
+        r'(?:IF\s+(?:NOT\s+)?EXISTS\s+)?"?(\w+)', re.IGNORECASE)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = dict()
+
+    @classmethod
+    def label(cls, sql):
+        verb = cls._VERB_RE.match(sql)
+        if not verb:
+            return 'OTHER'
+        table = cls._TABLE_RE.search(sql)
+        if not table:
+            return verb.group(1).upper()
+        return '{} {}'.format(verb.group(1).upper(), table.group(1))
+
+    def add(self, sql, duration):
+        label = self.label(sql)
+        duration_ms = duration * 1000
+        bucket = bisect_left(self.BUCKETS, duration_ms)
+        with self._lock:
+            stats = self._stats.get(label)
+            if stats is None:
+                stats = self._stats[label] = \
+                    [0, 0.0, 0.0, [0] * len(self.BUCKETS)]
+            stats[0] += 1
+            stats[1] += duration_ms
+            stats[2] = max(stats[2], duration_ms)
+            stats[3][bucket] += 1
+
+    def clear(self):
+        with self._lock:
+            self._stats = dict()
+
+    def get_diagnostics(self, output_format):
+        with self._lock:
+            data = {
+                label: dict(
+                    count=count,
+                    total_ms=total,
+                    avg_ms=total / count,
+                    max_ms=maximum,
+                    histogram={
+                        '<={}ms'.format(bound): number
+                        for bound, number in zip(self.BUCKETS, histogram)
+                    },
+                )
+                for label, (count, total, maximum, histogram)
+                in self._stats.items()
+            }
+        return self._format_diagnostics(data, output_format)
+
+
+class ProfiledSqliteDatabase(SqliteDatabase):
+    """ SqliteDatabase which measures execution time of every query """
+
+    def __init__(self, *args, **kwargs):
+        super(ProfiledSqliteDatabase, self).__init__(*args, **kwargs)
+        self.query_stats = QueryStats()
+
+    def execute_sql(self, sql, params=None, require_commit=True):
+        started = time.time()
+        try:
+            return super(ProfiledSqliteDatabase, self).execute_sql(
+                sql, params, require_commit)
+        finally:
+            self.query_stats.add(sql, time.time() - started)
+
+
+class DatabaseWriter(DiagnosticsProvider):
+    """ Performs database writes on a single, dedicated thread.
+
+    SQLite allows one writer at a time, so writes issued from the reactor
+    and worker threads used to wait on each other's locks (busy_timeout)
+    and each paid for a separate commit. Jobs passed to write() are queued
+    and the writer thread runs them in batches, each batch in a single
+    transaction; every job runs in its own savepoint, so a failing job
+    does not roll back the rest of the batch. Results are delivered to the
+    reactor thread. Until the writer is started, jobs are run synchronously
+    in the calling thread.
+    """
+
+    DEFAULT_BATCH_SIZE = 100
+
+    def __init__(self, database, batch_size=DEFAULT_BATCH_SIZE):
+        self.database = database
+        self.batch_size = batch_size
+
+        self._lock = threading.RLock()
+        self._queue = queue.Queue()
+        self._thread = None
+
+        self.jobs = 0
+        self.failed = 0
+        self.batches = 0
+        self.max_batch = 0
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run,
+                                        name='DatabaseWriter')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """ Stop the writer thread after all queued jobs are written """
+        if not self._thread:
+            return
+        thread, self._thread = self._thread, None
+        self._queue.put(None)
+        thread.join(timeout)
+
+    def write(self, method, *args, **kwargs):
+        """ Run method(*args, **kwargs) on the writer thread
+        :return Deferred: fires with the result of method in the reactor
+        thread; fires immediately if the writer is not running
+        """
+        if not self._thread:
+            with self._lock:
+                return defer.maybeDeferred(self._run_job, method, args,
+                                           kwargs)
+
+        deferred = defer.Deferred()
+        self._queue.put((method, args, kwargs, deferred))
+        return deferred
+
+    def get_diagnostics(self, output_format):
+        data = dict(
+            running=self.running,
+            queued=self._queue.qsize(),
+            jobs=self.jobs,
+            failed=self.failed,
+            batches=self.batches,
+            max_batch=self.max_batch,
+        )
+        return self._format_diagnostics(data, output_format)
+
+    def _run_job(self, method, args, kwargs):
+        self.jobs += 1
+        try:
+            return method(*args, **kwargs)
+        except Exception:
+            self.failed += 1
+            raise
+
+    def _run(self):
+        from twisted.internet import reactor
+
+        try:
+            stopped = False
+            while not stopped:
+                batch = [self._queue.get()]
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if None in batch:
+                    stopped = True
+                    batch = [job for job in batch if job is not None]
+                if not batch:
+                    continue
+
+                for deferred, result in self._write_batch(batch):
+                    method = deferred.errback \
+                        if isinstance(result, Failure) else deferred.callback
+                    reactor.callFromThread(method, result)
+        finally:
+            if not self.database.is_closed():
+                self.database.close()
+
+    def _write_batch(self, batch):
+        results = []
+        self.batches += 1
+        self.max_batch = max(self.max_batch, len(batch))
+
+        try:
+            with self._lock, self.database.atomic():
+                for method, args, kwargs, deferred in batch:
+                    try:
+                        with self.database.atomic():
+                            result = self._run_job(method, args, kwargs)
+                    except Exception:  # pylint: disable=broad-except
+                        result = Failure()
+                    results.append((deferred, result))
+        except Exception:  # pylint: disable=broad-except
+            # Commit failed, none of the jobs were written
+            logger.exception("Cannot write a batch of %d jobs", len(batch))
+            failure = Failure()
+            results = [(deferred, failure)
+                       for _, _, _, deferred in batch]
+        return results
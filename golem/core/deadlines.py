@@ -0,0 +1,60 @@
+import heapq
+import itertools
+
+
+class DeadlineScheduler(object):
+    """ Keeps deadlines of items and returns the items whose deadlines have
+    passed, in the order of their deadlines.
+
+    Deadlines are kept in a heap; cancelled and rescheduled items leave
+    stale heap entries behind, which are skipped when they come to the top
+    and dropped when they outnumber the live entries. Checking for expired
+    items costs O(expired * log n), regardless of how many items have been
+    scheduled before.
+    """
+
+    def __init__(self):
+        # (deadline, order, key); order keeps keys from being compared
+        self._heap = []
+        self._deadlines = {}
+        self._order = itertools.count()
+
+    def schedule(self, key, deadline):
+        """ Set deadline of an item, replacing its previous deadline """
+        self._deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, next(self._order), key))
+        self._compact()
+
+    def cancel(self, key):
+        self._deadlines.pop(key, None)
+
+    def deadline(self, key):
+        return self._deadlines.get(key)
+
+    def pop_expired(self, now):
+        """ Remove and return items with deadlines earlier than now
+        :return list: keys of expired items, earliest deadline first
+        """
+        expired = []
+        while self._heap and self._heap[0][0] < now:
+            deadline, _, key = heapq.heappop(self._heap)
+            if self._deadlines.get(key) == deadline:
+                del self._deadlines[key]
+                expired.append(key)
+        return expired
+
+    def clear(self):
+        self._heap = []
+        self._deadlines = {}
+
+    def __contains__(self, key):
+        return key in self._deadlines
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def _compact(self):
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._heap = [entry for entry in self._heap
+                          if self._deadlines.get(entry[2]) == entry[0]]
+            heapq.heapify(self._heap)
@@ -131,3 +131,113 @@ class AESFileEncryptor(FileEncryptor):
                     working = False
 
                 dst.write(chunk)
+
+    @classmethod
+    def stream_writer(cls, dst, secret, key_len=32):
+        """ Start an encrypted stream in file object dst. Output is
+        compatible with the encrypt method.
+        :return AESStreamWriter: file-like object to write plain data to
+        """
+        block_size = cls.block_size
+        salt = cls.gen_salt(block_size)
+        key, iv = cls.get_key_and_iv(secret, salt, key_len, block_size)
+
+        dst.write(cls.salt_prefix + salt)
+        return AESStreamWriter(dst, AES.new(key, cls.aes_mode, iv),
+                               block_size)
+
+    @classmethod
+    def stream_reader(cls, src, secret, key_len=32):
+        """ Decrypt a stream read from file object src, as created by the
+        encrypt method or a stream writer.
+        :return AESStreamReader: file-like object to read plain data from
+        """
+        block_size = cls.block_size
+
+        block = src.read(block_size)
+        salt = block[cls.salt_prefix_len:]
+        key, iv = cls.get_key_and_iv(secret, salt, key_len, block_size)
+
+        return AESStreamReader(src, AES.new(key, cls.aes_mode, iv),
+                               block_size, cls.chunk_size * block_size)
+
+
+class AESStreamWriter(object):
+    """ Encrypts data as it is written and passes it on to the underlying
+    file object. Closing the writer pads and writes the last block, but
+    doesn't close the underlying file. """
+
+    def __init__(self, dst, cipher, block_size):
+        self._dst = dst
+        self._cipher = cipher
+        self._block_size = block_size
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer += data
+
+        length = len(self._buffer)
+        length -= length % self._block_size
+        if length:
+            self._dst.write(self._cipher.encrypt(bytes(self._buffer[:length])))
+            del self._buffer[:length]
+
+        return len(data)
+
+    def flush(self):
+        self._dst.flush()
+
+    def close(self):
+        if self._cipher is None:
+            return
+
+        pad_len = self._block_size - len(self._buffer) % self._block_size
+        self._buffer += bytes([pad_len]) * pad_len
+        self._dst.write(self._cipher.encrypt(bytes(self._buffer)))
+
+        self._buffer = bytearray()
+        self._cipher = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class AESStreamReader(object):
+    """ Decrypts data read from the underlying file object on demand """
+
+    def __init__(self, src, cipher, block_size, chunk_size):
+        self._src = src
+        self._cipher = cipher
+        self._block_size = block_size
+        self._chunk_size = chunk_size
+        self._buffer = bytearray()
+        self._next_chunk = self._cipher.decrypt(src.read(chunk_size))
+        self._eof = False
+
+    def read(self, size=-1):
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            self._read_chunk()
+
+        if size < 0 or size > len(self._buffer):
+            size = len(self._buffer)
+
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def _read_chunk(self):
+        chunk = self._next_chunk
+        self._next_chunk = self._cipher.decrypt(self._src.read(
+            self._chunk_size))
+
+        if not self._next_chunk:
+            pad_len = chunk[-1] if chunk else 0
+            if not 0 < pad_len <= self._block_size:
+                raise ValueError("Invalid padding of encrypted data")
+            chunk = chunk[:-pad_len]
+            self._eof = True
+
+        self._buffer += chunk
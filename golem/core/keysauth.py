@@ -1,8 +1,11 @@
 import abc
 import logging
+import multiprocessing
 import os
+import threading
 from _pysha3 import sha3_256 as _sha3_256
 from abc import abstractmethod
+from collections import OrderedDict
 from hashlib import sha256
 
 import bitcoin
@@ -13,12 +16,17 @@ from Crypto.Signature.pkcs1_15 import PKCS115_SigScheme
 from devp2p.crypto import ECCx, mk_privkey
 
 from golem.core.variables import PRIVATE_KEY, PUBLIC_KEY
+from golem.diag.service import DiagnosticsProvider
+from golem.report import Component, Stage, StatusPublisher, report_call
 from golem.utils import encode_hex, decode_hex
 from .simpleenv import get_local_datadir
 from .simplehash import SimpleHash
 
 logger = logging.getLogger(__name__)
 
+# How many keys a worker process generates from one random seed
+KEY_SEARCH_BATCH = 64
+
 
 def sha3(seed):
     """ Return sha3-256 (NOT keccak) of seed in digest
@@ -36,6 +44,18 @@ def sha2(seed):
     return int("0x" + sha256(seed).hexdigest(), 16)
 
 
+def difficulty_threshold(difficulty):
+    """ Return the greatest sha256 digest meeting given difficulty.
+    Digests are compared as bytes, which for digests of equal length is the
+    same as comparing them as big-endian numbers.
+    :param int difficulty: difficulty level
+    :return bytes: digest of 2 ** (256 - difficulty)
+    """
+    if difficulty <= 0:
+        return b'\xff' * 32
+    return (2 ** (256 - difficulty)).to_bytes(32, 'big')
+
+
 def privtopub(raw_privkey):
     raw_pubkey = bitcoin.encode_pubkey(bitcoin.privtopub(raw_privkey),
                                        'bin_electrum')
@@ -72,6 +92,126 @@ def get_random_float():
     return float(result - 1) / float(10 ** len(str(result)))
 
 
+# (found event, counter of tried keys) shared by key search processes
+_key_search_state = None
+
+
+def _init_key_search(found, tried):
+    global _key_search_state
+    _key_search_state = (found, tried)
+
+
+def _search_key_pair(difficulty, batch_size):
+    """ Generate EC key pairs in a key search process until a key id
+    meets difficulty or another process finds one
+    :return (bytes, bytes)|None: private and public key
+    """
+    found, tried = _key_search_state
+    threshold = difficulty_threshold(difficulty)
+    while not found.is_set():
+        seed = os.urandom(32)
+        for i in range(batch_size):
+            priv_key = mk_privkey(seed + i.to_bytes(4, 'big'))
+            pub_key = privtopub(priv_key)
+            key_id = encode_hex(pub_key).encode()
+            if sha256(key_id).digest() <= threshold:
+                found.set()
+                return priv_key, pub_key
+        with tried.get_lock():
+            tried.value += batch_size
+    return None
+
+
+def find_key_pair(difficulty, processes=None, batch_size=KEY_SEARCH_BATCH,
+                  progress=None, progress_interval=1.0):
+    """ Generate an EC key pair whose key id meets given difficulty,
+    searching in a process per core. Every process derives keys from its
+    own random seeds; all of them stop when one finds a key pair.
+    :param progress: function called with the number of keys tried so far
+    every progress_interval seconds
+    :return (bytes, bytes): private and public key
+    """
+    processes = processes or multiprocessing.cpu_count()
+    found = multiprocessing.Event()
+    tried = multiprocessing.Value('L', 0)
+    pool = multiprocessing.Pool(processes, _init_key_search, (found, tried))
+    try:
+        results = [pool.apply_async(_search_key_pair,
+                                    (difficulty, batch_size))
+                   for _ in range(processes)]
+        while not found.wait(progress_interval):
+            for result in results:
+                if result.ready():
+                    # Raises exceptions of the worker
+                    result.get()
+            if progress:
+                progress(tried.value)
+        # Other processes return after their current batch
+        for result in results:
+            key_pair = result.get()
+            if key_pair:
+                return key_pair
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+class PublicKeyCache(DiagnosticsProvider):
+    """ Keeps ECCx instances prepared for public keys of peers, so that
+    the key is decoded and validated once rather than for every verified
+    signature. At most max_entries keys are kept, least recently used
+    ones are dropped first.
+    """
+
+    DEFAULT_MAX_ENTRIES = 1024
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, public_key):
+        """ Return ECCx instance for given public key
+        :param bytes public_key: raw public key (len == 64)
+        :raise AssertionError|Exception: in case of an invalid public key
+        """
+        with self._lock:
+            ecc = self._entries.get(public_key)
+            if ecc is not None:
+                self.hits += 1
+                self._entries.move_to_end(public_key)
+                return ecc
+            self.misses += 1
+
+        ecc = ECCx(public_key)
+
+        with self._lock:
+            self._entries[public_key] = ecc
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return ecc
+
+    def clear(self):
+        with self._lock:
+            self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_diagnostics(self, output_format):
+        requests = self.hits + self.misses
+        data = dict(
+            cached=len(self._entries),
+            hits=self.hits,
+            misses=self.misses,
+            hit_rate=self.hits / requests if requests else 0.0,
+        )
+        return self._format_diagnostics(data, output_format)
+
+
 class KeysAuth(object):
     """ Cryptographic authorization manager. Create and keeps private and public keys."""
 
@@ -94,15 +234,13 @@ class KeysAuth(object):
         use default key_id
         :return int: key_id difficulty
         """
-        difficulty = 0
         if key_id is None:
             key_id = self.key_id
-        min_hash = KeysAuth._count_min_hash(difficulty)
-        while sha2(key_id) <= min_hash:
-            difficulty += 1
-            min_hash = KeysAuth._count_min_hash(difficulty)
-
-        return difficulty - 1
+        if isinstance(key_id, str):
+            key_id = key_id.encode()
+        key_hash = int.from_bytes(sha256(key_id).digest(), 'big')
+        # Greatest difficulty for which key_hash <= 2 ** (256 - difficulty)
+        return 256 - (key_hash - 1).bit_length()
 
     def get_public_key(self):
         """ Return public key """
@@ -280,10 +418,10 @@ class RSAKeysAuth(KeysAuth):
         """ Generate new pair of keys with given difficulty
         :param int difficulty: desired key difficulty level
         """
-        min_hash = self._count_min_hash(difficulty)
+        threshold = difficulty_threshold(difficulty)
         priv_key = RSA.generate(2048)
         pub_key = str(priv_key.publickey().n)
-        while sha2(pub_key) > min_hash:
+        while sha256(pub_key.encode()).digest() > threshold:
             priv_key = RSA.generate(2048)
             pub_key = str(priv_key.publickey().n)
         pub_key = priv_key.publickey()
@@ -405,6 +543,7 @@ class EllipticalKeysAuth(KeysAuth):
         :param uuid|None uuid: application identifier (to read keys)
         """
         KeysAuth.__init__(self, datadir, private_key_name, public_key_name)
+        self.public_keys = PublicKeyCache()
         try:
             self.ecc = ECCx(None, self._private_key)
         except AssertionError:
@@ -464,7 +603,7 @@ class EllipticalKeysAuth(KeysAuth):
                 public_key = self.public_key
             if len(public_key) == 128:
                 public_key = decode_hex(public_key)
-            ecc = ECCx(public_key)
+            ecc = self.public_keys.get(public_key)
             return ecc.verify(sig, sha3(data))
         except AssertionError:
             logger.info("Wrong key format")
@@ -472,19 +611,24 @@ class EllipticalKeysAuth(KeysAuth):
             logger.error("Cannot verify signature: {}".format(exc))
         return False
 
-    def generate_new(self, difficulty):
-        """ Generate new pair of keys with given difficulty
+    def generate_new(self, difficulty, processes=None):
+        """ Generate new pair of keys with given difficulty, on all cores.
+        Progress is published as the client's 'generate_keys' status.
         :param int difficulty: desired key difficulty level
+        :param int processes: number of key search processes, one per core
+        by default
         :raise TypeError: in case of incorrect @difficulty type
         """
         if not isinstance(difficulty, int):
             raise TypeError("Incorrect 'difficulty' type: {}".format(type(difficulty)))
-        min_hash = self._count_min_hash(difficulty)
-        priv_key = mk_privkey(str(get_random_float()))
-        pub_key = privtopub(priv_key)
-        while sha2(self.cnt_key_id(pub_key)) > min_hash:
-            priv_key = mk_privkey(str(get_random_float()))
-            pub_key = privtopub(priv_key)
+
+        def progress(tried):
+            StatusPublisher.publish(Component.client, 'generate_keys',
+                                    Stage.pre, data=tried)
+
+        with report_call(Component.client, 'generate_keys'):
+            priv_key, pub_key = find_key_pair(difficulty, processes,
+                                              progress=progress)
         self._set_and_save(priv_key, pub_key)
 
     def load_from_file(self, file_name):
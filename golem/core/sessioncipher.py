@@ -0,0 +1,158 @@
+import itertools
+import os
+import struct
+
+import bitcoin
+from Crypto.Cipher import AES
+from Crypto.Hash import SHA256
+from Crypto.Protocol.KDF import HKDF
+
+from golem.core.keysauth import privtopub
+
+# Key in the hello message metadata that carries an ephemeral public key
+SESSION_KEY_METADATA = 'session_key'
+
+# First byte of a frame. Serialized messages start with 0x84 (CBOR array)
+# and ECIES ciphertexts with 0x04, so frames are easy to tell apart.
+FRAME_MAGIC = b'\xae'
+FRAME_HEADER = struct.Struct('!cQ')
+TAG_SIZE = 16
+MAX_COUNTER = 2 ** 64 - 1
+# Number of most recent frame counters remembered to reject replays
+REPLAY_WINDOW = 64
+
+KDF_CONTEXT = b'golem session keys'
+
+
+class SessionCipherError(Exception):
+    pass
+
+
+class SessionKeyExchange(object):
+    """ Ephemeral secp256k1 key pair. Its public key is sent in a signed
+    hello message and the ECDH secret it shares with the peer's ephemeral
+    key is used to derive symmetric session keys.
+    """
+
+    def __init__(self):
+        self._private_key = self._new_private_key()
+        self.public_key = privtopub(self._private_key)
+
+    def derive(self, peer_public_key):
+        """ Derive keys shared with the owner of peer_public_key
+        :param bytes peer_public_key: raw (64 bytes) ephemeral public key
+        :return SessionCipher: cipher for this side of the session
+        """
+        if not isinstance(peer_public_key, bytes) \
+                or len(peer_public_key) != 64 \
+                or peer_public_key == self.public_key:
+            raise SessionCipherError("Invalid session key")
+
+        try:
+            point = bitcoin.decode_pubkey(b'\x04' + peer_public_key, 'bin')
+            if not bitcoin.is_pubkey(point) or not self._on_curve(point):
+                raise ValueError("point is not on the curve")
+            shared = bitcoin.fast_multiply(
+                point, bitcoin.decode_privkey(self._private_key, 'bin'))
+        except (ValueError, TypeError, AssertionError) as exc:
+            raise SessionCipherError("Invalid session key: {}".format(exc))
+
+        secret = shared[0].to_bytes(32, 'big')
+        low, high = sorted([self.public_key, peer_public_key])
+        low_key, high_key = HKDF(secret, 32, low + high, SHA256,
+                                 num_keys=2, context=KDF_CONTEXT)
+
+        if self.public_key == low:
+            return SessionCipher(send_key=low_key, receive_key=high_key)
+        return SessionCipher(send_key=high_key, receive_key=low_key)
+
+    @staticmethod
+    def _new_private_key():
+        while True:
+            private_key = os.urandom(32)
+            if 0 < int.from_bytes(private_key, 'big') < bitcoin.N:
+                return private_key
+
+    @staticmethod
+    def _on_curve(point):
+        x, y = point
+        return (y * y - x * x * x - bitcoin.A * x - bitcoin.B) % bitcoin.P == 0
+
+
+class SessionCipher(object):
+    """ Encrypts and authenticates session traffic with AES-GCM. Every frame
+    carries a counter that is used as its nonce, so a key never encrypts
+    two frames with the same nonce. Frames may arrive slightly out of order
+    (chunks of a stream are prepared ahead of time), but each counter is
+    accepted only once.
+    """
+
+    def __init__(self, send_key, receive_key):
+        self._send_key = send_key
+        self._receive_key = receive_key
+        self._send_counter = itertools.count()
+        self._receive_max = -1
+        self._receive_window = 0
+
+    @staticmethod
+    def is_frame(data):
+        return len(data) >= FRAME_HEADER.size + TAG_SIZE \
+            and data[:1] == FRAME_MAGIC
+
+    def encrypt(self, data):
+        """ Encrypt data into a frame
+        :param bytes data: data to encrypt
+        :return bytes: frame
+        """
+        counter = next(self._send_counter)
+        if counter > MAX_COUNTER:
+            raise SessionCipherError("Session keys are exhausted")
+
+        header = FRAME_HEADER.pack(FRAME_MAGIC, counter)
+        cipher = AES.new(self._send_key, AES.MODE_GCM, nonce=header[1:],
+                         mac_len=TAG_SIZE)
+        cipher.update(header)
+        ciphertext, tag = cipher.encrypt_and_digest(data)
+        return b''.join([header, ciphertext, tag])
+
+    def decrypt(self, frame):
+        """ Verify and decrypt a frame
+        :param bytes frame: frame produced by the peer's cipher
+        :return bytes: decrypted data
+        :raise SessionCipherError: frame is malformed, forged or replayed
+        """
+        if not self.is_frame(frame):
+            raise SessionCipherError("Not a session frame")
+
+        header = frame[:FRAME_HEADER.size]
+        _, counter = FRAME_HEADER.unpack(header)
+        if not self._is_new(counter):
+            raise SessionCipherError("Replayed frame {}".format(counter))
+
+        cipher = AES.new(self._receive_key, AES.MODE_GCM, nonce=header[1:],
+                         mac_len=TAG_SIZE)
+        cipher.update(header)
+        try:
+            data = cipher.decrypt_and_verify(
+                frame[FRAME_HEADER.size:-TAG_SIZE], frame[-TAG_SIZE:])
+        except ValueError:
+            raise SessionCipherError("Frame authentication failed")
+
+        self._accept(counter)
+        return data
+
+    def _is_new(self, counter):
+        if counter > self._receive_max:
+            return True
+        offset = self._receive_max - counter
+        return offset < REPLAY_WINDOW \
+            and not (self._receive_window >> offset) & 1
+
+    def _accept(self, counter):
+        if counter > self._receive_max:
+            shift = counter - self._receive_max
+            window = (self._receive_window << shift) | 1
+            self._receive_window = window & ((1 << REPLAY_WINDOW) - 1)
+            self._receive_max = counter
+        else:
+            self._receive_window |= 1 << (self._receive_max - counter)
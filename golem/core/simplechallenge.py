@@ -1,12 +1,23 @@
 # Generating, solving and checking solutions of crypto-puzzles for proof of work system
 
-from random import sample
+import logging
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from hashlib import sha256
+from multiprocessing import cpu_count
+from random import sample
 
-from golem.core.keysauth import get_random, sha2
+from twisted.internet import defer
+from twisted.python.failure import Failure
+
+from golem.core.keysauth import difficulty_threshold, get_random
 
 __author__ = 'Magda.Stasiewicz'
 
+logger = logging.getLogger(__name__)
+
 CHALLENGE_HISTORY_LIMIT = 100
 MAX_RANDINT = 100000000000000000000000000
 
@@ -27,16 +38,34 @@ def create_challenge(history, prev):
     return concat
 
 
+def search_solution(challenge, threshold, start, stop):
+    """ Return the first solution from range [start, stop) or None
+    :param str challenge: puzzle to solve
+    :param bytes threshold: threshold returned by difficulty_threshold
+    """
+    prefix = sha256(challenge.encode())
+    for solution in range(start, stop):
+        digest = prefix.copy()
+        digest.update(str(solution).encode())
+        if digest.digest() <= threshold:
+            return solution
+    return None
+
+
 def solve_challenge(challenge, difficulty):
     """
     Solves the puzzle given in string challenge difficulty is required number of zeros in the beginning of binary
     representation of solution's hash returns solution and computation time in seconds
     """
     start = time.time()
-    min_hash = pow(2, 256 - difficulty)     # could be done prettier
-    solution = 0
-    while sha2(challenge + str(solution)) > min_hash:
-        solution += 1
+    threshold = difficulty_threshold(difficulty)
+    chunk_size = ChallengeSolver.DEFAULT_CHUNK_SIZE
+    solution = None
+    offset = 0
+    while solution is None:
+        solution = search_solution(challenge, threshold, offset,
+                                   offset + chunk_size)
+        offset += chunk_size
     end = time.time()
     return solution, end - start
 
@@ -48,6 +77,173 @@ def accept_challenge(challenge, solution, difficulty):
     :param int difficulty: difficulty of a challenge
     :return boolean: true if solution is valid, false otherwise
     """
-    if sha2(challenge + str(solution)) <= pow(2, 256 - difficulty):     # also could be done prettier
-        return True
-    return False
+    digest = sha256((challenge + str(solution)).encode()).digest()
+    return digest <= difficulty_threshold(difficulty)
+
+
+class ChallengeSolver(object):
+    """ Solves challenges in a pool of processes, outside of the reactor
+    thread.
+
+    The space of solutions is searched in chunks, a chunk per process at a
+    time. Chunks preceding the first solution found are searched to the
+    end, so the smallest solution is returned, as by solve_challenge.
+    A challenge which is not solved within the timeout is
+    abandoned and its Deferred fails with CancelledError, as it does when
+    it's cancelled. Until the solver is started, challenges are solved
+    synchronously in the calling thread. If a process of the pool dies,
+    the pool is restarted and the challenge being solved is searched in
+    the solver's thread instead.
+    """
+
+    DEFAULT_CHUNK_SIZE = 2 ** 14
+    DEFAULT_TIMEOUT = 30
+
+    def __init__(self, processes=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 timeout=DEFAULT_TIMEOUT):
+        self.processes = processes or cpu_count()
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+
+        self._executor = None
+        # Events stopping challenges which are being solved
+        self._stopped = set()
+
+    @property
+    def running(self):
+        return self._executor is not None
+
+    def start(self):
+        if self._executor:
+            return
+        self._executor = ProcessPoolExecutor(self.processes)
+
+    def stop(self):
+        if not self._executor:
+            return
+        executor, self._executor = self._executor, None
+        for stopped in list(self._stopped):
+            stopped.set()
+        executor.shutdown(wait=False)
+
+    def solve(self, challenge, difficulty):
+        """ Solve challenge with given difficulty
+        :return Deferred: fires with (solution, computation time in seconds)
+        in the reactor thread; fires immediately if the solver is not
+        running
+        """
+        if not self._executor:
+            return defer.maybeDeferred(solve_challenge, challenge, difficulty)
+
+        from twisted.internet import reactor
+
+        stopped = threading.Event()
+        self._stopped.add(stopped)
+        deferred = defer.Deferred(canceller=lambda _: stopped.set())
+        timeout = reactor.callLater(self.timeout, deferred.cancel)
+
+        def finished(result):
+            self._stopped.discard(stopped)
+            if timeout.active():
+                timeout.cancel()
+            return result
+
+        deferred.addBoth(finished)
+        reactor.callInThread(self._run, self._executor, challenge,
+                             difficulty, stopped, deferred)
+        return deferred
+
+    def _run(self, executor, challenge, difficulty, stopped, deferred):
+        from twisted.internet import reactor
+
+        try:
+            try:
+                result = self._search(executor, challenge, difficulty,
+                                      stopped)
+            except BrokenProcessPool:
+                logger.warning('Challenge solver process terminated '
+                               'abruptly, restarting the pool; solving '
+                               'challenge in a thread')
+                reactor.callFromThread(self._restart, executor)
+                result = self._search_in_thread(challenge, difficulty,
+                                                stopped)
+        except Exception:  # pylint: disable=broad-except
+            result = Failure()
+        if result is not None:
+            reactor.callFromThread(self._finish, deferred, result)
+
+    def _restart(self, executor):
+        """ Replace a broken pool of processes, unless the solver was
+        stopped or the pool was replaced already
+        """
+        if self._executor is not executor:
+            return
+        self._executor = ProcessPoolExecutor(self.processes)
+        executor.shutdown(wait=False)
+
+    @staticmethod
+    def _finish(deferred, result):
+        if deferred.called:
+            return
+        if isinstance(result, Failure):
+            deferred.errback(result)
+        else:
+            deferred.callback(result)
+
+    def _search(self, executor, challenge, difficulty, stopped):
+        """ :return (int, float)|None: solution and computation time or
+        None if stopped before the challenge was solved
+        """
+        started = time.time()
+        threshold = difficulty_threshold(difficulty)
+        pending = dict()  # future: start of its chunk
+        solution = None
+        offset = 0
+
+        try:
+            while not stopped.is_set():
+                # Keep looking in chunks preceding the solution found
+                while len(pending) < self.processes and \
+                        (solution is None or offset < solution):
+                    future = executor.submit(search_solution, challenge,
+                                             threshold, offset,
+                                             offset + self.chunk_size)
+                    pending[future] = offset
+                    offset += self.chunk_size
+                if not pending:
+                    return solution, time.time() - started
+
+                done, _ = wait(pending, timeout=0.1,
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    del pending[future]
+                    result = future.result()
+                    if result is not None and \
+                            (solution is None or result < solution):
+                        solution = result
+                # Chunks following the solution are not needed
+                for future, start in list(pending.items()):
+                    if solution is not None and start > solution:
+                        future.cancel()
+                        del pending[future]
+            return None
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _search_in_thread(self, challenge, difficulty, stopped):
+        """ Search chunks one by one in the calling thread
+        :return (int, float)|None: solution and computation time or
+        None if stopped before the challenge was solved
+        """
+        started = time.time()
+        threshold = difficulty_threshold(difficulty)
+        offset = 0
+
+        while not stopped.is_set():
+            solution = search_solution(challenge, threshold, offset,
+                                       offset + self.chunk_size)
+            if solution is not None:
+                return solution, time.time() - started
+            offset += self.chunk_size
+        return None
@@ -2,7 +2,7 @@ import logging
 from threading import Lock
 
 from golem.core.common import HandleAttributeError
-from golem.model import Stats
+from golem.model import Stats, db_writer
 
 logger = logging.getLogger(__name__)
 
@@ -58,14 +58,19 @@ class IntStatsKeeper(StatsKeeper):
         with self._lock:
             val = getattr(self.session_stats, stat_name)
             setattr(self.session_stats, stat_name, val + 1)
-            global_val = self._retrieve_stat(stat_name)
-            if global_val is not None:
-                setattr(self.global_stats, stat_name, global_val + increment)
-                try:
-                    Stats.update(value="{}".format(global_val+increment)) \
-                        .where(Stats.name == stat_name).execute()
-                except Exception as err:
-                    logger.error("Exception occured while updating stat %r: %r", stat_name, err)
+        # Global stats are updated by the database writer, which runs
+        # the read-modify-write updates one after another
+        db_writer.write(self._increase_global_stat, stat_name, increment)
+
+    def _increase_global_stat(self, stat_name, increment):
+        global_val = self._retrieve_stat(stat_name)
+        if global_val is not None:
+            setattr(self.global_stats, stat_name, global_val + increment)
+            try:
+                Stats.update(value="{}".format(global_val+increment)) \
+                    .where(Stats.name == stat_name).execute()
+            except Exception as err:
+                logger.error("Exception occured while updating stat %r: %r", stat_name, err)
 
     def _retrieve_stat(self, name):
         try:
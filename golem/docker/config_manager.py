@@ -4,7 +4,7 @@ from contextlib import contextmanager
 from golem.core.hardware import cpu_cores_available
 from golem.docker.task_thread import DockerTaskThread
 
-__all__ = ['DockerConfigManager']
+__all__ = ['DockerConfigManager', 'split_host_config']
 logger = logging.getLogger(__name__)
 
 DEFAULT_HOST_CONFIG = dict(
@@ -25,6 +25,36 @@ DEFAULT_HOST_CONFIG = dict(
 )
 
 
+def split_host_config(host_config, num_slots):
+    """ Divide cpu cores and memory limit of a container host config between
+    containers that will run side by side.
+    :param dict host_config: container host config to split
+    :param int num_slots: number of containers
+    :return list: host configs with disjoint cpusets, one per container.
+                  There will be fewer of them than num_slots if there are
+                  not enough cores to give each container one.
+    """
+    cpus = [c for c in host_config.get('cpuset', '').split(',') if c]
+    num_slots = max(int(num_slots), 1)
+    if cpus:
+        num_slots = min(num_slots, len(cpus))
+
+    mem_limit = host_config.get('mem_limit')
+    configs = []
+
+    for i in range(num_slots):
+        config = dict(host_config)
+        if cpus:
+            start = i * len(cpus) // num_slots
+            end = (i + 1) * len(cpus) // num_slots
+            config['cpuset'] = ','.join(cpus[start:end])
+        if mem_limit:
+            config['mem_limit'] = int(mem_limit) // num_slots
+        configs.append(config)
+
+    return configs
+
+
 class DockerConfigManager(object):
 
     def __init__(self):
@@ -25,7 +25,8 @@ class DockerTaskThread(TaskThread):
 
     def __init__(self, task_computer, subtask_id, docker_images,
                  orig_script_dir, src_code, extra_data, short_desc,
-                 res_path, tmp_path, timeout, check_mem=False):
+                 res_path, tmp_path, timeout, check_mem=False,
+                 host_config=None):
 
         if not docker_images:
             raise AttributeError("docker images is None")
@@ -44,6 +45,9 @@ class DockerTaskThread(TaskThread):
         self.job = None
         self.mc = None
         self.check_mem = check_mem
+        # Overrides docker manager's config, e.g. to pin the container
+        # to a subset of cpu cores
+        self.host_config = host_config
 
     def run(self):
         if not self.image:
@@ -61,7 +65,9 @@ class DockerTaskThread(TaskThread):
             if not os.path.exists(output_dir):
                 os.mkdir(output_dir)
 
-            if self.docker_manager:
+            if self.host_config:
+                host_config = self.host_config
+            elif self.docker_manager:
                 host_config = self.docker_manager.container_host_config
             else:
                 host_config = None
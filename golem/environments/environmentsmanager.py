@@ -1,17 +1,29 @@
 import logging
+from golem.diag.service import DiagnosticsProvider
 from golem.environments.environmentsconfig import EnvironmentsConfig
 from .environment import Environment, SupportStatus, UnsupportReason
 
 logger = logging.getLogger(__name__)
 
 
-class EnvironmentsManager(object):
-    """ Manage known environments. Allow user to choose accepted environment, keep track of supported environments """
+class EnvironmentsManager(DiagnosticsProvider):
+    """ Manage known environments. Allow user to choose accepted environment, keep track of supported environments
+
+    Performance of environments and whether their tasks can be computed are
+    checked for every task header and task request, so both are cached in
+    memory. Cached performance is invalidated when a benchmark completes,
+    cached statuses when environments or their acceptance change.
+    """
 
     def __init__(self):
         self.support_statuses = {}
         self.environments = set()
         self.env_config = None
+        self._environments_by_id = {}
+        self._performance = {}
+        self._statuses = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
 
     def load_config(self, datadir):
         """ Load acceptance of environments from the config file
@@ -23,16 +35,21 @@ class EnvironmentsManager(object):
         for env in self.environments:
             getter_for_env = getattr(config_entries, "get_" + env.get_id())
             env.accept_tasks = getter_for_env()
+        self._statuses = {}
 
     def add_environment(self, environment):
         """ Add new environment to the manager. Check if environment is supported.
         :param Environment environment:
         """
+        env_id = environment.get_id()
         self.environments.add(environment)
+        self._environments_by_id[env_id] = environment
         supported = environment.check_support()
         logger.info("Adding environment {} supported={}"
-                    .format(environment.get_id(), supported))
-        self.support_statuses[environment.get_id()] = supported
+                    .format(env_id, supported))
+        self.support_statuses[env_id] = supported
+        self._statuses.pop(env_id, None)
+        self._performance.pop(env_id, None)
 
     def get_support_status(self, env_id) -> SupportStatus:
         """ Return information if given environment are supported.
@@ -44,14 +61,34 @@ class EnvironmentsManager(object):
         return self.support_statuses.get(env_id, SupportStatus.err(
             {UnsupportReason.ENVIRONMENT_MISSING: env_id}))
 
+    def get_environment_status(self, env_id) -> SupportStatus:
+        """ Return information if given environment is supported and if
+            tasks from it are accepted. Result is cached.
+        :param str env_id:
+        :return SupportStatus:
+        """
+        status = self._statuses.get(env_id)
+        if status is not None:
+            self.cache_hits += 1
+            return status
+        self.cache_misses += 1
+
+        status = SupportStatus.ok()
+        if not self.accept_tasks(env_id):
+            status = SupportStatus.err(
+                {UnsupportReason.ENVIRONMENT_NOT_ACCEPTING_TASKS: env_id})
+        status = self.get_support_status(env_id).join(status)
+        self._statuses[env_id] = status
+        return status
+
     def accept_tasks(self, env_id):
         """Return information whether tasks from given environment are accepted.
         :param str env_id:
         :return bool:
         """
-        for env in self.environments:
-            if env.get_id() == env_id:
-                return env.is_accepted()
+        env = self._environments_by_id.get(env_id)
+        if env is not None:
+            return env.is_accepted()
 
     def get_environments(self):
         """ Return all known environments
@@ -60,10 +97,46 @@ class EnvironmentsManager(object):
         return self.environments
 
     def get_environment_by_id(self, env_id):
-        for env in self.environments:
-            if env.get_id() == env_id:
-                return env
-        return None
+        return self._environments_by_id.get(env_id)
+
+    def get_performance(self, env_id):
+        """ Return performance index of given environment, 0.0 if it's
+            unknown. Performance is read from the database only once,
+            until it is invalidated.
+        :param str env_id:
+        :return float:
+        """
+        performance = self._performance.get(env_id)
+        if performance is not None:
+            self.cache_hits += 1
+            return performance
+        self.cache_misses += 1
+
+        env = self._environments_by_id.get(env_id)
+        if env is None and env_id == Environment.get_id():
+            env = Environment
+        performance = env.get_performance() if env is not None else 0.0
+        self._performance[env_id] = performance
+        return performance
+
+    def invalidate_performance(self, env_id=None):
+        """ Forget cached performance of given environment, or of all
+            environments if env_id is None
+        :param str env_id:
+        """
+        if env_id is None:
+            self._performance = {}
+        else:
+            self._performance.pop(env_id, None)
+
+    def get_diagnostics(self, output_format):
+        requests = self.cache_hits + self.cache_misses
+        data = dict(
+            cache_hits=self.cache_hits,
+            cache_misses=self.cache_misses,
+            hit_rate=self.cache_hits / requests if requests else 0.0,
+        )
+        return self._format_diagnostics(data, output_format)
 
     def get_environments_to_config(self):
         envs = {}
@@ -77,18 +150,20 @@ class EnvironmentsManager(object):
         :param str env_id:
         :param bool state:
         """
-        for env in self.environments:
-            if env.get_id() == env_id:
-                env.accept_tasks = state
-                config_entries = self.env_config.get_config_entries()
-                setter_for_env = getattr(config_entries, "set_" + env.get_id())
-                setter_for_env(int(state))
-                self.env_config = self.env_config.change_config()
-                return
+        env = self._environments_by_id.get(env_id)
+        if env is None:
+            return
+        env.accept_tasks = state
+        self._statuses.pop(env_id, None)
+        config_entries = self.env_config.get_config_entries()
+        setter_for_env = getattr(config_entries, "set_" + env.get_id())
+        setter_for_env(int(state))
+        self.env_config = self.env_config.change_config()
 
     def get_performance_values(self):
-        perf_values  = {env.get_id(): env.get_performance()
-                        for env in self.environments}
+        perf_values = {env.get_id(): self.get_performance(env.get_id())
+                       for env in self.environments}
         if Environment.get_id() not in perf_values:
-            perf_values[Environment.get_id()] = Environment.get_performance()
+            perf_values[Environment.get_id()] = \
+                self.get_performance(Environment.get_id())
         return perf_values
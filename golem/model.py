@@ -10,8 +10,9 @@ from typing import Optional, Type  # pylint: disable=unused-import
 from ethereum.utils import denoms
 from peewee import (BooleanField, CharField, CompositeKey, DateTimeField,
                     FloatField, IntegerField, Model, SmallIntegerField,
-                    SqliteDatabase, TextField)
+                    TextField)
 
+from golem.core.dbwriter import DatabaseWriter, ProfiledSqliteDatabase
 from golem.core.simpleserializer import DictSerializable
 from golem.network.p2p.node import Node
 from golem.ranking.helper.trust_const import NEUTRAL_TRUST
@@ -21,8 +22,23 @@ log = logging.getLogger('golem.db')
 
 # Indicates how many KnownHosts can be stored in the DB
 MAX_STORED_HOSTS = 4
-db = SqliteDatabase(None, threadlocals=True,
-                    pragmas=(('foreign_keys', True), ('busy_timeout', 30000)))
+db = ProfiledSqliteDatabase(
+    None, threadlocals=True,
+    pragmas=(
+        ('foreign_keys', True),
+        ('busy_timeout', 30000),
+        # Readers do not block the writer and the other way around
+        ('journal_mode', 'wal'),
+        # In WAL mode a crash may lose the last commits, but cannot
+        # corrupt the database
+        ('synchronous', 'normal'),
+        ('mmap_size', 64 * 1024 * 1024),
+        # Negative value is a size in KiB
+        ('cache_size', -8 * 1024),
+        ('temp_store', 'memory'),
+    ))
+# Writes which do not need to be visible immediately go through db_writer
+db_writer = DatabaseWriter(db)
 
 
 class Database:
@@ -59,6 +75,7 @@ class Database:
             Stats,
             TaskPreset,
             Performance,
+            FileDigest,
         ]
         version = Database._get_user_version()
         if version != Database.SCHEMA_VERSION:
@@ -67,6 +84,29 @@ class Database:
             db.drop_tables(tables, safe=True)
             Database._set_user_version(Database.SCHEMA_VERSION)
         db.create_tables(tables, safe=True)
+        Database._create_missing_indexes(tables)
+
+    @staticmethod
+    def _create_missing_indexes(tables) -> None:
+        # create_tables() skips indexes of tables which already exist,
+        # so indexes added to an existing model are created here
+        compiler = db.compiler()
+        for table in tables:
+            table_name = table._meta.db_table
+            existing = {index.name for index in db.get_indexes(table_name)}
+            for fields, unique in table._index_data():
+                if unique:
+                    continue
+                fields = [table._meta.fields[f] if isinstance(f, str) else f
+                          for f in fields]
+                name = compiler.index_name(
+                    table_name, [f.db_column for f in fields])
+                if name in existing:
+                    continue
+                try:
+                    db.create_index(table, fields)
+                except Exception:  # pylint: disable=broad-except
+                    log.exception("Cannot create index %s", name)
 
     def close(self):
         if not self.db.is_closed():
@@ -214,6 +254,12 @@ class Payment(BaseModel):
     value = BigIntegerField()
     details = PaymentDetailsField()
 
+    class Meta:
+        database = db
+        indexes = (
+            (('modified_date',), False),
+        )
+
     def __init__(self, *args, **kwargs):
         super(Payment, self).__init__(*args, **kwargs)
         # For convenience always have .details as a dictionary
@@ -243,6 +289,15 @@ class ExpectedIncome(BaseModel):
     subtask = CharField()
     value = BigIntegerField()
 
+    class Meta:
+        database = db
+        indexes = (
+            # IncomesKeeper.run_once() looks for stale expected incomes
+            (('modified_date',), False),
+            # IncomesKeeper.received() looks up a received income
+            (('sender_node', 'subtask'), False),
+        )
+
     def __repr__(self):
         return "<ExpectedIncome: {!r} v:{:.3f}>"\
             .format(self.subtask, self.value)
@@ -412,3 +467,23 @@ class Performance(BaseModel):
         except Performance.DoesNotExist:
             perf = Performance(environment_id=env_id, value=performance)
             perf.save()
+
+
+###################
+# RESOURCE MODELS #
+###################
+
+
+class FileDigest(BaseModel):
+    """ Digest of a file, valid as long as file's inode, size and
+    modification time don't change """
+    path = CharField(null=False)
+    algorithm = CharField(null=False)
+    inode = IntegerField(null=False, default=0)
+    size = IntegerField(null=False)
+    mtime = FloatField(null=False)
+    digest = RawCharField(null=False)
+
+    class Meta:
+        database = db
+        primary_key = CompositeKey('path', 'algorithm')
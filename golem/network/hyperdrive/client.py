@@ -1,10 +1,12 @@
 import collections
 import json
 import logging
+from threading import Lock
 
 import requests
 from copy import deepcopy
 from ipaddress import AddressValueError, ip_address
+from requests.adapters import HTTPAdapter
 
 from golem.resource.client import IClient, ClientOptions
 
@@ -16,7 +18,14 @@ class HyperdriveClient(IClient):
     CLIENT_ID = 'hyperg'
     VERSION = 1.1
 
-    def __init__(self, port=3292, host='localhost', timeout=None):
+    DEFAULT_POOL_SIZE = 8
+
+    # (host, port, pool size) -> session shared by clients of a daemon
+    _sessions = dict()
+    _sessions_lock = Lock()
+
+    def __init__(self, port=3292, host='localhost', timeout=None,
+                 pool_size=None):
         super(HyperdriveClient, self).__init__()
 
         # API destination address
@@ -24,10 +33,37 @@ class HyperdriveClient(IClient):
         self.port = port
         # connection / read timeout
         self.timeout = timeout
+        # max. number of keep-alive connections to the daemon
+        self.pool_size = pool_size or self.DEFAULT_POOL_SIZE
 
         # default POST request headers
         self._url = 'http://{}:{}/api'.format(self.host, self.port)
         self._headers = {'content-type': 'application/json'}
+        self._session = self._get_session(self.host, self.port,
+                                          self.pool_size)
+
+    @classmethod
+    def _get_session(cls, host, port, pool_size):
+        key = (host, port, pool_size)
+
+        with cls._sessions_lock:
+            session = cls._sessions.get(key)
+            if not session:
+                adapter = HTTPAdapter(pool_connections=1,
+                                      pool_maxsize=pool_size)
+                session = requests.Session()
+                session.mount('http://', adapter)
+                cls._sessions[key] = session
+
+        return session
+
+    @classmethod
+    def close_sessions(cls):
+        with cls._sessions_lock:
+            sessions, cls._sessions = cls._sessions, dict()
+
+        for session in sessions.values():
+            session.close()
 
     @classmethod
     def build_options(cls, peers=None, **kwargs):
@@ -54,48 +90,53 @@ class HyperdriveClient(IClient):
         response = self._request(
             command='upload',
             id=kwargs.get('id'),
-            files=files
+            files=files,
+            timeout=kwargs.get('timeout')
         )
         return response['hash']
 
     def get_file(self, multihash, client_options=None, **kwargs):
         filepath = kwargs.pop('filepath')
-        peers = None
-
-        if client_options:
-            filtered_options = client_options.filtered(self.CLIENT_ID,
-                                                       self.VERSION)
-            if filtered_options:
-                peers = filtered_options.options.get('peers')
+        peers = self._get_peers(client_options)
 
         response = self._request(
             command='download',
             hash=multihash,
             dest=filepath,
-            peers=peers
+            peers=peers,
+            timeout=kwargs.get('timeout')
         )
         return [(filepath, multihash, response['files'])]
 
-    def pin_add(self, file_path, multihash):
+    def pin_add(self, file_path, multihash, timeout=None):
         response = self._request(
             command='upload',
             files=[file_path],
-            hash=multihash
+            hash=multihash,
+            timeout=timeout
         )
         return response['hash']
 
-    def pin_rm(self, multihash):
+    def pin_rm(self, multihash, timeout=None):
         response = self._request(
             command='cancel',
-            hash=multihash
+            hash=multihash,
+            timeout=timeout
         )
         return response['hash']
 
-    def _request(self, **data):
-        response = requests.post(url=self._url,
-                                 headers=self._headers,
-                                 data=json.dumps(data),
-                                 timeout=self.timeout)
+    def _get_peers(self, client_options):
+        if client_options:
+            filtered_options = client_options.filtered(self.CLIENT_ID,
+                                                       self.VERSION)
+            if filtered_options:
+                return filtered_options.options.get('peers')
+
+    def _request(self, timeout=None, **data):
+        response = self._session.post(url=self._url,
+                                      headers=self._headers,
+                                      data=json.dumps(data),
+                                      timeout=timeout or self.timeout)
         response.raise_for_status()
 
         if response.content:
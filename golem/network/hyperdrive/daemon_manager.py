@@ -81,6 +81,7 @@ class HyperdriveDaemonManager(object):
 
     def stop(self, *_):
         self._monitor.exit()
+        HyperdriveClient.close_sessions()
 
     def _start(self, *_):
         # do not supervise already running processes
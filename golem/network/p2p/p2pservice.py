@@ -9,7 +9,7 @@ import time
 from golem.core import simplechallenge
 
 from golem.diag.service import DiagnosticsProvider
-from golem.model import KnownHosts, MAX_STORED_HOSTS, db
+from golem.model import KnownHosts, MAX_STORED_HOSTS, db, db_writer
 from golem.network.p2p.peersession import PeerSession, PeerSessionInfo
 from golem.network.transport.network import ProtocolFactory, SessionFactory
 from golem.network.transport import tcpnetwork
@@ -87,6 +87,7 @@ class P2PService(tcpserver.PendingConnectionsServer, DiagnosticsProvider):
         self.refresh_peers_timeout = REFRESH_PEERS_TIMEOUT
         self.should_solve_challenge = SOLVE_CHALLENGE
         self.challenge_history = deque(maxlen=HISTORY_LEN)
+        self.challenge_solver = simplechallenge.ChallengeSolver()
         self.last_challenge = ""
         self.base_difficulty = BASE_DIFFICULTY
         self.connect_to_known_hosts = connect_to_known_hosts
@@ -179,31 +180,38 @@ class P2PService(tcpserver.PendingConnectionsServer, DiagnosticsProvider):
     def add_known_peer(self, node, ip_address, port):
         is_seed = node.is_super_node() if node else False
 
-        try:
-            with db.transaction():
-                KnownHosts.delete().where(
-                    (KnownHosts.ip_address == ip_address)
-                    & (KnownHosts.port == port)
-                ).execute()
-
-                KnownHosts.insert(
-                    ip_address=ip_address,
-                    port=port,
-                    last_connected=time.time(),
-                    is_seed=is_seed
-                ).execute()
-
-            self.__remove_redundant_hosts_from_db()
-            self.__sync_seeds()
-
-        except Exception as err:
+        def error(failure):
             logger.error(
                 "Couldn't add known peer %r:%r : %s",
                 ip_address,
                 port,
-                err
+                failure.value
             )
 
+        deferred = db_writer.write(self.__store_known_peer, ip_address, port,
+                                   is_seed)
+        deferred.addCallback(lambda _: self.__sync_seeds())
+        deferred.addErrback(error)
+        return deferred
+
+    @classmethod
+    def __store_known_peer(cls, ip_address, port, is_seed):
+        # A savepoint when run in a batch of db_writer
+        with db.atomic():
+            KnownHosts.delete().where(
+                (KnownHosts.ip_address == ip_address)
+                & (KnownHosts.port == port)
+            ).execute()
+
+            KnownHosts.insert(
+                ip_address=ip_address,
+                port=port,
+                last_connected=time.time(),
+                is_seed=is_seed
+            ).execute()
+
+        cls.__remove_redundant_hosts_from_db()
+
     def set_metadata_manager(self, metadata_manager):
         self.metadata_manager = metadata_manager
 
@@ -466,16 +474,21 @@ class P2PService(tcpserver.PendingConnectionsServer, DiagnosticsProvider):
         :param str key_id: key id of a node that has send this challenge
         :param str challenge: puzzle to solve
         :param int difficulty: difficulty of challenge
-        :return str: solution of a challenge
+        :return Deferred: fires with solution of a challenge
         """
         self.challenge_history.append([key_id, challenge])
-        solution, time_ = simplechallenge.solve_challenge(challenge, difficulty)
-        logger.debug(
-            "Solved challenge with difficulty %r in %r sec",
-            difficulty,
-            time_
-        )
-        return solution
+
+        def solved(result):
+            solution, time_ = result
+            logger.debug(
+                "Solved challenge with difficulty %r in %r sec",
+                difficulty,
+                time_
+            )
+            return solution
+
+        deferred = self.challenge_solver.solve(challenge, difficulty)
+        return deferred.addCallback(solved)
 
     def get_peers_degree(self):
         """ Return peers degree level
@@ -705,11 +718,26 @@ class P2PService(tcpserver.PendingConnectionsServer, DiagnosticsProvider):
         """
         return self.task_server.get_tasks_headers()
 
+    def get_tasks_headers_since(self, epoch, seq):
+        """ Return task headers that changed since given version
+        :param str epoch: epoch of the task header store
+        :param int seq: sequence number in the task header store
+        :return tuple: (epoch, seq, list of task headers)
+        """
+        return self.task_server.get_tasks_headers_since(epoch, seq)
+
+    def get_tasks_resync_counter(self):
+        """ Return counter which changes when all task headers should be
+        requested from peers again
+        :return int:
+        """
+        return self.task_server.task_keeper.resync_counter
+
     def add_task_header(self, th_dict_repr):
         """ Add new task header to a list of known task headers
         :param dict th_dict_repr: new task header dictionary representation
-        :return bool: True if a task header was in a right format,
-                      False otherwise
+        :return Deferred: fires with True if a task header was in a right
+                          format, False otherwise
         """
         return self.task_server.add_task_header(th_dict_repr)
 
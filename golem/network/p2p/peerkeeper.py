@@ -1,9 +1,9 @@
+import heapq
 import time
 import logging
 import random
 import operator
 from collections import deque
-import math
 
 logger = logging.getLogger("golem.network.p2p.peerkeeper")
 
@@ -16,7 +16,14 @@ IDLE_REFRESH = 3  # refresh idle buckets after this time
 
 
 class PeerKeeper(object):
-    """ Keeps information about peers in a network"""
+    """ Keeps information about peers in a network.
+
+    Only the bucket containing this peer's key is ever split, so
+    buckets[i] holds peers whose keys share exactly i leading bits with
+    this peer's key and the last bucket holds the rest. A bucket for a key
+    is therefore found from the length of the common prefix, without
+    scanning the buckets.
+    """
     def __init__(self, key, k_size=K_SIZE):
         """
         Create new peer keeper instance
@@ -63,19 +70,16 @@ class PeerKeeper(object):
 
         key_num = int(peer_info.key, 16)
 
-        bucket = self.bucket_for_peer(key_num)
-        peer_to_remove = bucket.add_peer(peer_info)
-        if peer_to_remove:
-            if bucket.start <= self.key_num <= bucket.end:
-                self.split_bucket(bucket)
-                return self.add_peer(peer_info)
-            else:
+        while True:
+            bucket = self.bucket_for_peer(key_num)
+            peer_to_remove = bucket.add_peer(peer_info, key_num)
+            if not peer_to_remove:
+                return None
+            if bucket is not self.buckets[-1]:
                 self.expected_pongs[peer_to_remove.key] = (peer_info, time.time())
                 return peer_to_remove
-
-        for bucket in self.buckets:
-            logger.debug(str(bucket))
-        return None
+            # Bucket contains this peer's key
+            self.split_bucket(bucket)
 
     def set_last_message_time(self, key):
         """ Set current time as a last message time for a bucket which range contain given key.
@@ -83,13 +87,10 @@ class PeerKeeper(object):
         """
         if not key:
             return
-        if isinstance(key, str):
-            key = key.encode()
+        if isinstance(key, bytes):
+            key = key.decode()
 
-        for i, bucket in enumerate(self.buckets):
-            if bucket.start <= int(key.hex(), 16) < bucket.end:
-                self.buckets[i].last_updated = time.time()
-                break
+        self.bucket_for_peer(int(key, 16)).last_updated = time.time()
 
     def get_random_known_peer(self):
         """ Return random peer from any bucket
@@ -113,19 +114,25 @@ class PeerKeeper(object):
         :param long key_num: key long representation for which a bucket should be found
         :return KBucket: bucket containing key in it's range
         """
-        for bucket in self.buckets:
-            if bucket.start <= key_num < bucket.end:
-                return bucket
+        return self.buckets[self.__bucket_index(key_num)]
+
+    def __bucket_index(self, key_num):
+        prefix_len = self.k_size - (key_num ^ self.key_num).bit_length()
+        return max(min(prefix_len, len(self.buckets) - 1), 0)
 
     def split_bucket(self, bucket):
-        """ Split given bucket into two buckets
+        """ Split the last bucket, which contains this peer's key, into
+        a bucket for keys with the next bit different than in this peer's
+        key and a new last bucket for the rest
         :param KBucket bucket: bucket to be split
         """
         logger.debug("Splitting bucket")
-        buck1, buck2 = bucket.split()
-        idx = self.buckets.index(bucket)
-        self.buckets[idx] = buck1
-        self.buckets.insert(idx + 1, buck2)
+        assert bucket is self.buckets[-1], "Only the last bucket is split"
+        lower, upper = bucket.split()
+        if lower.start <= self.key_num <= lower.end:
+            self.buckets[-1:] = [upper, lower]
+        else:
+            self.buckets[-1:] = [lower, upper]
 
     def cnt_distance(self, key):
         """ Return distance between this peer and peer with a given key. Distance is a xor between keys.
@@ -154,14 +161,25 @@ class PeerKeeper(object):
         if not alpha:
             alpha = self.concurrency
 
-        neigh = []
-        for bucket in self.buckets_by_id_distance(key_num):
-            for peer in bucket.peers_by_id_distance(key_num):
-                if int(peer.key, 16) != key_num:
-                    neigh.append(peer)
-                    if len(neigh) == alpha * 2:
-                        break
-        return sorted(neigh, key=lambda p: node_id_distance(p, key_num))[:alpha]
+        # Peers from the bucket for key_num are nearest to it, then peers
+        # from all the following buckets and then from each preceding
+        # bucket, in the reverse order. Distances to distinct keys are
+        # distinct, so peers themselves are never compared.
+        idx = self.__bucket_index(key_num)
+        groups = [self.buckets[idx:idx + 1], self.buckets[idx + 1:]]
+        groups += [[bucket] for bucket in reversed(self.buckets[:idx])]
+
+        nearest = []
+        for group in groups:
+            nearest += heapq.nsmallest(alpha - len(nearest), (
+                (peer_num ^ key_num, peer)
+                for bucket in group
+                for peer_num, peer in bucket.peers_with_key_nums()
+                if peer_num != key_num
+            ))
+            if len(nearest) >= alpha:
+                break
+        return [peer for _, peer in nearest]
 
     def buckets_by_id_distance(self, key_num):
         """
@@ -216,7 +234,7 @@ def node_id_distance(node_info, key_num):
 class KBucket(object):
     """ K-bucket for keeping information about peers from a given distance range """
     def __init__(self, start, end, k):
-        """ Create new bucket with range [start, end)
+        """ Create new bucket with range [start, end]
         :param long start: bucket range start
         :param long end: bucket range end
         :param int k: bucket size
@@ -225,28 +243,30 @@ class KBucket(object):
         self.end = end
         self.k = k
         self.peers = deque()
+        self.key_nums = {}  # key: peer key, value: key in long format
         self.last_updated = time.time()
 
-    def add_peer(self, peer):
+    def add_peer(self, peer, key_num=None):
         """ Try to append peer to a bucket. If it's already in a bucket remove it and append it at the end.
         If a bucket is full then return oldest peer in a bucket as a candidate for replacement
         :param Node peer: peer to add
+        :param long key_num: peer key in long format, if it's already known
         :return Node|None: oldest peer in a bucket, if a new peer hasn't been added or None otherwise
         """
-        logger.debug("KBucket adding peer {}".format(peer))
+        logger.debug("KBucket adding peer %s", peer)
         self.last_updated = time.time()
-        old_peer = None
-        for p in self.peers:
-            if p.key == peer.key:
-                old_peer = p
-                break
-        if old_peer:
-            self.peers.remove(old_peer)
-            self.peers.append(peer)
-        elif len(self.peers) < self.k:
-            self.peers.append(peer)
-        else:
+        if peer.key in self.key_nums:
+            for p in self.peers:
+                if p.key == peer.key:
+                    self.peers.remove(p)
+                    break
+        elif len(self.peers) >= self.k:
             return self.peers[0]
+        elif key_num is None:
+            key_num = int(peer.key, 16)
+        if key_num is not None:
+            self.key_nums[peer.key] = key_num
+        self.peers.append(peer)
         return None
 
     def remove_peer(self, key_num):
@@ -255,33 +275,40 @@ class KBucket(object):
         :return Node|None: information about peer if it was in this bucket, None otherwise
         """
         for peer in self.peers:
-            if int(peer.key, 16) == key_num:
+            if self.key_nums[peer.key] == key_num:
                 self.peers.remove(peer)
+                del self.key_nums[peer.key]
                 return peer
         return None
 
+    def peers_with_key_nums(self):
+        """ :return iterator: (key in long format, Node) pairs """
+        return ((self.key_nums[peer.key], peer) for peer in self.peers)
+
     def id_distance(self, key_num):
         """ Return distance from a middle of a bucket range to a given key
         :param long key_num:  other node public key in long format
         :return long: distance from a middle of this bucket to a given key
         """
-        return math.floor((self.start + self.end) / 2) ^ key_num
+        return ((self.start + self.end) // 2) ^ key_num
 
     def peers_by_id_distance(self, key_num):
-        return sorted(self.peers, key=lambda p: node_id_distance(p, key_num))
+        return [peer for _, peer in sorted(
+            (peer_num ^ key_num, peer)
+            for peer_num, peer in self.peers_with_key_nums())]
 
     def split(self):
         """ Split bucket into two buckets
         :return (KBucket, KBucket): two buckets that were created from this bucket
         """
-        midpoint = (self.start + self.end) / 2
+        midpoint = (self.start + self.end) // 2
         lower = KBucket(self.start, midpoint, self.k)
         upper = KBucket(midpoint + 1, self.end, self.k)
-        for peer in self.peers:
-            if int(peer.key, 16) < midpoint:
-                lower.add_peer(peer)
+        for key_num, peer in self.peers_with_key_nums():
+            if key_num <= midpoint:
+                lower.add_peer(peer, key_num)
             else:
-                upper.add_peer(peer)
+                upper.add_peer(peer, key_num)
         return lower, upper
 
     def __str__(self):
@@ -10,6 +10,10 @@ logger = logging.getLogger(__name__)
 
 P2P_PROTOCOL_ID = 14
 
+# Hello metadata key of peers that send only task headers changed since
+# the last sync (MessageGetTasksSince / MessageTasksSince)
+TASKS_SINCE_METADATA = 'tasks_since'
+
 
 class PeerSessionInfo(object):
     attributes = [
@@ -58,10 +62,18 @@ class PeerSession(BasicSafeSession):
 
         self.conn_id = None
 
+        # Delta sync of task headers
+        self.tasks_since_supported = False
+        # (epoch, seq, resync counter) of peer's task headers received so far
+        self.tasks_version = None
+        self._tasks_resync_counter = None
+
         # Verification by challenge not a random value
         self.solve_challenge = False
         self.challenge = None
         self.difficulty = 0
+        # Challenge received from the peer which is being solved
+        self._challenge_deferred = None
 
         self.can_be_unverified.extend(
             [
@@ -82,6 +94,10 @@ class PeerSession(BasicSafeSession):
         """
         Close connection and inform p2p service about disconnection
         """
+        if self._challenge_deferred:
+            deferred, self._challenge_deferred = \
+                self._challenge_deferred, None
+            deferred.cancel()
         BasicSafeSession.dropped(self)
         self.p2p_service.remove_peer(self)
 
@@ -150,6 +166,8 @@ class PeerSession(BasicSafeSession):
         :param str data: serialized message to be encrypted
         :return str: encrypted message
         """
+        if self.uses_session_cipher():
+            return self.session_cipher.encrypt(data)
         return self.p2p_service.encrypt(data, self.key_id)
 
     def decrypt(self, data):
@@ -159,6 +177,8 @@ class PeerSession(BasicSafeSession):
         :param str data: data to be decrypted
         :return str msg: decrypted message
         """
+        if self.is_session_frame(data):
+            return self.session_decrypt(data)
         if not self.p2p_service:
             return data
 
@@ -204,8 +224,20 @@ class PeerSession(BasicSafeSession):
         self.send(message.MessageGetPeers())
 
     def send_get_tasks(self):
-        """  Send get tasks message """
-        self.send(message.MessageGetTasks())
+        """  Send get tasks message. Peers that support it are asked only
+        for headers that changed since the last sync. All headers are
+        requested again when this node may accept headers it removed.
+        """
+        if not self.tasks_since_supported:
+            self.send(message.MessageGetTasks())
+            return
+
+        resync_counter = self.p2p_service.get_tasks_resync_counter()
+        epoch, seq = None, 0
+        if self.tasks_version and self.tasks_version[2] == resync_counter:
+            epoch, seq = self.tasks_version[:2]
+        self._tasks_resync_counter = resync_counter
+        self.send(message.MessageGetTasksSince(epoch=epoch, seq=seq))
 
     def send_remove_task(self, task_id):
         """  Send remove task  message
@@ -367,6 +399,9 @@ class PeerSession(BasicSafeSession):
             self.disconnect(PeerSession.DCRProtocolVersion)
             return
 
+        self.set_session_key(metadata)
+        self.tasks_since_supported = isinstance(metadata, dict) \
+            and bool(metadata.get(TASKS_SINCE_METADATA))
         self.p2p_service.add_to_peer_keeper(self.node_info)
         self.p2p_service.interpret_metadata(metadata,
                                             self.address,
@@ -418,16 +453,35 @@ class PeerSession(BasicSafeSession):
             self.__send_hello()
 
     def _solve_challenge(self, challenge, difficulty):
-        solution = self.p2p_service.solve_challenge(
+        self._challenge_deferred = self.p2p_service.solve_challenge(
             self.key_id,
             challenge,
             difficulty
         )
+        self._challenge_deferred.addCallbacks(
+            self._send_challenge_solution,
+            self._challenge_not_solved
+        )
+
+    def _send_challenge_solution(self, solution):
+        self._challenge_deferred = None
         self.send(
             message.MessageChallengeSolution(solution=solution),
             send_unverified=True
         )
 
+    def _challenge_not_solved(self, failure):
+        if self._challenge_deferred is None:
+            return  # Session has been dropped
+        self._challenge_deferred = None
+        logger.info(
+            "Challenge from %r:%r not solved: %r",
+            self.address,
+            self.port,
+            failure.getErrorMessage()
+        )
+        self.disconnect(PeerSession.DCRTimeout)
+
     def _react_to_get_peers(self, msg):
         self._send_peers()
 
@@ -442,9 +496,26 @@ class PeerSession(BasicSafeSession):
         self.send(message.MessageTasks(tasks))
 
     def _react_to_tasks(self, msg):
-        for t in msg.tasks_array:
-            if not self.p2p_service.add_task_header(t):
-                self.disconnect(PeerSession.DCRBadProtocol)
+        self._add_task_headers(msg.tasks_array)
+
+    def _react_to_get_tasks_since(self, msg):
+        epoch, seq, tasks = self.p2p_service.get_tasks_headers_since(
+            msg.epoch, msg.seq)
+        self.send(message.MessageTasksSince(epoch=epoch, seq=seq,
+                                            tasks_array=tasks))
+
+    def _react_to_tasks_since(self, msg):
+        self._add_task_headers(msg.tasks_array)
+        self.tasks_version = (msg.epoch, msg.seq, self._tasks_resync_counter)
+
+    def _add_task_headers(self, tasks_array):
+        for t in tasks_array:
+            deferred = self.p2p_service.add_task_header(t)
+            deferred.addCallback(self._task_header_added)
+
+    def _task_header_added(self, added):
+        if not added:
+            self.disconnect(PeerSession.DCRBadProtocol)
 
     def _react_to_remove_task(self, msg):
         self.p2p_service.remove_task_header(msg.task_id)
@@ -544,6 +615,9 @@ class PeerSession(BasicSafeSession):
             self.challenge = challenge_kwargs['challenge'] = challenge
             difficulty = self.p2p_service._get_difficulty(self.key_id)
             self.difficulty = challenge_kwargs['difficulty'] = difficulty
+        metadata = self.add_session_key(
+            self.p2p_service.metadata_manager.get_metadata())
+        metadata[TASKS_SINCE_METADATA] = True
         msg = message.MessageHello(
             proto_id=P2P_PROTOCOL_ID,
             port=self.p2p_service.cur_port,
@@ -552,7 +626,7 @@ class PeerSession(BasicSafeSession):
             node_info=self.p2p_service.node,
             client_ver=APP_VERSION,
             rand_val=self.rand_val,
-            metadata=self.p2p_service.metadata_manager.get_metadata(),
+            metadata=metadata,
             solve_challenge=self.solve_challenge,
             **challenge_kwargs
         )
@@ -594,6 +668,8 @@ class PeerSession(BasicSafeSession):
             message.MessagePeers.TYPE: self._react_to_peers,
             message.MessageGetTasks.TYPE: self._react_to_get_tasks,
             message.MessageTasks.TYPE: self._react_to_tasks,
+            message.MessageGetTasksSince.TYPE: self._react_to_get_tasks_since,  # noqa
+            message.MessageTasksSince.TYPE: self._react_to_tasks_since,
             message.MessageRemoveTask.TYPE: self._react_to_remove_task,
             message.MessageFindNode.TYPE: self._react_to_find_node,
             message.MessageRandVal.TYPE: self._react_to_rand_val,
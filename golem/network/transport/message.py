@@ -626,6 +626,51 @@ class MessageInformAboutNatTraverseFailure(Message):
         super(MessageInformAboutNatTraverseFailure, self).__init__(**kwargs)
 
 
+class MessageGetTasksSince(Message):
+    TYPE = P2P_MESSAGE_BASE + 20
+
+    MAPPING = {
+        'epoch': "EPOCH",
+        'seq': "SEQ",
+    }
+
+    def __init__(self, epoch=None, seq=0, **kwargs):
+        """
+        Create request for task headers that changed since given version
+        of peer's task header store
+        :param str epoch: epoch of the store, None to get all headers
+        :param int seq: last known sequence number in the store
+        """
+        self.epoch = epoch
+        self.seq = seq
+        super(MessageGetTasksSince, self).__init__(**kwargs)
+
+
+class MessageTasksSince(Message):
+    TYPE = P2P_MESSAGE_BASE + 21
+
+    MAPPING = {
+        'epoch': "EPOCH",
+        'seq': "SEQ",
+        'tasks_array': "TASKS",
+    }
+
+    def __init__(self, epoch=None, seq=0, tasks_array=None, **kwargs):
+        """
+        Create message containing task headers that changed since requested
+        version of task header store
+        :param str epoch: current epoch of the store
+        :param int seq: current sequence number in the store
+        :param list tasks_array: list of task headers
+        """
+        if tasks_array is None:
+            tasks_array = []
+        self.epoch = epoch
+        self.seq = seq
+        self.tasks_array = tasks_array
+        super(MessageTasksSince, self).__init__(**kwargs)
+
+
 TASK_MSG_BASE = 2000
 
 
@@ -1254,6 +1299,8 @@ def init_messages():
             MessageNatHole,
             MessageNatTraverseFailure,
             MessageInformAboutNatTraverseFailure,
+            MessageGetTasksSince,
+            MessageTasksSince,
             # Ranking messages
             MessageDegree,
             MessageGossip,
@@ -4,6 +4,8 @@ import random
 import time
 
 from golem.core.keysauth import get_random_float
+from golem.core.sessioncipher import SESSION_KEY_METADATA, SessionCipher, \
+    SessionCipherError, SessionKeyExchange
 from golem.core.variables import MSG_TTL, FUTURE_TIME_TOLERANCE, UNVERIFIED_CNT
 from golem.network.transport import message
 from .network import Session
@@ -180,6 +182,21 @@ class BasicSafeSession(BasicSession, SafeSession):
         self.can_be_unverified = [message.MessageDisconnect.TYPE]  # React to message even if it's self.verified is set to False
         self.can_be_unsigned = [message.MessageDisconnect.TYPE]  # React to message even if it's not signed.
         self.can_be_not_encrypted = [message.MessageDisconnect.TYPE]  # React to message even if it's not encrypted.
+        self.key_exchange = None  # ephemeral key offered to the peer in hello
+        self.session_cipher = None  # symmetric cipher agreed with the peer
+
+    @property
+    def key_id(self):
+        return self._key_id
+
+    @key_id.setter
+    def key_id(self, key_id):
+        # Session keys were agreed with another node (eg. before the
+        # connection became a middleman connection)
+        if getattr(self, '_key_id', None) and key_id != self._key_id:
+            self.key_exchange = None
+            self.session_cipher = None
+        self._key_id = key_id
 
     # Simple session with no encryption and no signing
     def sign(self, msg):
@@ -194,6 +211,60 @@ class BasicSafeSession(BasicSession, SafeSession):
     def decrypt(self, data):
         return data
 
+    def add_session_key(self, metadata=None):
+        """ Add ephemeral public key of this session to hello metadata.
+        Peers that don't know about session keys ignore it.
+        :param dict|None metadata: hello metadata
+        :return dict: copy of metadata with the session key
+        """
+        if self.key_exchange is None:
+            self.key_exchange = SessionKeyExchange()
+        metadata = dict(metadata) if isinstance(metadata, dict) else {}
+        metadata[SESSION_KEY_METADATA] = self.key_exchange.public_key
+        return metadata
+
+    def set_session_key(self, metadata):
+        """ Agree on session keys with the peer that sent given metadata in
+        its (verified) hello message. Nothing changes if peer doesn't offer
+        a session key.
+        :param dict|None metadata: hello metadata received from the peer
+        """
+        # Keys are agreed only once, so that nonces are never reused
+        if self.session_cipher is not None or not isinstance(metadata, dict):
+            return
+        peer_key = metadata.get(SESSION_KEY_METADATA)
+        if not peer_key:
+            return
+        if self.key_exchange is None:
+            self.key_exchange = SessionKeyExchange()
+        try:
+            self.session_cipher = self.key_exchange.derive(peer_key)
+        except SessionCipherError as exc:
+            logger.info("Cannot agree on session keys with %r:%r: %r",
+                        self.address, self.port, exc)
+            self.session_cipher = None
+
+    def uses_session_cipher(self):
+        """ Session keys are used to send data after the peer proved that
+        it received our hello, ie. after the connection was verified """
+        return self.verified and self.session_cipher is not None
+
+    def is_session_frame(self, data):
+        return self.session_cipher is not None \
+            and SessionCipher.is_frame(data)
+
+    def session_decrypt(self, data):
+        """ Decrypt data with session keys, drop the connection if it fails
+        :return bytes|None: decrypted data
+        """
+        try:
+            return self.session_cipher.decrypt(data)
+        except SessionCipherError as exc:
+            logger.warning("Failed to decrypt data from %r:%r: %r",
+                           self.address, self.port, exc)
+            self.dropped()
+            return None
+
     def send(self, message, send_unverified=False):
         """ Send given message if connection was verified or send_unverified option is set to True.
         :param Message message: message to be sent.
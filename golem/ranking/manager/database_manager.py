@@ -1,5 +1,8 @@
 import datetime
 import logging
+import sqlite3
+import time
+from threading import RLock
 
 from peewee import IntegrityError
 
@@ -7,95 +10,194 @@ from golem.model import LocalRank, GlobalRank, NeighbourLocRank, db
 
 logger = logging.getLogger(__name__)
 
+# How often changes of local ranks are written to the database, in seconds
+LOCAL_RANK_FLUSH_INTERVAL = 10
+
+
+class LocalRankTable(object):
+    """ In-memory, write-behind view of the LocalRank table.
+
+    Trust changes are applied to ranks kept in memory and coalesced per node.
+    flush() writes them to the database in a single transaction; sync()
+    does it at most every flush_interval seconds. Ranks are read from the
+    database only once, later reads are served from memory.
+    """
+
+    FIELDS = (
+        'positive_computed',
+        'negative_computed',
+        'wrong_computed',
+        'positive_requested',
+        'negative_requested',
+        'positive_payment',
+        'negative_payment',
+        'positive_resource',
+        'negative_resource',
+    )
+
+    # INSERT ... ON CONFLICT DO UPDATE is available since SQLite 3.24
+    UPSERT_SUPPORTED = sqlite3.sqlite_version_info >= (3, 24, 0)
+
+    def __init__(self, flush_interval=LOCAL_RANK_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self.last_flush = time.time()
+        self._lock = RLock()
+        self._database = None
+        # node id -> LocalRank (or None if there is no rank)
+        self._ranks = {}
+        # node id -> {field: increment} not yet written to the database
+        self._pending = {}
+
+    def increase(self, node_id, field, trust_mod):
+        with self._lock:
+            self._check_database()
+            increments = self._pending.setdefault(node_id, {})
+            increments[field] = increments.get(field, 0.0) + trust_mod
+
+            if node_id in self._ranks:
+                rank = self._ranks[node_id]
+                if rank is None:
+                    rank = self._ranks[node_id] = self._new_rank(node_id)
+                setattr(rank, field, getattr(rank, field) + trust_mod)
+
+    def get(self, node_id):
+        with self._lock:
+            self._check_database()
+            if node_id not in self._ranks:
+                self._ranks[node_id] = self._load(node_id)
+            return self._ranks[node_id]
+
+    def get_all(self):
+        self.flush()
+        return LocalRank.select()
+
+    def sync(self):
+        """ Flush pending changes if flush_interval passed """
+        if time.time() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            self._check_database()
+            self.last_flush = time.time()
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return
+
+            try:
+                self._write(pending)
+            except Exception:
+                # Keep changes for the next flush
+                for node_id, increments in pending.items():
+                    current = self._pending.setdefault(node_id, {})
+                    for field, value in increments.items():
+                        current[field] = current.get(field, 0.0) + value
+                raise
+
+    def clear(self):
+        with self._lock:
+            self._ranks = {}
+            self._pending = {}
+
+    def _check_database(self):
+        # Database was opened in another location (eg. in tests)
+        if self._database != db.database:
+            if self._pending:
+                logger.warning("Dropping %d local rank changes",
+                               len(self._pending))
+            self.clear()
+            self._database = db.database
+
+    def _load(self, node_id):
+        rank = LocalRank.select().where(LocalRank.node_id == node_id).first()
+        increments = self._pending.get(node_id)
+        if increments:
+            if rank is None:
+                rank = self._new_rank(node_id)
+            for field, value in increments.items():
+                setattr(rank, field, getattr(rank, field) + value)
+        return rank
+
+    @staticmethod
+    def _new_rank(node_id):
+        return LocalRank(node_id=node_id)
+
+    def _write(self, pending):
+        now = str(datetime.datetime.now())
+        rows = [
+            (node_id, now, now) +
+            tuple(increments.get(field, 0.0) for field in self.FIELDS)
+            for node_id, increments in pending.items()
+        ]
+
+        table = LocalRank._meta.db_table
+        insert = "INSERT {{}} INTO {} (node_id, created_date, " \
+                 "modified_date, {}) VALUES ({})".format(
+                     table, ', '.join(self.FIELDS),
+                     ', '.join('?' * (3 + len(self.FIELDS))))
 
-def increase_positive_computed(node_id, trust_mod):
-    try:
         with db.transaction():
-            LocalRank.create(node_id=node_id, positive_computed=trust_mod)
-    except IntegrityError:
-        LocalRank.update(positive_computed=LocalRank.positive_computed + trust_mod,
-                         modified_date=str(datetime.datetime.now())) \
-            .where(LocalRank.node_id == node_id).execute()
+            cursor = db.get_cursor()
+            if self.UPSERT_SUPPORTED:
+                updates = ', '.join('{0} = {0} + excluded.{0}'.format(field)
+                                    for field in self.FIELDS)
+                cursor.executemany(
+                    insert.format('') + " ON CONFLICT(node_id) DO UPDATE "
+                    "SET {}, modified_date = excluded.modified_date"
+                    .format(updates), rows)
+            else:
+                cursor.executemany(
+                    insert.format('OR IGNORE'),
+                    [row[:3] + (0.0,) * len(self.FIELDS) for row in rows])
+                updates = ', '.join('{0} = {0} + ?'.format(field)
+                                    for field in self.FIELDS)
+                cursor.executemany(
+                    "UPDATE {} SET {}, modified_date = ? "
+                    "WHERE node_id = ?".format(table, updates),
+                    [row[3:] + (now, row[0]) for row in rows])
+
+
+local_ranks = LocalRankTable()
+
+
+def flush_local_ranks():
+    local_ranks.flush()
+
+
+def increase_positive_computed(node_id, trust_mod):
+    local_ranks.increase(node_id, 'positive_computed', trust_mod)
 
 
 def increase_negative_computed(node_id, trust_mod):
-    try:
-        with db.transaction():
-            LocalRank.create(node_id=node_id, negative_computed=trust_mod)
-    except IntegrityError:
-        LocalRank.update(negative_computed=LocalRank.negative_computed + trust_mod,
-                         modified_date=str(datetime.datetime.now())) \
-            .where(LocalRank.node_id == node_id).execute()
+    local_ranks.increase(node_id, 'negative_computed', trust_mod)
 
 
 def increase_wrong_computed(node_id, trust_mod):
-    try:
-        with db.transaction():
-            LocalRank.create(node_id=node_id, wrong_computed=trust_mod)
-    except IntegrityError:
-        LocalRank.update(wrong_computed=LocalRank.wrong_computed + trust_mod,
-                         modified_date=str(datetime.datetime.now())) \
-            .where(LocalRank.node_id == node_id).execute()
+    local_ranks.increase(node_id, 'wrong_computed', trust_mod)
 
 
 def increase_positive_requested(node_id, trust_mod):
-    try:
-        with db.transaction():
-            LocalRank.create(node_id=node_id, positive_requested=trust_mod)
-    except IntegrityError:
-        LocalRank.update(positive_requested=LocalRank.positive_requested + trust_mod,
-                         modified_date=str(datetime.datetime.now())) \
-            .where(LocalRank.node_id == node_id).execute()
+    local_ranks.increase(node_id, 'positive_requested', trust_mod)
 
 
 def increase_negative_requested(node_id, trust_mod):
-    try:
-        with db.transaction():
-            LocalRank.create(node_id=node_id, negative_requested=trust_mod)
-    except IntegrityError:
-        LocalRank.update(negative_requested=LocalRank.negative_requested + trust_mod,
-                         modified_date=str(datetime.datetime.now())) \
-            .where(LocalRank.node_id == node_id).execute()
+    local_ranks.increase(node_id, 'negative_requested', trust_mod)
 
 
 def increase_positive_payment(node_id, trust_mod):
-    try:
-        with db.transaction():
-            LocalRank.create(node_id=node_id, positive_payment=trust_mod)
-    except IntegrityError:
-        LocalRank.update(positive_payment=LocalRank.positive_payment + trust_mod,
-                         modified_date=str(datetime.datetime.now())) \
-            .where(LocalRank.node_id == node_id).execute()
+    local_ranks.increase(node_id, 'positive_payment', trust_mod)
 
 
 def increase_negative_payment(node_id, trust_mod):
-    try:
-        with db.transaction():
-            LocalRank.create(node_id=node_id, negative_payment=trust_mod)
-    except IntegrityError:
-        LocalRank.update(negative_payment=LocalRank.negative_payment + trust_mod,
-                         modified_date=str(datetime.datetime.now())) \
-            .where(LocalRank.node_id == node_id).execute()
+    local_ranks.increase(node_id, 'negative_payment', trust_mod)
 
 
 def increase_positive_resource(node_id, trust_mod):
-    try:
-        with db.transaction():
-            LocalRank.create(node_id=node_id, positive_resource=trust_mod)
-    except IntegrityError:
-        LocalRank.update(positive_resource=LocalRank.positive_resource + trust_mod,
-                         modified_date=str(datetime.datetime.now())) \
-            .where(LocalRank.node_id == node_id).execute()
+    local_ranks.increase(node_id, 'positive_resource', trust_mod)
 
 
 def increase_negative_resource(node_id, trust_mod):
-    try:
-        with db.transaction():
-            LocalRank.create(node_id=node_id, negative_resource=trust_mod)
-    except IntegrityError:
-        LocalRank.update(negative_resource=LocalRank.negative_resource + trust_mod,
-                         modified_date=str(datetime.datetime.now())) \
-            .where(LocalRank.node_id == node_id).execute()
+    local_ranks.increase(node_id, 'negative_resource', trust_mod)
 
 
 def get_global_rank(node_id):
@@ -115,11 +217,11 @@ def upsert_global_rank(node_id, comp_trust, req_trust, comp_weight, req_weight):
 
 
 def get_local_rank(node_id):
-    return LocalRank.select().where(LocalRank.node_id == node_id).first()
+    return local_ranks.get(node_id)
 
 
 def get_local_rank_for_all():
-    return LocalRank.select()
+    return local_ranks.get_all()
 
 
 def get_neighbour_loc_rank(neighbour_id, about_id):
@@ -1,9 +1,12 @@
 import abc
+import heapq
+import itertools
 import logging
 import os
 import re
 import shutil
-from collections import deque
+import time
+from enum import Enum
 from threading import Lock
 
 from golem.core.common import to_unicode
@@ -42,6 +45,66 @@ def dir_files(directory):
     return result
 
 
+class DownloadPriority(Enum):
+    """ Downloads with a lower value are started first """
+    result = 0
+    resource = 1
+
+
+class DownloadStatus(Enum):
+    queued = 0
+    downloading = 1
+
+
+class Download(object):
+    """ State of a resource download. Requests for a hash that is already
+    being downloaded wait for that download to finish. """
+
+    def __init__(self, resource_hash, request):
+        self.hash = resource_hash
+        self.request = request
+        self.waiting = []
+        self.status = DownloadStatus.queued
+        self.queued = time.time()
+        self.started = None
+        self.attempts = 0
+        # sequence number of the current download queue entry
+        self.queue_key = None
+
+    @property
+    def priority(self):
+        return min([self.request.priority] +
+                   [r.priority for r in self.waiting],
+                   key=lambda p: p.value)
+
+    def progress(self):
+        return dict(
+            status=self.status,
+            priority=self.priority,
+            tasks=sorted({self.request.task_id} |
+                         {r.task_id for r in self.waiting}),
+            queued=self.queued,
+            started=self.started,
+            attempts=self.attempts
+        )
+
+
+class DownloadRequest(object):
+
+    def __init__(self, entry, task_id, success, error,
+                 client=None, client_options=None, async=True, pin=True,
+                 priority=DownloadPriority.resource):
+        self.entry = entry
+        self.task_id = task_id
+        self.success = success
+        self.error = error
+        self.client = client
+        self.client_options = client_options
+        self.async = async
+        self.pin = pin
+        self.priority = priority
+
+
 class Resource(object):
 
     def __init__(self, resource_hash, task_id=None, path=None):
@@ -274,7 +337,11 @@ class AbstractResourceManager(IClientHandler, metaclass=abc.ABCMeta):
 
     def __init__(self, dir_manager, resource_dir_method=None):
 
-        self.download_queue = deque()
+        # heap of (priority, sequence number, download)
+        self.download_queue = []
+        self.download_counter = itertools.count()
+        # resource hash -> queued or running download
+        self.downloads = dict()
         self.current_downloads = 0
         self.storage = ResourceStorage(dir_manager, resource_dir_method
                                        or dir_manager.get_task_resource_dir)
@@ -407,7 +474,8 @@ class AbstractResourceManager(IClientHandler, metaclass=abc.ABCMeta):
 
     def pull_resource(self, entry, task_id,
                       success, error,
-                      client=None, client_options=None, async=True, pin=True):
+                      client=None, client_options=None, async=True, pin=True,
+                      priority=DownloadPriority.resource):
 
         resource = self._wrap_resource(entry, task_id)
 
@@ -415,64 +483,112 @@ class AbstractResourceManager(IClientHandler, metaclass=abc.ABCMeta):
             success(entry, task_id)
             return
 
+        make_path_dirs(self.storage.get_path(resource.path, task_id))
+        local = self.storage.cache.get_by_hash(resource.hash)
+
+        if local:
+            try:
+                self.storage.copy(local.path, resource.path, task_id)
+            except Exception as exc:
+                logger.error("Resource manager: error copying {} ({}): {}"
+                             .format(resource.path, resource.hash, exc))
+                error(exc, entry, task_id)
+            else:
+                success(entry, task_id)
+            return
+
+        request = DownloadRequest(entry, task_id, success, error,
+                                  client=client, client_options=client_options,
+                                  async=async, pin=pin, priority=priority)
+
+        with self.lock:
+            download = self.downloads.get(resource.hash)
+            if download:
+                # the same hash is being downloaded for another request
+                requeue = (download.status == DownloadStatus.queued and
+                           priority.value < download.priority.value)
+                download.waiting.append(request)
+                if not requeue:
+                    return
+            else:
+                download = Download(resource.hash, request)
+                self.downloads[resource.hash] = download
+
+        self.__push_to_queue(download)
+        self.__process_queue()
+
+    def get_download_progress(self, resource_hash=None):
+        """ Return state of a download or of all downloads by hash """
+        with self.lock:
+            if resource_hash is not None:
+                download = self.downloads.get(resource_hash)
+                return download.progress() if download else None
+            return {h: d.progress() for h, d in self.downloads.items()}
+
+    def __download(self, download):
+        request = download.request
+        entry, task_id = request.entry, request.task_id
+        resource = self._wrap_resource(entry, task_id)
+
         def success_wrapper(response, **_):
             self.__dec_downloads()
             self._clear_retry(self.commands.get, resource.hash)
 
-            if pin:
+            if request.pin:
                 self._cache_resource(resource)
                 self.pin_resource(resource.hash)
 
             logger.debug("Resource manager: {} ({}) downloaded"
                          .format(resource.path, resource.hash))
 
-            success(entry, task_id)
+            waiting = self.__finish_download(download)
+            request.success(entry, task_id)
+
+            # Resources are now available locally
+            for waiting_request in waiting:
+                self.__pull_again(waiting_request)
             self.__process_queue()
 
         def error_wrapper(exception, **_):
             self.__dec_downloads()
 
             if self._can_retry(exception, self.commands.get, resource.hash):
-                self.pull_resource(entry, task_id,
-                                   client_options=client_options,
-                                   success=success,
-                                   error=error,
-                                   async=async,
-                                   pin=pin)
+                download.status = DownloadStatus.queued
+                self.__push_to_queue(download)
             else:
                 logger.error("Resource manager: error downloading {} ({}): {}"
                              .format(resource.path, resource.hash, exception))
 
-                error(exception, entry, task_id)
-                self.__process_queue()
-
-        make_path_dirs(self.storage.get_path(resource.path, task_id))
-        local = self.storage.cache.get_by_hash(resource.hash)
-
-        if local:
-
-            self.__inc_downloads()
-            try:
-                self.storage.copy(local.path, resource.path, task_id)
-            except Exception as exc:
-                error_wrapper(exc)
-            else:
-                success_wrapper(entry)
+                waiting = self.__finish_download(download)
+                for failed in [request] + waiting:
+                    failed.error(exception, failed.entry, failed.task_id)
 
-        else:
+            self.__process_queue()
 
-            if self.__can_download():
-                self.__inc_downloads()
-                self.__pull(resource, task_id,
-                            success=success_wrapper,
-                            error=error_wrapper,
-                            client=client,
-                            client_options=client_options,
-                            async=async)
-            else:
-                self.__push_to_queue(entry, task_id,
-                                     success, error,
-                                     client, client_options, async, pin)
+        download.started = time.time()
+        download.attempts += 1
+
+        self.__pull(resource, task_id,
+                    success=success_wrapper,
+                    error=error_wrapper,
+                    client=request.client,
+                    client_options=request.client_options,
+                    async=request.async)
+
+    def __pull_again(self, request):
+        self.pull_resource(request.entry, request.task_id,
+                           success=request.success,
+                           error=request.error,
+                           client=request.client,
+                           client_options=request.client_options,
+                           async=request.async,
+                           pin=request.pin,
+                           priority=request.priority)
+
+    def __finish_download(self, download):
+        with self.lock:
+            self.downloads.pop(download.hash, None)
+            return download.waiting
 
     def command_failed(self, exc, cmd, obj_id, **kwargs):
         logger.error("Resource manager: Error executing command '{}': {}"
@@ -555,19 +671,32 @@ class AbstractResourceManager(IClientHandler, metaclass=abc.ABCMeta):
         with self.lock:
             self.current_downloads -= 1
 
-    def __push_to_queue(self, *params):
+    def __push_to_queue(self, download):
         with self.queue_lock:
-            self.download_queue.append(params)
+            if download.status != DownloadStatus.queued:
+                return
+            # a download re-queued with a higher priority leaves a stale
+            # entry behind; only the latest entry is used
+            download.queue_key = next(self.download_counter)
+            heapq.heappush(self.download_queue,
+                           (download.priority.value,
+                            download.queue_key,
+                            download))
 
     def __process_queue(self):
-        params = None
-
-        with self.queue_lock:
-            if self.download_queue:
-                params = self.download_queue.popleft()
+        """ Start queued downloads in all free download slots """
+        while True:
+            with self.queue_lock:
+                if not self.download_queue or not self.__can_download():
+                    return
+                _, queue_key, download = heapq.heappop(self.download_queue)
+                if queue_key != download.queue_key:
+                    continue
+                download.queue_key = None
+                download.status = DownloadStatus.downloading
+                self.__inc_downloads()
 
-        if params:
-            self.pull_resource(*params)
+            self.__download(download)
 
 
 class TestResourceManager(AbstractResourceManager, ClientHandler):
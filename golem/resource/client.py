@@ -1,5 +1,4 @@
 import abc
-import hashlib
 import inspect
 import logging
 import os
@@ -19,28 +18,17 @@ from requests.packages.urllib3.exceptions import MaxRetryError, TimeoutError, \
 from twisted.internet import threads
 
 from golem.core.async import AsyncRequest, async_run
+from golem.resource.filehash import file_digest, file_hasher
 
 log = logging.getLogger(__name__)
 
 
-SHA1_BLOCK_SIZE = 64
-
-
 def file_sha_256(file_path):
-    sha = hashlib.sha256()
-
-    with open(file_path, 'rb') as f:
-        buf = f.read(SHA1_BLOCK_SIZE)
-
-        while len(buf) > 0:
-            sha.update(buf)
-            buf = f.read(SHA1_BLOCK_SIZE)
-
-    return sha.hexdigest()
+    return file_digest(file_path, 'sha256').hex()
 
 
 def file_multihash(file_path):
-    h = file_sha_256(file_path)
+    h = file_hasher.digest(file_path, 'sha256').hex()
     encoded = multihash.encode(h, multihash.SHA2_256)
     return base58.b58encode(bytes(encoded))
 
@@ -107,10 +95,13 @@ class ClientConfig(object):
     """
     Initial configuration for classes implementing the IClient interface
     """
-    def __init__(self, max_concurrent_downloads=3, max_retries=3, timeout=None):
+    def __init__(self, max_concurrent_downloads=3, max_retries=3, timeout=None,
+                 pool_size=None):
 
         self.max_concurrent_downloads = max_concurrent_downloads
         self.max_retries = max_retries
+        # max. number of pooled connections to a resource daemon
+        self.pool_size = pool_size
         self.client = dict(
             timeout=timeout or (12000, 12000)
         )
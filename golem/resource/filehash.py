@@ -0,0 +1,191 @@
+import hashlib
+import logging
+import mmap
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from golem.model import FileDigest
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 2 ** 20
+# Files of at least this size are hashed from a memory map
+MMAP_MIN_SIZE = 16 * 2 ** 20
+
+
+def file_digest(file_path, algorithm='sha256'):
+    """ Hash contents of a file. Large files are memory mapped, so they're
+    hashed with a single call that doesn't hold the GIL.
+    :param str file_path: file to hash
+    :param str algorithm: name of a hashlib algorithm
+    :return bytes: digest of the file
+    """
+    hasher = hashlib.new(algorithm)
+
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size >= MMAP_MIN_SIZE:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                hasher.update(m)
+        else:
+            for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+                hasher.update(block)
+
+    return hasher.digest()
+
+
+class FileDigestCache(object):
+    """ Keeps file digests in memory and in the database. A digest is
+    returned only if inode, size and modification time of the file haven't
+    changed since it was computed. At most max_entries digests are kept in
+    memory, least recently used ones are dropped first. Works in memory only
+    if the database is not available.
+    """
+
+    DEFAULT_MAX_ENTRIES = 16384
+
+    def __init__(self, persistent=True, max_entries=DEFAULT_MAX_ENTRIES):
+        self.persistent = persistent
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, file_path, algorithm):
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+
+        key = (file_path, algorithm)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is None and self.persistent:
+            entry = self._load(file_path, algorithm)
+            if entry is not None:
+                self._remember(key, entry)
+
+        if entry is None:
+            return None
+
+        inode, size, mtime, digest = entry
+        if (inode, size, mtime) != self._stat_key(stat):
+            return None
+        return digest
+
+    def set(self, file_path, algorithm, digest, stat):
+        entry = self._stat_key(stat) + (digest,)
+        self._remember((file_path, algorithm), entry)
+        if self.persistent:
+            self._store(file_path, algorithm, entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def _stat_key(stat):
+        return stat.st_ino, stat.st_size, stat.st_mtime
+
+    @staticmethod
+    def _load(file_path, algorithm):
+        try:
+            row = FileDigest.get(FileDigest.path == file_path,
+                                 FileDigest.algorithm == algorithm)
+        except FileDigest.DoesNotExist:
+            return None
+        except Exception as exc:  # database not available
+            logger.debug("Cannot read file digest: %r", exc)
+            return None
+        return row.inode, row.size, row.mtime, row.digest
+
+    @staticmethod
+    def _store(file_path, algorithm, entry):
+        inode, size, mtime, digest = entry
+        try:
+            FileDigest.insert(path=file_path, algorithm=algorithm, inode=inode,
+                              size=size, mtime=mtime,
+                              digest=digest).upsert().execute()
+        except Exception as exc:  # database not available
+            logger.debug("Cannot store file digest: %r", exc)
+
+
+class FileHasher(object):
+    """ Hashes files on a thread pool and caches their digests """
+
+    DEFAULT_MAX_WORKERS = 4
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, cache=None):
+        self.max_workers = max_workers
+        self.cache = cache or FileDigestCache()
+        self._executor = None
+        self._lock = Lock()
+
+    def digest(self, file_path, algorithm='sha256'):
+        """ Return digest of a file, computing it if it's not cached
+        :return bytes: digest of the file
+        """
+        digest = self.cache.get(file_path, algorithm)
+        if digest is None:
+            digest = self._compute(file_path, algorithm)
+        return digest
+
+    def digests(self, file_paths, algorithm='sha256'):
+        """ Return digests of many files. Files which are not cached are
+        hashed in parallel.
+        :return dict: file path -> digest
+        """
+        result = dict()
+        missing = []
+
+        for file_path in file_paths:
+            digest = self.cache.get(file_path, algorithm)
+            if digest is None:
+                missing.append(file_path)
+            else:
+                result[file_path] = digest
+
+        if len(missing) == 1:
+            result[missing[0]] = self._compute(missing[0], algorithm)
+        elif missing:
+            executor = self._get_executor()
+            futures = [executor.submit(self._compute, file_path, algorithm)
+                       for file_path in missing]
+            for file_path, future in zip(missing, futures):
+                result[file_path] = future.result()
+
+        return result
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=True)
+
+    def _compute(self, file_path, algorithm):
+        stat = os.stat(file_path)
+        digest = file_digest(file_path, algorithm)
+        self.cache.set(file_path, algorithm, digest, stat)
+        return digest
+
+    def _get_executor(self):
+        with self._lock:
+            if not self._executor:
+                self._executor = ThreadPoolExecutor(self.max_workers)
+            return self._executor
+
+
+file_hasher = FileHasher()
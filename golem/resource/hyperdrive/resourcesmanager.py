@@ -19,9 +19,12 @@ class HyperdriveResourceManager(ClientHandler, AbstractResourceManager):
         AbstractResourceManager.__init__(self, dir_manager, **kwargs)
 
         self.peer_manager = HyperdrivePeerManager(daemon_address)
+        # task id -> (files signature, resource hash)
+        self._added = dict()
 
     def new_client(self):
-        return HyperdriveClient(**self.config.client)
+        return HyperdriveClient(pool_size=self.config.pool_size,
+                                **self.config.client)
 
     def build_client_options(self, peers=None, **kwargs):
         return HyperdriveClient.build_options(peers=peers, **kwargs)
@@ -67,6 +70,14 @@ class HyperdriveResourceManager(ClientHandler, AbstractResourceManager):
                              .format(f))
                 return
 
+        signature = self._files_signature(files)
+        added_signature, added_hash = self._added.get(task_id, (None, None))
+        if signature == added_signature and \
+                self.storage.cache.get_by_hash(added_hash):
+            logger.debug("Resource manager: files for task %s are unchanged, "
+                         "reusing resource %s", task_id, added_hash)
+            return
+
         client = client or self.new_client()
         response = self._handle_retries(client.add,
                                         self.commands.add,
@@ -76,6 +87,15 @@ class HyperdriveResourceManager(ClientHandler, AbstractResourceManager):
                                         obj_id=str(uuid.uuid4()))
 
         self._cache_response(list(files.values()), response, task_id)
+        self._added[task_id] = (signature, response)
+
+    def remove_task(self, task_id,
+                    client=None, client_options=None):
+
+        self._added.pop(task_id, None)
+        super().remove_task(task_id,
+                            client=client,
+                            client_options=client_options)
 
     def wrap_file(self, resource):
         resource_path, resource_hash = resource
@@ -87,6 +107,18 @@ class HyperdriveResourceManager(ClientHandler, AbstractResourceManager):
         return ResourceBundle(files, resource_hash,
                               task_id=task_id, path=path)
 
+    @staticmethod
+    def _files_signature(files):
+        """ Describe files by their paths, names, sizes and modification
+        times. Hyperg hashes the files on its own, so an unchanged signature
+        is used to skip sending the same files again.
+        """
+        signature = []
+        for path, name in files.items():
+            stat = os.stat(path)
+            signature.append((path, name, stat.st_size, stat.st_mtime))
+        return tuple(sorted(signature))
+
     def _cache_response(self, resources, resource_hash, task_id):
         res = self._wrap_resource((resource_hash, resources), task_id)
         self._cache_resource(res)
@@ -1,16 +1,39 @@
 import logging
 import os
 import string
+import tempfile
 import unicodedata
 import zipfile
+from threading import Lock
 
 from golem.core.simplehash import SimpleHash
 from golem.resource.dirmanager import split_path
+from golem.resource.filehash import file_hasher
 
 
 logger = logging.getLogger(__name__)
 
 
+def hash_file_base64(file_path):
+    """ Return sha1 of a file encoded with base64. Digest is computed only
+    if the file has changed since it was last hashed.
+    :param str file_path: file to hash
+    :return bytes: base64 encoded sha1 of the file
+    """
+    return SimpleHash.base64_encode(file_hasher.digest(file_path, 'sha1'))
+
+
+def hash_files_base64(file_paths):
+    """ Return sha1 of many files encoded with base64. Files that have
+    changed are hashed in parallel.
+    :param list file_paths: files to hash
+    :return dict: file path -> base64 encoded sha1 of the file
+    """
+    digests = file_hasher.digests(file_paths, 'sha1')
+    return {path: SimpleHash.base64_encode(digest)
+            for path, digest in digests.items()}
+
+
 class TaskResourceHeader(object):
     def __init__(self, dir_name):
         self.sub_dir_headers = []
@@ -40,6 +63,7 @@ class TaskResourceHeader(object):
         cur_th = TaskResourceHeader(dir_name)
 
         abs_dirs = split_path(absolute_root)
+        hashes = hash_files_base64(chosen_files)
 
         for f in chosen_files:
 
@@ -57,7 +81,7 @@ class TaskResourceHeader(object):
                     last_header.sub_dir_headers.append(child_sub_dir_header)
                     last_header = child_sub_dir_header
 
-            hsh = SimpleHash.hash_file_base64(f)
+            hsh = hashes[f]
             last_header.files_data.append((file_name, hsh))
 
         return cur_th
@@ -73,7 +97,7 @@ class TaskResourceHeader(object):
         for f in files:
             if chosen_files and os.path.join(absolute_root, f) not in chosen_files:
                 continue
-            hsh = SimpleHash.hash_file_base64(os.path.join(absolute_root, f))
+            hsh = hash_file_base64(os.path.join(absolute_root, f))
 
             files_data.append((f, hsh))
 
@@ -98,6 +122,7 @@ class TaskResourceHeader(object):
         cur_th = TaskResourceHeader(header.dir_name)
 
         abs_dirs = split_path(absolute_root)
+        hashes = hash_files_base64(chosen_files)
 
         for file_ in chosen_files:
 
@@ -109,7 +134,7 @@ class TaskResourceHeader(object):
 
             last_header, last_ref_header, ref_header_found = cls.__resolve_dirs(dirs, last_header, last_ref_header)
 
-            hsh = SimpleHash.hash_file_base64(file_)
+            hsh = hashes[file_]
             if ref_header_found:
                 if last_ref_header.__has_file(file_name):
                     if hsh == last_ref_header.__get_file_hash(file_name):
@@ -125,6 +150,7 @@ class TaskResourceHeader(object):
         cur_th = TaskResourceHeader(header.dir_name)
         abs_dirs = split_path(absolute_root)
         delta_parts = []
+        hashes = hash_files_base64(list(res_parts))
 
         for file_, parts in res_parts.items():
             dir_, file_name = os.path.split(file_)
@@ -135,7 +161,7 @@ class TaskResourceHeader(object):
 
             last_header, last_ref_header, ref_header_found = cls.__resolve_dirs(dirs, last_header, last_ref_header)
 
-            hsh = SimpleHash.hash_file_base64(file_)
+            hsh = hashes[file_]
             if ref_header_found:
                 if last_ref_header.__has_file(file_name):
                     if hsh == last_ref_header.__get_file_hash(file_name):
@@ -170,13 +196,13 @@ class TaskResourceHeader(object):
 
             file_hash = 0
             if header.__has_file(f):
-                file_hash = SimpleHash.hash_file_base64(os.path.join(absolute_root, f))
+                file_hash = hash_file_base64(os.path.join(absolute_root, f))
 
                 if file_hash == header.__get_file_hash(f):
                     continue
 
             if not file_hash:
-                file_hash = SimpleHash.hash_file_base64(os.path.join(absolute_root, f))
+                file_hash = hash_file_base64(os.path.join(absolute_root, f))
 
             cur_tr.files_data.append((f, file_hash))
 
@@ -367,7 +393,7 @@ class TaskResource(object):
         for f in files:
             if f in [file_[0] for file_ in header.files_data]:
                 idx = [file_[0] for file_ in header.files_data].index(f)
-                if SimpleHash.hash_file_base64(os.path.join(absolute_root, f)) == header.files_data[idx][1]:
+                if hash_file_base64(os.path.join(absolute_root, f)) == header.files_data[idx][1]:
                     continue
 
             fdata = cls.read_file(os.path.join(absolute_root, f))
@@ -427,42 +453,135 @@ def remove_disallowed_filename_chars(filename):
 
 
 def compress_dir(root_path, header, output_dir):
-    output_file = remove_disallowed_filename_chars(header.hash().strip().decode('unicode-escape') + ".zip")
+    output_file = os.path.join(output_dir, get_zip_file_name(header))
 
-    output_file = os.path.join(output_dir, output_file)
-
-    zipf = zipfile.ZipFile(output_file, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True)
-
-    cur_working_dir = os.getcwd()
-    os.chdir(root_path)
-    logger.debug("Working directory {}".format(os.getcwd()))
+    # Write to a temporary file first, so other threads never see
+    # a partially written archive
+    fd, tmp_file = tempfile.mkstemp(suffix='.part', dir=output_dir)
+    os.close(fd)
 
     try:
-        compress_dir_impl("", header, zipf)
-
-        zipf.close()
-    finally:
-        os.chdir(cur_working_dir)
-        logger.debug("Return to prev working directory {}".format(os.getcwd()))
+        with zipfile.ZipFile(tmp_file, 'w', compression=zipfile.ZIP_DEFLATED,
+                             allowZip64=True) as zipf:
+            compress_dir_impl("", header, zipf, root_path)
+        os.replace(tmp_file, output_file)
+    except Exception:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
 
     return output_file
 
 
+def get_zip_file_name(header):
+    return remove_disallowed_filename_chars(header.hash().strip().decode('unicode-escape') + ".zip")
+
+
 def decompress_dir(root_path, zip_file):
     zipf = zipfile.ZipFile(zip_file, 'r', allowZip64=True)
 
     zipf.extractall(root_path)
 
 
-def compress_dir_impl(root_path, header, zipf):
+def compress_dir_impl(root_path, header, zipf, absolute_root=None):
+    """ Add files described by the header to the zip archive
+    :param str root_path: path of the header's files inside the archive
+    :param TaskResourceHeader header: header of files to add
+    :param zipfile.ZipFile zipf: archive to add files to
+    :param str absolute_root: directory that root_path is relative to;
+    current working directory if not set
+    """
     for sdh in header.sub_dir_headers:
-        compress_dir_impl(os.path.join(root_path, sdh.dir_name), sdh, zipf)
+        compress_dir_impl(os.path.join(root_path, sdh.dir_name), sdh, zipf,
+                          absolute_root)
 
     for fdata in header.files_data:
-        zipf.write(os.path.join(root_path, fdata[0]))
+        arc_name = os.path.join(root_path, fdata[0])
+        if absolute_root:
+            zipf.write(os.path.join(absolute_root, arc_name), arc_name)
+        else:
+            zipf.write(arc_name)
 
 
 def prepare_delta_zip(root_dir, header, output_dir, chosen_files=None):
     # delta_header = TaskResourceHeader.build_header_delta_from_header(header, root_dir, chosen_files)
     delta_header = TaskResourceHeader.build_header_delta_from_chosen(header, root_dir, chosen_files)
     return compress_dir(root_dir, delta_header, output_dir)
+
+
+class DeltaZipCache(object):
+    """ Keeps delta zips of task resources in a subdirectory of the output
+    directory. Archives are named after the hash of the delta header, so
+    providers that miss the same files receive the same archive. When the
+    archives take more than max_size bytes, the least recently used ones
+    are removed. Concurrent requests for the same archive wait for a single
+    build. """
+
+    DIR_NAME = 'delta'
+    DEFAULT_MAX_SIZE = 2 ** 30
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self._lock = Lock()
+        # archive path -> lock held while the archive is being built
+        self._building = dict()
+
+    def get(self, root_dir, header, output_dir, chosen_files=None):
+        """ Return path to a zip with files from chosen_files that are
+        missing in the header or differ from it """
+        delta_header = TaskResourceHeader.build_header_delta_from_chosen(header, root_dir, chosen_files)
+        cache_dir = os.path.join(output_dir, self.DIR_NAME)
+        output_file = os.path.join(cache_dir, get_zip_file_name(delta_header))
+
+        with self._lock:
+            build_lock = self._building.setdefault(output_file, Lock())
+
+        try:
+            with build_lock:
+                if self._touch(output_file):
+                    logger.debug("Reusing delta zip %s", output_file)
+                    return output_file
+
+                os.makedirs(cache_dir, exist_ok=True)
+                compress_dir(root_dir, delta_header, cache_dir)
+                self._evict(cache_dir, keep=output_file)
+                return output_file
+        finally:
+            with self._lock:
+                self._building.pop(output_file, None)
+
+    @staticmethod
+    def _touch(file_path):
+        try:
+            os.utime(file_path)
+        except OSError:
+            return False
+        return True
+
+    def _evict(self, cache_dir, keep):
+        entries = []
+        for name in os.listdir(cache_dir):
+            if not name.endswith('.zip'):
+                continue
+            path = os.path.join(cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError as exc:  # e.g. still being sent on Windows
+                logger.debug("Cannot remove delta zip %s: %r", path, exc)
+                continue
+            total_size -= size
+
+
+delta_zip_cache = DeltaZipCache()
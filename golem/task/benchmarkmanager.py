@@ -32,6 +32,8 @@ class BenchmarkManager(object):
 
         def success_callback(performance):
             Performance.update_or_create(env_id, performance)
+            self.task_server.client.environments_manager \
+                .invalidate_performance(env_id)
             if success:
                 success(performance)
 
@@ -0,0 +1,180 @@
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+
+from twisted.internet import defer, threads
+from twisted.python.failure import Failure
+from twisted.python.threadpool import ThreadPool
+
+from golem.diag.service import DiagnosticsProvider
+from golem.task.taskbase import TaskHeader
+
+logger = logging.getLogger(__name__)
+
+
+class TaskHeaderVerifier(DiagnosticsProvider):
+    """ Verifies signatures of task headers received from peers.
+
+    The same headers are gossiped by every peer in each sync round, so
+    (digest, signature, owner key) tuples of headers that were verified
+    successfully are kept in a bounded LRU cache and never verified twice.
+    Headers which are not in the cache are verified in batches on a worker
+    thread. Until the verifier is started, headers are verified
+    synchronously in the calling thread.
+    """
+
+    DEFAULT_CACHE_SIZE = 4096
+    DEFAULT_BATCH_SIZE = 64
+
+    def __init__(self, verify, cache_size=DEFAULT_CACHE_SIZE,
+                 batch_size=DEFAULT_BATCH_SIZE):
+        """
+        :param verify: function that checks signature of a task header
+                       dict and returns a bool
+        """
+        self.verify_method = verify
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+
+        self._pool = None
+        self._verified = OrderedDict()
+        # cache key -> (header dict, deferreds waiting for the result)
+        self._pending = OrderedDict()
+        self._batch = None
+
+        self.hits = 0
+        self.misses = 0
+        self.invalid = 0
+        self.verifications = 0
+        self.batches = 0
+        self.total_verification_time = 0.0
+        self.max_verification_time = 0.0
+
+    @property
+    def running(self):
+        return self._pool is not None
+
+    def start(self):
+        if self._pool:
+            return
+        self._pool = ThreadPool(minthreads=0, maxthreads=1,
+                                name='TaskHeaderVerifier')
+        self._pool.start()
+        self._dispatch()
+
+    def stop(self):
+        if not self._pool:
+            return
+        pool, self._pool = self._pool, None
+
+        pending, self._pending = self._pending, OrderedDict()
+        for _, deferreds in pending.values():
+            for deferred in deferreds:
+                deferred.errback(defer.CancelledError())
+        pool.stop()
+
+    def verify(self, th_dict_repr):
+        """ Check signature of a task header
+        :param dict th_dict_repr: task header dictionary representation
+        :return Deferred: fires with True if the signature is valid;
+        fires immediately if the header was verified before
+        """
+        key = self._cache_key(th_dict_repr)
+
+        if key in self._verified:
+            self.hits += 1
+            self._verified.move_to_end(key)
+            return defer.succeed(True)
+
+        self.misses += 1
+        deferred = defer.Deferred()
+
+        if key in self._pending:
+            self._pending[key][1].append(deferred)
+        else:
+            self._pending[key] = (th_dict_repr, [deferred])
+            self._dispatch()
+        return deferred
+
+    def clear(self):
+        self._verified = OrderedDict()
+
+    def get_diagnostics(self, output_format):
+        requests = self.hits + self.misses
+        data = dict(
+            cached=len(self._verified),
+            pending=len(self._pending),
+            hits=self.hits,
+            misses=self.misses,
+            hit_rate=self.hits / requests if requests else 0.0,
+            invalid=self.invalid,
+            batches=self.batches,
+            avg_verification_time=(
+                self.total_verification_time / self.verifications
+                if self.verifications else 0.0),
+            max_verification_time=self.max_verification_time,
+        )
+        return self._format_diagnostics(data, output_format)
+
+    @staticmethod
+    def _cache_key(th_dict_repr):
+        digest = hashlib.sha256(TaskHeader.dict_to_binary(th_dict_repr))
+        return (digest.digest(), th_dict_repr["signature"],
+                th_dict_repr["task_owner_key_id"])
+
+    def _dispatch(self):
+        if self._batch is not None or not self._pending:
+            return
+
+        keys = list(self._pending)[:self.batch_size]
+        self._batch = [(key,) + self._pending.pop(key) for key in keys]
+        headers = [th_dict_repr for _, th_dict_repr, _ in self._batch]
+
+        if self._pool:
+            from twisted.internet import reactor
+            deferred = threads.deferToThreadPool(reactor, self._pool,
+                                                 self._verify_batch, headers)
+        else:
+            deferred = defer.maybeDeferred(self._verify_batch, headers)
+        deferred.addBoth(self._batch_finished)
+
+    def _verify_batch(self, headers):
+        results = []
+        for th_dict_repr in headers:
+            started = time.time()
+            try:
+                valid = bool(self.verify_method(th_dict_repr))
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.debug("Cannot verify task header signature: %r", exc)
+                valid = False
+            results.append((valid, time.time() - started))
+        return results
+
+    def _batch_finished(self, results):
+        batch, self._batch = self._batch, None
+        self.batches += 1
+
+        if isinstance(results, Failure):
+            logger.error("Task header verification failed: %r", results)
+            results = [(False, 0.0)] * len(batch)
+
+        for (key, _, deferreds), (valid, duration) in zip(batch, results):
+            self.verifications += 1
+            self.total_verification_time += duration
+            self.max_verification_time = max(self.max_verification_time,
+                                             duration)
+            if valid:
+                self._remember(key)
+            else:
+                self.invalid += 1
+            for deferred in deferreds:
+                deferred.callback(valid)
+
+        self._dispatch()
+
+    def _remember(self, key):
+        self._verified[key] = True
+        self._verified.move_to_end(key)
+        while len(self._verified) > self.cache_size:
+            self._verified.popitem(last=False)
@@ -4,6 +4,7 @@ import os
 
 from golem.core.fileencrypt import FileEncryptor
 from golem.core.async import AsyncRequest, async_run
+from golem.resource.base.resourcesmanager import DownloadPriority
 from .resultpackage import EncryptingTaskResultPackager
 
 logger = logging.getLogger(__name__)
@@ -62,9 +63,11 @@ class EncryptedResultPackageManager(TaskResultPackageManager):
                                             success=package_downloaded,
                                             error=error,
                                             async=async,
-                                            pin=False)
+                                            pin=False,
+                                            priority=DownloadPriority.result)
 
-    def create(self, node, task_result, client_options=None, key_or_secret=None):
+    def create(self, node, task_result, client_options=None, key_or_secret=None,
+               package_version=None):
         if not key_or_secret:
             raise ValueError("Empty key / secret")
 
@@ -75,7 +78,7 @@ class EncryptedResultPackageManager(TaskResultPackageManager):
         if os.path.exists(file_path):
             os.remove(file_path)
 
-        packager = self.package_class(key_or_secret)
+        packager = self.package_class(key_or_secret, package_version)
         path = packager.create(file_path,
                                node=node,
                                task_result=task_result)
@@ -1,7 +1,11 @@
 import abc
+import io
 import os
+import shutil
+import tarfile
 import uuid
 import zipfile
+import zlib
 
 from golem.core.fileencrypt import AESFileEncryptor
 from golem.core.simpleserializer import CBORSerializer
@@ -72,30 +76,205 @@ class ZipPackager(Packager):
         obj.writestr(file_name, cbord_data)
 
 
+class DeflateWriter(object):
+    """ Compresses data as it is written and passes it on to the underlying
+    file object """
+
+    def __init__(self, dst, level=zlib.Z_DEFAULT_COMPRESSION):
+        self._dst = dst
+        self._compressor = zlib.compressobj(level)
+
+    def write(self, data):
+        self._dst.write(self._compressor.compress(data))
+        return len(data)
+
+    def close(self):
+        if self._compressor:
+            self._dst.write(self._compressor.flush())
+            self._compressor = None
+
+
+class InflateReader(object):
+    """ Decompresses data read from the underlying file object on demand """
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, src):
+        self._src = src
+        self._decompressor = zlib.decompressobj()
+        self._buffer = bytearray()
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            data = self._decompressor.unconsumed_tail
+            if not data:
+                data = self._src.read(self.chunk_size)
+            if not data:
+                self._buffer += self._decompressor.flush()
+                break
+            self._buffer += self._decompressor.decompress(data,
+                                                          self.chunk_size)
+
+        if size < 0 or size > len(self._buffer):
+            size = len(self._buffer)
+
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+class EncryptedStreamGenerator(object):
+    """ Writes a versioned package header followed by a compressed and
+    encrypted tar stream """
+
+    def __init__(self, output_path, header, encryptor_class, key_or_secret):
+        self._file = open(output_path, 'wb')
+        try:
+            self._file.write(header)
+            self._encryptor = encryptor_class.stream_writer(self._file,
+                                                            key_or_secret)
+            self._compressor = DeflateWriter(self._encryptor)
+            self.tar = tarfile.open(fileobj=self._compressor, mode='w|')
+        except Exception:
+            self._file.close()
+            raise
+
+    def __enter__(self):
+        return self.tar
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            self.tar.close()
+            self._compressor.close()
+            self._encryptor.close()
+        finally:
+            self._file.close()
+
+
 class EncryptingPackager(Packager):
+    """ Packs files into a single encrypted file.
+
+    Package format version 1: AES encrypted zip archive with no header.
+    It's written in two passes, through a plain zip file on disk.
+
+    Package format version 2: package_magic, a version byte and an AES
+    encrypted stream (see AESFileEncryptor) of a deflated tar archive.
+    Files are compressed and encrypted in a single pass, without creating
+    an intermediate plain package on disk.
+
+    Packages of both versions are extracted. Version 1 is written unless
+    another one is requested, since older nodes read only version 1.
+    """
 
     creator_class = ZipPackager
     encryptor_class = AESFileEncryptor
 
-    def __init__(self, key_or_secret):
+    package_magic = b'GOLEMPKG'
+    legacy_version = 1
+    version = 2
+
+    def __init__(self, key_or_secret, version=None):
+        """
+        :param key_or_secret: encryption key or secret
+        :param int version: format version of created packages, from
+        legacy_version to version; legacy_version by default
+        """
+        if version is None:
+            version = self.legacy_version
+        if not self.legacy_version <= version <= self.version:
+            raise ValueError("Unsupported package version {}"
+                             .format(version))
 
         self._creator = self.creator_class()
         self.key_or_secret = key_or_secret
+        self.package_version = version
 
     def create(self, output_path, disk_files=None, cbor_files=None, **kwargs):
 
+        if self.package_version == self.legacy_version:
+            return self._create_v1(output_path, disk_files, cbor_files)
+
+        return super(EncryptingPackager, self).create(output_path,
+                                                      disk_files=disk_files,
+                                                      cbor_files=cbor_files)
+
+    def extract(self, input_path, output_dir=None, **kwargs):
+
+        if not output_dir:
+            output_dir = os.path.dirname(input_path)
+
+        with open(input_path, 'rb') as src:
+            version = self._read_version(src)
+            if version is not None:
+                if version > self.version:
+                    raise ValueError("Unsupported package version {}"
+                                     .format(version))
+                return self._extract_stream(src, output_dir)
+
+        return self._extract_v1(input_path, output_dir)
+
+    def generator(self, output_path):
+        header = self.package_magic + bytes([self.version])
+        return EncryptedStreamGenerator(output_path, header,
+                                        self.encryptor_class,
+                                        self.key_or_secret)
+
+    def write_disk_file(self, obj, file_path, file_name):
+        obj.add(file_path, arcname=file_name)
+
+    def write_cbor_file(self, obj, file_name, cbord_data):
+        info = tarfile.TarInfo(file_name)
+        info.size = len(cbord_data)
+        obj.addfile(info, io.BytesIO(cbord_data))
+
+    def _read_version(self, src):
+        header = src.read(len(self.package_magic) + 1)
+        if len(header) > len(self.package_magic) and \
+                header.startswith(self.package_magic):
+            return header[-1]
+        return None
+
+    def _extract_stream(self, src, output_dir):
+
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+
+        decryptor = self.encryptor_class.stream_reader(src,
+                                                       self.key_or_secret)
+        extracted = []
+
+        with tarfile.open(fileobj=InflateReader(decryptor), mode='r|') as tf:
+            for member in tf:
+                file_name = os.path.basename(member.name)
+                if not member.isfile() or file_name != member.name:
+                    continue
+
+                with tf.extractfile(member) as member_file, \
+                        open(os.path.join(output_dir, file_name), 'wb') as dst:
+                    shutil.copyfileobj(member_file, dst)
+                extracted.append(file_name)
+
+        return extracted, output_dir
+
+    def _create_v1(self, output_path, disk_files, cbor_files):
+
         output_dir = os.path.dirname(output_path)
         pkg_file_path = os.path.join(output_dir, str(uuid.uuid4()) + ".pkg")
-        out_file_path = super(EncryptingPackager, self).create(pkg_file_path,
-                                                               disk_files=disk_files,
-                                                               cbor_files=cbor_files)
 
-        self.encryptor_class.encrypt(out_file_path,
-                                     output_path,
-                                     self.key_or_secret)
+        try:
+            self._creator.create(pkg_file_path,
+                                 disk_files=disk_files,
+                                 cbor_files=cbor_files)
+            self.encryptor_class.encrypt(pkg_file_path,
+                                         output_path,
+                                         self.key_or_secret)
+        finally:
+            if os.path.exists(pkg_file_path):
+                os.remove(pkg_file_path)
+
         return output_path
 
-    def extract(self, input_path, output_dir=None, **kwargs):
+    def _extract_v1(self, input_path, output_dir):
 
         input_dir = os.path.dirname(input_path)
         tmp_file_path = os.path.join(input_dir, str(uuid.uuid4()) + ".dec")
@@ -109,15 +288,6 @@ class EncryptingPackager(Packager):
 
         return self._creator.extract(input_path, output_dir=output_dir)
 
-    def generator(self, output_path):
-        return self._creator.generator(output_path)
-
-    def write_disk_file(self, obj, file_path, file_name):
-        self._creator.write_disk_file(obj, file_path, file_name)
-
-    def write_cbor_file(self, obj, file_name, cbord_data):
-        self._creator.write_cbor_file(obj, file_name, cbord_data)
-
 
 class TaskResultDescriptor(object):
 
@@ -137,9 +307,9 @@ class EncryptingTaskResultPackager(EncryptingPackager):
     descriptor_file_name = '.package_desc'
     result_file_name = '.result_cbor'
 
-    def __init__(self, key_or_secret):
+    def __init__(self, key_or_secret, version=None):
         self.parent = super(EncryptingTaskResultPackager, self)
-        self.parent.__init__(key_or_secret)
+        self.parent.__init__(key_or_secret, version)
 
     def create(self, output_path,
                disk_files=None, cbor_files=None,
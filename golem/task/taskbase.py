@@ -281,6 +281,29 @@ class Task(metaclass=abc.ABCMeta):
         """
         return  # Implement in derived class
 
+    def verify_results(self, subtask_id, task_result,
+                       result_type=ResultType.DATA):
+        """ Check results of a finished subtask before they're applied by
+        results_verified. It's run in a worker thread, so it mustn't change
+        the task's state. By default results are checked by
+        computation_finished.
+        :param subtask_id: finished subtask id
+        :param task_result: task result, can be binary data or list of files
+        :param result_type: ResultType representation
+        :return: verdict passed to results_verified
+        """
+        return None
+
+    def results_verified(self, subtask_id, task_result, result_type, verdict):
+        """ Apply results of a finished subtask, checked by verify_results.
+        It's run in the reactor thread.
+        :param subtask_id: finished subtask id
+        :param task_result: task result, can be binary data or list of files
+        :param result_type: ResultType representation
+        :param verdict: value returned by verify_results
+        """
+        self.computation_finished(subtask_id, task_result, result_type)
+
     @abc.abstractmethod
     def computation_failed(self, subtask_id):
         """ Inform that computation of a task with given id has failed
@@ -9,6 +9,7 @@ from pydispatch import dispatcher
 
 from golem.core.common import deadline_to_timeout
 from golem.core.statskeeper import IntStatsKeeper
+from golem.docker.config_manager import split_host_config
 from golem.docker.manager import DockerManager
 from golem.docker.task_thread import DockerTaskThread
 from golem.manager.nodestatesnapshot import TaskChunkStateSnapshot
@@ -29,9 +30,65 @@ class CompStats(object):
         self.tasks_requested = 0
 
 
+class ComputationSlot(object):
+    """ A share of cpu cores and memory offered for computation. Each slot
+    computes at most one subtask at a time, in a separate container pinned
+    to the slot's cores.
+    """
+
+    def __init__(self, index, host_config=None, num_cores=0,
+                 max_memory_size=0):
+        self.index = index
+        self.host_config = host_config
+        self.num_cores = num_cores
+        self.max_memory_size = max_memory_size
+
+        self.task_id = None
+        self.subtask_id = None
+        self.task_thread = None
+        self.delta = None
+
+        self.use_waiting_ttl = False
+        self.waiting_ttl = 0
+        self.last_checking = time.time()
+
+    @property
+    def idle(self):
+        return self.task_id is None
+
+    @property
+    def computing(self):
+        return self.task_thread is not None
+
+    @property
+    def waiting(self):
+        """ Task has been requested or assigned, but its computation
+        hasn't started yet """
+        return not self.idle and not self.computing
+
+    def wait(self, wait=True, ttl=0):
+        self.use_waiting_ttl = wait
+        self.waiting_ttl = ttl
+        self.last_checking = time.time()
+
+    def reset(self):
+        self.task_id = None
+        self.subtask_id = None
+        self.task_thread = None
+        self.delta = None
+        self.use_waiting_ttl = False
+        self.waiting_ttl = 0
+
+    def __repr__(self):
+        return "<ComputationSlot {} cores={} task={} subtask={}>".format(
+            self.index, self.num_cores, self.task_id, self.subtask_id)
+
+
 class TaskComputer(object):
     """ TaskComputer is responsible for task computations that take place in Golem application. Tasks are started
-    in separate threads.
+    in separate threads. Available cores and memory are split into
+    max_assigned_tasks computation slots, which request and compute
+    subtasks independently.
     """
 
     lock = Lock()
@@ -45,23 +102,22 @@ class TaskComputer(object):
         """
         self.node_name = node_name
         self.task_server = task_server
-        self.waiting_for_task = None
-        self.counting_task = False
-        self.task_requested = False
         self.runnable = True
         self.listeners = []
         self.current_computations = []
         self.last_task_request = time.time()
 
-        self.waiting_ttl = 0
-        self.last_checking = time.time()
+        self.slots = []
+        self._slots_outdated = False
 
         self.dir_manager = None
         self.resource_manager = None
         self.task_request_frequency = None
-        self.use_waiting_ttl = None
         self.waiting_for_task_timeout = None
         self.waiting_for_task_session_timeout = None
+        self.max_assigned_tasks = 1
+        self.num_cores = 0
+        self.max_memory_size = 0
 
         self.docker_manager = DockerManager.install()
         if use_docker_machine_manager:
@@ -75,24 +131,51 @@ class TaskComputer(object):
 
         self.assigned_subtasks = {}
         self.task_to_subtask_mapping = {}
-        self.max_assigned_tasks = 1
 
-        self.delta = None
         self.last_task_timeout_checking = None
         self.support_direct_computation = False
         self.compute_tasks = task_server.config_desc.accept_tasks
 
+    @property
+    def waiting_for_task(self):
+        """ Id of a task requested or assigned to one of the slots, which
+        computation hasn't started yet """
+        for slot in self.slots:
+            if slot.waiting:
+                return slot.task_id
+        return None
+
+    @property
+    def counting_task(self):
+        """ Id of a task computed in one of the slots """
+        for slot in self.slots:
+            if slot.computing:
+                return slot.task_id
+        return None
+
+    @property
+    def task_requested(self):
+        return any(slot.waiting and slot.subtask_id is None
+                   for slot in self.slots)
+
     def task_given(self, ctd):
-        if ctd.subtask_id not in self.assigned_subtasks:
-            self.wait(ttl=self.waiting_for_task_timeout)
-            self.assigned_subtasks[ctd.subtask_id] = ctd
-            self.task_to_subtask_mapping[ctd.task_id] = ctd.subtask_id
-            self.__request_resource(ctd.task_id, self.resource_manager.get_resource_header(ctd.task_id),
-                                    ctd.return_address, ctd.return_port, ctd.key_id, ctd.task_owner)
-            return True
-        else:
+        if ctd.subtask_id in self.assigned_subtasks:
+            return False
+
+        slot = self.__get_slot(ctd.task_id) or self.__get_idle_slot()
+        if slot is None or slot.subtask_id is not None:
+            logger.warning("No free slot to compute subtask %r",
+                           ctd.subtask_id)
             return False
 
+        slot.task_id = ctd.task_id
+        slot.subtask_id = ctd.subtask_id
+        self.assigned_subtasks[ctd.subtask_id] = ctd
+        self.task_to_subtask_mapping[ctd.task_id] = ctd.subtask_id
+        self.__request_resource(slot, self.resource_manager.get_resource_header(ctd.task_id),
+                                ctd.return_address, ctd.return_port, ctd.key_id, ctd.task_owner)
+        return True
+
     def resource_given(self, task_id):
         if task_id in self.task_to_subtask_mapping:
             subtask_id = self.task_to_subtask_mapping[task_id]
@@ -102,7 +185,6 @@ class TaskComputer(object):
                 self.__compute_task(subtask_id, subtask.docker_images,
                                     subtask.src_code, subtask.extra_data,
                                     subtask.short_description, subtask.deadline)
-                self.waiting_for_task = None
                 return True
             else:
                 return False
@@ -112,9 +194,12 @@ class TaskComputer(object):
             subtask_id = self.task_to_subtask_mapping[task_id]
             if subtask_id in self.assigned_subtasks:
                 subtask = self.assigned_subtasks[subtask_id]
+                slot = self.__get_slot(task_id)
+                delta = slot.delta if slot else None
                 if unpack_delta:
-                    self.task_server.unpack_delta(self.dir_manager.get_task_resource_dir(task_id), self.delta, task_id)
-                self.delta = None
+                    self.task_server.unpack_delta(self.dir_manager.get_task_resource_dir(task_id), delta, task_id)
+                if slot:
+                    slot.delta = None
                 self.last_task_timeout_checking = time.time()
                 self.__compute_task(subtask_id, subtask.docker_images, subtask.src_code, subtask.extra_data,
                                     subtask.short_description, subtask.deadline)
@@ -130,22 +215,31 @@ class TaskComputer(object):
                                                   'Error downloading resources: {}'.format(reason),
                                                   subtask.return_address, subtask.return_port, subtask.key_id,
                                                   subtask.task_owner, self.node_name)
-            self.session_closed()
+            slot = self.__get_slot(task_id)
+            if slot and not slot.computing:
+                slot.reset()
 
     def wait_for_resources(self, task_id, delta):
         if task_id in self.task_to_subtask_mapping:
             subtask_id = self.task_to_subtask_mapping[task_id]
-            if subtask_id in self.assigned_subtasks:
-                self.delta = delta
+            slot = self.__get_slot(task_id)
+            if slot and subtask_id in self.assigned_subtasks:
+                slot.delta = delta
 
     def task_request_rejected(self, task_id, reason):
         logger.info("Task {} request rejected: {}".format(task_id, reason))
+        slot = self.__get_slot(task_id)
+        if slot and slot.subtask_id is None:
+            slot.reset()
 
     def resource_request_rejected(self, subtask_id, reason):
         logger.info("Task {} resource request rejected: {}".format(subtask_id,
                                                                    reason))
         self.assigned_subtasks.pop(subtask_id, None)
-        self.reset()
+        for slot in self.slots:
+            if subtask_id in (slot.task_id, slot.subtask_id) \
+                    and not slot.computing:
+                self.__free_slot(slot)
 
     def task_computed(self, task_thread):
         if task_thread.end_time is None:
@@ -156,6 +250,9 @@ class TaskComputer(object):
                 self.current_computations.remove(task_thread)
             except ValueError:  # not in list
                 pass
+            for slot in self.slots:
+                if slot.task_thread is task_thread:
+                    slot.reset()
 
         work_wall_clock_time = task_thread.end_time - task_thread.start_time
         subtask_id = task_thread.subtask_id
@@ -198,23 +295,26 @@ class TaskComputer(object):
                                               subtask.return_address, subtask.return_port, subtask.key_id,
                                               subtask.task_owner, self.node_name)
             dispatcher.send(signal='golem.monitor', event='computation_time_spent', success=False, value=work_time_to_be_paid)
-        self.counting_task = None
 
     def run(self):
-        if self.counting_task:
-            for task_thread in self.current_computations:
-                task_thread.check_timeout()
-        elif self.compute_tasks and self.runnable:
-            if not self.waiting_for_task:
-                if time.time() - self.last_task_request > self.task_request_frequency:
-                    if len(self.current_computations) == 0:
-                        self.__request_task()
-            elif self.use_waiting_ttl:
+        if self._slots_outdated:
+            self.__update_slots()
+
+        for slot in list(self.slots):
+            if slot.computing:
+                slot.task_thread.check_timeout()
+            elif slot.waiting and slot.use_waiting_ttl:
                 time_ = time.time()
-                self.waiting_ttl -= time_ - self.last_checking
-                self.last_checking = time_
-                if self.waiting_ttl < 0:
-                    self.reset()
+                slot.waiting_ttl -= time_ - slot.last_checking
+                slot.last_checking = time_
+                if slot.waiting_ttl < 0:
+                    logger.info("Slot %d stopped waiting for task %r",
+                                slot.index, slot.task_id)
+                    self.__free_slot(slot)
+
+        if self.compute_tasks and self.runnable and not self._slots_outdated:
+            if time.time() - self.last_task_request > self.task_request_frequency:
+                self.__request_tasks()
 
     def get_progresses(self):
         ret = {}
@@ -232,7 +332,11 @@ class TaskComputer(object):
         self.waiting_for_task_timeout = config_desc.waiting_for_task_timeout
         self.waiting_for_task_session_timeout = config_desc.waiting_for_task_session_timeout
         self.compute_tasks = config_desc.accept_tasks
+        self.max_assigned_tasks = max(config_desc.max_assigned_tasks, 1)
+        self.num_cores = config_desc.num_cores
+        self.max_memory_size = config_desc.max_memory_size
         self.change_docker_config(config_desc, run_benchmarks, in_background)
+        self.__update_slots()
 
     def config_changed(self):
         for l in self.listeners:
@@ -273,52 +377,114 @@ class TaskComputer(object):
         for l in self.listeners:
             l.lock_config(on)
 
-    def session_timeout(self):
-        self.session_closed()
+    def session_timeout(self, task_id=None):
+        self.session_closed(task_id)
 
-    def session_closed(self):
-        if not self.counting_task:
-            self.reset()
+    def session_closed(self, task_id=None):
+        """ Stop waiting for a task that hasn't been assigned yet
+        :param task_id: id of the task that the session was opened for;
+                        if None, every slot waiting for a task is freed
+        """
+        for slot in self.slots:
+            if slot.waiting and slot.subtask_id is None \
+                    and task_id in (None, slot.task_id):
+                slot.reset()
 
     def wait(self, wait=True, ttl=None):
-        self.use_waiting_ttl = wait
         if ttl is None:
-            self.waiting_ttl = self.waiting_for_task_session_timeout
-        else:
-            self.waiting_ttl = ttl
-
-    def reset(self, computing_task=False):
-        self.counting_task = computing_task
-        self.use_waiting_ttl = False
-        self.task_requested = False
-        self.waiting_for_task = None
-        self.waiting_ttl = 0
-
-    def __request_task(self):
+            ttl = self.waiting_for_task_session_timeout
+        for slot in self.slots:
+            if slot.waiting:
+                slot.wait(wait, ttl)
+
+    def __get_slot(self, task_id):
+        for slot in self.slots:
+            if slot.task_id == task_id:
+                return slot
+        return None
+
+    def __get_idle_slot(self):
+        for slot in self.slots:
+            if slot.idle:
+                return slot
+        return None
+
+    def __free_slot(self, slot):
+        subtask_id = slot.subtask_id
+        if subtask_id is not None:
+            self.assigned_subtasks.pop(subtask_id, None)
+            if self.task_to_subtask_mapping.get(slot.task_id) == subtask_id:
+                del self.task_to_subtask_mapping[slot.task_id]
+        slot.reset()
+
+    def __update_slots(self):
+        """ Split configured cores and memory into max_assigned_tasks slots.
+        If any slot is in use, slots are rebuilt when all of them are free
+        again and no new tasks are requested in the meantime.
+        """
         with self.lock:
-            perform_request = not self.waiting_for_task and not self.counting_task
+            if not all(slot.idle for slot in self.slots):
+                self._slots_outdated = True
+                return
+
+            host_configs = split_host_config(
+                self.docker_manager.container_host_config,
+                self.max_assigned_tasks)
+            num_slots = len(host_configs)
+
+            slots = []
+            for index, host_config in enumerate(host_configs):
+                cpuset = host_config.get('cpuset')
+                if cpuset:
+                    num_cores = len(cpuset.split(','))
+                else:
+                    num_cores = self.num_cores // num_slots
+                slots.append(ComputationSlot(
+                    index, host_config=host_config, num_cores=num_cores,
+                    max_memory_size=self.max_memory_size // num_slots))
+
+            self.slots = slots
+            self._slots_outdated = False
+
+        logger.debug("Computation slots: %r", self.slots)
+
+    def __request_tasks(self):
+        with self.lock:
+            idle_slots = [slot for slot in self.slots if slot.idle]
+            requested = {slot.task_id for slot in self.slots
+                         if not slot.idle}
 
-        if not perform_request:
+        if not idle_slots:
             return
 
-        now = time.time()
-        self.wait()
-        self.last_checking = now
-        self.last_task_request = now
-        self.waiting_for_task = self.task_server.request_task()
-        if self.waiting_for_task is not None:
+        self.last_task_request = time.time()
+
+        for slot in idle_slots:
+            task_id = self.task_server.request_task(
+                num_cores=slot.num_cores,
+                max_memory_size=slot.max_memory_size,
+                exclude=set(requested))
+            if task_id is None:
+                break
+
+            requested.add(task_id)
+            slot.task_id = task_id
+            slot.wait(ttl=self.waiting_for_task_session_timeout)
             self.stats.increase_stat('tasks_requested')
 
-    def __request_resource(self, task_id, resource_header, return_address, return_port, key_id, task_owner):
-        self.last_checking = time.time()
-        self.wait(ttl=self.waiting_for_task_timeout)
-        self.waiting_for_task = self.task_server.request_resource(task_id, resource_header, return_address, return_port,
-                                                                  key_id,
-                                                                  task_owner)
+    def __request_resource(self, slot, resource_header, return_address, return_port, key_id, task_owner):
+        slot.wait(ttl=self.waiting_for_task_timeout)
+        self.task_server.request_resource(slot.task_id, resource_header, return_address, return_port,
+                                          key_id,
+                                          task_owner)
 
     def __compute_task(self, subtask_id, docker_images,
                        src_code, extra_data, short_desc, subtask_deadline):
         task_id = self.assigned_subtasks[subtask_id].task_id
+        slot = self.__get_slot(task_id)
+        if slot is None:
+            logger.error("No slot assigned to subtask %r", subtask_id)
+            return
 
         task_header = self.task_server.task_keeper.task_headers[task_id]
         deadline = min(task_header.deadline, subtask_deadline)
@@ -327,7 +493,7 @@ class TaskComputer(object):
         working_dir = self.assigned_subtasks[subtask_id].working_directory
         unique_str = str(uuid.uuid4())
 
-        self.reset(computing_task=task_id)
+        slot.use_waiting_ttl = False
 
         with self.dir_lock:
             resource_dir = self.resource_manager.get_resource_dir(task_id)
@@ -341,7 +507,8 @@ class TaskComputer(object):
         if docker_images:
             tt = DockerTaskThread(self, subtask_id, docker_images, working_dir,
                                   src_code, extra_data, short_desc,
-                                  resource_dir, temp_dir, task_timeout)
+                                  resource_dir, temp_dir, task_timeout,
+                                  host_config=slot.host_config)
         elif self.support_direct_computation:
             tt = PyTaskThread(self, subtask_id, working_dir, src_code,
                               extra_data, short_desc, resource_dir, temp_dir,
@@ -356,10 +523,12 @@ class TaskComputer(object):
                                               subtask.key_id,
                                               subtask.task_owner,
                                               self.node_name)
-            self.counting_task = None
+            slot.reset()
             return
 
-        self.current_computations.append(tt)
+        with self.lock:
+            slot.task_thread = tt
+            self.current_computations.append(tt)
         tt.start()
 
     def quit(self):
@@ -1,17 +1,24 @@
+import bisect
+import heapq
+import itertools
 import logging
 import math
+import os
 import pickle
-import random
 import time
+import uuid
+from collections import OrderedDict
 
 from typing import Optional
 import typing
 from semantic_version import Version
 
 from golem.core.common import HandleKeyError, get_timestamp_utc
+from golem.core.deadlines import DeadlineScheduler
 from golem.core.variables import APP_VERSION
 from golem.environments.environment import SupportStatus, UnsupportReason
 from .taskbase import TaskHeader, ComputeTaskDef
+from .taskselector import TaskSelector
 
 logger = logging.getLogger('golem.task.taskkeeper')
 
@@ -56,6 +63,8 @@ class CompTaskKeeper(object):
 
     handle_key_error = HandleKeyError(log_key_error)
 
+    DUMP_NAME = "comp_task_keeper.pickle"
+
     def __init__(self, tasks_path, persist=True):
         """ Create new instance of compuatational task's definition's keeper
 
@@ -64,7 +73,7 @@ class CompTaskKeeper(object):
         # information about tasks that this node wants to compute
         self.active_tasks = {}  # type: typing.Dict[str, CompTaskInfo]
         self.subtask_to_task = {}  # maps subtasks id to tasks id
-        self.dump_path = tasks_path / "comp_task_keeper.pickle"
+        self.dump_path = tasks_path / self.DUMP_NAME
         self.persist = persist
         self.restore()
 
@@ -72,12 +81,13 @@ class CompTaskKeeper(object):
         if not self.persist:
             return
         logger.debug('COMPTASK DUMP: %s', self.dump_path)
-        with self.dump_path.open('wb') as f:
+        # Written to a temporary file first, so that a crash cannot leave
+        # a truncated dump
+        tmp_path = self.dump_path.with_name(self.dump_path.name + '.tmp')
+        with tmp_path.open('wb') as f:
             dump_data = self.active_tasks, self.subtask_to_task
-            from pprint import pformat
-            for task in list(self.active_tasks.values()):
-                logger.debug('dump_data: %s', pformat(task))
-            pickle.dump(dump_data, f)
+            pickle.dump(dump_data, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(str(tmp_path), str(self.dump_path))
 
     def restore(self):
         if not self.persist:
@@ -175,18 +185,42 @@ class TaskHeaderKeeper(object):
             app_version=APP_VERSION,
             remove_task_timeout=180,
             verification_timeout=3600,
-            max_tasks_per_requestor=10):
+            max_tasks_per_requestor=10,
+            task_selector=None,
+            rescore_interval=60):
         # all computing tasks that this node knows about
         self.task_headers = {}
         # ids of tasks that this node may try to compute
-        self.supported_tasks = []
+        self.supported_tasks = set()
         # results of tasks' support checks
         self.support_status = {}
         # tasks that were removed from network recently, so they won't
-        # be added again to task_headers
-        self.removed_tasks = {}
-        # task ids by owner
+        # be added again to task_headers; oldest removals first
+        self.removed_tasks = OrderedDict()
+        # owner key id -> (last_checking, task id) of owner's tasks, sorted
         self.tasks_by_owner = {}
+        self._deadlines = DeadlineScheduler()
+        # (-score, order, task id) heap of supported tasks, best task on top
+        self._ranking = []
+        # task id -> its current entry in _ranking
+        self._ranks = {}
+        self._rank_order = itertools.count()
+        self.task_selector = task_selector or TaskSelector()
+        # scores depend on eg. trust, which changes over time
+        self.rescore_interval = rescore_interval
+        self._last_rescore = time.time()
+        # Versioned view of known headers, so that peers may ask only for
+        # headers that changed since their last sync. Sequence numbers are
+        # valid only within an epoch (ie. until restart).
+        self.headers_epoch = uuid.uuid4().hex
+        self.headers_seq = 0
+        # task id -> sequence number of its last change, in sequence order
+        self.header_seqs = OrderedDict()
+        # task id -> (signature, header) of tasks requested by this node
+        self.own_headers = {}
+        # incremented when removed tasks may be added again; peers should
+        # then be asked for all of their headers
+        self.resync_counter = 0
 
         self.min_price = min_price
         self.app_version = app_version
@@ -240,11 +274,7 @@ class TaskHeaderKeeper(object):
                                task, err() otherwise
         """
         env = th_dict_repr.get("environment")
-        status = SupportStatus.ok()
-        if not self.environments_manager.accept_tasks(env):
-            status = SupportStatus.err(
-                {UnsupportReason.ENVIRONMENT_NOT_ACCEPTING_TASKS: env})
-        return self.environments_manager.get_support_status(env).join(status)
+        return self.environments_manager.get_environment_status(env)
 
     def check_price(self, th_dict_repr) -> SupportStatus:
         """Check if this node offers prices that isn't greater than maximum
@@ -318,12 +348,23 @@ class TaskHeaderKeeper(object):
         if config_desc.min_price == self.min_price:
             return
         self.min_price = config_desc.min_price
-        self.supported_tasks = []
+        self.supported_tasks = set()
         for id_, th in self.task_headers.items():
             supported = self.check_support(th.__dict__)
             self.support_status[id_] = supported
             if supported:
-                self.supported_tasks.append(id_)
+                self.supported_tasks.add(id_)
+        self.rescore()
+
+    def rescore(self):
+        """ Score all supported tasks again, eg. after trust of their owners
+        changed """
+        self._last_rescore = time.time()
+        self._ranks = {}
+        for task_id in self.supported_tasks:
+            self._ranks[task_id] = self._rank_entry(task_id)
+        self._ranking = list(self._ranks.values())
+        heapq.heapify(self._ranking)
 
     def add_task_header(self, th_dict_repr):
         """This function will try to add to or update a task header
@@ -336,18 +377,23 @@ class TaskHeaderKeeper(object):
         """
         try:
             id_ = th_dict_repr["task_id"]
-            update = id_ in list(self.task_headers.keys())
+            update = id_ in self.task_headers
 
             self.check_correct(th_dict_repr)
 
-            if id_ in list(self.removed_tasks.keys()):  # recent
+            if id_ in self.removed_tasks:  # recent
                 # silently ignore
                 return True
 
             th = TaskHeader.from_dict(th_dict_repr)
+            if update:
+                self._remove_from_owner(self.task_headers[id_])
             self.task_headers[id_] = th
+            self._header_changed(id_)
 
-            self._get_tasks_by_owner_set(th.task_owner_key_id).add(id_)
+            bisect.insort(self._get_tasks_by_owner_set(th.task_owner_key_id),
+                          (th.last_checking, id_))
+            self._deadlines.schedule(id_, th.deadline)
 
             self.update_supported_set(th_dict_repr, update)
 
@@ -365,15 +411,19 @@ class TaskHeaderKeeper(object):
         self.support_status[id_] = support
 
         if update_header:
-            if not support and id_ in self.supported_tasks:
-                self.supported_tasks.remove(id_)
+            if not support:
+                self.supported_tasks.discard(id_)
+                self._ranks.pop(id_, None)
+            elif id_ in self.supported_tasks:
+                self._rank(id_)
         elif support:
             logger.info(
                 "Adding task %r support=%r",
                 id_,
                 support
             )
-            self.supported_tasks.append(id_)
+            self.supported_tasks.add(id_)
+            self._rank(id_)
 
     def check_correct(self, th_dict_repr):
         is_correct, err = self.is_correct(th_dict_repr)
@@ -382,22 +432,31 @@ class TaskHeaderKeeper(object):
 
     def _get_tasks_by_owner_set(self, owner_key_id):
         if owner_key_id not in self.tasks_by_owner:
-            self.tasks_by_owner[owner_key_id] = set()
+            self.tasks_by_owner[owner_key_id] = []
 
         return self.tasks_by_owner[owner_key_id]
 
+    def _remove_from_owner(self, th):
+        owner_tasks = self.tasks_by_owner.get(th.task_owner_key_id)
+        if not owner_tasks:
+            return
+        entry = (th.last_checking, th.task_id)
+        idx = bisect.bisect_left(owner_tasks, entry)
+        if idx < len(owner_tasks) and owner_tasks[idx] == entry:
+            del owner_tasks[idx]
+        if not owner_tasks:
+            del self.tasks_by_owner[th.task_owner_key_id]
+
     def check_max_tasks_per_owner(self, owner_key_id):
-        owner_task_set = self._get_tasks_by_owner_set(owner_key_id)
+        owner_tasks = self.tasks_by_owner.get(owner_key_id, [])
 
-        if len(owner_task_set) <= self.max_tasks_per_requestor:
+        if len(owner_tasks) <= self.max_tasks_per_requestor:
             return
 
-        by_age = sorted(owner_task_set,
-                        key=lambda tid: self.task_headers[tid].last_checking)
-
         # leave alone the first (oldest) max_tasks_per_requestor
         # headers, remove the rest
-        to_remove = by_age[self.max_tasks_per_requestor:]
+        to_remove = [tid for _, tid
+                     in owner_tasks[self.max_tasks_per_requestor:]]
 
         logger.warning("Too many tasks from %s, dropping %d tasks",
                        owner_key_id, len(to_remove))
@@ -409,37 +468,115 @@ class TaskHeaderKeeper(object):
         """ Removes task with given id from a list of known task headers.
         """
         if task_id in self.task_headers:
-            owner_key_id = self.task_headers[task_id].task_owner_key_id
-            del self.task_headers[task_id]
-            if owner_key_id in self.tasks_by_owner:
-                self.tasks_by_owner[owner_key_id].discard(task_id)
-        if task_id in self.supported_tasks:
-            self.supported_tasks.remove(task_id)
+            self._remove_from_owner(self.task_headers.pop(task_id))
+        self._deadlines.cancel(task_id)
+        self.supported_tasks.discard(task_id)
+        self._ranks.pop(task_id, None)
         if task_id in self.support_status:
             del self.support_status[task_id]
+        if task_id not in self.own_headers:
+            self.header_seqs.pop(task_id, None)
         self.removed_tasks[task_id] = time.time()
+        self.removed_tasks.move_to_end(task_id)
 
-    def get_task(self) -> TaskHeader:
-        """ Returns random task from supported tasks that may be computed
+    def set_own_headers(self, headers):
+        """ Update versions of headers of tasks requested by this node.
+        Header is considered changed when its signature changes.
+        :param list headers: TaskHeaders of active tasks of this node
+        """
+        current = {th.task_id: th for th in headers}
+        for task_id in list(self.own_headers):
+            if task_id not in current:
+                del self.own_headers[task_id]
+                self.header_seqs.pop(task_id, None)
+        for task_id, th in current.items():
+            known = self.own_headers.get(task_id)
+            if known is None or known[0] != th.signature:
+                self._header_changed(task_id)
+            self.own_headers[task_id] = (th.signature, th)
+
+    def get_headers_since(self, epoch, seq):
+        """ Return headers that changed since given version. All headers
+        are returned if the version comes from another epoch.
+        :param str epoch: epoch of the version, known by the peer
+        :param int seq: last sequence number known by the peer
+        :return tuple: (epoch, seq, list of TaskHeaders) - current version
+                       and changed headers
+        """
+        if epoch != self.headers_epoch or not isinstance(seq, int):
+            seq = 0
+
+        changed = []
+        for task_id in reversed(self.header_seqs):
+            if self.header_seqs[task_id] <= seq:
+                break
+            changed.append(task_id)
+
+        headers = []
+        for task_id in reversed(changed):
+            if task_id in self.own_headers:
+                headers.append(self.own_headers[task_id][1])
+            else:
+                headers.append(self.task_headers[task_id])
+        return self.headers_epoch, self.headers_seq, headers
+
+    def _header_changed(self, task_id):
+        self.headers_seq += 1
+        self.header_seqs[task_id] = self.headers_seq
+        self.header_seqs.move_to_end(task_id)
+
+    def get_task(self, exclude=None) -> TaskHeader:
+        """ Returns supported task with the highest score from task selector
+        :param exclude: ids of tasks that shouldn't be returned
         :return TaskHeader|None: returns either None if there are no tasks
                                  that this node may want to compute
         """
-        if self.supported_tasks:
-            tn = random.randrange(0, len(self.supported_tasks))
-            task_id = self.supported_tasks[tn]
+        skipped = []
+        task_id = None
+        while self._ranking:
+            entry = self._ranking[0]
+            if self._ranks.get(entry[2]) is not entry:  # outdated entry
+                heapq.heappop(self._ranking)
+            elif exclude and entry[2] in exclude:
+                skipped.append(heapq.heappop(self._ranking))
+            else:
+                task_id = entry[2]
+                break
+
+        for entry in skipped:
+            heapq.heappush(self._ranking, entry)
+        if task_id is not None:
             return self.task_headers[task_id]
 
+    def _rank(self, task_id):
+        entry = self._rank_entry(task_id)
+        self._ranks[task_id] = entry
+        heapq.heappush(self._ranking, entry)
+
+    def _rank_entry(self, task_id):
+        try:
+            score = float(self.task_selector.score(self.task_headers[task_id]))
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("Cannot score task %r: %r", task_id, exc)
+            score = 0.0
+        return (-score, next(self._rank_order), task_id)
+
     def remove_old_tasks(self):
-        for t in list(self.task_headers.values()):
-            cur_time = get_timestamp_utc()
-            if cur_time > t.deadline:
-                logger.warning("Task {} dies".format(t.task_id))
-                self.remove_task_header(t.task_id)
-
-        for task_id, remove_time in list(self.removed_tasks.items()):
-            cur_time = time.time()
-            if cur_time - remove_time > self.removed_task_timeout:
-                del self.removed_tasks[task_id]
+        for task_id in self._deadlines.pop_expired(get_timestamp_utc()):
+            logger.warning("Task {} dies".format(task_id))
+            self.remove_task_header(task_id)
+
+        cur_time = time.time()
+        while self.removed_tasks:
+            task_id, remove_time = next(iter(self.removed_tasks.items()))
+            if cur_time - remove_time <= self.removed_task_timeout:
+                break
+            del self.removed_tasks[task_id]
+            # Peers won't send the header again unless it changes
+            self.resync_counter += 1
+
+        if cur_time - self._last_rescore > self.rescore_interval:
+            self.rescore()
 
     def request_failure(self, task_id):
         self.remove_task_header(task_id)
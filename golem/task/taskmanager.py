@@ -4,10 +4,12 @@ import time
 
 from pathlib import Path
 from pydispatch import dispatcher
+from twisted.internet.defer import CancelledError, succeed
 
 from apps.appsmanager import AppsManager
 from golem.core.common import HandleKeyError, get_timestamp_utc, \
     timeout_to_deadline, to_unicode, update_dict
+from golem.core.deadlines import DeadlineScheduler
 from golem.manager.nodestatesnapshot import LocalTaskStateSnapshot
 from golem.network.transport.tcpnetwork import SocketAddress
 from golem.resource.dirmanager import DirManager
@@ -17,6 +19,8 @@ from golem.task.taskbase import ComputeTaskDef, TaskEventListener, Task, Resourc
 from golem.task.taskkeeper import CompTaskKeeper, compute_subtask_value
 from golem.task.taskstate import TaskState, TaskStatus, SubtaskStatus, \
     SubtaskState
+from golem.task.taskstore import LazyTaskDict, TaskStore
+from golem.task.verificationqueue import VerificationQueue
 
 logger = logging.getLogger(__name__)
 
@@ -66,9 +70,12 @@ class TaskManager(TaskEventListener):
         self.keys_auth = keys_auth
         self.key_id = keys_auth.get_key_id()
 
-        self.tasks = {}
+        self.tasks = LazyTaskDict(self._load_task)
         self.tasks_states = {}
         self.subtask2task_mapping = {}
+        # Deadlines of active tasks and of subtasks being computed
+        self._task_deadlines = DeadlineScheduler()
+        self._subtask_deadlines = DeadlineScheduler()
 
         self.listen_address = listen_address
         self.listen_port = listen_port
@@ -80,12 +87,17 @@ class TaskManager(TaskEventListener):
         self.tasks_dir = Path(tasks_dir)
         if not self.tasks_dir.is_dir():
             self.tasks_dir.mkdir(parents=True)
+        self.task_store = TaskStore(self.tasks_dir)
+        # Task id -> ids of updated subtasks (None: all of them) of tasks
+        # updated since they were last stored
+        self._updated_tasks = {}
         self.root_path = root_path
         self.dir_manager = DirManager(self.get_task_manager_root())
 
         resource_manager = HyperdriveResourceManager(self.dir_manager,
                                                      resource_dir_method=self.dir_manager.get_task_temporary_dir)
         self.task_result_manager = EncryptedResultPackageManager(resource_manager)
+        self.verification_queue = VerificationQueue()
 
         self.activeStatus = [TaskStatus.computing, TaskStatus.starting,
                              TaskStatus.waiting, TaskStatus.restarted]
@@ -165,44 +177,112 @@ class TaskManager(TaskEventListener):
         task.task_status = TaskStatus.waiting
         task_state.status = TaskStatus.waiting
         task.register_listener(self)
+        self._schedule_deadlines(task_id)
 
         if self.task_persistence:
             self.dump_task(task.header.task_id)
             logger.info("Task {} added".format(task.header.task_id))
             self.notice_task_updated(task.header.task_id)
 
-    def dump_task(self, task_id):
-        logger.debug('DUMP TASK')
+    def dump_task(self, task_id, subtask_ids=None):
+        """ Store state of a task in the task store
+        :param subtask_ids: ids of the only subtasks whose states have
+        changed, None if states of all subtasks should be stored
+        """
+        logger.debug('DUMP TASK %r', task_id)
+        self._updated_tasks.pop(task_id, None)
         try:
-            data = self.tasks[task_id], self.tasks_states[task_id]
-            filepath = self.tasks_dir / ('%s.pickle' % (task_id,))
-            logger.debug('DUMP TASK %r', filepath)
-            with filepath.open('wb') as f:
-                pickle.dump(data, f, protocol=2)
+            self.task_store.update(self.tasks[task_id],
+                                   self.tasks_states[task_id], subtask_ids)
         except:
             logger.exception('DUMP ERROR task_id: %r task: %r state: %r', task_id, self.tasks.get(task_id, '<not found>'), self.tasks_states.get(task_id, '<not found>'))
-            if filepath.exists():
-                filepath.unlink()
             raise
 
+    def flush_tasks(self, force=False):
+        """ Store states of tasks updated since the last flush and write
+        task bodies changed since they were last stored. Unless force is
+        set, bodies are written at most once every
+        TaskStore.body_sync_interval seconds.
+        """
+        if not self.task_persistence:
+            return
+        updated, self._updated_tasks = self._updated_tasks, {}
+        for task_id, subtask_ids in updated.items():
+            if task_id not in self.tasks_states:
+                continue
+            try:
+                self.dump_task(task_id, subtask_ids)
+            except Exception:  # pylint: disable=broad-except
+                pass  # Logged by dump_task, other tasks are still stored
+        self.task_store.flush(self.tasks_states, force)
+
     def restore_tasks(self):
         logger.debug('RESTORE TASKS')
+        states = self.task_store.restore()
+        for task_id, state in states.items():
+            active = state.status in self.activeStatus
+            if active:
+                task = self._load_task(task_id)
+                if task is None:
+                    continue
+                self.tasks[task_id] = task
+            else:
+                # Bodies of inactive tasks are loaded when they are needed
+                self.tasks.add_unloaded(task_id)
+
+            self.tasks_states[task_id] = state
+            for subtask_id in state.subtask_states:
+                self.subtask2task_mapping[subtask_id] = task_id
+            if active:
+                self._schedule_deadlines(task_id)
+        self._restore_task_pickles()
+
+    def _restore_task_pickles(self):
+        # Tasks stored in separate pickles by previous versions are moved
+        # to the task store
         for path in self.tasks_dir.iterdir():
-            logger.debug('RESTORE TASKS %r', path)
-            if not path.suffix == '.pickle':
+            if not path.suffix == '.pickle' or \
+                    path.name == CompTaskKeeper.DUMP_NAME:
                 continue
             logger.debug('RESTORE TASKS really %r', path)
             with path.open('rb') as f:
                 try:
                     task, state = pickle.load(f)
-                    self.tasks[task.header.task_id] = task
-                    self.tasks_states[task.header.task_id] = state
+                    task_id = task.header.task_id
+                    self.tasks[task_id] = task
+                    self.tasks_states[task_id] = state
+                    for subtask_id in state.subtask_states:
+                        self.subtask2task_mapping[subtask_id] = task_id
+                    self.task_store.add(task, state)
                 except (pickle.UnpicklingError, EOFError, ImportError):
                     logger.exception('Problem restoring task from: %s', path)
                     path.unlink()
                     continue
+            path.unlink()
+            task.register_listener(self)
+            if state.status in self.activeStatus:
+                self._schedule_deadlines(task_id)
             dispatcher.send(signal='golem.taskmanager', event='task_restored', task=task, state=state)
 
+    def _load_task(self, task_id):
+        task = self.task_store.load_task(task_id)
+        if task is None:
+            # Logged by the task store
+            self._drop_unreadable_task(task_id)
+            return None
+        task.register_listener(self)
+        dispatcher.send(signal='golem.taskmanager', event='task_restored',
+                        task=task, state=self.tasks_states.get(task_id))
+        return task
+
+    def _drop_unreadable_task(self, task_id):
+        state = self.tasks_states.pop(task_id, None)
+        if state is not None:
+            for subtask_id in state.subtask_states:
+                self.subtask2task_mapping.pop(subtask_id, None)
+        self._updated_tasks.pop(task_id, None)
+        self.task_store.remove(task_id)
+
     @handle_task_key_error
     def resources_send(self, task_id):
         self.tasks_states[task_id].status = TaskStatus.waiting
@@ -283,12 +363,14 @@ class TaskManager(TaskEventListener):
 
         self.subtask2task_mapping[ctd.subtask_id] = task_id
         self.__add_subtask_to_tasks_states(node_name, node_id, price, ctd, address)
-        self.notice_task_updated(task_id)
+        self._subtask_deadlines.schedule(ctd.subtask_id, ctd.deadline)
+        self.notice_task_updated(task_id, ctd.subtask_id)
         return ctd, False, extra_data.should_wait
 
     def get_tasks_headers(self):
         ret = []
-        for t in list(self.tasks.values()):
+        # Tasks which are not loaded were inactive when restored
+        for t in self.tasks.loaded_values():
             if t.needs_computation() and t.task_status in self.activeStatus:
                 ret.append(t.header)
 
@@ -349,6 +431,16 @@ class TaskManager(TaskEventListener):
 
     @handle_subtask_key_error
     def computed_task_received(self, subtask_id, result, result_type):
+        """ Verify received subtask result and update task state accordingly.
+        Results are checked by the verification queue, so it doesn't block
+        the caller when queue is running; the task's state is updated in
+        the reactor thread afterwards. Results of one task are checked one
+        at a time, since their verification shares the task's verificator
+        and temporary directory.
+        :return Deferred: fires with True if the result has been accepted;
+        errbacks if it couldn't be verified, with CancelledError if the
+        verification was cancelled and the subtask is still pending
+        """
         task_id = self.subtask2task_mapping[subtask_id]
 
         subtask_state = self.tasks_states[task_id].subtask_states[subtask_id]
@@ -357,10 +449,34 @@ class TaskManager(TaskEventListener):
         if not SubtaskStatus.is_computed(subtask_status):
             logger.warning("Result for subtask {} when subtask state is {}"
                            .format(subtask_id, subtask_status))
-            self.notice_task_updated(task_id)
-            return False
+            self.notice_task_updated(task_id, subtask_id)
+            return succeed(False)
+
+        deferred = self.verification_queue.submit(
+            task_id, self.tasks[task_id].verify_results,
+            subtask_id, result, result_type)
+        deferred.addCallback(
+            lambda verdict: self.tasks[task_id].results_verified(
+                subtask_id, result, result_type, verdict))
+        deferred.addCallbacks(
+            lambda _: self.__subtask_verified(subtask_id, task_id),
+            self.__verification_error, errbackArgs=(subtask_id,))
+        return deferred
+
+    def __verification_error(self, failure, subtask_id):
+        if failure.check(CancelledError):
+            logger.info("Verification of subtask {} cancelled"
+                        .format(subtask_id))
+            return failure
+
+        logger.error("Cannot verify result of subtask {}: {}"
+                     .format(subtask_id, failure.getErrorMessage()))
+        self.task_computation_failure(subtask_id, failure.getErrorMessage())
+        return failure
 
-        self.tasks[task_id].computation_finished(subtask_id, result, result_type)
+    @handle_subtask_key_error
+    def __subtask_verified(self, subtask_id, task_id):
+        self._subtask_deadlines.cancel(subtask_id)
         ss = self.tasks_states[task_id].subtask_states[subtask_id]
         ss.subtask_progress = 1.0
         ss.subtask_rem_time = 0.0
@@ -372,7 +488,7 @@ class TaskManager(TaskEventListener):
         if not self.tasks[task_id].verify_subtask(subtask_id):
             logger.debug("Subtask {} not accepted\n".format(subtask_id))
             ss.subtask_status = SubtaskStatus.failure
-            self.notice_task_updated(task_id)
+            self.notice_task_updated(task_id, subtask_id)
             return False
 
         if self.tasks_states[task_id].status in self.activeStatus:
@@ -384,7 +500,7 @@ class TaskManager(TaskEventListener):
                     self.tasks_states[task_id].status = TaskStatus.finished
                 else:
                     logger.debug("Task {} not accepted".format(task_id))
-        self.notice_task_updated(task_id)
+        self.notice_task_updated(task_id, subtask_id)
         return True
 
     @handle_subtask_key_error
@@ -397,9 +513,10 @@ class TaskManager(TaskEventListener):
         if not SubtaskStatus.is_computed(subtask_status):
             logger.warning("Result for subtask {} when subtask state is {}"
                            .format(subtask_id, subtask_status))
-            self.notice_task_updated(task_id)
+            self.notice_task_updated(task_id, subtask_id)
             return False
 
+        self._subtask_deadlines.cancel(subtask_id)
         self.tasks[task_id].computation_failed(subtask_id)
         ss = self.tasks_states[task_id].subtask_states[subtask_id]
         ss.subtask_progress = 1.0
@@ -407,7 +524,7 @@ class TaskManager(TaskEventListener):
         ss.subtask_status = SubtaskStatus.failure
         ss.stderr = str(err)
 
-        self.notice_task_updated(task_id)
+        self.notice_task_updated(task_id, subtask_id)
         return True
 
     def task_result_incoming(self, subtask_id):
@@ -422,7 +539,7 @@ class TaskManager(TaskEventListener):
                 task.result_incoming(subtask_id)
                 states.subtask_status = SubtaskStatus.downloading
 
-                self.notify_update_task(task_id)
+                self.notice_task_updated(task_id, subtask_id)
             else:
                 logger.error("Unknown task id: {}".format(task_id))
         else:
@@ -432,32 +549,61 @@ class TaskManager(TaskEventListener):
     # CHANGE TO RETURN KEY_ID (check IF SUBTASK COMPUTER HAS KEY_ID
     def check_timeouts(self):
         nodes_with_timeouts = []
-        for t in list(self.tasks.values()):
-            th = t.header
-            if self.tasks_states[th.task_id].status not in self.activeStatus:
+        cur_time = get_timestamp_utc()
+
+        # Only items whose deadlines have passed are visited. Tasks and
+        # subtasks that have finished or became inactive since they were
+        # scheduled are skipped.
+        for subtask_id in self._subtask_deadlines.pop_expired(cur_time):
+            task_id = self.subtask2task_mapping.get(subtask_id)
+            ts = self.tasks_states.get(task_id)
+            if ts is None or ts.status not in self.activeStatus:
+                continue
+            s = ts.subtask_states.get(subtask_id)
+            if s is None or not SubtaskStatus.is_computed(s.subtask_status):
+                continue
+            if cur_time <= s.deadline:
+                self._subtask_deadlines.schedule(subtask_id, s.deadline)
+                continue
+            logger.info("Subtask {} dies".format(subtask_id))
+            s.subtask_status = SubtaskStatus.failure
+            nodes_with_timeouts.append(s.computer.node_id)
+            self.tasks[task_id].computation_failed(subtask_id)
+            s.stderr = "[GOLEM] Timeout"
+            self.notice_task_updated(task_id, subtask_id)
+
+        for task_id in self._task_deadlines.pop_expired(cur_time):
+            ts = self.tasks_states.get(task_id)
+            if ts is None or ts.status not in self.activeStatus:
+                continue
+            t = self.tasks[task_id]
+            if cur_time <= t.header.deadline:
+                self._task_deadlines.schedule(task_id, t.header.deadline)
                 continue
-            cur_time = get_timestamp_utc()
-            if cur_time > th.deadline:
-                logger.info("Task {} dies".format(th.task_id))
-                t.task_stats = TaskStatus.timeout
-                self.tasks_states[th.task_id].status = TaskStatus.timeout
-                self.notice_task_updated(th.task_id)
-            ts = self.tasks_states[th.task_id]
-            for s in list(ts.subtask_states.values()):
-                if SubtaskStatus.is_computed(s.subtask_status):
-                    if cur_time > s.deadline:
-                        logger.info("Subtask {} dies".format(s.subtask_id))
-                        s.subtask_status = SubtaskStatus.failure
-                        nodes_with_timeouts.append(s.computer.node_id)
-                        t.computation_failed(s.subtask_id)
-                        s.stderr = "[GOLEM] Timeout"
-                        self.notice_task_updated(th.task_id)
+            logger.info("Task {} dies".format(task_id))
+            t.task_stats = TaskStatus.timeout
+            ts.status = TaskStatus.timeout
+            self.notice_task_updated(task_id)
         return nodes_with_timeouts
 
+    def _schedule_deadlines(self, task_id):
+        """ Schedule deadlines of a task and of its subtasks being computed
+        """
+        self._task_deadlines.schedule(task_id,
+                                      self.tasks[task_id].header.deadline)
+        for s in self.tasks_states[task_id].subtask_states.values():
+            if SubtaskStatus.is_computed(s.subtask_status):
+                self._subtask_deadlines.schedule(s.subtask_id, s.deadline)
+
+    def _cancel_deadlines(self, task_id):
+        self._task_deadlines.cancel(task_id)
+        for subtask_id in self.tasks_states[task_id].subtask_states:
+            self._subtask_deadlines.cancel(subtask_id)
+
     def get_progresses(self):
         tasks_progresses = {}
 
-        for t in list(self.tasks.values()):
+        for t in self.tasks.loaded_values():
             if t.get_progress() < 1.0:
                 ltss = LocalTaskStateSnapshot(t.header.task_id, t.get_total_tasks(),
                                               t.get_active_tasks(), t.get_progress(), t.short_extra_data_repr(2200.0)) # FIXME in short_extra_data_repr should there be extra data
@@ -487,6 +633,8 @@ class TaskManager(TaskEventListener):
             if ss.subtask_status != SubtaskStatus.failure:
                 ss.subtask_status = SubtaskStatus.restarted
 
+        self._cancel_deadlines(task_id)
+        self._schedule_deadlines(task_id)
         task.header.signature = self.sign_task_header(task.header)
 
         self.notice_task_updated(task_id)
@@ -495,11 +643,12 @@ class TaskManager(TaskEventListener):
     def restart_subtask(self, subtask_id):
         task_id = self.subtask2task_mapping[subtask_id]
         self.tasks[task_id].restart_subtask(subtask_id)
+        self._subtask_deadlines.cancel(subtask_id)
         self.tasks_states[task_id].status = TaskStatus.computing
         self.tasks_states[task_id].subtask_states[subtask_id].subtask_status = SubtaskStatus.restarted
         self.tasks_states[task_id].subtask_states[subtask_id].stderr = "[GOLEM] Restarted"
 
-        self.notice_task_updated(task_id)
+        self.notice_task_updated(task_id, subtask_id)
 
     @handle_task_key_error
     def restart_frame_subtasks(self, task_id, frame):
@@ -512,6 +661,7 @@ class TaskManager(TaskEventListener):
 
         for subtask_id in list(subtasks.keys()):
             task.restart_subtask(subtask_id)
+            self._subtask_deadlines.cancel(subtask_id)
             subtask_state = task_state.subtask_states[subtask_id]
             subtask_state.subtask_status = SubtaskStatus.restarted
             subtask_state.stderr = "[GOLEM] Restarted"
@@ -524,6 +674,7 @@ class TaskManager(TaskEventListener):
         self.tasks[task_id].abort()
         self.tasks[task_id].task_status = TaskStatus.aborted
         self.tasks_states[task_id].status = TaskStatus.aborted
+        self._cancel_deadlines(task_id)
         for sub in list(self.tasks_states[task_id].subtask_states.values()):
             del self.subtask2task_mapping[sub.subtask_id]
         self.tasks_states[task_id].subtask_states.clear()
@@ -541,6 +692,7 @@ class TaskManager(TaskEventListener):
     def resume_task(self, task_id):
         self.tasks[task_id].task_status = TaskStatus.starting
         self.tasks_states[task_id].status = TaskStatus.starting
+        self._schedule_deadlines(task_id)
 
         self.notice_task_updated(task_id)
 
@@ -550,13 +702,18 @@ class TaskManager(TaskEventListener):
 
     @handle_task_key_error
     def delete_task(self, task_id):
+        self._cancel_deadlines(task_id)
         for sub in list(self.tasks_states[task_id].subtask_states.values()):
             del self.subtask2task_mapping[sub.subtask_id]
         self.tasks_states[task_id].subtask_states.clear()
 
-        self.tasks[task_id].unregister_listener(self)
+        if self.tasks.is_loaded(task_id):
+            self.tasks[task_id].unregister_listener(self)
         del self.tasks[task_id]
         del self.tasks_states[task_id]
+        self._updated_tasks.pop(task_id, None)
+        if self.task_persistence:
+            self.task_store.remove(task_id)
 
         self.dir_manager.clear_temporary(task_id)
 
@@ -599,6 +756,7 @@ class TaskManager(TaskEventListener):
         task.header.subtask_timeout = subtask_timeout
         task.full_task_timeout = full_task_timeout
         task.header.last_checking = time.time()
+        self._task_deadlines.schedule(task_id, task.header.deadline)
 
     def get_task_id(self, subtask_id):
         return self.subtask2task_mapping[subtask_id]
@@ -719,8 +877,14 @@ class TaskManager(TaskEventListener):
         self.notice_task_updated(task_id)
 
     @handle_task_key_error
-    def notice_task_updated(self, task_id):
-        # self.save_state()
+    def notice_task_updated(self, task_id, subtask_id=None):
+        # States are stored by flush_tasks, so a task updated many times
+        # between flushes is stored once
         if self.task_persistence:
-            self.dump_task(task_id)
+            if subtask_id is None:
+                self._updated_tasks[task_id] = None
+            else:
+                subtask_ids = self._updated_tasks.setdefault(task_id, set())
+                if subtask_ids is not None:
+                    subtask_ids.add(subtask_id)
         dispatcher.send(signal='golem.taskmanager', event='task_status_updated', task_id=task_id)
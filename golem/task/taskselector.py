@@ -0,0 +1,91 @@
+import logging
+import math
+
+from golem.task.taskbase import TaskHeader
+
+logger = logging.getLogger(__name__)
+
+
+class TaskSelector(object):
+    """ Scores supported task headers. TaskHeaderKeeper offers the task with
+    the highest score first. This selector gives every task the same score,
+    so tasks are offered in the order they were added.
+    """
+
+    def score(self, header: TaskHeader) -> float:
+        return 0.0
+
+
+class ScoringTaskSelector(TaskSelector):
+    """ Prefers tasks that pay most per second spent on them, from trusted
+    requestors, with small resources and in environments in which this node
+    performs well.
+
+    Score is a weighted sum of the following terms, each scaled
+    logarithmically, so that terms with different units can be combined:
+      - price per estimated second: value of a subtask computed for the
+        whole subtask timeout, divided by the timeout extended with the
+        time needed to download task resources,
+      - requesting trust of the task owner, from -1 to 1,
+      - resource size in MiB (the larger, the lower the score),
+      - performance of this node in task's environment.
+    """
+
+    MIB = 1024 * 1024
+
+    def __init__(self, environments_manager, get_trust=None,
+                 download_speed=MIB,
+                 price_weight=1.0, trust_weight=1.0,
+                 resource_size_weight=0.1, performance_weight=0.1):
+        """
+        :param environments_manager: source of environment performance
+        :param get_trust: function returning requesting trust of a node
+                          with given key id, or None if it's unknown
+        :param download_speed: expected download speed in bytes per second
+        """
+        self.environments_manager = environments_manager
+        self.get_trust = get_trust
+        self.download_speed = download_speed
+        self.price_weight = price_weight
+        self.trust_weight = trust_weight
+        self.resource_size_weight = resource_size_weight
+        self.performance_weight = performance_weight
+
+    def score(self, header: TaskHeader) -> float:
+        return self.price_weight * math.log1p(self.price_rate(header)) \
+            + self.trust_weight * self.trust(header) \
+            - self.resource_size_weight * math.log1p(
+                self._resource_size(header) / self.MIB) \
+            + self.performance_weight * math.log1p(self.performance(header))
+
+    def price_rate(self, header: TaskHeader) -> float:
+        computation_time = max(getattr(header, 'subtask_timeout', 0) or 0, 0)
+        transfer_time = self._resource_size(header) / self.download_speed
+        total_time = computation_time + transfer_time
+        if total_time <= 0:
+            return 0.0
+        # max_price is a price for an hour of computation
+        max_price = max(getattr(header, 'max_price', 0) or 0, 0)
+        return max_price * computation_time / 3600 / total_time
+
+    def trust(self, header: TaskHeader) -> float:
+        if self.get_trust is None:
+            return 0.0
+        try:
+            return float(self.get_trust(header.task_owner_key_id) or 0.0)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.debug("Cannot get trust of %r: %r",
+                         header.task_owner_key_id, exc)
+            return 0.0
+
+    def performance(self, header: TaskHeader) -> float:
+        if self.environments_manager.get_environment_by_id(
+                header.environment) is None:
+            return 0.0
+        return max(self.environments_manager.get_performance(
+            header.environment) or 0.0, 0.0)
+
+    @staticmethod
+    def _resource_size(header):
+        # Headers received from the network may lack optional fields
+        return max(getattr(header, 'resource_size', 0) or 0, 0)
@@ -7,6 +7,8 @@ import os
 from pydispatch import dispatcher
 import time
 
+from twisted.internet import defer
+
 from golem import model
 from golem.clientconfigdescriptor import ClientConfigDescriptor
 from golem.network.transport.network import ProtocolFactory, SessionFactory
@@ -15,10 +17,12 @@ from golem.network.transport.tcpserver import PendingConnectionsServer, PenConnS
 from golem.ranking.helper.trust import Trust
 from golem.task.benchmarkmanager import BenchmarkManager
 from golem.task.deny import get_deny_set
+from golem.task.headerverifier import TaskHeaderVerifier
 from golem.task.taskbase import TaskHeader
 from golem.task.taskconnectionshelper import TaskConnectionsHelper
 from .taskcomputer import TaskComputer
 from .taskkeeper import TaskHeaderKeeper
+from .taskselector import ScoringTaskSelector
 from .taskmanager import TaskManager
 from .tasksession import TaskSession
 import weakref
@@ -104,7 +108,14 @@ class TaskServer(PendingConnectionsServer, TaskResourcesMixin):
         self.config_desc = config_desc
 
         self.node = node
-        self.task_keeper = TaskHeaderKeeper(client.environments_manager, min_price=config_desc.min_price)
+        self.task_keeper = TaskHeaderKeeper(
+            client.environments_manager,
+            min_price=config_desc.min_price,
+            task_selector=ScoringTaskSelector(
+                client.environments_manager,
+                get_trust=client.get_requesting_trust))
+        self.header_verifier = TaskHeaderVerifier(
+            lambda th_dict_repr: self.verify_header_sig(th_dict_repr))
         self.task_manager = TaskManager(config_desc.node_name, self.node, self.keys_auth,
                                         root_path=TaskServer.__get_task_manager_root(client.datadir),
                                         use_distributed_resources=config_desc.use_distributed_resource_management,
@@ -180,44 +191,67 @@ class TaskServer(PendingConnectionsServer, TaskResourcesMixin):
     def get_environment_by_id(self, env_id):
         return self.task_keeper.environments_manager.get_environment_by_id(env_id)
 
-    # This method chooses random task from the network to compute on our machine
-    def request_task(self):
-        theader = self.task_keeper.get_task()
-        if theader is None:
-            return None
-        try:
-            env = self.get_environment_by_id(theader.environment)
-            if env is not None:
-                performance = env.get_performance()
-            else:
-                performance = 0.0
-            is_requestor_accepted = self.should_accept_requestor(
-                theader.task_owner_key_id)
-            is_price_accepted = self.config_desc.min_price < theader.max_price
-            if is_requestor_accepted and is_price_accepted:
-                price = int(theader.max_price)
-                self.task_manager.add_comp_task_request(theader=theader,
-                                                        price=price)
-                args = {
-                    'node_name': self.config_desc.node_name,
-                    'key_id': theader.task_owner_key_id,
-                    'task_id': theader.task_id,
-                    'estimated_performance': performance,
-                    'price': self.config_desc.min_price,
-                    'max_resource_size': self.config_desc.max_resource_size,
-                    'max_memory_size': self.config_desc.max_memory_size,
-                    'num_cores': self.config_desc.num_cores
-                }
-                self._add_pending_request(TASK_CONN_TYPES['task_request'],
-                                          theader.task_owner,
-                                          theader.task_owner_port,
-                                          theader.task_owner_key_id,
-                                          args)
-
-                return theader.task_id
-        except Exception as err:
-            logger.warning("Cannot send request for task: {}".format(err))
-            self.task_keeper.remove_task_header(theader.task_id)
+    # This method chooses the best scored task from the network to compute on our machine
+    def request_task(self, num_cores=None, max_memory_size=None,
+                     exclude=None):
+        """ Request the best task from the network for a single computation
+        slot. May be called several times in a row to request work for many
+        slots in parallel.
+        :param int num_cores: cores offered to the task owner, defaults to
+                              num_cores from config
+        :param int max_memory_size: memory offered to the task owner,
+                                    defaults to max_memory_size from config
+        :param exclude: ids of tasks that shouldn't be requested, e.g.
+                        because they are computed in other slots already
+        :return: id of the requested task or None
+        """
+        if num_cores is None:
+            num_cores = self.config_desc.num_cores
+        if max_memory_size is None:
+            max_memory_size = self.config_desc.max_memory_size
+        exclude = set(exclude or ())
+        while True:
+            theader = self.task_keeper.get_task(exclude=exclude)
+            if theader is None:
+                return None
+            try:
+                env_id = theader.environment
+                if self.get_environment_by_id(env_id) is not None:
+                    performance = self.task_keeper.environments_manager \
+                        .get_performance(env_id)
+                else:
+                    performance = 0.0
+                is_requestor_accepted = self.should_accept_requestor(
+                    theader.task_owner_key_id)
+                is_price_accepted = \
+                    self.config_desc.min_price < theader.max_price
+                if is_requestor_accepted and is_price_accepted:
+                    price = int(theader.max_price)
+                    self.task_manager.add_comp_task_request(theader=theader,
+                                                            price=price)
+                    args = {
+                        'node_name': self.config_desc.node_name,
+                        'key_id': theader.task_owner_key_id,
+                        'task_id': theader.task_id,
+                        'estimated_performance': performance,
+                        'price': self.config_desc.min_price,
+                        'max_resource_size':
+                            self.config_desc.max_resource_size,
+                        'max_memory_size': max_memory_size,
+                        'num_cores': num_cores
+                    }
+                    self._add_pending_request(TASK_CONN_TYPES['task_request'],
+                                              theader.task_owner,
+                                              theader.task_owner_port,
+                                              theader.task_owner_key_id,
+                                              args)
+
+                    return theader.task_id
+            except Exception as err:
+                logger.warning("Cannot send request for task: {}".format(err))
+                self.task_keeper.remove_task_header(theader.task_id)
+            # Try the next best task
+            exclude.add(theader.task_id)
 
     def send_results(self, subtask_id, task_id, result, computing_time,
                      owner_address, owner_port, owner_key_id, owner,
@@ -284,9 +318,34 @@ class TaskServer(PendingConnectionsServer, TaskResourcesMixin):
               self.task_manager.get_tasks_headers()
         return [th.to_dict() for th in ths]
 
+    def get_tasks_headers_since(self, epoch, seq):
+        """ Return headers of tasks that changed since given version of
+        the task header store
+        :return tuple: (epoch, seq, list of task header dicts)
+        """
+        self.task_keeper.set_own_headers(self.task_manager.get_tasks_headers())
+        epoch, seq, ths = self.task_keeper.get_headers_since(epoch, seq)
+        return epoch, seq, [th.to_dict() for th in ths]
+
     def add_task_header(self, th_dict_repr):
+        """ Add a task header received from the network, once its signature
+        is verified
+        :param dict th_dict_repr: task header dictionary representation
+        :return Deferred: fires with True if the header is correct
+        """
+        try:
+            deferred = self.header_verifier.verify(th_dict_repr)
+        except Exception as err:
+            logger.warning("Wrong task header received {}".format(err))
+            return defer.succeed(False)
+
+        deferred.addCallback(self._task_header_verified, th_dict_repr)
+        deferred.addErrback(self._task_header_cancelled)
+        return deferred
+
+    def _task_header_verified(self, valid, th_dict_repr):
         try:
-            if not self.verify_header_sig(th_dict_repr):
+            if not valid:
                 raise Exception("Invalid signature")
 
             task_id = th_dict_repr["task_id"]
@@ -306,6 +365,12 @@ class TaskServer(PendingConnectionsServer, TaskResourcesMixin):
             logger.warning("Wrong task header received {}".format(err))
             return False
 
+    @staticmethod
+    def _task_header_cancelled(failure):
+        # Verifier was stopped, the header is dropped
+        failure.trap(defer.CancelledError)
+        return True
+
     def verify_header_sig(self, th_dict_repr):
         _bin = TaskHeader.dict_to_binary(th_dict_repr)
         _sig = th_dict_repr["signature"]
@@ -566,6 +631,7 @@ class TaskServer(PendingConnectionsServer, TaskResourcesMixin):
 
     def quit(self):
         self.task_computer.quit()
+        self.header_verifier.stop()
 
     def receive_subtask_computation_time(self, subtask_id, computation_time):
         self.task_manager.set_computation_time(subtask_id, computation_time)
@@ -980,6 +1046,7 @@ class TaskServer(PendingConnectionsServer, TaskResourcesMixin):
         nodes_with_timeouts = self.task_manager.check_timeouts()
         for node_id in nodes_with_timeouts:
             Trust.COMPUTED.decrease(node_id)
+        self.task_manager.flush_tasks()
 
     def __remove_old_sessions(self):
         cur_time = time.time()
@@ -992,7 +1059,8 @@ class TaskServer(PendingConnectionsServer, TaskResourcesMixin):
                 sessions_to_remove.append(subtask_id)
         for subtask_id in sessions_to_remove:
             if sessions[subtask_id].task_computer is not None:
-                sessions[subtask_id].task_computer.session_timeout()
+                sessions[subtask_id].task_computer.session_timeout(
+                    sessions[subtask_id].task_id)
             sessions[subtask_id].dropped()
 
     def _find_sessions(self, subtask):
@@ -5,6 +5,8 @@ import struct
 import time
 import threading
 
+from twisted.internet.defer import CancelledError, Deferred, maybeDeferred
+
 from golem.core.common import HandleAttributeError
 from golem.core.simpleserializer import CBORSerializer
 from golem.decorators import log_error
@@ -16,6 +18,7 @@ from golem.model import Payment
 from golem.network.transport import tcpnetwork
 from golem.core.async import AsyncRequest, async_run
 from golem.resource.resource import decompress_dir
+from golem.task.result.resultpackage import EncryptingPackager
 from golem.task.taskbase import ComputeTaskDef, ResultType, ResourceType
 from golem.transactions.ethereum.ethereumpaymentskeeper import EthAccountInfo
 
@@ -23,6 +26,11 @@ logger = logging.getLogger(__name__)
 
 TASK_PROTOCOL_ID = 15
 
+# Hello metadata key with the latest result package format version that
+# the node can extract. Results are packed in the legacy format for peers
+# that don't send it.
+RESULT_PACKAGE_METADATA = 'result_package_version'
+
 
 def drop_after_attr_error(*args, **kwargs):
     logger.warning("Attribute error occur")
@@ -31,7 +39,7 @@ def drop_after_attr_error(*args, **kwargs):
 
 def call_task_computer_and_drop_after_attr_error(*args, **kwargs):
     logger.warning("Attribute error occur")
-    args[0].task_computer.session_closed()
+    args[0].task_computer.session_closed(args[0].task_id)
     args[0].dropped()
 
 
@@ -40,7 +48,14 @@ def dropped_after():
         @functools.wraps(f)
         def curry(self, *args, **kwargs):
             result = f(self, *args, **kwargs)
-            self.dropped()
+            if isinstance(result, Deferred):
+                # Keep the session open until the deferred action completes
+                def drop(value):
+                    self.dropped()
+                    return value
+                result.addBoth(drop)
+            else:
+                self.dropped()
             return result
         return curry
     return inner
@@ -77,6 +92,8 @@ class TaskSession(MiddlemanSafeSession):
         # information about user that should be rewarded (or punished)
         # for the result
         self.result_owner = None
+        # format version of result packages sent to the peer
+        self.result_package_version = None
         self.err_msg = None  # Keep track of errors
         self.__set_msg_interpretations()
 
@@ -119,6 +136,8 @@ class TaskSession(MiddlemanSafeSession):
         :return str: encrypted data or unchanged message
                      (if server doesn't exist)
         """
+        if self.uses_session_cipher():
+            return self.session_cipher.encrypt(data)
         if self.task_server:
             return self.task_server.encrypt(data, self.key_id)
         logger.warning("Can't encrypt message - no task server")
@@ -131,6 +150,8 @@ class TaskSession(MiddlemanSafeSession):
         :param str data: data to be decrypted
         :return str|None: decrypted data
         """
+        if self.is_session_frame(data):
+            return self.session_decrypt(data)
         if self.task_server is None:
             logger.warning("Can't decrypt data - no task server")
             return data
@@ -260,17 +281,32 @@ class TaskSession(MiddlemanSafeSession):
                 self._reject_subtask_result(subtask_id)
                 return
 
-        self.task_manager.computed_task_received(
+        def verification_finished(accepted):
+            if not accepted:
+                self._reject_subtask_result(subtask_id)
+                return
+
+            self.task_server.accept_result(subtask_id, self.result_owner)
+            self.send(message.MessageSubtaskResultAccepted(
+                subtask_id=subtask_id))
+
+        def verification_failed(failure):
+            # Cancelled on shutdown, the result hasn't been verified yet
+            if failure.check(CancelledError):
+                return
+            self._reject_subtask_result(subtask_id)
+
+        deferred = maybeDeferred(
+            self.task_manager.computed_task_received,
             subtask_id,
             result,
             result_type
         )
-        if not self.task_manager.verify_subtask(subtask_id):
-            self._reject_subtask_result(subtask_id)
-            return
-
-        self.task_server.accept_result(subtask_id, self.result_owner)
-        self.send(message.MessageSubtaskResultAccepted(subtask_id=subtask_id))
+        deferred.addCallbacks(verification_finished, verification_failed)
+        deferred.addErrback(
+            lambda failure: logger.error("Result of subtask {} not handled: {}"
+                                         .format(subtask_id, failure.value)))
+        return deferred
 
     @log_error()
     def inform_worker_about_payment(self, payment):
@@ -414,7 +450,10 @@ class TaskSession(MiddlemanSafeSession):
             message.MessageHello(
                 client_key_id=self.task_server.get_key_id(),
                 rand_val=self.rand_val,
-                proto_id=TASK_PROTOCOL_ID
+                proto_id=TASK_PROTOCOL_ID,
+                metadata=self.add_session_key({
+                    RESULT_PACKAGE_METADATA: EncryptingPackager.version
+                })
             ),
             send_unverified=True
         )
@@ -530,11 +569,11 @@ class TaskSession(MiddlemanSafeSession):
                     reason=self.err_msg
                 )
             )
-            self.task_computer.session_closed()
+            self.task_computer.session_closed(self.task_id)
             self.dropped()
 
     def _react_to_waiting_for_results(self, _):
-        self.task_computer.session_closed()
+        self.task_computer.session_closed(self.task_id)
         if not self.msgs_to_send:
             self.disconnect(self.DCRNoMoreMessages)
 
@@ -549,7 +588,7 @@ class TaskSession(MiddlemanSafeSession):
     def _react_to_cannot_assign_task(self, msg):
         self.task_computer.task_request_rejected(msg.task_id, msg.reason)
         self.task_server.remove_task_header(msg.task_id)
-        self.task_computer.session_closed()
+        self.task_computer.session_closed(msg.task_id)
         self.dropped()
 
     def _react_to_report_computed_task(self, msg):
@@ -698,6 +737,9 @@ class TaskSession(MiddlemanSafeSession):
             self.disconnect(TaskSession.DCRProtocolVersion)
             return
 
+        self.set_session_key(msg.metadata)
+        self.result_package_version = self._result_package_version(
+            msg.metadata)
         if send_hello:
             self.send_hello()
         self.send(
@@ -705,6 +747,20 @@ class TaskSession(MiddlemanSafeSession):
             send_unverified=True
         )
 
+    @staticmethod
+    def _result_package_version(metadata):
+        """ Return the latest result package format version supported by
+        both nodes, None if the peer doesn't support other than legacy one
+        :param dict|None metadata: hello metadata received from the peer
+        """
+        if not isinstance(metadata, dict):
+            return None
+        version = metadata.get(RESULT_PACKAGE_METADATA)
+        if not isinstance(version, int) \
+                or version < EncryptingPackager.legacy_version:
+            return None
+        return min(version, EncryptingPackager.version)
+
     def _react_to_rand_val(self, msg):
         if self.rand_val == msg.rand_val:
             self.verified = True
@@ -957,7 +1013,8 @@ class TaskSession(MiddlemanSafeSession):
         request = AsyncRequest(task_result_manager.create,
                                self.task_server.node, res,
                                client_options=client_options,
-                               key_or_secret=secret)
+                               key_or_secret=secret,
+                               package_version=self.result_package_version)
 
         return async_run(request, success=success, error=error)
 
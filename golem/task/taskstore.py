@@ -0,0 +1,427 @@
+import logging
+import os
+import pickle
+import struct
+import time
+from collections.abc import MutableMapping
+from pathlib import Path
+
+from golem.task.taskstate import TaskState
+
+logger = logging.getLogger(__name__)
+
+
+class LazyTaskDict(MutableMapping):
+    """ Task id -> Task mapping in which tasks may be added without their
+    bodies. A body is loaded with the load function when the task is
+    accessed for the first time. Membership tests, iteration over task ids
+    and len() never load bodies.
+    """
+
+    def __init__(self, load):
+        """
+        :param load: function returning a task with given id or None
+        """
+        self._load = load
+        self._tasks = {}
+        self._unloaded = set()
+
+    def add_unloaded(self, task_id):
+        if task_id not in self._tasks:
+            self._unloaded.add(task_id)
+
+    def is_loaded(self, task_id):
+        return task_id in self._tasks
+
+    def loaded_values(self):
+        return list(self._tasks.values())
+
+    def __getitem__(self, task_id):
+        try:
+            return self._tasks[task_id]
+        except KeyError:
+            if task_id not in self._unloaded:
+                raise
+        self._unloaded.discard(task_id)
+        task = self._load(task_id)
+        if task is None:
+            raise KeyError(task_id)
+        self._tasks[task_id] = task
+        return task
+
+    def __setitem__(self, task_id, task):
+        self._unloaded.discard(task_id)
+        self._tasks[task_id] = task
+
+    def __delitem__(self, task_id):
+        if task_id in self._unloaded:
+            self._unloaded.discard(task_id)
+        else:
+            del self._tasks[task_id]
+
+    def __contains__(self, task_id):
+        return task_id in self._tasks or task_id in self._unloaded
+
+    def __iter__(self):
+        return iter(list(self._tasks) + list(self._unloaded))
+
+    def __len__(self):
+        return len(self._tasks) + len(self._unloaded)
+
+    def __repr__(self):
+        return '<LazyTaskDict loaded: %r, unloaded: %r>' % (
+            self._tasks, sorted(self._unloaded))
+
+
+class TaskStore(object):
+    """ Persists requested tasks and their states in an append-only journal.
+
+    Every state update appends a record with the task state (without its
+    subtask states) and, if only some subtasks have changed, the states of
+    these subtasks, so the cost of an update does not grow with the number
+    of subtasks. Task bodies are large and change with most updates, so they
+    are written behind: a changed body is appended at most once every
+    body_sync_interval seconds and when the store is flushed with
+    force=True. When records of removed tasks and overwritten states take
+    most of the journal, it is compacted to one full state and one body
+    per task.
+
+    A body is always written after the states it matches. Restoring drops
+    states written after the last body of a task and compacts the journal
+    without them, so that restored states match the restored body; updates
+    from the last body_sync_interval before a crash may be lost. Restoring
+    reads states only; offsets of bodies are remembered, so that bodies
+    are read when the tasks are needed (see LazyTaskDict).
+    """
+
+    JOURNAL_NAME = 'tasks.journal'
+
+    TASK = 1
+    STATE = 2
+    SUBTASK = 3
+    REMOVE = 4
+
+    # record type, task id size, payload size
+    HEADER = struct.Struct('>BHI')
+
+    def __init__(self, tasks_dir, body_sync_interval=5.0,
+                 compact_ratio=4, compact_min_size=1024 * 1024):
+        self.path = Path(tasks_dir) / self.JOURNAL_NAME
+        self.body_sync_interval = body_sync_interval
+        self.compact_ratio = compact_ratio
+        self.compact_min_size = compact_min_size
+
+        self._file = None
+        self._size = 0
+        # task id -> (offset, size) of the last body record
+        self._bodies = {}
+        # task id -> [size of the last full state record,
+        #             size of the last state record]
+        self._state_sizes = {}
+        # task id -> {subtask id -> size of the last subtask record}
+        self._subtask_sizes = {}
+        # task id -> task whose body has changed since it was written
+        self._dirty = {}
+        self._last_body_sync = time.time()
+
+    def restore(self):
+        """ Read states of all stored tasks
+        :return dict: task id -> TaskState; bodies of these tasks can be
+        read with load_task()
+        """
+        states = {}
+        if not self.path.exists():
+            return states
+
+        size = self.path.stat().st_size
+        with self.path.open('rb') as f:
+            records, offset = self._read_headers(f, size)
+            last_bodies = {task_id: index
+                           for index, (record_type, task_id, _, _)
+                           in enumerate(records)
+                           if record_type == self.TASK}
+            dropped = 0
+            for index, record in enumerate(records):
+                record_type, task_id, _, _ = record
+                if record_type in (self.STATE, self.SUBTASK) and \
+                        index > last_bodies.get(task_id, -1):
+                    dropped += 1
+                    continue
+                self._read_record(f, record, states)
+
+        if dropped:
+            logger.info('Dropping %d state records written after the last '
+                        'task bodies in %s', dropped, self.path)
+
+        if offset < size:
+            logger.warning('Dropping %d bytes of incomplete records from %s',
+                           size - offset, self.path)
+            with self.path.open('r+b') as f:
+                f.truncate(offset)
+        self._size = offset
+
+        for task_id in list(states):
+            if task_id not in self._bodies:
+                logger.warning('No body of task %r in %s', task_id, self.path)
+                self._forget(task_id)
+                del states[task_id]
+
+        # Dropped records would apply to later bodies of their tasks
+        if dropped or self._should_compact():
+            self.compact(states)
+        return states
+
+    def load_task(self, task_id):
+        """ Read body of a stored task
+        :return Task: task or None if it is not stored or cannot be read
+        """
+        if task_id in self._dirty:
+            return self._dirty[task_id]
+        if task_id not in self._bodies:
+            return None
+        offset, size = self._bodies[task_id]
+        self._flush_file()
+        try:
+            with self.path.open('rb') as f:
+                f.seek(offset)
+                return pickle.loads(f.read(size))
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('Cannot load task %r from %s', task_id,
+                             self.path)
+            return None
+
+    def add(self, task, state):
+        """ Store task body and full task state """
+        task_id = task.header.task_id
+        self._dirty.pop(task_id, None)
+        self._write_state(task_id, state, with_subtasks=True)
+        self._write_body(task_id, task)
+        self._flush_file()
+
+    def update(self, task, state, subtask_ids=None):
+        """ Store task state after an update
+        :param subtask_ids: ids of the only subtasks whose states have
+        changed; if it's None, states of all subtasks are stored
+        """
+        task_id = task.header.task_id
+        if task_id not in self._bodies:
+            self.add(task, state)
+            return
+
+        with_subtasks = subtask_ids is None or \
+            len(subtask_ids) >= len(state.subtask_states)
+        self._dirty[task_id] = task
+        self._write_state(task_id, state, with_subtasks)
+        if not with_subtasks:
+            for subtask_id in subtask_ids:
+                if subtask_id in state.subtask_states:
+                    self._write_subtask(task_id, subtask_id,
+                                        state.subtask_states[subtask_id])
+        self._flush_file()
+
+    def remove(self, task_id):
+        if task_id not in self._bodies:
+            return
+        self._forget(task_id)
+        self._append(self.REMOVE, task_id, b'')
+        self._flush_file()
+
+    def flush(self, states, force=False):
+        """ Write changed task bodies if body_sync_interval has passed
+        since they were last written, and compact the journal if needed
+        :param dict states: task id -> TaskState of all stored tasks
+        """
+        now = time.time()
+        if not force and now - self._last_body_sync < self.body_sync_interval:
+            return
+        self._last_body_sync = now
+
+        dirty, self._dirty = self._dirty, {}
+        for task_id, task in dirty.items():
+            if task_id in self._bodies:
+                self._write_body(task_id, task)
+        self._flush_file()
+
+        if self._should_compact():
+            self.compact(states)
+
+    def compact(self, states):
+        """ Rewrite the journal with a full state and the last body of
+        every stored task
+        """
+        self._flush_file()
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        bodies = {}
+        state_sizes = {}
+        started = time.time()
+
+        with tmp_path.open('wb') as tmp, self.path.open('rb') as journal:
+            offset = 0
+            for task_id, (body_offset, size) in self._bodies.items():
+                if task_id not in states:
+                    continue
+                if task_id in self._dirty:
+                    body = pickle.dumps(self._dirty[task_id])
+                else:
+                    journal.seek(body_offset)
+                    body = journal.read(size)
+                state = self._dump_state(states[task_id], True)
+                offset += self._write_record(tmp, self.STATE, task_id, state)
+                state_sizes[task_id] = [len(state), len(state)]
+                offset += self._write_record(tmp, self.TASK, task_id, body)
+                bodies[task_id] = (offset - len(body), len(body))
+            tmp.flush()
+            os.fsync(tmp.fileno())
+
+        self._close_file()
+        os.replace(str(tmp_path), str(self.path))
+        logger.info('Compacted %s from %d to %d bytes in %.3f s', self.path,
+                    self._size, offset, time.time() - started)
+
+        self._size = offset
+        self._bodies = bodies
+        self._dirty = {}
+        self._state_sizes = state_sizes
+        self._subtask_sizes = {}
+
+    def close(self):
+        self._close_file()
+
+    def _should_compact(self):
+        if self._size < self.compact_min_size:
+            return False
+        return self._size > self.compact_ratio * self._live_size()
+
+    def _live_size(self):
+        header = self.HEADER.size
+        size = sum(header + s for _, s in self._bodies.values())
+        size += sum(2 * header + full + last
+                    for full, last in self._state_sizes.values())
+        for subtasks in self._subtask_sizes.values():
+            size += sum(header + s for s in subtasks.values())
+        return size
+
+    def _forget(self, task_id):
+        self._bodies.pop(task_id, None)
+        self._state_sizes.pop(task_id, None)
+        self._subtask_sizes.pop(task_id, None)
+        self._dirty.pop(task_id, None)
+
+    def _write_body(self, task_id, task):
+        body = pickle.dumps(task)
+        offset = self._append(self.TASK, task_id, body)
+        self._bodies[task_id] = (offset, len(body))
+
+    def _write_state(self, task_id, state, with_subtasks):
+        payload = self._dump_state(state, with_subtasks)
+        self._append(self.STATE, task_id, payload)
+        self._count_state(task_id, len(payload), with_subtasks)
+
+    def _count_state(self, task_id, size, with_subtasks):
+        sizes = self._state_sizes.setdefault(task_id, [0, 0])
+        sizes[1] = size
+        if with_subtasks:
+            sizes[0] = size
+            self._subtask_sizes[task_id] = {}
+
+    def _write_subtask(self, task_id, subtask_id, subtask_state):
+        payload = pickle.dumps((subtask_id, subtask_state))
+        self._append(self.SUBTASK, task_id, payload)
+        self._subtask_sizes.setdefault(task_id, {})[subtask_id] = \
+            len(payload)
+
+    @staticmethod
+    def _dump_state(state, with_subtasks):
+        data = dict(vars(state))
+        subtask_states = data.pop('subtask_states')
+        return pickle.dumps(
+            (data, subtask_states if with_subtasks else None))
+
+    def _append(self, record_type, task_id, payload):
+        """ :return int: offset of the payload in the journal """
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = self.path.open('ab')
+            self._size = self._file.tell()
+        self._size += self._write_record(self._file, record_type, task_id,
+                                         payload)
+        return self._size - len(payload)
+
+    def _write_record(self, f, record_type, task_id, payload):
+        key = task_id.encode('utf-8')
+        f.write(self.HEADER.pack(record_type, len(key), len(payload)))
+        f.write(key)
+        f.write(payload)
+        return self.HEADER.size + len(key) + len(payload)
+
+    def _read_headers(self, f, journal_size):
+        """ :return tuple: list of (record type, task id, payload offset,
+        payload size) of complete records and offset of the end of the
+        last one
+        """
+        records = []
+        offset = 0
+        while True:
+            f.seek(offset)
+            header = f.read(self.HEADER.size)
+            if len(header) < self.HEADER.size:
+                break
+            record_type, key_size, size = self.HEADER.unpack(header)
+            payload_offset = offset + self.HEADER.size + key_size
+            next_offset = payload_offset + size
+            if next_offset > journal_size:
+                break
+            task_id = f.read(key_size).decode('utf-8')
+            records.append((record_type, task_id, payload_offset, size))
+            offset = next_offset
+        return records, offset
+
+    def _read_record(self, f, record, states):
+        record_type, task_id, payload_offset, size = record
+
+        if record_type == self.TASK:
+            # Bodies are read on demand
+            self._bodies[task_id] = (payload_offset, size)
+            return
+
+        f.seek(payload_offset)
+        payload = f.read(size)
+
+        try:
+            if record_type == self.STATE:
+                data, subtask_states = pickle.loads(payload)
+                with_subtasks = subtask_states is not None
+                state = states.get(task_id)
+                if state is None:
+                    state = states[task_id] = TaskState()
+                if not with_subtasks:
+                    subtask_states = state.subtask_states
+                state.__dict__.update(data)
+                state.subtask_states = subtask_states
+                self._count_state(task_id, size, with_subtasks)
+            elif record_type == self.SUBTASK:
+                subtask_id, subtask_state = pickle.loads(payload)
+                if task_id in states:
+                    states[task_id].subtask_states[subtask_id] = \
+                        subtask_state
+                    self._subtask_sizes.setdefault(task_id, {})[
+                        subtask_id] = size
+            elif record_type == self.REMOVE:
+                states.pop(task_id, None)
+                self._forget(task_id)
+            else:
+                logger.warning('Unknown record type %r in %s', record_type,
+                               self.path)
+        except (pickle.UnpicklingError, EOFError, ImportError,
+                AttributeError, ValueError):
+            logger.exception('Cannot restore record of task %r from %s',
+                             task_id, self.path)
+
+    def _flush_file(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
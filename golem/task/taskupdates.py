@@ -0,0 +1,75 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TaskUpdates(object):
+    """ Coalesces task updates between publishing ticks.
+
+    Ids of updated tasks are collected as updates are noticed. On every
+    tick, dictionaries of the updated tasks only are rebuilt and compared
+    with the ones published before, so that a task updated many times
+    within a tick is published once and only with the fields which have
+    changed. Dictionaries of all tasks are built only after a reset, e.g.
+    for a newly connected client, so that bodies of tasks which are not
+    updated are not loaded.
+    """
+
+    def __init__(self, get_task_dict):
+        """
+        :param get_task_dict: function returning a dictionary of the task
+        with given id; raises KeyError if the task cannot be read
+        """
+        self._get_task_dict = get_task_dict
+        self._updated = set()
+        # Task id -> last published dictionary of the task
+        self._published = dict()
+        self._full = True
+
+    def mark(self, task_id):
+        self._updated.add(task_id)
+
+    def reset(self):
+        """ Forget published dictionaries; the next collect() returns all
+        fields of all tasks
+        """
+        self._published = dict()
+        self._full = True
+
+    def collect(self, task_ids):
+        """ Rebuild dictionaries of tasks updated since the last call, or
+        of all tasks after a reset
+        :param task_ids: ids of all current tasks
+        :return (list, dict, bool): ids of updated tasks which still exist,
+        task id -> changed fields of the task, with removed tasks mapped to
+        None, and whether the changes contain all fields of all tasks
+        """
+        task_ids = set(task_ids)
+        updated, self._updated = self._updated, set()
+        full, self._full = self._full, False
+        changes = dict()
+
+        for task_id in set(self._published) - task_ids:
+            del self._published[task_id]
+            changes[task_id] = None
+
+        for task_id in (task_ids if full else updated & task_ids):
+            try:
+                new = self._get_task_dict(task_id)
+            except KeyError:
+                logger.warning('Cannot publish update of task %r', task_id)
+                if self._published.pop(task_id, None) is not None:
+                    changes[task_id] = None
+                continue
+            old = self._published.get(task_id, {})
+            diff = {key: value for key, value in new.items()
+                    if key not in old or old[key] != value}
+            self._published[task_id] = new
+            if diff:
+                changes[task_id] = diff
+
+        return sorted(updated & task_ids), changes, full
+
+    def task_list(self):
+        """ :return list: last published dictionaries of all tasks """
+        return list(self._published.values())
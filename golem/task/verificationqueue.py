@@ -0,0 +1,159 @@
+import logging
+import time
+from collections import deque
+
+from twisted.internet import defer, threads
+from twisted.python.failure import Failure
+from twisted.python.threadpool import ThreadPool
+
+from golem.diag.service import DiagnosticsProvider
+
+logger = logging.getLogger(__name__)
+
+
+class VerificationJob(object):
+
+    def __init__(self, key, method, args, kwargs):
+        self.key = key
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.deferred = defer.Deferred()
+        self.queued = time.time()
+        self.started = None
+
+
+class VerificationQueue(DiagnosticsProvider):
+    """ Runs subtask result verification, which may include re-rendering
+    a part of the result in Docker, on a bounded pool of worker threads.
+
+    Jobs submitted with the same key (e.g. a task id) are run one at a time,
+    in submission order, and each of them starts after callbacks of the
+    previous one have been run; jobs with different keys run concurrently.
+    Until the queue is started, jobs are run synchronously in the calling
+    thread.
+    """
+
+    DEFAULT_MAX_WORKERS = 4
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS):
+        self.max_workers = max_workers
+
+        self._pool = None
+        self._pending = deque()
+        self._running = set()
+
+        self.processed = 0
+        self.failed = 0
+        self.total_wait_time = 0.0
+        self.total_run_time = 0.0
+        self.max_wait_time = 0.0
+        self.max_run_time = 0.0
+
+    @property
+    def running(self):
+        return self._pool is not None
+
+    @property
+    def queue_depth(self):
+        return len(self._pending)
+
+    def start(self):
+        if self._pool:
+            return
+        self._pool = ThreadPool(minthreads=0, maxthreads=self.max_workers,
+                                name='VerificationQueue')
+        self._pool.start()
+        self._dispatch()
+
+    def stop(self):
+        if not self._pool:
+            return
+        pool, self._pool = self._pool, None
+
+        pending, self._pending = self._pending, deque()
+        for job in pending:
+            job.deferred.errback(defer.CancelledError())
+        pool.stop()
+
+    def submit(self, key, method, *args, **kwargs):
+        """ Schedule method(*args, **kwargs) for execution
+        :param key: jobs with equal keys are never run concurrently
+        :return Deferred: fires with the method's result in the reactor
+        thread
+        """
+        job = VerificationJob(key, method, args, kwargs)
+        self._pending.append(job)
+        self._dispatch()
+        return job.deferred
+
+    def get_diagnostics(self, output_format):
+        data = dict(
+            queued=len(self._pending),
+            running=len(self._running),
+            processed=self.processed,
+            failed=self.failed,
+            avg_wait_time=self._average(self.total_wait_time),
+            max_wait_time=self.max_wait_time,
+            avg_run_time=self._average(self.total_run_time),
+            max_run_time=self.max_run_time,
+        )
+        return self._format_diagnostics(data, output_format)
+
+    def _dispatch(self):
+        while len(self._running) < self.max_workers:
+            job = self._next_job()
+            if job is None:
+                return
+            self._start_job(job)
+
+    def _next_job(self):
+        for job in self._pending:
+            if job.key not in self._running:
+                self._pending.remove(job)
+                return job
+        return None
+
+    def _start_job(self, job):
+        self._running.add(job.key)
+        job.started = time.time()
+
+        if self._pool:
+            from twisted.internet import reactor
+            deferred = threads.deferToThreadPool(reactor, self._pool,
+                                                 job.method, *job.args,
+                                                 **job.kwargs)
+        else:
+            deferred = defer.maybeDeferred(job.method, *job.args,
+                                           **job.kwargs)
+        deferred.addBoth(self._job_finished, job)
+
+    def _job_finished(self, result, job):
+        self._running.discard(job.key)
+
+        wait_time = job.started - job.queued
+        run_time = time.time() - job.started
+        self.processed += 1
+        self.total_wait_time += wait_time
+        self.total_run_time += run_time
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+        self.max_run_time = max(self.max_run_time, run_time)
+
+        logger.debug("Verification job %r finished in %.3f s "
+                     "(waited %.3f s, %d queued)",
+                     job.key, run_time, wait_time, len(self._pending))
+
+        # Callbacks run before the next job with the same key is started,
+        # so that it sees their changes
+        if isinstance(result, Failure):
+            self.failed += 1
+            job.deferred.errback(result)
+        else:
+            job.deferred.callback(result)
+
+        self._dispatch()
+
+    def _average(self, total):
+        if not self.processed:
+            return 0.0
+        return total / self.processed
@@ -0,0 +1,65 @@
+""" Measures how long solving proof of work challenges takes for a range of
+difficulties, in the calling thread and in a pool of processes. A peer
+which cannot solve a challenge within ChallengeSolver.DEFAULT_TIMEOUT
+drops the connection, so the difficulty should stay well below it.
+
+    python scripts/challenge_benchmark.py [--difficulties 8 12 16 20]
+        [--challenges N] [--processes N]
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from golem.core.simplechallenge import ChallengeSolver, \
+    create_challenge, solve_challenge  # noqa
+
+
+def measure(solve, challenges):
+    times = []
+    for challenge in challenges:
+        started = time.time()
+        solve(challenge)
+        times.append(time.time() - started)
+    return statistics.median(times), max(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--difficulties', type=int, nargs='+',
+                        default=[5, 8, 12, 16, 20])
+    parser.add_argument('--challenges', type=int, default=10)
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args()
+
+    solver = ChallengeSolver(processes=args.processes)
+    print("{} challenges per difficulty, {} processes".format(
+        args.challenges, solver.processes))
+    print("{:>10} {:>14} {:>14} {:>14} {:>14}".format(
+        'difficulty', 'median 1 proc', 'max 1 proc', 'median pool',
+        'max pool'))
+
+    with ProcessPoolExecutor(solver.processes) as executor:
+        # Start worker processes before measuring
+        solver._search(executor, 'warm up', 1, threading.Event())
+
+        for difficulty in args.difficulties:
+            challenges = [create_challenge([], None)
+                          for _ in range(args.challenges)]
+            single = measure(
+                lambda c: solve_challenge(c, difficulty), challenges)
+            pool = measure(
+                lambda c: solver._search(executor, c, difficulty,
+                                         threading.Event()),
+                challenges)
+            print("{:>10} {:>13.3f}s {:>13.3f}s {:>13.3f}s {:>13.3f}s".format(
+                difficulty, single[0], single[1], pool[0], pool[1]))
+
+
+if __name__ == '__main__':
+    main()
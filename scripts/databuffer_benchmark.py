@@ -0,0 +1,88 @@
+""" Compares message framing speed of DataBuffer with the previous,
+bytes based implementation.
+
+    python scripts/databuffer_benchmark.py [--messages N] [--size BYTES]
+"""
+import argparse
+import os
+import struct
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from golem.core.databuffer import DataBuffer  # noqa
+
+
+class BytesDataBuffer:
+    """ Previous DataBuffer implementation, reduced to the framing path """
+
+    def __init__(self):
+        self.buffered_data = b""
+
+    def append_string(self, data):
+        self.buffered_data = b"".join([self.buffered_data, data])
+
+    def data_size(self):
+        return len(self.buffered_data)
+
+    def peek_ulong(self):
+        (ret_val,) = struct.unpack("!L", self.buffered_data[0:4])
+        return ret_val
+
+    def read_ulong(self):
+        val_ = self.peek_ulong()
+        self.buffered_data = self.buffered_data[4:]
+        return val_
+
+    def read_string(self, num_chars):
+        val_ = self.buffered_data[:num_chars]
+        self.buffered_data = self.buffered_data[num_chars:]
+        return val_
+
+    def get_len_prefixed_string(self):
+        while (self.data_size() > 4 and
+               self.data_size() >= (self.peek_ulong() + 4)):
+            num_chars = self.read_ulong()
+            yield self.read_string(num_chars)
+
+
+def framed(num_messages, size):
+    message = os.urandom(size)
+    return b"".join(
+        struct.pack("!L", size) + message for _ in range(num_messages))
+
+
+def frame(buffer_class, data, chunk_size):
+    db = buffer_class()
+    count = 0
+    for i in range(0, len(data), chunk_size):
+        db.append_string(data[i:i + chunk_size])
+        for _ in db.get_len_prefixed_string():
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--size', type=int, default=200)
+    parser.add_argument('--chunk', type=int, default=64 * 1024,
+                        help="bytes delivered by a single read")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    data = framed(args.messages, args.size)
+    print("{} messages of {} B, {} B reads".format(args.messages, args.size,
+                                                   args.chunk))
+
+    for buffer_class in (BytesDataBuffer, DataBuffer):
+        assert frame(buffer_class, data, args.chunk) == args.messages
+        best = min(timeit.repeat(
+            lambda: frame(buffer_class, data, args.chunk),
+            number=1, repeat=args.repeat))
+        print("{:>16}: {:8.2f} ms".format(buffer_class.__name__, best * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+""" Measures how many ECDSA signatures per second EllipticalKeysAuth
+verifies for a fixed set of peers with the public key cache enabled and
+with it disabled (max_entries=0), and how many messages it encrypts, which
+doesn't depend on the cache.
+
+    python scripts/keysauth_benchmark.py [--peers N] [--calls N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from devp2p.crypto import ECCx  # noqa
+from golem.core.keysauth import EllipticalKeysAuth, PublicKeyCache, \
+    sha3  # noqa
+from golem.utils import encode_hex  # noqa
+
+DATA = b'task header' * 20
+
+
+def measure(name, calls, function, args):
+    started = time.time()
+    for i in range(calls):
+        function(*args[i % len(args)])
+    duration = time.time() - started
+    print("{:>24}: {:10.1f} calls/s".format(name, calls / duration))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--peers', type=int, default=200)
+    parser.add_argument('--calls', type=int, default=20000)
+    args = parser.parse_args()
+
+    peers = [ECCx() for _ in range(args.peers)]
+    signed = [(peer.sign(sha3(DATA)), DATA, encode_hex(peer.raw_pubkey))
+              for peer in peers]
+    messages = [(DATA, peer.raw_pubkey) for peer in peers]
+
+    with tempfile.TemporaryDirectory() as datadir:
+        keys_auth = EllipticalKeysAuth(datadir)
+        print("{} peers, {} calls".format(args.peers, args.calls))
+
+        for max_entries in [0, PublicKeyCache.DEFAULT_MAX_ENTRIES]:
+            keys_auth.public_keys = PublicKeyCache(max_entries)
+            suffix = 'cached' if max_entries else 'not cached'
+            measure('verify ({})'.format(suffix), args.calls,
+                    keys_auth.verify, signed)
+        measure('encrypt', args.calls // 10, keys_auth.encrypt, messages)
+
+
+if __name__ == '__main__':
+    main()
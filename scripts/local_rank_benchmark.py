@@ -0,0 +1,84 @@
+""" Drives rank events through a temporary database, comparing a separate
+INSERT / UPDATE per event with the write-behind LocalRankTable.
+
+    python scripts/local_rank_benchmark.py [--events N] [--nodes N]
+"""
+import argparse
+import datetime
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from peewee import IntegrityError  # noqa
+
+from golem.model import Database, LocalRank, db  # noqa
+from golem.ranking.manager import database_manager as dm  # noqa
+from golem.ranking.manager.trust_manager import computed_trust_local  # noqa
+
+
+def per_event(node_id, field, trust_mod):
+    # How every event was stored before the write-behind table
+    try:
+        with db.transaction():
+            LocalRank.create(node_id=node_id, **{field: trust_mod})
+    except IntegrityError:
+        LocalRank.update(**{
+            field: getattr(LocalRank, field) + trust_mod,
+            'modified_date': str(datetime.datetime.now())
+        }).where(LocalRank.node_id == node_id).execute()
+
+
+def per_event_read(node_id):
+    return LocalRank.select().where(LocalRank.node_id == node_id).first()
+
+
+def write_behind(node_id, field, trust_mod):
+    dm.local_ranks.increase(node_id, field, trust_mod)
+    dm.local_ranks.sync()
+
+
+def run(events, store, read):
+    started = time.time()
+    for node_id, field, trust_mod in events:
+        store(node_id, field, trust_mod)
+        computed_trust_local(read(node_id))
+    dm.flush_local_ranks()
+    return time.time() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=100000)
+    parser.add_argument('--nodes', type=int, default=100)
+    parser.add_argument('--flush-interval', type=float, default=1.0)
+    args = parser.parse_args()
+
+    events = [('node{}'.format(random.randrange(args.nodes)),
+               random.choice(dm.LocalRankTable.FIELDS),
+               random.random())
+              for _ in range(args.events)]
+    dm.local_ranks.flush_interval = args.flush_interval
+
+    print("{} rank events for {} nodes, each followed by a trust read".format(
+        args.events, args.nodes))
+    for name, store, read in [('per event', per_event, per_event_read),
+                              ('write-behind', write_behind,
+                               dm.get_local_rank)]:
+        datadir = tempfile.mkdtemp()
+        try:
+            database = Database(datadir)
+            duration = run(events, store, read)
+            database.close()
+        finally:
+            shutil.rmtree(datadir, ignore_errors=True)
+        print("{:>14}: {:8.2f} s, {:10.0f} events/s".format(
+            name, duration, args.events / duration))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+""" Feeds simulated peers into a PeerKeeper and measures routing table
+lookups: adding peers, last message time updates and neighbour queries.
+
+    python scripts/peerkeeper_benchmark.py [--peers N] [--lookups N]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from golem.network.p2p.node import Node  # noqa
+from golem.network.p2p.peerkeeper import K_SIZE, PeerKeeper  # noqa
+
+
+def random_key():
+    return '{:0128x}'.format(random.getrandbits(K_SIZE))
+
+
+def measure(name, calls, function, args):
+    started = time.time()
+    for arg in args:
+        function(arg)
+    duration = time.time() - started
+    print("{:>22}: {:8.2f} s, {:10.2f} us/call".format(
+        name, duration, duration / calls * 10 ** 6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--peers', type=int, default=100000)
+    parser.add_argument('--lookups', type=int, default=10000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    peer_keeper = PeerKeeper(random_key())
+    peers = [Node(node_name='node{}'.format(i), key=random_key())
+             for i in range(args.peers)]
+    keys = [random.choice(peers).key for _ in range(args.lookups)]
+    key_nums = [random.getrandbits(K_SIZE) for _ in range(args.lookups)]
+
+    print("{} simulated peers, {} lookups".format(args.peers, args.lookups))
+    measure('add_peer', args.peers, peer_keeper.add_peer, peers)
+    print("{:>22}: {} buckets, {} peers".format(
+        'routing table', len(peer_keeper.buckets),
+        sum(len(bucket.peers) for bucket in peer_keeper.buckets)))
+    measure('set_last_message_time', args.lookups,
+            peer_keeper.set_last_message_time, keys)
+    measure('bucket_for_peer', args.lookups,
+            peer_keeper.bucket_for_peer, key_nums)
+    measure('neighbours', args.lookups, peer_keeper.neighbours, key_nums)
+
+
+if __name__ == '__main__':
+    main()
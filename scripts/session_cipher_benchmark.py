@@ -0,0 +1,52 @@
+""" Compares encryption throughput of per message ECIES, used with peers
+that don't support session keys, with AES-GCM session keys.
+
+    python scripts/session_cipher_benchmark.py [--size BYTES] [--count N]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from devp2p.crypto import ECCx  # noqa
+from golem.core.sessioncipher import SessionKeyExchange  # noqa
+
+
+def ecies(count, data):
+    receiver = ECCx()
+    for _ in range(count):
+        receiver.ecies_decrypt(ECCx.ecies_encrypt(data, receiver.raw_pubkey))
+
+
+def session_keys(count, data):
+    sender, receiver = SessionKeyExchange(), SessionKeyExchange()
+    sender_cipher = sender.derive(receiver.public_key)
+    receiver_cipher = receiver.derive(sender.public_key)
+    for _ in range(count):
+        receiver_cipher.decrypt(sender_cipher.encrypt(data))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, action='append',
+                        help="bytes encrypted at once; messages are usually "
+                             "small, file chunks take 64 KiB")
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for size in args.size or [200, 64 * 1024]:
+        data = os.urandom(size)
+        print("{} frames of {} B, encrypted and decrypted".format(
+            args.count, size))
+        for fn in (ecies, session_keys):
+            best = min(timeit.repeat(lambda: fn(args.count, data),
+                                     number=1, repeat=args.repeat))
+            print("{:>16}: {:8.2f} ms, {:8.2f} MB/s".format(
+                fn.__name__, best * 1000, args.count * size / best / 2 ** 20))
+
+
+if __name__ == '__main__':
+    main()
@@ -280,6 +280,15 @@ class TestBlenderTask(TempDirFixture, LogTestCase):
         self.bt.res_y = 300
         assert self.bt._get_min_max_y(2) == (0.5, 0.75)
 
+    def test_get_part_offsets(self):
+        self.bt.res_y = 10
+        assert self.bt._get_part_offsets(3) == [0, 4, 7]
+        assert self.bt._get_part_offsets(1) == [0]
+
+        self.bt.use_frames = True
+        self.bt.res_y = 300
+        assert self.bt._get_part_offsets(4) == [0, 75, 150, 225]
+
     def test_put_img_together_exr(self):
         for chunks in [1, 5, 7, 11, 13, 31, 57, 100]:
             res_y = 0
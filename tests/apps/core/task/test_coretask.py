@@ -21,6 +21,7 @@ from golem.tools.testdirfixture import TestDirFixture
 from apps.core.task.coretask import (CoreTask, logger, log_key_error, CoreTaskTypeInfo,
                                      CoreTaskBuilder, AcceptClientVerdict)
 from apps.core.task.coretaskstate import TaskDefinition
+from apps.core.task.verificator import SubtaskVerificationState
 
 
 class TestCoreTask(LogTestCase, TestDirFixture):
@@ -258,6 +259,35 @@ class TestCoreTask(LogTestCase, TestDirFixture):
         assert task.stderr[subtask_id] == files[3]
         assert task.stdout[subtask_id] == files[2]
 
+    def test_verify_results(self):
+        task = self._get_core_task()
+
+        subtask_id = "xxyyzz"
+        task.subtasks_given[subtask_id] = {'status': SubtaskStatus.downloading}
+        files_dir = os.path.join(task.tmp_dir, subtask_id)
+        files = self.additional_dir_content([2], sub_dir=files_dir)
+        shutil.move(files[1], files[1] + ".log")
+        files[1] += ".log"
+
+        # Verification doesn't change the task's state
+        verdict = task.verify_results(subtask_id, files, ResultType.FILES)
+        assert verdict.state == SubtaskVerificationState.VERIFIED
+        assert verdict.files == [outer_dir_path(files[0])]
+        assert verdict.stdout == files[1]
+        assert subtask_id not in task.results
+        assert subtask_id not in task.stdout
+        assert not task.verificator.ver_states
+
+        task.results_verified(subtask_id, files, ResultType.FILES, verdict)
+        assert task.results[subtask_id] == verdict.files
+        assert task.stdout[subtask_id] == files[1]
+        assert task.verificator.is_verified(subtask_id)
+        assert task.subtasks_given[subtask_id]['status'] == SubtaskStatus.finished
+
+        # Results are not accepted twice
+        task.results_verified(subtask_id, files, ResultType.FILES, verdict)
+        assert task.verify_results(subtask_id, files, ResultType.FILES) is None
+
     def test_restart(self):
         task = self._get_core_task()
         task.num_tasks_received = 1
@@ -406,6 +436,7 @@ class TestCoreTask(LogTestCase, TestDirFixture):
         z = zipfile.ZipFile(resource)
         in_z = z.namelist()
         assert len(in_z) == 6
+        assert c.get_resources(th) == resource
 
         assert c.get_resources(th, ResourceType.HASHES) == files[1:]
 
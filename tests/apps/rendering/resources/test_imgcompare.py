@@ -167,6 +167,13 @@ class TestCompareImgFunctions(TempDirFixture, LogTestCase, PEP8MixIn):
 
         assert calculate_mse(img1, img2, start1=(0, 0), start2=(2, 2), box=(7, 7)) == 0
 
+        # Box exceeding one of the images
+        with self.assertRaises(ValueError):
+            calculate_mse(img1, img2, start1=(0, 0), start2=(4, 4), box=(7, 7))
+
+        with self.assertRaises(ValueError):
+            calculate_mse(img1, img2, start1=(-1, 0), box=(5, 5))
+
 
     def test_compare_imgs(self):
         img1_path = self.temp_file_name("img1.png")
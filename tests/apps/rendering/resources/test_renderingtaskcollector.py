@@ -103,3 +103,65 @@ class TestRenderingTaskCollector(TestDirFixture):
         img = collector.finalize()
         assert isinstance(img, Image.Image)
         assert img.size == (10, 20)
+
+    def test_finalize_paste_parts_as_added(self):
+        files = []
+        for i, (height, color) in enumerate([(3, (255, 0, 0)),
+                                             (5, (0, 255, 0)),
+                                             (2, (0, 0, 255))]):
+            files.append(self.temp_file_name("part{}.png".format(i)))
+            make_test_img(files[-1], size=(10, height), color=color)
+
+        collector = RenderingTaskCollector(paste=True, width=10, height=10,
+                                           parts=3)
+        collector.add_img_file(files[2], 3)
+        collector.add_img_file(files[1], 2)
+        assert not collector.complete
+        collector.add_img_file(files[0], 1)
+        assert collector.complete
+
+        final_img = collector.finalize()
+        assert final_img.size == (10, 10)
+        assert final_img.getpixel((0, 2)) == (255, 0, 0)
+        assert final_img.getpixel((0, 3)) == (0, 255, 0)
+        assert final_img.getpixel((0, 8)) == (0, 0, 255)
+        assert collector.compositor is None
+
+        # Size of the final image is computed from the parts
+        collector = RenderingTaskCollector(paste=True)
+        for img_file in files:
+            collector.add_img_file(img_file)
+        assert not collector.complete
+        final_img = collector.finalize()
+        assert final_img.size == (10, 10)
+        assert final_img.getpixel((0, 7)) == (0, 255, 0)
+
+    def test_finalize_paste_at_offsets(self):
+        files = []
+        for i, (height, color) in enumerate([(3, (255, 0, 0)),
+                                             (4, (0, 255, 0)),
+                                             (2, (0, 0, 255))]):
+            files.append(self.temp_file_name("part{}.png".format(i)))
+            make_test_img(files[-1], size=(10, height), color=color)
+
+        collector = RenderingTaskCollector(paste=True, width=10, height=10,
+                                           parts=3, offsets=[0, 4, 8])
+        collector.add_img_file(files[2], 3)
+        # Parts are pasted as they're added
+        assert not collector.compositor._pending
+        collector.add_img_file(files[0], 1)
+        collector.add_img_file(files[1], 2)
+        assert collector.complete
+        final_img = collector.finalize()
+        assert final_img.getpixel((0, 3)) == (0, 0, 0)
+        assert final_img.getpixel((0, 4)) == (0, 255, 0)
+        assert final_img.getpixel((0, 8)) == (0, 0, 255)
+
+        # Parts which weren't pasted as they were added
+        collector = RenderingTaskCollector(paste=True, width=10, height=10,
+                                           offsets=[0, 4, 8])
+        for img_file in files:
+            collector.add_img_file(img_file)
+        final_img = collector.finalize()
+        assert final_img.getpixel((0, 3)) == (0, 0, 0)
+        assert final_img.getpixel((0, 8)) == (0, 0, 255)
@@ -0,0 +1,79 @@
+import os
+
+from PIL import Image
+
+from apps.rendering.resources.tilecompositor import TileCompositor
+from golem.tools.testdirfixture import TestDirFixture
+
+COLORS = [(255, 0, 0), (0, 255, 0), (0, 0, 255)]
+
+
+def column(img):
+    return [img.getpixel((0, y)) for y in range(img.size[1])]
+
+
+class TestTileCompositor(TestDirFixture):
+
+    def test_add(self):
+        compositor = TileCompositor(4, 6, 3)
+        assert compositor.image().size == (4, 6)
+
+        compositor.add(3, Image.new('RGB', (4, 3), COLORS[2]))
+        compositor.add(2, Image.new('RGB', (4, 2), COLORS[1]))
+        assert not compositor.complete
+        # Stripes wait for the ones above them
+        assert column(compositor.image()) == [(0, 0, 0)] * 6
+
+        compositor.add(1, Image.new('RGB', (4, 1), COLORS[0]))
+        assert compositor.complete
+        assert column(compositor.image()) == \
+            [COLORS[0]] + [COLORS[1]] * 2 + [COLORS[2]] * 3
+
+        # Stripe computed again is pasted in the same place
+        compositor.add(2, Image.new('RGB', (4, 2), COLORS[0]))
+        assert column(compositor.image())[1:3] == [COLORS[0]] * 2
+
+        with self.assertRaises(ValueError):
+            compositor.add(4, Image.new('RGB', (4, 1)))
+        compositor.close()
+
+    def test_add_with_layout(self):
+        compositor = TileCompositor(4, 6, 3, offsets=[0, 1, 3])
+        # Stripes are pasted as they arrive
+        compositor.add(3, Image.new('RGB', (4, 3), COLORS[2]))
+        assert not compositor._pending
+        assert column(compositor.image()) == [(0, 0, 0)] * 3 + [COLORS[2]] * 3
+
+        compositor.add(1, Image.new('RGB', (4, 1), COLORS[0]))
+        assert not compositor.complete
+        compositor.add(2, Image.new('RGB', (4, 2), COLORS[1]))
+        assert compositor.complete
+        assert column(compositor.image()) == \
+            [COLORS[0]] + [COLORS[1]] * 2 + [COLORS[2]] * 3
+        compositor.close()
+
+        with self.assertRaises(ValueError):
+            TileCompositor(4, 6, 3, offsets=[0, 1])
+
+    def test_clip_and_convert(self):
+        compositor = TileCompositor(4, 3, 2)
+        compositor.add(1, Image.new('RGBA', (2, 2), (1, 2, 3, 4)))
+        compositor.add(2, Image.new('RGB', (6, 5), (5, 6, 7)))
+        img = compositor.image()
+        assert img.mode == 'RGBA'
+        assert img.size == (4, 3)
+        assert img.getpixel((1, 1)) == (1, 2, 3, 4)
+        assert img.getpixel((3, 1)) == (0, 0, 0, 0)
+        assert img.getpixel((3, 2)) == (5, 6, 7, 255)
+        compositor.close()
+
+    def test_mmap(self):
+        mmap_path = os.path.join(self.path, 'image.raw')
+        compositor = TileCompositor(4, 2, 2, mmap_path)
+        compositor.add(1, Image.new('L', (4, 1), 7))
+        assert os.path.getsize(mmap_path) == 8
+        compositor.add(2, Image.new('L', (4, 1), 9))
+        img = compositor.image()
+        compositor.close()
+        assert not os.path.exists(mmap_path)
+        assert column(img) == [7, 9]
@@ -2,6 +2,7 @@ import os
 import unittest
 import uuid
 from pathlib import Path
+from unittest.mock import patch
 
 from PIL import Image
 
@@ -120,6 +121,33 @@ class TestFrameRenderingTask(TestDirFixture, LogTestCase):
         assert task.frames_given["5"][0] == img_file2
         assert task.num_tasks_received == 1
 
+    @patch('apps.rendering.task.framerenderingtask.FrameRenderingTask'
+           '._update_task_preview')
+    @patch('apps.rendering.task.framerenderingtask.FrameRenderingTask'
+           '._update_preview')
+    def test_parts_pasted_as_accepted(self, *_):
+        task = self._get_frame_task(use_frames=False)
+        task._accept_client("NODE 1")
+        colors = {1: (255, 0, 0), 2: (0, 255, 0), 3: (0, 0, 255)}
+        for num, color in colors.items():
+            subtask_id = "SUBTASK{}".format(num)
+            task.subtasks_given[subtask_id] = {
+                "start_task": num, "end_task": num, "node_id": "NODE 1",
+                "parts": 1, "frames": [1], "status": SubtaskStatus.starting}
+            img_file = os.path.join(self.path, "part{}.png".format(num))
+            Image.new("RGB", (800, 200), color).save(img_file)
+
+        task.accept_results("SUBTASK3", [os.path.join(self.path, "part3.png")])
+        task.accept_results("SUBTASK1", [os.path.join(self.path, "part1.png")])
+        assert not task.collectors[None].complete
+        task.accept_results("SUBTASK2", [os.path.join(self.path, "part2.png")])
+        assert task.collectors == {}
+
+        img = Image.open(task.output_file)
+        assert [img.getpixel((0, y)) for y in (0, 199, 200, 399, 400, 599)] \
+            == [colors[1]] * 2 + [colors[2]] * 2 + [colors[3]] * 2
+        img.close()
+
     def test_get_output_names(self):
         frame_task = self._get_frame_task(True)
         output_names = frame_task.get_output_names()
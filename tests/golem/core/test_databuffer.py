@@ -0,0 +1,93 @@
+import struct
+import unittest
+
+from golem.core import databuffer
+from golem.core.databuffer import DataBuffer
+
+
+class TestDataBuffer(unittest.TestCase):
+
+    def test_ulong(self):
+        db = DataBuffer()
+        with self.assertRaises(ValueError):
+            db.peek_ulong()
+        with self.assertRaises(AttributeError):
+            db.append_ulong(-1)
+
+        assert db.append_ulong(17) == struct.pack("!L", 17)
+        db.append_ulong(2 ** 32 - 1)
+        assert db.data_size() == 8
+        assert db.peek_ulong() == 17
+        assert db.read_ulong() == 17
+        assert db.read_ulong() == 2 ** 32 - 1
+        assert db.data_size() == 0
+
+    def test_string(self):
+        db = DataBuffer()
+        db.append_string(b"abc")
+        db.append_string(b"defgh")
+        assert db.data_size() == 8
+        assert db.peek_string(2) == b"ab"
+        assert db.read_string(4) == b"abcd"
+        assert db.buffered_data == b"efgh"
+        with self.assertRaises(AttributeError):
+            db.read_string(5)
+        assert db.read_all() == b"efgh"
+        assert db.data_size() == 0
+        assert db.read_all() == b""
+
+    def test_len_prefixed_string(self):
+        db = DataBuffer()
+        assert db.read_len_prefixed_string() is None
+
+        db.append_len_prefixed_string(b"first")
+        db.append_len_prefixed_string(b"second")
+        db.append_ulong(10)
+        db.append_string(b"third")
+        assert list(db.get_len_prefixed_string()) == [b"first", b"second"]
+
+        db.append_string(b"third")
+        assert db.read_len_prefixed_string() == b"thirdthird"
+        assert db.data_size() == 0
+
+    def test_overflow(self):
+        db = DataBuffer()
+        db.append_string(b"x" * 10)
+        db.read_string(5)
+
+        data = b"y" * databuffer.MAX_BUFFER_SIZE
+        db.append_len_prefixed_string(data)
+        assert db.read_len_prefixed_string() == data
+        assert db.data_size() == 0
+
+        db.append_string(b"z" * 10)
+        db.append_string(data, check_size=False)
+        assert db.data_size() == len(data) + 10
+
+    def test_compaction(self):
+        db = DataBuffer()
+        message = b"m" * 1000
+        num_messages = 4 * databuffer.COMPACT_THRESHOLD // len(message)
+
+        for _ in range(num_messages):
+            db.append_len_prefixed_string(message)
+        db.append_string(b"tail")
+
+        received = 0
+        for msg in db.get_len_prefixed_string():
+            assert msg == message
+            # consumed data never takes most of a big buffer
+            assert db._offset < databuffer.COMPACT_THRESHOLD or \
+                db._offset * 2 < len(db._data)
+            received += 1
+
+        assert received == num_messages
+        assert db.buffered_data == b"tail"
+
+    def test_clear(self):
+        db = DataBuffer()
+        db.append_len_prefixed_string(b"abc")
+        db.read_ulong()
+        db.clear_buffer()
+        assert db.data_size() == 0
+        assert db.buffered_data == b""
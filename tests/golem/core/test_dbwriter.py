@@ -0,0 +1,116 @@
+import threading
+import unittest
+
+from mock import Mock, patch
+from peewee import CharField, IntegrityError, Model
+
+from golem.core.dbwriter import DatabaseWriter, ProfiledSqliteDatabase, \
+    QueryStats
+from golem.diag.service import DiagnosticsOutputFormat
+from golem.testutils import TempDirFixture
+
+
+class TestQueryStats(unittest.TestCase):
+
+    def test_label(self):
+        assert QueryStats.label('SELECT "t1"."id" FROM "stats" AS t1') \
+            == 'SELECT stats'
+        assert QueryStats.label('UPDATE "stats" SET "value" = ?') \
+            == 'UPDATE stats'
+        assert QueryStats.label('INSERT INTO "knownhosts" ("a") VALUES (?)') \
+            == 'INSERT knownhosts'
+        assert QueryStats.label('CREATE TABLE IF NOT EXISTS "stats" (x)') \
+            == 'CREATE stats'
+        assert QueryStats.label('PRAGMA user_version') == 'PRAGMA'
+        assert QueryStats.label('') == 'OTHER'
+
+    def test_histogram(self):
+        stats = QueryStats()
+        stats.add('SELECT "id" FROM "stats"', 0.00005)
+        stats.add('SELECT "id" FROM "stats"', 0.005)
+        stats.add('SELECT "id" FROM "stats"', 2)
+
+        data = stats.get_diagnostics(DiagnosticsOutputFormat.data)
+        select = data['SELECT stats']
+        assert select['count'] == 3
+        assert select['max_ms'] == 2000
+        assert select['histogram']['<=0.1ms'] == 1
+        assert select['histogram']['<=10.0ms'] == 1
+        assert select['histogram']['<=infms'] == 1
+
+        stats.clear()
+        assert stats.get_diagnostics(DiagnosticsOutputFormat.data) == {}
+
+
+class Item(Model):
+    name = CharField(unique=True)
+
+
+class TestDatabaseWriter(TempDirFixture):
+
+    def setUp(self):
+        super(TestDatabaseWriter, self).setUp()
+        self.database = ProfiledSqliteDatabase(
+            str(self.new_path / 'test.db'), threadlocals=True,
+            pragmas=(('journal_mode', 'wal'),))
+        Item._meta.database = self.database
+        self.database.create_tables([Item])
+        self.writer = DatabaseWriter(self.database, batch_size=10)
+
+    def tearDown(self):
+        self.writer.stop()
+        self.database.close()
+        super(TestDatabaseWriter, self).tearDown()
+
+    def test_sync_when_not_started(self):
+        results = []
+        self.writer.write(Item.create, name='a').addCallback(results.append)
+        assert results[0].name == 'a'
+
+        errors = []
+        self.writer.write(Item.create, name='a').addErrback(errors.append)
+        assert errors[0].check(IntegrityError)
+        assert self.writer.jobs == 2
+        assert self.writer.failed == 1
+
+        stats = self.database.query_stats.get_diagnostics(
+            DiagnosticsOutputFormat.data)
+        assert stats['INSERT item']['count'] == 2
+
+    @patch('twisted.internet.reactor.callFromThread')
+    def test_batches(self, call_mock):
+        blocked = threading.Event()
+        release = threading.Event()
+
+        def block():
+            blocked.set()
+            release.wait(10)
+
+        self.writer.start()
+        self.writer.write(block)
+        assert blocked.wait(10)
+
+        # Jobs queued while the writer is busy are written in one batch;
+        # a failing job does not roll back the others
+        deferreds = [self.writer.write(Item.create, name=name)
+                     for name in ['a', 'b', 'a', 'c']]
+        release.set()
+        self.writer.stop()
+
+        assert not self.writer.running
+        assert self.writer.batches == 2
+        assert self.writer.max_batch == 4
+        assert self.writer.failed == 1
+        assert sorted(i.name for i in Item.select()) == ['a', 'b', 'c']
+
+        results = {call[0][0].__self__: call[0][1]
+                   for call in call_mock.call_args_list}
+        assert results[deferreds[1]].name == 'b'
+        assert results[deferreds[2]].check(IntegrityError)
+
+    def test_diagnostics(self):
+        self.writer.write(Mock())
+        data = self.writer.get_diagnostics(DiagnosticsOutputFormat.data)
+        assert data['jobs'] == 1
+        assert data['queued'] == 0
+        assert not data['running']
@@ -0,0 +1,48 @@
+import unittest
+
+from golem.core.deadlines import DeadlineScheduler
+
+
+class TestDeadlineScheduler(unittest.TestCase):
+
+    def test_pop_expired(self):
+        scheduler = DeadlineScheduler()
+        scheduler.schedule('c', 30)
+        scheduler.schedule('a', 10)
+        scheduler.schedule('b', 20)
+
+        assert scheduler.pop_expired(10) == []
+        assert scheduler.pop_expired(25) == ['a', 'b']
+        assert 'a' not in scheduler
+        assert len(scheduler) == 1
+        assert scheduler.pop_expired(100) == ['c']
+        assert scheduler.pop_expired(100) == []
+
+    def test_cancel_and_reschedule(self):
+        scheduler = DeadlineScheduler()
+        scheduler.schedule('a', 10)
+        scheduler.schedule('b', 10)
+        scheduler.schedule('c', 10)
+        scheduler.cancel('b')
+        scheduler.cancel('unknown')
+        scheduler.schedule('c', 50)
+
+        assert scheduler.deadline('c') == 50
+        assert scheduler.deadline('b') is None
+        assert scheduler.pop_expired(20) == ['a']
+        assert scheduler.pop_expired(60) == ['c']
+        assert len(scheduler) == 0
+
+    def test_compact(self):
+        scheduler = DeadlineScheduler()
+        for i in range(1000):
+            scheduler.schedule('a', i)
+        assert len(scheduler._heap) <= 2 * len(scheduler) + 65
+        assert scheduler.pop_expired(2000) == ['a']
+
+    def test_clear(self):
+        scheduler = DeadlineScheduler()
+        scheduler.schedule('a', 10)
+        scheduler.clear()
+        assert len(scheduler) == 0
+        assert scheduler.pop_expired(20) == []
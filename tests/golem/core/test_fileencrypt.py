@@ -98,6 +98,33 @@ class TestAESFileEncryptor(TestDirFixture):
 
         self.assertFalse(decrypted)
 
+    def test_stream(self):
+        """ Test streaming encryption and decryption """
+        secret = FileEncryptor.gen_secret(10, 20)
+
+        with open(self.test_file_path, 'rb') as f:
+            data = f.read()
+
+        with open(self.enc_file_path, 'wb') as dst:
+            with AESFileEncryptor.stream_writer(dst, secret) as writer:
+                for i in range(0, len(data), 100):
+                    writer.write(data[i:i + 100])
+
+        # compatible with the whole file decryption
+        decrypted_path = self.test_file_path + ".dec"
+        AESFileEncryptor.decrypt(self.enc_file_path, decrypted_path, secret)
+        with open(decrypted_path, 'rb') as f:
+            self.assertEqual(f.read(), data)
+
+        AESFileEncryptor.encrypt(self.test_file_path,
+                                 self.enc_file_path,
+                                 secret)
+
+        with open(self.enc_file_path, 'rb') as src:
+            reader = AESFileEncryptor.stream_reader(src, secret)
+            chunks = iter(lambda: reader.read(100), b'')
+            self.assertEqual(b''.join(chunks), data)
+
     def test_get_key_and_iv(self):
         """ Test helper methods: gen_salt and get_key_and_iv """
         salt = AESFileEncryptor.gen_salt(AESFileEncryptor.block_size)
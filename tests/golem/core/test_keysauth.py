@@ -1,11 +1,16 @@
 import time
+import unittest
 from os import path
 from random import random, randint
 
 from devp2p.crypto import ECCx
+from mock import Mock, patch
 
 from golem.core.keysauth import KeysAuth, EllipticalKeysAuth, RSAKeysAuth, \
-    get_random, get_random_float, sha2, sha3
+    PublicKeyCache, difficulty_threshold, find_key_pair, get_random, \
+    get_random_float, privtopub, sha2, sha3
+from golem.diag.service import DiagnosticsOutputFormat
+from golem.report import Component, Stage
 from golem.core.simpleserializer import CBORSerializer
 from golem.network.transport.message import MessageWantToComputeTask
 from golem.tools.testwithappconfig import TestWithKeysAuth
@@ -37,6 +42,12 @@ class KeysAuthTest(TestWithKeysAuth):
         self.assertGreaterEqual(difficulty, 0)
         difficulty = ka.get_difficulty("j_AUzb*?V0?g^f9,uI:hewjOTLdu8jn5$%s'a#\iJ8q's~Pa")
         self.assertGreaterEqual(difficulty, 0)
+        # sha256("a") starts with 0xca
+        self.assertEqual(ka.get_difficulty("a"), 0)
+        for key_id in ["golem{}".format(i) for i in range(50)]:
+            difficulty = ka.get_difficulty(key_id)
+            self.assertLessEqual(sha2(key_id), 2 ** (256 - difficulty))
+            self.assertGreater(sha2(key_id), 2 ** (255 - difficulty))
 
     def test_keys_dir_default2(self):
         self.assertEqual(KeysAuth(self.path).get_keys_dir(), KeysAuth(self.path).get_keys_dir())
@@ -145,6 +156,40 @@ class TestRSAKeysAuth(TestWithKeysAuth):
 
 class TestEllipticalKeysAuth(TestWithKeysAuth):
 
+    def test_find_key_pair(self):
+        for processes in [1, 3]:
+            priv_key, pub_key = find_key_pair(8, processes, batch_size=4)
+            self.assertEqual(privtopub(priv_key), pub_key)
+            key_id = encode_hex(pub_key)
+            self.assertLessEqual(sha2(key_id), 2 ** (256 - 8))
+
+    @patch('multiprocessing.Pool')
+    @patch('multiprocessing.Event')
+    def test_find_key_pair_waits_for_result(self, event, pool):
+        event.return_value.wait.side_effect = [False, True]
+        result = pool.return_value.apply_async.return_value
+        result.ready.return_value = False
+        result.get.return_value = (b'priv', b'pub')
+        progress = Mock()
+
+        key_pair = find_key_pair(8, 2, progress=progress)
+        self.assertEqual(key_pair, (b'priv', b'pub'))
+        # Progress is reported only until the key pair is found
+        self.assertEqual(progress.call_count, 1)
+        pool.return_value.terminate.assert_called_once_with()
+
+    def test_difficulty_threshold(self):
+        self.assertEqual(difficulty_threshold(0), b'\xff' * 32)
+        self.assertEqual(difficulty_threshold(8), b'\x01' + b'\x00' * 31)
+
+    @patch('golem.core.keysauth.StatusPublisher.publish')
+    def test_generate_new_reports_status(self, publish):
+        ek = EllipticalKeysAuth(self.path)
+        ek.generate_new(6, processes=2)
+        self.assertGreaterEqual(ek.get_difficulty(), 6)
+        publish.assert_any_call(Component.client, 'generate_keys', Stage.pre)
+        publish.assert_any_call(Component.client, 'generate_keys', Stage.post)
+
     def test_elliptical_init(self):
         for i in range(100):
             ek = EllipticalKeysAuth(path.join(self.path), str(random()))
@@ -291,3 +336,49 @@ class TestEllipticalKeysAuth(TestWithKeysAuth):
         self.assertEqual(ek2.decrypt(ek2.encrypt(data3)), data3)
         with self.assertRaises(TypeError):
             ek2.encrypt(None)
+
+    def test_public_keys_cached(self):
+        ek = EllipticalKeysAuth(path.join(self.path, str(random())))
+        ek2 = EllipticalKeysAuth(path.join(self.path, str(random())))
+        data = b"abcdefgh" * 10
+        sig = ek2.sign(data)
+        for _ in range(3):
+            self.assertTrue(ek.verify(sig, data, ek2.key_id))
+        self.assertEqual(ek2.decrypt(ek.encrypt(data, ek2.public_key)), data)
+        self.assertEqual((ek.public_keys.misses, ek.public_keys.hits), (1, 2))
+        self.assertFalse(ek.verify(sig, data, "12" * 64))
+        self.assertEqual(len(ek.public_keys), 1)
+
+
+class TestPublicKeyCache(unittest.TestCase):
+
+    @patch('golem.core.keysauth.ECCx')
+    def test_get(self, eccx):
+        eccx.side_effect = lambda public_key: [public_key]
+        cache = PublicKeyCache(max_entries=2)
+        ecc = cache.get(b'a' * 64)
+        self.assertEqual(ecc, [b'a' * 64])
+        self.assertIs(cache.get(b'a' * 64), ecc)
+        cache.get(b'b' * 64)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+        # Least recently used key is dropped
+        cache.get(b'a' * 64)
+        cache.get(b'c' * 64)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(eccx.call_count, 3)
+        cache.get(b'b' * 64)
+        self.assertEqual(eccx.call_count, 4)
+
+        # Invalid keys are not cached
+        eccx.side_effect = AssertionError
+        with self.assertRaises(AssertionError):
+            cache.get(b'd')
+        self.assertEqual(len(cache), 2)
+
+        diagnostics = cache.get_diagnostics(DiagnosticsOutputFormat.data)
+        self.assertEqual(diagnostics['hits'], 2)
+        self.assertEqual(diagnostics['misses'], 5)
+
+        cache.clear()
+        self.assertEqual(len(cache), 0)
@@ -0,0 +1,86 @@
+import os
+from unittest import TestCase
+
+from golem.core.sessioncipher import FRAME_HEADER, REPLAY_WINDOW, \
+    SessionCipher, SessionCipherError, SessionKeyExchange
+from golem.core.simpleserializer import CBORSerializer
+
+
+class TestSessionKeyExchange(TestCase):
+
+    def test_derive(self):
+        alice, bob = SessionKeyExchange(), SessionKeyExchange()
+        alice_cipher = alice.derive(bob.public_key)
+        bob_cipher = bob.derive(alice.public_key)
+
+        data = os.urandom(1024)
+        assert bob_cipher.decrypt(alice_cipher.encrypt(data)) == data
+        assert alice_cipher.decrypt(bob_cipher.encrypt(data)) == data
+
+        # Each direction uses its own key
+        with self.assertRaises(SessionCipherError):
+            alice_cipher.decrypt(alice_cipher.encrypt(data))
+
+    def test_derive_other_peer(self):
+        alice, bob, eve = (SessionKeyExchange() for _ in range(3))
+        frame = alice.derive(bob.public_key).encrypt(b'data')
+        with self.assertRaises(SessionCipherError):
+            eve.derive(alice.public_key).decrypt(frame)
+
+    def test_invalid_key(self):
+        alice = SessionKeyExchange()
+        for key in [None, b'', b'\x01' * 64, os.urandom(32),
+                    alice.public_key]:
+            with self.assertRaises(SessionCipherError):
+                alice.derive(key)
+
+
+class TestSessionCipher(TestCase):
+
+    def setUp(self):
+        send_key, receive_key = os.urandom(32), os.urandom(32)
+        self.sender = SessionCipher(send_key, receive_key)
+        self.receiver = SessionCipher(receive_key, send_key)
+
+    def test_is_frame(self):
+        assert SessionCipher.is_frame(self.sender.encrypt(b''))
+        assert not SessionCipher.is_frame(CBORSerializer.dumps([0, '', 0, {}]))
+        assert not SessionCipher.is_frame(b'\x04' + os.urandom(128))
+
+    def test_nonces(self):
+        frames = [self.sender.encrypt(b'data') for _ in range(3)]
+        assert len(set(frames)) == 3
+        assert [FRAME_HEADER.unpack(f[:FRAME_HEADER.size])[1]
+                for f in frames] == [0, 1, 2]
+
+    def test_tampered(self):
+        frame = bytearray(self.sender.encrypt(b'data'))
+        frame[FRAME_HEADER.size] ^= 1
+        with self.assertRaises(SessionCipherError):
+            self.receiver.decrypt(bytes(frame))
+
+        frame = bytearray(self.sender.encrypt(b'data'))
+        frame[1] ^= 1
+        with self.assertRaises(SessionCipherError):
+            self.receiver.decrypt(bytes(frame))
+
+    def test_replayed(self):
+        frame = self.sender.encrypt(b'data')
+        assert self.receiver.decrypt(frame) == b'data'
+        with self.assertRaises(SessionCipherError):
+            self.receiver.decrypt(frame)
+
+    def test_out_of_order(self):
+        frames = [self.sender.encrypt(bytes([i])) for i in range(4)]
+        for i in [1, 0, 3, 2]:
+            assert self.receiver.decrypt(frames[i]) == bytes([i])
+        for frame in frames:
+            with self.assertRaises(SessionCipherError):
+                self.receiver.decrypt(frame)
+
+    def test_too_old(self):
+        old = self.sender.encrypt(b'old')
+        for _ in range(REPLAY_WINDOW):
+            self.receiver.decrypt(self.sender.encrypt(b'new'))
+        with self.assertRaises(SessionCipherError):
+            self.receiver.decrypt(old)
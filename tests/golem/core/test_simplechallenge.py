@@ -0,0 +1,121 @@
+import threading
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from hashlib import sha256
+
+from mock import Mock, patch
+from twisted.internet.defer import CancelledError
+
+from golem.core.simplechallenge import ChallengeSolver, accept_challenge, \
+    create_challenge, difficulty_threshold, solve_challenge
+
+
+def is_solution(challenge, solution, difficulty):
+    digest = sha256((challenge + str(solution)).encode()).hexdigest()
+    return int(digest, 16) <= 2 ** (256 - difficulty)
+
+
+class TestSimpleChallenge(unittest.TestCase):
+
+    def test_solve_and_accept(self):
+        challenge = create_challenge([['node', 'challenge']], 'prev')
+        solution, time_ = solve_challenge(challenge, 10)
+        assert time_ >= 0
+        assert accept_challenge(challenge, solution, 10)
+        assert is_solution(challenge, solution, 10)
+        # The smallest solution is found
+        assert not any(is_solution(challenge, s, 10) for s in range(solution))
+
+        for candidate in range(100):
+            assert accept_challenge(challenge, candidate, 5) == \
+                is_solution(challenge, candidate, 5)
+
+    def test_difficulty_threshold(self):
+        assert difficulty_threshold(0) == b'\xff' * 32
+        assert difficulty_threshold(1) == b'\x80' + b'\x00' * 31
+        assert difficulty_threshold(9) == b'\x00\x80' + b'\x00' * 30
+        assert accept_challenge('challenge', 'anything', 0)
+
+
+class TestChallengeSolver(unittest.TestCase):
+
+    def test_sync_when_not_started(self):
+        solver = ChallengeSolver()
+        results = []
+        solver.solve('challenge', 8).addCallback(results.append)
+        assert results[0][0] == solve_challenge('challenge', 8)[0]
+
+    def test_search_in_processes(self):
+        solver = ChallengeSolver(processes=2, chunk_size=64)
+        with ProcessPoolExecutor(2) as executor:
+            for difficulty in [1, 8, 12]:
+                solution, _ = solver._search(executor, 'challenge',
+                                             difficulty, threading.Event())
+                assert solution == solve_challenge('challenge',
+                                                   difficulty)[0]
+
+            stopped = threading.Event()
+            stopped.set()
+            assert solver._search(executor, 'challenge', 12, stopped) is None
+
+    @patch('twisted.internet.reactor.callInThread')
+    @patch('twisted.internet.reactor.callLater')
+    def test_cancel(self, call_later, call_in_thread):
+        solver = ChallengeSolver(processes=1, timeout=10)
+        solver._executor = Mock()
+        errors = []
+
+        deferred = solver.solve('challenge', 30)
+        deferred.addErrback(errors.append)
+        assert call_later.call_args[0] == (10, deferred.cancel)
+        stopped = call_in_thread.call_args[0][4]
+        assert not stopped.is_set()
+
+        deferred.cancel()
+        assert stopped.is_set()
+        assert errors[0].check(CancelledError)
+        assert not solver._stopped
+
+        # Result of a cancelled challenge is ignored
+        solver._finish(deferred, (1, 1.0))
+
+    @patch('twisted.internet.reactor.callFromThread')
+    def test_broken_pool(self, call_from_thread):
+        solver = ChallengeSolver(processes=1, chunk_size=64)
+        executor = solver._executor = Mock()
+        executor.submit.side_effect = BrokenProcessPool()
+        deferred = Mock(called=False)
+
+        solver._run(executor, 'challenge', 8, threading.Event(), deferred)
+        restart, finish = [c[0] for c in call_from_thread.call_args_list]
+
+        # Challenge is solved in the thread
+        assert finish[0] == solver._finish
+        assert finish[2][0] == solve_challenge('challenge', 8)[0]
+
+        # Broken pool is replaced
+        assert restart == (solver._restart, executor)
+        with patch('golem.core.simplechallenge.ProcessPoolExecutor') as pool:
+            solver._restart(executor)
+            solver._restart(executor)
+        assert solver._executor is pool.return_value
+        pool.assert_called_once_with(1)
+        executor.shutdown.assert_called_once_with(wait=False)
+
+        stopped = threading.Event()
+        stopped.set()
+        assert solver._search_in_thread('challenge', 30, stopped) is None
+
+    @patch('twisted.internet.reactor.callInThread')
+    @patch('twisted.internet.reactor.callLater')
+    def test_stop(self, *_):
+        solver = ChallengeSolver(processes=1)
+        solver.start()
+        assert solver.running
+        solver.solve('challenge', 30)
+        stopped = list(solver._stopped)
+
+        solver.stop()
+        assert not solver.running
+        assert all(event.is_set() for event in stopped)
@@ -1,6 +1,7 @@
 import unittest
 
-from golem.docker.config_manager import DockerConfigManager
+from golem.docker.config_manager import DockerConfigManager, \
+    split_host_config
 from golem.tools.ci import ci_skip
 
 
@@ -45,3 +46,25 @@ class TestDockerConfigManager(unittest.TestCase):
         cm = DockerConfigManager()
         with cm._try():
             raise Exception("Not supposed to be raised further")
+
+
+class TestSplitHostConfig(unittest.TestCase):
+
+    def test_split(self):
+        host_config = dict(cpuset='0,1,2,3,4', mem_limit=3000,
+                           network_mode='none')
+
+        configs = split_host_config(host_config, 2)
+        assert [c['cpuset'] for c in configs] == ['0,1', '2,3,4']
+        assert all(c['mem_limit'] == 1500 for c in configs)
+        assert all(c['network_mode'] == 'none' for c in configs)
+
+        configs = split_host_config(host_config, 10)
+        assert [c['cpuset'] for c in configs] == ['0', '1', '2', '3', '4']
+        assert all(c['mem_limit'] == 600 for c in configs)
+
+        assert split_host_config(host_config, 0) == [host_config]
+
+    def test_split_without_limits(self):
+        configs = split_host_config(dict(network_mode='none'), 3)
+        assert configs == [dict(network_mode='none')] * 3
@@ -1,7 +1,9 @@
 import unittest
 
+from mock import Mock, patch
+
 from golem.environments.environmentsmanager import EnvironmentsManager
-from golem.environments.environment import Environment
+from golem.environments.environment import Environment, UnsupportReason
 
 import logging
 
@@ -22,4 +24,42 @@ class TestEnvironmentsManager(unittest.TestCase):
         self.assertTrue(env1 == em.get_environment_by_id("Env1"))
         self.assertTrue(env2 == em.get_environment_by_id("Env2"))
         self.assertTrue(env3 == em.get_environment_by_id("Env3"))
-        
\ No newline at end of file
+
+    @patch('golem.environments.environment.Environment.get_performance')
+    def test_performance_cache(self, get_performance):
+        get_performance.return_value = 100.0
+        em = EnvironmentsManager()
+        env = Environment()
+        em.add_environment(env)
+
+        assert em.get_performance(env.get_id()) == 100.0
+        assert em.get_performance(env.get_id()) == 100.0
+        assert em.get_performance_values() == {env.get_id(): 100.0}
+        assert get_performance.call_count == 1
+        assert em.cache_hits == 2
+        assert em.cache_misses == 1
+
+        get_performance.return_value = 200.0
+        em.invalidate_performance(env.get_id())
+        assert em.get_performance(env.get_id()) == 200.0
+        assert get_performance.call_count == 2
+
+        assert em.get_performance("unknown") == 0.0
+
+    def test_environment_status_cache(self):
+        em = EnvironmentsManager()
+        em.env_config = Mock()
+        env = Environment()
+        env.get_id = lambda: "Env1"
+
+        status = em.get_environment_status("Env1")
+        assert UnsupportReason.ENVIRONMENT_MISSING in status.desc
+
+        em.add_environment(env)
+        status = em.get_environment_status("Env1")
+        assert UnsupportReason.ENVIRONMENT_NOT_ACCEPTING_TASKS in status.desc
+
+        em.change_accept_tasks("Env1", True)
+        assert em.get_environment_status("Env1")
+        assert em.get_environment_status("Env1")
+        assert em.cache_hits == 1
@@ -1,11 +1,78 @@
+import json
+import logging
+import time
 import unittest
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from threading import Lock, Thread
 
 import mock
+import pytest
+import requests
 
 from golem.network.hyperdrive.client import HyperdriveClient, \
     HyperdriveClientOptions
 
+logger = logging.getLogger(__name__)
+
+
+class FakeHyperdriveHandler(BaseHTTPRequestHandler):
+    """ Answers hyperg API requests and counts client connections """
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        data = json.loads(self.rfile.read(length).decode('utf-8'))
+        with self.server.lock:
+            self.server.requests.append(data)
+
+        body = json.dumps(dict(
+            hash=data.get('hash') or 'hash',
+            files=[data.get('dest')]
+        )).encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_):
+        pass
+
+
+class FakeHyperdriveServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeHyperdriveHandler)
+        self.lock = Lock()
+        self.connections = 0
+        self.requests = []
+        self.thread = Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self.shutdown()
+        self.server_close()
+
 
 class TestHyperdriveClient(unittest.TestCase):
 
@@ -86,6 +153,86 @@ class TestHyperdriveClient(unittest.TestCase):
 
             assert client.pin_rm(multihash) == self.response['hash']
 
+    def test_request_timeout(self):
+        client = HyperdriveClient(timeout=10)
+        client._session = mock.Mock()
+        client._session.post.return_value.content = b'{"hash": "hash"}'
+
+        client.pin_rm('hash')
+        assert client._session.post.call_args[1]['timeout'] == 10
+
+        client.pin_rm('hash', timeout=1)
+        assert client._session.post.call_args[1]['timeout'] == 1
+
+    def test_shared_sessions(self):
+        client = HyperdriveClient()
+        assert HyperdriveClient()._session is client._session
+        assert HyperdriveClient(pool_size=1)._session is not client._session
+        assert HyperdriveClient(port=1)._session is not client._session
+
+        HyperdriveClient.close_sessions()
+        assert HyperdriveClient()._session is not client._session
+
+
+class TestHyperdriveClientConnections(unittest.TestCase):
+
+    def tearDown(self):
+        HyperdriveClient.close_sessions()
+
+    def test_keep_alive(self):
+        with FakeHyperdriveServer() as server:
+            for _ in range(20):
+                client = HyperdriveClient(port=server.port, host='127.0.0.1')
+                assert client.pin_rm('hash') == 'hash'
+
+        assert len(server.requests) == 20
+        assert server.connections == 1
+
+    def test_concurrent_downloads(self):
+        pool_size = 4
+        entries = [(str(uuid.uuid4()), str(uuid.uuid4())) for _ in range(32)]
+
+        def get_file(entry):
+            # Resource managers download with a new client in each thread
+            multihash, filepath = entry
+            client = HyperdriveClient(port=server.port, host='127.0.0.1',
+                                      pool_size=pool_size)
+            return client.get_file(multihash, filepath=filepath)
+
+        with FakeHyperdriveServer() as server, \
+                ThreadPoolExecutor(pool_size) as executor:
+            results = list(executor.map(get_file, entries))
+
+        assert results == [[(filepath, multihash, [filepath])]
+                           for multihash, filepath in entries]
+        assert len(server.requests) == len(entries)
+        assert server.connections <= pool_size
+
+    @pytest.mark.slow
+    def test_throughput(self):
+        num_requests = 500
+
+        def run(post):
+            start = time.time()
+            for _ in range(num_requests):
+                post(url, data=json.dumps(dict(command='id'))) \
+                    .raise_for_status()
+            return num_requests / (time.time() - start)
+
+        with FakeHyperdriveServer() as server:
+            url = 'http://127.0.0.1:{}/api'.format(server.port)
+            unpooled = run(requests.post)
+            unpooled_connections = server.connections
+
+            client = HyperdriveClient(port=server.port, host='127.0.0.1')
+            server.connections = 0
+            pooled = run(client._session.post)
+
+        logger.info("hyperg API requests/s: %.0f unpooled, %.0f pooled",
+                    unpooled, pooled)
+        assert unpooled_connections == num_requests
+        assert server.connections == 1
+
 
 class TestHyperdriveClientOptions(unittest.TestCase):
 
@@ -10,7 +10,7 @@ from golem import testutils
 from golem.clientconfigdescriptor import ClientConfigDescriptor
 from golem.core.keysauth import EllipticalKeysAuth
 from golem.diag.service import DiagnosticsOutputFormat
-from golem.model import MAX_STORED_HOSTS, KnownHosts
+from golem.model import MAX_STORED_HOSTS, KnownHosts, db_writer
 from golem.network.p2p import peersession
 from golem.network.p2p.node import Node
 from golem.network.p2p.p2pservice import HISTORY_LEN, P2PService
@@ -220,6 +220,27 @@ class TestP2PService(testutils.DatabaseFixture):
         assert len(KnownHosts.select()) == MAX_STORED_HOSTS
         assert len(self.service.seeds) == nominal_seeds
 
+    def test_store_known_peer_in_batch(self):
+        KnownHosts.delete().execute()
+        store = self.service._P2PService__store_known_peer
+        insert = KnownHosts.insert
+
+        def failing_insert(**kwargs):
+            if kwargs['port'] == 2:
+                raise ValueError('Test error')
+            return insert(**kwargs)
+
+        with mock.patch.object(KnownHosts, 'insert',
+                               side_effect=failing_insert):
+            results = db_writer._write_batch([
+                (store, ('1.2.3.4', 1, False), {}, Mock()),
+                (store, ('1.2.3.4', 2, False), {}, Mock()),
+            ])
+        assert results[0][1] is None
+        assert results[1][1].check(ValueError)
+        # The failing job does not roll back the rest of the batch
+        assert [h.port for h in KnownHosts.select()] == [1]
+
     def test_sync_free_peers(self):
         node = MagicMock()
         node.key = EllipticalKeysAuth(self.path, "PRIVTEST",
@@ -0,0 +1,89 @@
+import random
+import unittest
+
+from golem.network.p2p.node import Node
+from golem.network.p2p.peerkeeper import PeerKeeper
+
+K_SIZE = 32
+
+
+def random_key():
+    return '{:08x}'.format(random.getrandbits(K_SIZE))
+
+
+class TestPeerKeeper(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(0)
+        self.peer_keeper = PeerKeeper(random_key(), k_size=K_SIZE)
+        self.peers = [Node(key=random_key()) for _ in range(2000)]
+        for peer in self.peers:
+            self.peer_keeper.add_peer(peer)
+
+    def test_buckets(self):
+        pk = self.peer_keeper
+        assert len(pk.buckets) > 1
+        assert pk.buckets[-1].start <= pk.key_num <= pk.buckets[-1].end
+        assert sum(len(b.peers) for b in pk.buckets) >= pk.k * 2
+
+        for bucket in pk.buckets:
+            assert len(bucket.peers) <= pk.k
+            for peer in bucket.peers:
+                key_num = int(peer.key, 16)
+                assert bucket.start <= key_num <= bucket.end
+                assert pk.bucket_for_peer(key_num) is bucket
+
+        # Bucket ranges cover the whole key space without gaps
+        ranges = sorted((b.start, b.end) for b in pk.buckets)
+        assert ranges[0][0] == 0
+        assert ranges[-1][1] == 2 ** K_SIZE - 1
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            assert start == end + 1
+
+    def test_add_peer_to_full_bucket(self):
+        pk = self.peer_keeper
+        bucket = pk.buckets[0]
+        assert len(bucket.peers) == pk.k
+        key = '{:08x}'.format(bucket.start)
+        peer = Node(key=key)
+        assert pk.add_peer(peer) is bucket.peers[0]
+        assert pk.expected_pongs[bucket.peers[0].key][0] is peer
+
+        # Known peer is moved to the end of the bucket
+        oldest = bucket.peers[0]
+        assert pk.add_peer(oldest) is None
+        assert bucket.peers[-1] is oldest
+        assert len(bucket.peers) == pk.k
+
+    def test_set_last_message_time(self):
+        pk = self.peer_keeper
+        for bucket in pk.buckets:
+            bucket.last_updated = 0
+        peer = pk.buckets[1].peers[0]
+        pk.set_last_message_time(peer.key)
+        assert pk.buckets[1].last_updated > 0
+        assert all(b.last_updated == 0 for b in pk.buckets if
+                   b is not pk.buckets[1])
+
+    def test_neighbours(self):
+        pk = self.peer_keeper
+        known = [p for b in pk.buckets for p in b.peers]
+        for _ in range(100):
+            key_num = random.getrandbits(K_SIZE)
+            expected = sorted(known,
+                              key=lambda p: int(p.key, 16) ^ key_num)[:5]
+            assert pk.neighbours(key_num, 5) == expected
+
+        # Peer with the sought key is not its own neighbour
+        key_num = int(known[0].key, 16)
+        assert known[0] not in pk.neighbours(key_num)
+        assert len(pk.neighbours(key_num)) == pk.concurrency
+
+    def test_remove_peer(self):
+        pk = self.peer_keeper
+        peer = pk.buckets[0].peers[0]
+        key_num = int(peer.key, 16)
+        assert pk.bucket_for_peer(key_num).remove_peer(key_num) is peer
+        assert peer not in pk.buckets[0].peers
+        assert peer.key not in pk.buckets[0].key_nums
+        assert pk.buckets[0].remove_peer(key_num) is None
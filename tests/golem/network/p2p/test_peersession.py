@@ -3,14 +3,17 @@ from mock import MagicMock, Mock
 import random
 import unittest
 
+from twisted.internet.defer import Deferred, succeed
+
 from golem import testutils
 from golem.core.keysauth import EllipticalKeysAuth, KeysAuth
 from golem.core.variables import APP_VERSION
 from golem.network.p2p.node import Node
 from golem.network.p2p.p2pservice import P2PService
 from golem.network.p2p.peersession import (PeerSession, logger, P2P_PROTOCOL_ID,
-    PeerSessionInfo)
-from golem.network.transport.message import MessageHello, MessageStopGossip
+    PeerSessionInfo, TASKS_SINCE_METADATA)
+from golem.network.transport.message import MessageHello, MessageStopGossip, \
+    MessageTasks, MessageGetTasks, MessageGetTasksSince, MessageTasksSince
 from golem.tools.assertlogs import LogTestCase
 from golem.tools.testwithappconfig import TestWithKeysAuth
 
@@ -31,7 +34,7 @@ class TestPeerSession(TestWithKeysAuth, LogTestCase, testutils.PEP8MixIn):
         self.peer_session.conn.server.keys_auth.get_key_id.return_value = \
             key_id = 'client_key_id'
         self.peer_session.conn.server.metadata_manager.\
-            get_metadata.return_value = metadata = 'metadata'
+            get_metadata.return_value = metadata = {'metadata': 'value'}
         self.peer_session.conn.server.cur_port = port = random.randint(1, 50000)
         self.peer_session.hello()
         send_mock.assert_called_once_with(mock.ANY, mock.ANY)
@@ -40,7 +43,10 @@ class TestPeerSession(TestWithKeysAuth, LogTestCase, testutils.PEP8MixIn):
             'CLIENT_KEY_ID': key_id,
             'CLI_VER': APP_VERSION,
             'DIFFICULTY': 0,
-            'METADATA': metadata,
+            'METADATA': dict(
+                metadata,
+                session_key=self.peer_session.key_exchange.public_key,
+                tasks_since=True),
             'NODE_INFO': node,
             'NODE_NAME': node_name,
             'PORT': port,
@@ -70,6 +76,88 @@ class TestPeerSession(TestWithKeysAuth, LogTestCase, testutils.PEP8MixIn):
             self.assertEqual(ps2.decrypt(data), data)
         self.assertTrue(any("not encrypted" in log for log in l.output))
 
+    def test_encrypt_decrypt_session_keys(self):
+        ps = PeerSession(MagicMock())
+        ps2 = PeerSession(MagicMock())
+        ps.set_session_key(ps2.add_session_key({'metadata': 'value'}))
+        ps2.set_session_key(ps.add_session_key())
+
+        data = b"abcdefghijklm" * 1000
+        # Session keys are not used before the connection is verified
+        ps.encrypt(data)
+        ps.p2p_service.encrypt.assert_called_once_with(data, ps.key_id)
+
+        ps.verified = ps2.verified = True
+        ps.p2p_service.encrypt.reset_mock()
+        self.assertEqual(ps2.decrypt(ps.encrypt(data)), data)
+        self.assertEqual(ps.decrypt(ps2.encrypt(data)), data)
+        assert not ps.p2p_service.encrypt.called
+        assert not ps2.p2p_service.decrypt.called
+
+        # Peer without session keys
+        ps3 = PeerSession(MagicMock())
+        ps3.set_session_key({'metadata': 'value'})
+        ps3.verified = True
+        ps3.encrypt(data)
+        ps3.p2p_service.encrypt.assert_called_once_with(data, ps3.key_id)
+
+    def test_react_to_tasks(self):
+        ps = self.peer_session
+        ps.disconnect = Mock()
+        pending = Deferred()
+        ps.p2p_service.add_task_header.side_effect = [succeed(True), pending]
+
+        ps._react_to_tasks(MessageTasks(tasks_array=[{}, {}]))
+        assert not ps.disconnect.called
+
+        pending.callback(False)
+        ps.disconnect.assert_called_once_with(PeerSession.DCRBadProtocol)
+
+    def test_get_tasks_since(self):
+        ps = self.peer_session
+        ps.send = Mock()
+        ps.p2p_service.get_tasks_resync_counter.return_value = 0
+        ps.p2p_service.add_task_header.return_value = succeed(True)
+
+        # Peers that don't support delta sync are asked for all tasks
+        ps.send_get_tasks()
+        assert isinstance(ps.send.call_args[0][0], MessageGetTasks)
+
+        ps.tasks_since_supported = True
+        ps.send_get_tasks()
+        msg = ps.send.call_args[0][0]
+        assert isinstance(msg, MessageGetTasksSince)
+        assert (msg.epoch, msg.seq) == (None, 0)
+
+        ps._react_to_tasks_since(MessageTasksSince(
+            epoch='epoch', seq=5, tasks_array=[{'task_id': 'xyz'}]))
+        ps.p2p_service.add_task_header.assert_called_once_with(
+            {'task_id': 'xyz'})
+        ps.send_get_tasks()
+        msg = ps.send.call_args[0][0]
+        assert (msg.epoch, msg.seq) == ('epoch', 5)
+
+        # Removed tasks may be accepted again, ask for all of them
+        ps.p2p_service.get_tasks_resync_counter.return_value = 1
+        ps.send_get_tasks()
+        msg = ps.send.call_args[0][0]
+        assert (msg.epoch, msg.seq) == (None, 0)
+
+    def test_react_to_get_tasks_since(self):
+        ps = self.peer_session
+        ps.send = Mock()
+        ps.p2p_service.get_tasks_headers_since.return_value = \
+            ('epoch', 7, [{'task_id': 'xyz'}])
+
+        ps._react_to_get_tasks_since(MessageGetTasksSince(epoch='epoch',
+                                                          seq=3))
+        ps.p2p_service.get_tasks_headers_since.assert_called_once_with(
+            'epoch', 3)
+        msg = ps.send.call_args[0][0]
+        assert isinstance(msg, MessageTasksSince)
+        assert msg.dict_repr() == {'EPOCH': 'epoch', 'SEQ': 7,
+                                   'TASKS': [{'task_id': 'xyz'}]}
+
     def test_react_to_hello(self):
 
         conn = MagicMock()
@@ -113,6 +201,11 @@ class TestPeerSession(TestWithKeysAuth, LogTestCase, testutils.PEP8MixIn):
         peer_session._react_to_hello(msg)
         assert key_id in peer_session.p2p_service.peers
         assert peer_session.p2p_service.peers[key_id]
+        assert not peer_session.tasks_since_supported
+
+        msg.metadata = {TASKS_SINCE_METADATA: True}
+        peer_session._react_to_hello(msg)
+        assert peer_session.tasks_since_supported
 
         peer_session.p2p_service.peers[key_id] = MagicMock()
         conn.opened = True
@@ -153,6 +246,33 @@ class TestPeerSession(TestWithKeysAuth, LogTestCase, testutils.PEP8MixIn):
         assert peer_session.p2p_service.remove_peer.called
         assert not peer_session.p2p_service.remove_pending_conn.called
 
+    def test_solve_challenge(self):
+        peer_session = PeerSession(MagicMock())
+        peer_session.p2p_service = MagicMock()
+        peer_session.send = MagicMock()
+        peer_session.disconnect = MagicMock()
+
+        peer_session.p2p_service.solve_challenge.return_value = succeed(7)
+        peer_session._solve_challenge('challenge', 5)
+        assert peer_session.send.call_args[0][0].solution == 7
+        assert peer_session._challenge_deferred is None
+
+        # Challenge which is not solved in time
+        deferred = Deferred()
+        peer_session.p2p_service.solve_challenge.return_value = deferred
+        peer_session._solve_challenge('challenge', 50)
+        deferred.cancel()
+        peer_session.disconnect.assert_called_once_with(PeerSession.DCRTimeout)
+
+        # Challenge is abandoned when the session is dropped
+        deferred = Deferred()
+        peer_session.p2p_service.solve_challenge.return_value = deferred
+        peer_session.disconnect.reset_mock()
+        peer_session._solve_challenge('challenge', 50)
+        peer_session.dropped()
+        assert deferred.called
+        assert not peer_session.disconnect.called
+
     def test_react_to_stop_gossip(self):
         conn = MagicMock()
         conf = MagicMock()
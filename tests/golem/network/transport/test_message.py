@@ -335,6 +335,23 @@ class TestMessages(unittest.TestCase, PEP8MixIn):
         }
         self.assertEqual(expected, msg.dict_repr())
 
+    def test_message_tasks_since(self):
+        epoch = uuid.uuid4().hex
+        msg = message.MessageGetTasksSince(epoch=epoch, seq=3)
+        expected = {
+            'EPOCH': epoch,
+            'SEQ': 3,
+        }
+        self.assertEqual(expected, msg.dict_repr())
+
+        msg = message.MessageTasksSince(epoch=epoch, seq=5)
+        expected = {
+            'EPOCH': epoch,
+            'SEQ': 5,
+            'TASKS': [],
+        }
+        self.assertEqual(expected, msg.dict_repr())
+
     def test_message_get_resource(self):
         task_id = 'test-ti-{}'.format(uuid.uuid4())
         resource_header = 'test-rh-{}'.format(uuid.uuid4())
@@ -1,8 +1,15 @@
+from mock import patch
+
+from golem.model import LocalRank
 from golem.ranking.helper.trust import Trust
 from golem.ranking.manager import database_manager as dm
 from golem.testutils import DatabaseFixture
 
 
+def get_stored_rank(node_id):
+    return LocalRank.select().where(LocalRank.node_id == node_id).first()
+
+
 class TestDatabaseManager(DatabaseFixture):
     def test_should_update_database_records(self):
         """Should update database records
@@ -251,3 +258,63 @@ class TestDatabaseManager(DatabaseFixture):
         """Should throw exception for WRONG_COMPUTED increase."""
         with self.assertRaises(KeyError):
             Trust.WRONG_COMPUTED.increase('alpha', 0.3)
+
+    def test_write_behind(self):
+        for _ in range(3):
+            dm.increase_positive_computed('alpha', 0.5)
+        dm.increase_negative_payment('alpha', 0.25)
+
+        # Not written to the database yet, read from memory
+        assert get_stored_rank('alpha') is None
+        assert dm.get_local_rank('alpha').positive_computed == 1.5
+        assert dm.get_local_rank('beta') is None
+
+        dm.flush_local_ranks()
+        stored = get_stored_rank('alpha')
+        assert stored.positive_computed == 1.5
+        assert stored.negative_payment == 0.25
+        assert stored.wrong_computed == 0.0
+
+        # Increments of existing rows
+        dm.increase_positive_computed('alpha', 1.0)
+        dm.increase_positive_computed('beta', 1.0)
+        assert dm.get_local_rank('beta').positive_computed == 1.0
+        dm.flush_local_ranks()
+        assert get_stored_rank('alpha').positive_computed == 2.5
+        assert get_stored_rank('beta').positive_computed == 1.0
+        assert [r.node_id for r in dm.get_local_rank_for_all()] == \
+            ['alpha', 'beta']
+
+    def test_write_behind_without_upsert(self):
+        with patch.object(dm.LocalRankTable, 'UPSERT_SUPPORTED', False):
+            self.test_write_behind()
+
+    def test_rank_read_before_increase(self):
+        dm.increase_positive_requested('alpha', 1.0)
+        dm.flush_local_ranks()
+        dm.local_ranks.clear()
+
+        dm.increase_positive_requested('alpha', 1.0)
+        assert dm.get_local_rank('alpha').positive_requested == 2.0
+        dm.increase_positive_requested('alpha', 1.0)
+        assert dm.get_local_rank('alpha').positive_requested == 3.0
+        dm.flush_local_ranks()
+        assert get_stored_rank('alpha').positive_requested == 3.0
+
+    def test_sync(self):
+        dm.increase_positive_computed('alpha', 1.0)
+        dm.local_ranks.last_flush = 0
+        dm.local_ranks.sync()
+        assert get_stored_rank('alpha') is not None
+
+        dm.increase_positive_computed('alpha', 1.0)
+        dm.local_ranks.sync()
+        assert get_stored_rank('alpha').positive_computed == 1.0
+
+    def test_flush_failure(self):
+        dm.increase_positive_computed('alpha', 1.0)
+        with patch.object(dm.local_ranks, '_write', side_effect=OSError):
+            with self.assertRaises(OSError):
+                dm.flush_local_ranks()
+        dm.flush_local_ranks()
+        assert get_stored_rank('alpha').positive_computed == 1.0
@@ -2,7 +2,7 @@ import os
 import unittest
 import uuid
 
-from mock import patch
+from mock import Mock, patch
 
 from golem.resource.base import resourcesmanager
 from golem.resource.dirmanager import DirManager
@@ -357,3 +357,121 @@ class TestAbstractResourceManager(_Common.ResourceSetUp):
             ['resource', '1'],
             [os.path.join('split', 'path'), '4']
         ]
+
+
+class TestDownloadScheduler(_Common.ResourceSetUp):
+
+    def setUp(self):
+        _Common.ResourceSetUp.setUp(self)
+        self.resource_manager = resourcesmanager.TestResourceManager(self.dir_manager)  # noqa
+        self.resource_manager.config.max_concurrent_downloads = 2
+        self.resource_manager.new_client = Mock()
+        self.started = []
+
+        def async_call(method, success, error, **kwargs):
+            self.started.append((kwargs['multihash'], success, error))
+
+        self.resource_manager._async_call = async_call
+
+    def pull(self, resource_hash, task_id=None, **kwargs):
+        success, error = Mock(), Mock()
+        entry = (resource_hash + '.file', resource_hash)
+        self.resource_manager.pull_resource(entry, task_id or self.task_id,
+                                            success=success, error=error,
+                                            **kwargs)
+        return success, error
+
+    def finish(self, resource_hash, exception=None):
+        index = [s[0] for s in self.started].index(resource_hash)
+        _, success, error = self.started.pop(index)
+
+        if exception:
+            error(exception)
+        else:
+            path = self.resource_manager.storage.get_path(
+                resource_hash + '.file', self.task_id)
+            open(path, 'w').close()
+            success(None)
+
+    def test_free_slots(self):
+        callbacks = [self.pull('hash{}'.format(i)) for i in range(5)]
+        assert [s[0] for s in self.started] == ['hash0', 'hash1']
+        assert self.resource_manager.current_downloads == 2
+
+        self.resource_manager.config.max_concurrent_downloads = 4
+        self.finish('hash0')
+
+        assert callbacks[0][0].called
+        assert [s[0] for s in self.started] == ['hash1', 'hash2', 'hash3',
+                                                'hash4']
+        assert self.resource_manager.current_downloads == 4
+
+    def test_priority(self):
+        self.resource_manager.config.max_concurrent_downloads = 1
+        self.pull('resource1')
+        self.pull('resource2')
+        self.pull('result', priority=resourcesmanager.DownloadPriority.result)
+        self.pull('resource3')
+
+        order = []
+        while self.started:
+            resource_hash = self.started[0][0]
+            order.append(resource_hash)
+            self.finish(resource_hash)
+
+        assert order == ['resource1', 'result', 'resource2', 'resource3']
+        assert not self.resource_manager.downloads
+        assert self.resource_manager.current_downloads == 0
+
+    def test_raise_priority(self):
+        self.resource_manager.config.max_concurrent_downloads = 1
+        self.pull('resource1')
+        self.pull('resource2')
+        self.pull('shared')
+        self.pull('shared', task_id=str(uuid.uuid4()),
+                  priority=resourcesmanager.DownloadPriority.result)
+
+        self.finish('resource1')
+        assert [s[0] for s in self.started] == ['shared']
+        self.finish('shared')
+        assert [s[0] for s in self.started] == ['resource2']
+        self.finish('resource2')
+        assert not self.started
+
+    def test_deduplicate(self):
+        other_task_id = str(uuid.uuid4())
+        success, error = self.pull('hash')
+        other_success, other_error = self.pull('hash', task_id=other_task_id)
+
+        assert len(self.started) == 1
+        progress = self.resource_manager.get_download_progress('hash')
+        assert progress['status'] == resourcesmanager.DownloadStatus.downloading
+        assert progress['tasks'] == sorted([self.task_id, other_task_id])
+        assert progress['attempts'] == 1
+        assert 'hash' in self.resource_manager.get_download_progress()
+
+        self.finish('hash')
+
+        success.assert_called_once_with(('hash.file', 'hash'), self.task_id)
+        other_success.assert_called_once_with(('hash.file', 'hash'),
+                                              other_task_id)
+        assert os.path.exists(self.resource_manager.storage.get_path(
+            'hash.file', other_task_id))
+        assert not self.started
+        assert self.resource_manager.get_download_progress('hash') is None
+
+    def test_error(self):
+        exception = Exception('error')
+        success, error = self.pull('hash')
+        other_success, other_error = self.pull('hash', task_id='other')
+
+        self.finish('hash', exception)
+
+        assert not success.called
+        assert not other_success.called
+        error.assert_called_once_with(exception, ('hash.file', 'hash'),
+                                      self.task_id)
+        other_error.assert_called_once_with(exception, ('hash.file', 'hash'),
+                                            'other')
+        assert not self.resource_manager.downloads
+        assert self.resource_manager.current_downloads == 0
@@ -0,0 +1,143 @@
+import hashlib
+import os
+
+from mock import patch
+
+from golem.model import FileDigest
+from golem.resource import filehash
+from golem.resource.filehash import file_digest, FileDigestCache, FileHasher
+from golem.testutils import DatabaseFixture, TempDirFixture
+
+
+class TestFileDigest(TempDirFixture):
+
+    def test_small_file(self):
+        path = os.path.join(self.tempdir, 'small')
+        data = os.urandom(3 * 1024 + 1)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+        assert file_digest(path) == hashlib.sha256(data).digest()
+        assert file_digest(path, 'sha1') == hashlib.sha1(data).digest()
+
+    def test_empty_file(self):
+        path = os.path.join(self.tempdir, 'empty')
+        open(path, 'wb').close()
+        assert file_digest(path) == hashlib.sha256(b'').digest()
+
+    @patch('golem.resource.filehash.MMAP_MIN_SIZE', 1024)
+    def test_mapped_file(self):
+        path = os.path.join(self.tempdir, 'mapped')
+        data = os.urandom(4096)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+        with patch('golem.resource.filehash.mmap.mmap',
+                   wraps=filehash.mmap.mmap) as mapped:
+            assert file_digest(path) == hashlib.sha256(data).digest()
+        assert mapped.called
+
+
+class TestFileDigestCache(TempDirFixture):
+
+    def setUp(self):
+        super().setUp()
+        self.cache = FileDigestCache(persistent=False, max_entries=2)
+        self.paths = []
+        for i in range(3):
+            path = os.path.join(self.tempdir, 'file_{}'.format(i))
+            with open(path, 'wb') as f:
+                f.write(b'data')
+            self.paths.append(path)
+
+    def test_lru(self):
+        for path in self.paths[:2]:
+            self.cache.set(path, 'sha1', b'digest', os.stat(path))
+        assert self.cache.get(self.paths[0], 'sha1') == b'digest'
+
+        self.cache.set(self.paths[2], 'sha1', b'digest',
+                       os.stat(self.paths[2]))
+        assert len(self.cache) == 2
+        assert self.cache.get(self.paths[0], 'sha1') == b'digest'
+        assert self.cache.get(self.paths[1], 'sha1') is None
+        assert self.cache.get(self.paths[2], 'sha1') == b'digest'
+
+    def test_replaced_file(self):
+        path, other = self.paths[:2]
+        stat = os.stat(path)
+        self.cache.set(path, 'sha1', b'digest', stat)
+
+        os.replace(other, path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        assert os.stat(path).st_ino != stat.st_ino
+        assert self.cache.get(path, 'sha1') is None
+
+    def test_missing_file(self):
+        assert self.cache.get(os.path.join(self.tempdir, 'missing'),
+                              'sha1') is None
+
+
+class TestFileHasher(DatabaseFixture):
+
+    def setUp(self):
+        super().setUp()
+        self.hasher = FileHasher(max_workers=2, cache=FileDigestCache())
+        self.paths = []
+        for i in range(3):
+            path = os.path.join(self.tempdir, 'file_{}'.format(i))
+            with open(path, 'wb') as f:
+                f.write(os.urandom(1024 * (i + 1)))
+            self.paths.append(path)
+
+    def tearDown(self):
+        self.hasher.shutdown()
+        super().tearDown()
+
+    def test_digest_cached(self):
+        path = self.paths[0]
+        expected = file_digest(path)
+
+        with patch('golem.resource.filehash.file_digest',
+                   wraps=file_digest) as digest:
+            assert self.hasher.digest(path) == expected
+            assert self.hasher.digest(path) == expected
+        assert digest.call_count == 1
+
+        row = FileDigest.get(FileDigest.path == path)
+        assert row.digest == expected
+        assert row.size == os.path.getsize(path)
+
+    def test_digest_persistent(self):
+        path = self.paths[0]
+        expected = self.hasher.digest(path)
+        self.hasher.cache.clear()
+
+        with patch('golem.resource.filehash.file_digest') as digest:
+            assert self.hasher.digest(path) == expected
+        assert not digest.called
+
+    def test_digest_modified(self):
+        path = self.paths[0]
+        self.hasher.digest(path)
+
+        with open(path, 'ab') as f:
+            f.write(b'modified')
+
+        with open(path, 'rb') as f:
+            expected = hashlib.sha256(f.read()).digest()
+        assert self.hasher.digest(path) == expected
+
+    def test_digests(self):
+        expected = {path: file_digest(path) for path in self.paths}
+        self.hasher.digest(self.paths[0])
+
+        assert self.hasher.digests(self.paths) == expected
+        assert self.hasher.digests(self.paths) == expected
+
+    def test_without_database(self):
+        hasher = FileHasher(cache=FileDigestCache())
+
+        with patch.object(FileDigest, 'insert', side_effect=Exception):
+            digest = hasher.digest(self.paths[0])
+        assert digest == file_digest(self.paths[0])
+        assert hasher.cache.get(self.paths[0], 'sha256') == digest
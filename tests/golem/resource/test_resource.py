@@ -1,5 +1,13 @@
 import os
-from golem.resource.resource import TaskResourceHeader, TaskResource
+import zipfile
+from threading import Thread
+
+from mock import patch
+
+from golem.core.simplehash import SimpleHash
+from golem.resource.filehash import FileDigestCache, FileHasher
+from golem.resource.resource import TaskResourceHeader, TaskResource, \
+    DeltaZipCache, compress_dir
 from golem.resource.dirmanager import DirManager
 from test_dirmanager import TestDirFixture
 
@@ -47,8 +55,121 @@ class TestTaskResourceHeader(TestDirFixture):
         with self.assertRaises(TypeError):
             TaskResourceHeader.build_header_delta_from_header(None, None, None)
 
+    def testBuildReusesDigests(self):
+        dir_name = self.dir_manager.get_task_resource_dir('task2')
+        chosen = [self.file1, self.file3]
+        hasher = FileHasher(cache=FileDigestCache(persistent=False))
+
+        with patch('golem.resource.resource.file_hasher', hasher), \
+                patch('golem.resource.filehash.file_digest') as file_digest:
+            file_digest.return_value = SimpleHash.hash(b'')
+            header = TaskResourceHeader.build_from_chosen("resource", dir_name,
+                                                          chosen)
+            assert file_digest.call_count == 2
+
+            delta = TaskResourceHeader.build_header_delta_from_chosen(
+                header, dir_name, chosen)
+            assert not delta.files_data
+            assert file_digest.call_count == 2
+
+            with open(self.file1, 'w') as f:
+                f.write('modified')
+            file_digest.return_value = SimpleHash.hash(b'modified')
+
+            delta = TaskResourceHeader.build_header_delta_from_chosen(
+                header, dir_name, chosen)
+            assert file_digest.call_count == 3
+            assert delta.files_data == [
+                ('file1', SimpleHash.hash_base64(b'modified'))]
+
 
 class TestTaskResource(TestDirFixture):
 
     def testInit(self):
         self.assertIsNotNone(TaskResource(self.path))
+
+
+class TestDeltaZipCache(TestDirFixture):
+
+    def setUp(self):
+        TestDirFixture.setUp(self)
+
+        self.res_dir = os.path.join(self.path, 'resources')
+        self.out_dir = os.path.join(self.path, 'tmp')
+        os.makedirs(os.path.join(self.res_dir, 'dir1'))
+        os.makedirs(self.out_dir)
+
+        self.files = [os.path.join(self.res_dir, 'file1'),
+                      os.path.join(self.res_dir, 'dir1', 'file2')]
+        for i, file_path in enumerate(self.files):
+            with open(file_path, 'wb') as f:
+                f.write(os.urandom(1024 * (i + 1)))
+
+        self.header = TaskResourceHeader('resources')
+
+    def testCompressDir(self):
+        header = TaskResourceHeader.build_from_chosen('resources', self.res_dir,
+                                                      self.files)
+        cwd = os.getcwd()
+
+        with patch('os.chdir') as chdir:
+            zip_file = compress_dir(self.res_dir, header, self.out_dir)
+
+        assert not chdir.called
+        assert os.getcwd() == cwd
+        assert set(zipfile.ZipFile(zip_file).namelist()) == \
+            {'file1', os.path.join('dir1', 'file2')}
+        assert os.listdir(self.out_dir) == [os.path.basename(zip_file)]
+
+    def testReuse(self):
+        cache = DeltaZipCache()
+
+        with patch('golem.resource.resource.compress_dir',
+                   wraps=compress_dir) as compress:
+            zip_file = cache.get(self.res_dir, self.header, self.out_dir,
+                                 self.files)
+            assert cache.get(self.res_dir, self.header, self.out_dir,
+                             self.files) == zip_file
+            assert compress.call_count == 1
+
+            header = TaskResourceHeader.build_from_chosen(
+                'resources', self.res_dir, self.files[:1])
+            other_zip_file = cache.get(self.res_dir, header, self.out_dir,
+                                       self.files)
+            assert compress.call_count == 2
+
+        assert other_zip_file != zip_file
+        assert zipfile.ZipFile(other_zip_file).namelist() == \
+            [os.path.join('dir1', 'file2')]
+
+    def testEvict(self):
+        cache = DeltaZipCache(max_size=0)
+        zip_file = cache.get(self.res_dir, self.header, self.out_dir,
+                             self.files)
+        header = TaskResourceHeader.build_from_chosen(
+            'resources', self.res_dir, self.files[:1])
+        other_zip_file = cache.get(self.res_dir, header, self.out_dir,
+                                   self.files)
+
+        assert not os.path.exists(zip_file)
+        assert os.path.isfile(other_zip_file)
+
+    def testConcurrentRequests(self):
+        cache = DeltaZipCache()
+        results = []
+
+        def get():
+            results.append(cache.get(self.res_dir, self.header, self.out_dir,
+                                     self.files))
+
+        with patch('golem.resource.resource.compress_dir',
+                   wraps=compress_dir) as compress:
+            threads = [Thread(target=get) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert compress.call_count == 1
+        assert len(set(results)) == 1
+        assert not cache._building
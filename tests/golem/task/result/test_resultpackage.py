@@ -2,7 +2,7 @@ import os
 import shutil
 import uuid
 
-from golem.core.fileencrypt import FileEncryptor
+from golem.core.fileencrypt import FileEncryptor, AESFileEncryptor
 from golem.resource.dirmanager import DirManager
 from golem.task.result.resultpackage import ZipPackager, EncryptingPackager, EncryptingTaskResultPackager, \
     ExtractedPackage
@@ -124,6 +124,54 @@ class TestEncryptingPackager(TestDirFixture):
         self.assertTrue(len(files) == len(self.file_list))
         shutil.rmtree(self.out_dir)
 
+    def testCreateVersion1(self):
+        ep = EncryptingPackager(self.secret)
+        ep.create(self.out_path, self.files, self.pickle_files)
+
+        # Legacy format is written by default and has no header
+        with open(self.out_path, 'rb') as f:
+            header = f.read(len(ep.package_magic))
+        self.assertNotEqual(header, ep.package_magic)
+        self.assertEqual(os.listdir(os.path.dirname(self.out_path)),
+                         [os.path.basename(self.out_path)])
+
+        zip_path = self.out_path + '.zip'
+        AESFileEncryptor.decrypt(self.out_path, zip_path, self.secret)
+        files, outdir = ZipPackager().extract(zip_path)
+        self.assertTrue(len(files) == len(self.file_list))
+
+        with self.assertRaises(ValueError):
+            EncryptingPackager(self.secret, ep.version + 1)
+
+    def testVersion(self):
+        ep = EncryptingPackager(self.secret, EncryptingPackager.version)
+        ep.create(self.out_path, self.files, self.pickle_files)
+
+        with open(self.out_path, 'rb') as f:
+            header = f.read(len(ep.package_magic) + 1)
+        self.assertEqual(header, ep.package_magic + bytes([ep.version]))
+
+        files, outdir = ep.extract(self.out_path)
+        self.assertTrue(len(files) == len(self.file_list))
+
+        with open(self.out_path, 'r+b') as f:
+            f.seek(len(ep.package_magic))
+            f.write(bytes([ep.version + 1]))
+
+        with self.assertRaises(ValueError):
+            ep.extract(self.out_path)
+
+    def testExtractVersion1(self):
+        zip_path = self.out_path + '.zip'
+        ZipPackager().create(zip_path, self.files, self.pickle_files)
+        AESFileEncryptor.encrypt(zip_path, self.out_path, self.secret)
+
+        ep = EncryptingPackager(self.secret)
+        files, outdir = ep.extract(self.out_path)
+
+        self.assertTrue(len(files) == len(self.file_list))
+        shutil.rmtree(self.out_dir)
+
 
 class TestEncryptingTaskResultPackager(TestDirFixture):
 
@@ -0,0 +1,137 @@
+import unittest
+
+from mock import Mock, patch
+from twisted.internet.defer import Deferred, CancelledError
+
+from golem.diag.service import DiagnosticsOutputFormat
+from golem.network.p2p.node import Node
+from golem.task.headerverifier import TaskHeaderVerifier
+
+
+def get_header(task_id='task', signature=b'sig'):
+    return {
+        'task_id': task_id,
+        'task_owner': Node().to_dict(),
+        'task_owner_key_id': 'key',
+        'signature': signature,
+    }
+
+
+class TestTaskHeaderVerifier(unittest.TestCase):
+
+    def test_sync_when_not_started(self):
+        verify = Mock(return_value=True)
+        verifier = TaskHeaderVerifier(verify)
+        results = []
+
+        verifier.verify(get_header()).addCallback(results.append)
+        verify.assert_called_once_with(get_header())
+        assert results == [True]
+
+    def test_cache(self):
+        verify = Mock(return_value=True)
+        verifier = TaskHeaderVerifier(verify, cache_size=2)
+        results = []
+
+        for _ in range(3):
+            verifier.verify(get_header()).addCallback(results.append)
+        assert results == [True] * 3
+        assert verify.call_count == 1
+        assert verifier.hits == 2
+
+        # Different signature or content is verified again
+        verifier.verify(get_header(signature=b'other'))
+        header = get_header()
+        header['task_owner']['pub_port'] = 1234
+        verifier.verify(header)
+        assert verify.call_count == 3
+
+        # Least recently used entry was dropped
+        verifier.verify(get_header())
+        assert verify.call_count == 4
+
+    def test_invalid_not_cached(self):
+        verify = Mock(return_value=False)
+        verifier = TaskHeaderVerifier(verify)
+        results = []
+
+        for _ in range(2):
+            verifier.verify(get_header()).addCallback(results.append)
+        assert results == [False, False]
+        assert verify.call_count == 2
+        assert verifier.invalid == 2
+
+    def test_verify_error(self):
+        verifier = TaskHeaderVerifier(Mock(side_effect=ValueError))
+        results = []
+        verifier.verify(get_header()).addCallback(results.append)
+        assert results == [False]
+
+    def test_malformed(self):
+        verifier = TaskHeaderVerifier(Mock())
+        with self.assertRaises(KeyError):
+            verifier.verify(dict())
+
+    @patch('golem.task.headerverifier.ThreadPool')
+    @patch('golem.task.headerverifier.threads.deferToThreadPool')
+    def test_batches(self, defer_mock, _):
+        batches = []
+
+        def run(_reactor, _pool, method, headers):
+            deferred = Deferred()
+            batches.append((headers, deferred))
+            return deferred
+
+        defer_mock.side_effect = run
+
+        verifier = TaskHeaderVerifier(Mock(), batch_size=2)
+        verifier.start()
+
+        results = [verifier.verify(get_header(str(i))) for i in range(4)]
+        # Repeated header waits for the pending verification
+        results.append(verifier.verify(get_header('3')))
+
+        assert len(batches) == 1
+        assert [h['task_id'] for h in batches[0][0]] == ['0']
+
+        batches[0][1].callback([(True, 0.5)])
+        assert results[0].result is True
+        assert len(batches) == 2
+        assert [h['task_id'] for h in batches[1][0]] == ['1', '2']
+
+        batches[1][1].callback([(True, 0.25), (False, 0.25)])
+        assert [h['task_id'] for h in batches[2][0]] == ['3']
+        batches[2][1].callback([(True, 0.0)])
+
+        assert [r.result for r in results] == [True, True, False, True, True]
+        assert verifier.batches == 3
+
+        diagnostics = verifier.get_diagnostics(DiagnosticsOutputFormat.data)
+        assert diagnostics['cached'] == 3
+        assert diagnostics['misses'] == 5
+        assert diagnostics['invalid'] == 1
+        assert diagnostics['max_verification_time'] == 0.5
+        assert diagnostics['avg_verification_time'] == 0.25
+
+        results = []
+        verifier.verify(get_header('0')).addCallback(results.append)
+        assert results == [True]
+        diagnostics = verifier.get_diagnostics(DiagnosticsOutputFormat.data)
+        assert diagnostics['hit_rate'] == 1 / 6
+
+    @patch('golem.task.headerverifier.ThreadPool')
+    @patch('golem.task.headerverifier.threads.deferToThreadPool')
+    def test_stop_cancels_pending(self, defer_mock, pool_mock):
+        defer_mock.return_value = Deferred()
+
+        verifier = TaskHeaderVerifier(Mock())
+        verifier.start()
+        verifier.verify(get_header('0'))
+        errors = []
+        verifier.verify(get_header('1')).addErrback(errors.append)
+
+        verifier.stop()
+        assert len(errors) == 1
+        assert errors[0].check(CancelledError)
+        assert pool_mock.return_value.stop.called
+        assert not verifier.running
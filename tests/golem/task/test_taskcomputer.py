@@ -42,13 +42,13 @@ class TestTaskComputer(DatabaseFixture, LogTestCase):
         self.assertIsNone(tc.waiting_for_task)
         tc.last_task_request = 0
         tc.run()
-        task_server.request_task.assert_called_with()
+        slot = tc.slots[0]
+        task_server.request_task.assert_called_with(
+            num_cores=slot.num_cores, max_memory_size=slot.max_memory_size,
+            exclude=set())
         task_server.request_task = mock.MagicMock()
         task_server.config_desc.accept_tasks = False
         tc2 = TaskComputer("DEF", task_server, use_docker_machine_manager=False)
-        tc2.counting_task = False
-        tc2.current_computations = []
-        tc2.waiting_for_task = None
         tc2.last_task_request = 0
 
         tc2.run()
@@ -56,24 +56,74 @@ class TestTaskComputer(DatabaseFixture, LogTestCase):
 
         tc2.runnable = True
         tc2.compute_tasks = True
-        tc2.waiting_for_task = False
-        tc2.counting_task = False
-
         tc2.last_task_request = 0
-        tc2.current_computations = []
 
         tc2.run()
 
         assert task_server.request_task.called
+        assert tc2.waiting_for_task
 
         task_server.request_task.called = False
 
-        tc2.waiting_for_task = 'xxyyzz'
-        tc2.use_waiting_ttl = True
-        tc2.last_checking = 10 ** 10
+        slot = tc2.slots[0]
+        slot.task_id = 'xxyyzz'
+        slot.use_waiting_ttl = True
+        slot.waiting_ttl = 1
+        slot.last_checking = 0
 
         tc2.run()
+        assert slot.idle
+        assert tc2.waiting_for_task is None
+
+        slot.task_id = 'xxyyzz'
+        tc2.session_timeout('aabbcc')
+        assert tc2.waiting_for_task == 'xxyyzz'
         tc2.session_timeout()
+        assert tc2.waiting_for_task is None
+
+    def test_slots(self):
+        task_server = self.task_server
+        task_server.config_desc.accept_tasks = True
+        task_server.config_desc.task_request_interval = 0
+        task_server.config_desc.max_assigned_tasks = 2
+        task_server.config_desc.num_cores = 4
+        task_server.config_desc.max_memory_size = 4000000
+        task_server.request_task.side_effect = ["xyz", "abc", None]
+
+        tc = TaskComputer("ABC", task_server, use_docker_machine_manager=False)
+        tc.docker_manager = mock.Mock()
+        tc.docker_manager.container_host_config = dict(
+            cpuset="0,1,2,3", mem_limit=4000000000)
+        tc.change_config(task_server.config_desc)
+
+        assert len(tc.slots) == 2
+        assert tc.slots[0].host_config['cpuset'] == "0,1"
+        assert tc.slots[1].host_config['cpuset'] == "2,3"
+        assert tc.slots[0].num_cores == 2
+        assert tc.slots[0].max_memory_size == 2000000
+
+        tc.last_task_request = 0
+        tc.run()
+        assert task_server.request_task.call_count == 2
+        _, kwargs = task_server.request_task.call_args
+        assert kwargs['exclude'] == {"xyz"}
+        assert [slot.task_id for slot in tc.slots] == ["xyz", "abc"]
+
+        tc.task_request_rejected("abc", "reason")
+        assert tc.slots[1].idle
+
+        # slots are not rebuilt while in use
+        task_server.config_desc.max_assigned_tasks = 1
+        tc.change_config(task_server.config_desc)
+        assert len(tc.slots) == 2
+        tc.last_task_request = 0
+        tc.run()
+        assert task_server.request_task.call_count == 2
+
+        tc.session_closed("xyz")
+        tc.run()
+        assert len(tc.slots) == 1
+        assert tc.slots[0].host_config['cpuset'] == "0,1,2,3"
 
     def test_resource_failure(self):
         task_server = self.task_server
@@ -233,21 +283,23 @@ class TestTaskComputer(DatabaseFixture, LogTestCase):
 
         tc = TaskComputer("ABC", task_server, use_docker_machine_manager=False)
         tc.docker_manager = mock.Mock()
+        tc.docker_manager.container_host_config = dict()
 
         tc.use_docker_machine_manager = False
-        tc.change_config(mock.Mock(), in_background=False)
+        tc.change_config(ClientConfigDescriptor(), in_background=False)
         assert not tc.docker_manager.update_config.called
 
         tc.use_docker_machine_manager = True
         tc.docker_manager.update_config = lambda x, y, z: x()
 
-        tc.counting_task = True
-        tc.change_config(mock.Mock(), in_background=False)
+        tc.slots[0].task_id = "xyz"
+        tc.slots[0].task_thread = mock.Mock()
+        tc.change_config(ClientConfigDescriptor(), in_background=False)
 
         tc.docker_manager.update_config = lambda x, y, z: y()
 
-        tc.counting_task = False
-        tc.change_config(mock.Mock(), in_background=False)
+        tc.slots[0].reset()
+        tc.change_config(ClientConfigDescriptor(), in_background=False)
 
     def test_event_listeners(self):
         client = mock.Mock()
@@ -285,14 +337,14 @@ class TestTaskThread(DatabaseFixture):
         ts.config_desc = ClientConfigDescriptor()
 
         tc = TaskComputer("ABC", ts, use_docker_machine_manager=False)
-        tc.counting_task = True
-        tc.waiting_for_task = None
+        tc.slots[0].task_id = "xyz"
+        tc.slots[0].task_thread = mock.Mock()
         tt = self._new_task_thread(tc)
 
         tt.run()
         self.assertGreater(tt.end_time - tt.start_time, 0)
         self.assertLess(tt.end_time - tt.start_time, 20)
-        self.assertTrue(tc.counting_task)
+        self.assertEqual(tc.counting_task, "xyz")
 
     def test_fail(self):
         first_error_msg = "First error message"
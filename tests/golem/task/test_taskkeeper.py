@@ -133,6 +133,7 @@ class TestTaskHeaderKeeper(LogTestCase):
         tk.environments_manager.add_environment(e)
         task_header["task_id"] = "xyz"
         self.assertTrue(tk.add_task_header(task_header))
+        self.assertIsNone(tk.get_task(exclude=["xyz"]))
         th = tk.get_task()
         assert isinstance(th.task_owner, Node)
         self.assertEqual(task_header["task_id"], th.task_id)
@@ -168,8 +169,21 @@ class TestTaskHeaderKeeper(LogTestCase):
         assert tk.task_headers.get("xyz") is not None
         assert tk.removed_tasks.get("abc") is not None
         assert tk.removed_tasks.get("xyz") is None
-        assert len(tk.supported_tasks) == 1
-        assert tk.supported_tasks[0] == "xyz"
+        assert tk.supported_tasks == {"xyz"}
+
+        # Updated header dies with its new deadline
+        task_header["deadline"] = timeout_to_deadline(20)
+        task_header["task_id"] = "xyz"
+        assert tk.add_task_header(task_header)
+        with patch('golem.task.taskkeeper.get_timestamp_utc',
+                   return_value=timeout_to_deadline(15)):
+            tk.remove_old_tasks()
+        assert tk.task_headers.get("xyz") is not None
+        with patch('golem.task.taskkeeper.get_timestamp_utc',
+                   return_value=timeout_to_deadline(25)):
+            tk.remove_old_tasks()
+        assert tk.task_headers.get("xyz") is None
+        assert tk.supported_tasks == set()
 
     def test_task_header_update(self):
         e = Environment()
@@ -346,6 +360,101 @@ class TestTaskHeaderKeeper(LogTestCase):
         self.assertIn("tb0", tk.task_headers)
         self.assertEqual(new_limit + 1, len(tk.task_headers))
 
+    def test_get_task_scored(self):
+        selector = Mock()
+        selector.score.side_effect = lambda th: th.max_price
+        tk = TaskHeaderKeeper(EnvironmentsManager(), 10,
+                              task_selector=selector)
+        e = Environment()
+        e.accept_tasks = True
+        tk.environments_manager.add_environment(e)
+
+        for task_id, price in [("a", 20), ("b", 40), ("c", 30)]:
+            header = get_dict_task_header(task_id)
+            header["max_price"] = price
+            assert tk.add_task_header(header)
+
+        assert tk.get_task().task_id == "b"
+        assert tk.get_task(exclude={"b"}).task_id == "c"
+        assert tk.get_task(exclude={"b", "c"}).task_id == "a"
+        assert tk.get_task(exclude={"a", "b", "c"}) is None
+        # Excluded tasks are still offered later
+        assert tk.get_task().task_id == "b"
+
+        tk.remove_task_header("b")
+        assert tk.get_task().task_id == "c"
+
+        # Updated header is scored again
+        header = get_dict_task_header("a")
+        header["max_price"] = 50
+        assert tk.add_task_header(header)
+        assert tk.get_task().task_id == "a"
+
+        # Scores change, eg. with trust of task owners
+        selector.score.side_effect = lambda th: -th.max_price
+        assert tk.get_task().task_id == "a"
+        tk.rescore()
+        assert tk.get_task().task_id == "c"
+
+        selector.score.side_effect = Exception
+        tk.rescore()
+        assert tk.get_task() is not None
+
+    def test_get_headers_since(self):
+        tk = TaskHeaderKeeper(EnvironmentsManager(), 10)
+
+        def ids(headers):
+            return [th.task_id for th in headers]
+
+        epoch, seq, headers = tk.get_headers_since(None, 0)
+        assert (epoch, seq, headers) == (tk.headers_epoch, 0, [])
+
+        for task_id in ["t1", "t2", "t3"]:
+            assert tk.add_task_header(get_dict_task_header(task_id))
+        epoch, seq, headers = tk.get_headers_since(None, 0)
+        assert seq == 3
+        assert ids(headers) == ["t1", "t2", "t3"]
+
+        # Nothing changed
+        assert tk.get_headers_since(epoch, seq)[2] == []
+
+        # Updated and removed headers
+        header = get_dict_task_header("t1")
+        header["signature"] = "new signature"
+        assert tk.add_task_header(header)
+        tk.remove_task_header("t2")
+        own = get_task_header()
+        own.task_id = "own"
+        tk.set_own_headers([own])
+        _, new_seq, headers = tk.get_headers_since(epoch, seq)
+        assert new_seq == 5
+        assert ids(headers) == ["t1", "own"]
+
+        # Own header changes when it's signed again
+        tk.set_own_headers([own])
+        assert tk.get_headers_since(epoch, new_seq)[2] == []
+        own.signature = "signature"
+        tk.set_own_headers([own])
+        assert ids(tk.get_headers_since(epoch, new_seq)[2]) == ["own"]
+        tk.set_own_headers([])
+        assert ids(tk.get_headers_since(epoch, 0)[2]) == ["t3", "t1"]
+
+        # Version from another epoch
+        assert ids(tk.get_headers_since("other", new_seq)[2]) == \
+            ["t3", "t1"]
+
+    def test_resync_counter(self):
+        tk = TaskHeaderKeeper(EnvironmentsManager(), 10,
+                              remove_task_timeout=10)
+        tk.remove_task_header("xyz")
+        tk.remove_old_tasks()
+        assert tk.resync_counter == 0
+        tk.removed_tasks["xyz"] -= 11
+        tk.remove_old_tasks()
+        assert tk.resync_counter == 1
+        tk.remove_old_tasks()
+        assert tk.resync_counter == 1
+
 
 def get_dict_task_header(task_id="xyz"):
     return {
@@ -1,4 +1,5 @@
 import os
+import pickle
 import random
 import shutil
 import time
@@ -6,10 +7,12 @@ import uuid
 from collections import OrderedDict
 
 from mock import Mock, patch
+from twisted.internet.defer import CancelledError, fail
 
 from apps.core.task.coretaskstate import TaskDefinition
 from apps.blender.task.blenderrendertask import BlenderRenderTask
 from golem.core.common import get_timestamp_utc, timeout_to_deadline
+from golem.core.deferred import sync_wait
 from golem.core.keysauth import EllipticalKeysAuth
 from golem.network.p2p.node import Node
 from golem.resource.resource import TaskResourceHeader
@@ -299,7 +302,7 @@ class TestTaskManager(LogTestCase, TestDirFixtureWithReactor):
         assert task_id == "xyz"
         ss = self.tm.tasks_states["xyz"].subtask_states["xxyyzz"]
         assert ss.subtask_status == SubtaskStatus.starting
-        assert self.tm.computed_task_received("xxyyzz", [], 0)
+        assert sync_wait(self.tm.computed_task_received("xxyyzz", [], 0))
         assert t.finished["xxyyzz"]
         assert ss.subtask_progress == 1.0
         assert ss.subtask_rem_time == 0.0
@@ -317,7 +320,7 @@ class TestTaskManager(LogTestCase, TestDirFixtureWithReactor):
         self.tm.restart_subtask("aabbcc")
         ss = self.tm.tasks_states["abc"].subtask_states["aabbcc"]
         assert ss.subtask_status == SubtaskStatus.restarted
-        assert not self.tm.computed_task_received("aabbcc", [], 0)
+        assert not sync_wait(self.tm.computed_task_received("aabbcc", [], 0))
         assert ss.subtask_progress == 0.0
         assert ss.subtask_status == SubtaskStatus.restarted
         assert not t2.finished["aabbcc"]
@@ -336,7 +339,7 @@ class TestTaskManager(LogTestCase, TestDirFixtureWithReactor):
         assert ss.subtask_rem_time == 0.0
         assert ss.stderr == "something went wrong"
         with self.assertLogs(logger, level="WARNING"):
-            assert not self.tm.computed_task_received("qqwwee", [], 0)
+            assert not sync_wait(self.tm.computed_task_received("qqwwee", [], 0))
 
         th.task_id = "task4"
         t2 = TestTask(th, "print 'Hello world!", ["ttt4", "sss4"], {'ttt4': False, 'sss4': True})
@@ -346,13 +349,36 @@ class TestTaskManager(LogTestCase, TestDirFixtureWithReactor):
                                                            "10.10.10.10")
         assert not wrong_task
         assert ctd.subtask_id == "ttt4"
-        assert not self.tm.computed_task_received("ttt4", [], 0)
+        assert not sync_wait(self.tm.computed_task_received("ttt4", [], 0))
         assert self.tm.tasks_states["task4"].subtask_states["ttt4"].subtask_status == SubtaskStatus.failure
-        assert not self.tm.computed_task_received("ttt4", [], 0)
+        assert not sync_wait(self.tm.computed_task_received("ttt4", [], 0))
         ctd, wrong_task, should_wait = self.tm.get_next_subtask("DEF", "DEF", "task4", 1000, 10, 5, 10, 2, "10.10.10.10")
         assert not wrong_task
         assert ctd.subtask_id == "sss4"
-        assert self.tm.computed_task_received("sss4", [], 0)
+        assert sync_wait(self.tm.computed_task_received("sss4", [], 0))
+
+    @patch('golem.task.taskbase.Task.needs_computation', return_value=True)
+    def test_computed_task_verification_error(self, *_):
+        t = self._get_task_mock()
+        self.tm.add_new_task(t)
+        self.tm.start_task(t.header.task_id)
+        self.tm.get_next_subtask("ABC", "ABC", "xyz", 1000, 10, 5, 10, 2, "10.10.10.10")
+        ss = self.tm.tasks_states["xyz"].subtask_states["xxyyzz"]
+
+        # Verification cancelled on shutdown leaves the subtask pending
+        with patch.object(self.tm.verification_queue, 'submit',
+                          return_value=fail(CancelledError())):
+            with self.assertRaises(CancelledError):
+                sync_wait(self.tm.computed_task_received("xxyyzz", [], 0))
+        assert ss.subtask_status == SubtaskStatus.starting
+
+        with patch.object(t, 'verify_results', side_effect=ValueError("broken")), \
+                patch.object(t, 'results_verified') as results_verified:
+            with self.assertRaises(ValueError):
+                sync_wait(self.tm.computed_task_received("xxyyzz", [], 0))
+        assert not results_verified.called
+        assert ss.subtask_status == SubtaskStatus.failure
+        assert ss.stderr == "broken"
 
     def test_task_result_incoming(self):
         subtask_id = "xxyyzz"
@@ -431,6 +457,129 @@ class TestTaskManager(LogTestCase, TestDirFixtureWithReactor):
         finally:
             dispatcher.disconnect(listener, signal='golem.taskmanager')
 
+    def test_updates_stored_once(self):
+        self.tm.task_persistence = True
+        t = Task(TaskHeader("ABC", "xyz", "10.10.10.10", 1023, "abcde",
+                            "DEFAULT"), "print 'hello world'", None)
+        self.tm.add_new_task(t)
+        self.tm.start_task("xyz")
+        self.tm.flush_tasks()
+
+        with patch.object(self.tm.task_store, 'update') as update:
+            for subtask_id in ["s1", "s2", "s1"]:
+                self.tm.notice_task_updated("xyz", subtask_id)
+            assert not update.called
+            self.tm.flush_tasks()
+            update.assert_called_once_with(t, self.tm.tasks_states["xyz"],
+                                           {"s1", "s2"})
+
+            update.reset_mock()
+            self.tm.notice_task_updated("xyz", "s1")
+            self.tm.notice_task_updated("xyz")
+            self.tm.flush_tasks()
+            update.assert_called_once_with(t, self.tm.tasks_states["xyz"],
+                                           None)
+
+    def test_restore_lazily(self):
+        self.tm.task_persistence = True
+        t = Task(TaskHeader("ABC", "xyz", "10.10.10.10", 1023, "abcde",
+                            "DEFAULT"), "print 'hello world'", None)
+        self.tm.add_new_task(t)
+        self.tm.start_task("xyz")
+        self.tm.pause_task("xyz")
+        self.tm.flush_tasks(force=True)
+
+        tm = TaskManager("ABC", Node(), Mock(), root_path=self.path,
+                         tasks_dir=self.tm.tasks_dir, task_persistence=True)
+        assert "xyz" in tm.tasks
+        assert tm.tasks_states["xyz"].status == TaskStatus.paused
+        assert not tm.tasks.is_loaded("xyz")
+        assert tm.get_tasks_headers() == []
+
+        tm.resume_task("xyz")
+        assert tm.tasks.is_loaded("xyz")
+        assert tm.tasks["xyz"].header.task_id == "xyz"
+
+        tm.delete_task("xyz")
+        tm = TaskManager("ABC", Node(), Mock(), root_path=self.path,
+                         tasks_dir=self.tm.tasks_dir, task_persistence=True)
+        assert "xyz" not in tm.tasks
+
+    def test_restore_unreadable_task(self):
+        self.tm.task_persistence = True
+        t = Task(TaskHeader("ABC", "xyz", "10.10.10.10", 1023, "abcde",
+                            "DEFAULT"), "print 'hello world'", None)
+        self.tm.add_new_task(t)
+        self.tm.start_task("xyz")
+        ss = SubtaskState()
+        ss.subtask_id = "xxyyzz"
+        self.tm.tasks_states["xyz"].subtask_states["xxyyzz"] = ss
+        self.tm.notice_task_updated("xyz")
+        self.tm.flush_tasks(force=True)
+
+        with patch('golem.task.taskmanager.TaskStore.load_task',
+                   return_value=None):
+            tm = TaskManager("ABC", Node(), Mock(), root_path=self.path,
+                             tasks_dir=self.tm.tasks_dir,
+                             task_persistence=True)
+        assert "xyz" not in tm.tasks
+        assert "xyz" not in tm.tasks_states
+        assert "xxyyzz" not in tm.subtask2task_mapping
+        assert tm.get_tasks_headers() == []
+
+        tm = TaskManager("ABC", Node(), Mock(), root_path=self.path,
+                         tasks_dir=self.tm.tasks_dir, task_persistence=True)
+        assert "xyz" not in tm.tasks_states
+
+    def test_load_unreadable_task(self):
+        self.tm.task_persistence = True
+        t = Task(TaskHeader("ABC", "xyz", "10.10.10.10", 1023, "abcde",
+                            "DEFAULT"), "print 'hello world'", None)
+        self.tm.add_new_task(t)
+        self.tm.start_task("xyz")
+        ss = SubtaskState()
+        ss.subtask_id = "xxyyzz"
+        self.tm.tasks_states["xyz"].subtask_states["xxyyzz"] = ss
+        self.tm.pause_task("xyz")
+        self.tm.flush_tasks(force=True)
+
+        tm = TaskManager("ABC", Node(), Mock(), root_path=self.path,
+                         tasks_dir=self.tm.tasks_dir, task_persistence=True)
+        assert tm.subtask2task_mapping["xxyyzz"] == "xyz"
+        with patch('golem.task.taskmanager.TaskStore.load_task',
+                   return_value=None):
+            assert tm.tasks.get("xyz") is None
+        assert "xyz" not in tm.tasks
+        assert "xyz" not in tm.tasks_states
+        assert "xxyyzz" not in tm.subtask2task_mapping
+
+        tm = TaskManager("ABC", Node(), Mock(), root_path=self.path,
+                         tasks_dir=self.tm.tasks_dir, task_persistence=True)
+        assert "xyz" not in tm.tasks_states
+
+    def test_restore_task_pickles(self):
+        t = Task(TaskHeader("ABC", "xyz", "10.10.10.10", 1023, "abcde",
+                            "DEFAULT"), "print 'hello world'", None)
+        t.header.deadline = timeout_to_deadline(10)
+        state = TaskState()
+        state.status = TaskStatus.computing
+        ss = SubtaskState()
+        ss.subtask_id = "xxyyzz"
+        ss.subtask_status = SubtaskStatus.starting
+        ss.deadline = timeout_to_deadline(5)
+        state.subtask_states["xxyyzz"] = ss
+        path = os.path.join(self.tm.tasks_dir, "xyz.pickle")
+        with open(path, 'wb') as f:
+            pickle.dump((t, state), f)
+
+        tm = TaskManager("ABC", Node(), Mock(), root_path=self.path,
+                         tasks_dir=self.tm.tasks_dir, task_persistence=True)
+        assert not os.path.exists(path)
+        assert tm.tasks["xyz"].header.task_id == "xyz"
+        assert tm.subtask2task_mapping["xxyyzz"] == "xyz"
+        assert tm._task_deadlines.deadline("xyz") == t.header.deadline
+        assert tm._subtask_deadlines.deadline("xxyyzz") == ss.deadline
+
     def test_check_timeouts(self):
         # Task with timeout
         t = self._get_task_mock(timeout=0.05)
@@ -462,6 +611,23 @@ class TestTaskManager(LogTestCase, TestDirFixtureWithReactor):
             assert self.tm.tasks_states["qwe"].status == TaskStatus.timeout
             assert self.tm.tasks_states["qwe"].subtask_states["qwerty"].subtask_status == SubtaskStatus.failure
 
+    def test_check_timeouts_of_inactive_tasks(self):
+        t = self._get_task_mock(timeout=0.05)
+        self.tm.add_new_task(t)
+        self.tm.start_task("xyz")
+        assert "xyz" in self.tm._task_deadlines
+        self.tm.abort_task("xyz")
+        assert "xyz" not in self.tm._task_deadlines
+        time.sleep(0.1)
+        self.tm.check_timeouts()
+        assert self.tm.tasks_states["xyz"].status == TaskStatus.aborted
+
+        # Restarted task gets a new deadline
+        self.tm.restart_task("xyz")
+        assert self.tm._task_deadlines.deadline("xyz") == t.header.deadline
+        self.tm.check_timeouts()
+        assert self.tm.tasks_states["xyz"].status == TaskStatus.restarted
+
     def test_task_event_listener(self):
         self.tm.notice_task_updated = Mock()
         assert isinstance(self.tm, TaskEventListener)
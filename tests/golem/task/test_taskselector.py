@@ -0,0 +1,66 @@
+import unittest
+
+from mock import Mock
+
+from golem.task.taskbase import TaskHeader
+from golem.task.taskselector import ScoringTaskSelector, TaskSelector
+
+
+def get_header(max_price=3600, subtask_timeout=100, resource_size=0,
+               owner='owner'):
+    return TaskHeader('node', 'task', '10.0.0.1', 40102, owner, 'env',
+                      subtask_timeout=subtask_timeout,
+                      resource_size=resource_size, max_price=max_price)
+
+
+class TestScoringTaskSelector(unittest.TestCase):
+
+    def setUp(self):
+        self.environments_manager = Mock()
+        self.environments_manager.get_performance.return_value = 0.0
+        self.trust = {}
+        self.selector = ScoringTaskSelector(self.environments_manager,
+                                            get_trust=self.trust.get)
+
+    def test_default(self):
+        assert TaskSelector().score(get_header()) == 0.0
+
+    def test_price_rate(self):
+        selector = self.selector
+        assert selector.price_rate(get_header()) == 1.0
+        assert selector.price_rate(get_header(subtask_timeout=0)) == 0.0
+        # Download time lowers the rate
+        assert selector.price_rate(
+            get_header(resource_size=100 * ScoringTaskSelector.MIB)) == 0.5
+
+        assert selector.score(get_header(max_price=7200)) > \
+            selector.score(get_header())
+
+    def test_trust(self):
+        self.trust['trusted'] = 0.5
+        self.trust['untrusted'] = -0.5
+        scores = [self.selector.score(get_header(owner=owner))
+                  for owner in ['trusted', 'unknown', 'untrusted']]
+        assert scores == sorted(scores, reverse=True)
+
+        selector = ScoringTaskSelector(self.environments_manager,
+                                       get_trust=Mock(side_effect=KeyError))
+        assert selector.trust(get_header()) == 0.0
+
+    def test_resource_size(self):
+        selector = ScoringTaskSelector(self.environments_manager,
+                                       price_weight=0)
+        assert selector.score(get_header(resource_size=1024)) > \
+            selector.score(get_header(resource_size=1024 ** 3))
+
+        header = get_header()
+        del header.resource_size
+        assert selector.score(header) == 0.0
+
+    def test_performance(self):
+        low = self.selector.score(get_header())
+        self.environments_manager.get_performance.return_value = 1000.0
+        assert self.selector.score(get_header()) > low
+
+        self.environments_manager.get_environment_by_id.return_value = None
+        assert self.selector.performance(get_header()) == 0.0
@@ -92,6 +92,7 @@ class TestTaskServer(TestWithKeysAuth, LogTestCase, testutils.DatabaseFixture):
         task_header["task_owner"] = n2
         ts.add_task_header(task_header)
         self.assertEqual(ts.request_task(), "uvw")
+        self.assertIsNone(ts.request_task(exclude=["uvw"]))
         ts.remove_task_header("uvw")
         task_header["task_owner_port"] = 0
         task_header["task_id"] = "uvw2"
@@ -5,6 +5,7 @@ import unittest
 import uuid
 
 from mock import Mock, MagicMock, patch
+from twisted.internet.defer import CancelledError, fail, succeed
 
 from apps.core.task.coretask import TaskResourceHeader
 from golem import model
@@ -23,7 +24,9 @@ from golem.network.transport.message import (MessageWantToComputeTask, MessageCa
 from golem.network.transport.tcpnetwork import BasicProtocol
 from golem.task.taskbase import ComputeTaskDef, ResultType
 from golem.task.taskserver import WaitingTaskResult
-from golem.task.tasksession import TaskSession, logger, TASK_PROTOCOL_ID
+from golem.task.result.resultpackage import EncryptingPackager
+from golem.task.tasksession import TaskSession, logger, TASK_PROTOCOL_ID, \
+    RESULT_PACKAGE_METADATA
 from golem.tools.assertlogs import LogTestCase
 
 
@@ -54,7 +57,9 @@ class TestTaskSession(LogTestCase, testutils.TempDirFixture,
             'CLIENT_KEY_ID': key_id,
             'CLI_VER': 0,
             'DIFFICULTY': 0,
-            'METADATA': None,
+            'METADATA': {
+                'session_key': self.task_session.key_exchange.public_key,
+                RESULT_PACKAGE_METADATA: EncryptingPackager.version},
             'NODE_INFO': None,
             'NODE_NAME': None,
             'PORT': 0,
@@ -103,6 +108,28 @@ class TestTaskSession(LogTestCase, testutils.TempDirFixture,
         with self.assertLogs(logger, level='WARNING'):
             self.assertEqual(ts.encrypt(data), data)
 
+    def test_session_keys(self):
+        ts, ts2 = TaskSession(Mock()), TaskSession(Mock())
+        ts.key_id, ts2.key_id = 'key id 2', 'key id'
+        ts.set_session_key(ts2.add_session_key())
+        ts2.set_session_key(ts.add_session_key())
+        ts.verified = ts2.verified = True
+
+        data = b'data' * 1000
+        frame = ts.encrypt(data)
+        assert not ts.task_server.encrypt.called
+        assert ts2.decrypt(frame) == data
+        assert not ts2.task_server.decrypt.called
+
+        ts2.dropped = Mock()
+        assert ts2.decrypt(frame) is None
+        assert ts2.dropped.called
+
+        # Keys were agreed with another node
+        ts.key_id = 'other key id'
+        ts.encrypt(data)
+        ts.task_server.encrypt.assert_called_once_with(data, 'other key id')
+
     def test_request_task(self):
         ts = TaskSession(Mock())
         ts.verified = True
@@ -222,7 +249,6 @@ class TestTaskSession(LogTestCase, testutils.TempDirFixture,
         ts = TaskSession(conn)
         ts.task_server = Mock()
         ts.task_manager = Mock()
-        ts.task_manager.verify_subtask.return_value = True
 
         extra_data = dict(
             # the result is explicitly serialized using cPickle
@@ -260,6 +286,31 @@ class TestTaskSession(LogTestCase, testutils.TempDirFixture,
         assert not ts.msgs_to_send
         assert conn.close.called
 
+    def test_result_received_not_verified(self):
+        conn = Mock()
+        ts = TaskSession(conn)
+        ts.task_server = Mock()
+        ts.task_manager = Mock()
+        extra_data = dict(
+            result=pickle.dumps({'stdout': 'xyz'}),
+            result_type=ResultType.DATA,
+            subtask_id='xxyyzz'
+        )
+
+        for verification in [succeed(False), fail(ValueError())]:
+            ts.msgs_to_send = []
+            ts.task_manager.computed_task_received.return_value = verification
+            ts.result_received(extra_data, decrypt=False)
+            assert isinstance(ts.msgs_to_send[0], MessageSubtaskResultRejected)
+
+        # Verification cancelled on shutdown, the result isn't rejected
+        ts.msgs_to_send = []
+        ts.task_manager.computed_task_received.return_value = \
+            fail(CancelledError())
+        ts.result_received(extra_data, decrypt=False)
+        assert not ts.msgs_to_send
+        assert not ts.task_server.accept_result.called
+
     def test_react_to_task_result_hash(self):
 
         def create_pull_package(result):
@@ -324,7 +375,7 @@ class TestTaskSession(LogTestCase, testutils.TempDirFixture,
         with self.assertLogs(logger, level="WARNING"):
             ts._react_to_task_to_compute(msg)
         ts.task_manager.comp_task_keeper.receive_subtask.assert_not_called()
-        ts.task_computer.session_closed.assert_called_with()
+        ts.task_computer.session_closed.assert_called_with(ts.task_id)
         assert conn.close.called
 
         # No source code in the local environment -> failure
@@ -340,7 +391,7 @@ class TestTaskSession(LogTestCase, testutils.TempDirFixture,
         msg = MessageTaskToCompute(ctd)
         ts._react_to_task_to_compute(msg)
         ts.task_manager.comp_task_keeper.receive_subtask.assert_not_called()
-        ts.task_computer.session_closed.assert_called_with()
+        ts.task_computer.session_closed.assert_called_with(ts.task_id)
         assert conn.close.called
 
         # Source code from local environment -> proper execution
@@ -358,7 +409,7 @@ class TestTaskSession(LogTestCase, testutils.TempDirFixture,
         ctd.key_id = "KEY_ID2"
         ts._react_to_task_to_compute(MessageTaskToCompute(ctd))
         ts.task_manager.comp_task_keeper.receive_subtask.assert_not_called()
-        ts.task_computer.session_closed.assert_called_with()
+        ts.task_computer.session_closed.assert_called_with(ts.task_id)
         assert conn.close.called
 
         # Wrong task owner key id -> failure
@@ -367,7 +418,7 @@ class TestTaskSession(LogTestCase, testutils.TempDirFixture,
         ctd.task_owner.key = "KEY_ID2"
         ts._react_to_task_to_compute(MessageTaskToCompute(ctd))
         ts.task_manager.comp_task_keeper.receive_subtask.assert_not_called()
-        ts.task_computer.session_closed.assert_called_with()
+        ts.task_computer.session_closed.assert_called_with(ts.task_id)
         assert conn.close.called
 
         # Wrong return port -> failure
@@ -376,7 +427,7 @@ class TestTaskSession(LogTestCase, testutils.TempDirFixture,
         ctd.return_port = 0
         ts._react_to_task_to_compute(MessageTaskToCompute(ctd))
         ts.task_manager.comp_task_keeper.receive_subtask.assert_not_called()
-        ts.task_computer.session_closed.assert_called_with()
+        ts.task_computer.session_closed.assert_called_with(ts.task_id)
         assert conn.close.called
 
         # Proper port and key -> proper execution
@@ -392,7 +443,7 @@ class TestTaskSession(LogTestCase, testutils.TempDirFixture,
         ctd.src_code = ""
         ts._react_to_task_to_compute(MessageTaskToCompute(ctd))
         ts.task_manager.comp_task_keeper.receive_subtask.assert_not_called()
-        ts.task_computer.session_closed.assert_called_with()
+        ts.task_computer.session_closed.assert_called_with(ts.task_id)
         assert conn.close.called
 
         # Allow custom code / code in ComputerTaskDef -> proper execution
@@ -410,7 +461,7 @@ class TestTaskSession(LogTestCase, testutils.TempDirFixture,
         ts._react_to_task_to_compute(MessageTaskToCompute(ctd))
         assert ts.err_msg.startswith("Wrong environment")
         ts.task_manager.comp_task_keeper.receive_subtask.assert_not_called()
-        ts.task_computer.session_closed.assert_called_with()
+        ts.task_computer.session_closed.assert_called_with(ts.task_id)
         assert conn.close.called
 
         # Envrionment is Docker environment but with different images -> failure
@@ -424,7 +475,7 @@ class TestTaskSession(LogTestCase, testutils.TempDirFixture,
         ts._react_to_task_to_compute(MessageTaskToCompute(ctd))
         assert ts.err_msg.startswith("Wrong docker images")
         ts.task_manager.comp_task_keeper.receive_subtask.assert_not_called()
-        ts.task_computer.session_closed.assert_called_with()
+        ts.task_computer.session_closed.assert_called_with(ts.task_id)
         assert conn.close.called
 
         # Envrionment is Docker environment with proper images, but no srouce code -> failure
@@ -438,7 +489,7 @@ class TestTaskSession(LogTestCase, testutils.TempDirFixture,
         ts._react_to_task_to_compute(MessageTaskToCompute(ctd))
         assert ts.err_msg.startswith("No source code")
         ts.task_manager.comp_task_keeper.receive_subtask.assert_not_called()
-        ts.task_computer.session_closed.assert_called_with()
+        ts.task_computer.session_closed.assert_called_with(ts.task_id)
         assert conn.close.called
 
         # Proper Docker environment with source code
@@ -633,3 +684,23 @@ class TestCreatePackage(unittest.TestCase):
 
         assert ts.send.called
         assert ts.dropped.called
+
+    @patch('golem.task.tasksession.async_run', side_effect=executor_success)
+    def test_result_package_version(self, async_run):
+        ts = self.ts
+        ts.verify = Mock(return_value=True)
+        msg = MessageHello(client_key_id='deadbeef', proto_id=TASK_PROTOCOL_ID)
+
+        # Peers that don't advertise a version get legacy packages
+        for metadata, version in [(None, None),
+                                  ({}, None),
+                                  ({RESULT_PACKAGE_METADATA: 0}, None),
+                                  ({RESULT_PACKAGE_METADATA: 2}, 2),
+                                  ({RESULT_PACKAGE_METADATA: 99},
+                                   EncryptingPackager.version)]:
+            msg.metadata = metadata
+            ts._react_to_hello(msg)
+            ts._react_to_get_task_result(self.msg)
+
+            request = async_run.call_args[0][0]
+            assert request.kwargs['package_version'] == version
@@ -0,0 +1,198 @@
+import os
+import shutil
+import unittest
+
+from mock import Mock
+
+from golem.task.taskbase import TaskHeader
+from golem.task.taskstate import SubtaskState, TaskState, TaskStatus
+from golem.task.taskstore import LazyTaskDict, TaskStore
+from golem.testutils import TempDirFixture
+
+
+class StoredTask(object):
+    def __init__(self, task_id):
+        self.header = TaskHeader('node', task_id, '10.0.0.1', 40102, 'key',
+                                 'env')
+        self.counter = 0
+
+
+def get_state(*subtask_ids):
+    state = TaskState()
+    state.status = TaskStatus.computing
+    for subtask_id in subtask_ids:
+        subtask_state = SubtaskState()
+        subtask_state.subtask_id = subtask_id
+        state.subtask_states[subtask_id] = subtask_state
+    return state
+
+
+class TestLazyTaskDict(unittest.TestCase):
+
+    def test_lazy(self):
+        load = Mock(side_effect=StoredTask)
+        tasks = LazyTaskDict(load)
+        tasks['a'] = StoredTask('a')
+        tasks.add_unloaded('b')
+        tasks.add_unloaded('c')
+
+        assert 'b' in tasks
+        assert len(tasks) == 3
+        assert sorted(tasks) == ['a', 'b', 'c']
+        assert [t.header.task_id for t in tasks.loaded_values()] == ['a']
+        assert not load.called
+
+        assert tasks['b'].header.task_id == 'b'
+        assert tasks.is_loaded('b')
+        tasks['b'].counter = 1
+        assert tasks['b'].counter == 1
+        load.assert_called_once_with('b')
+
+        del tasks['c']
+        assert 'c' not in tasks
+        assert load.call_count == 1
+
+        load.side_effect = None
+        load.return_value = None
+        tasks.add_unloaded('d')
+        assert tasks.get('d') is None
+        assert 'd' not in tasks
+
+
+class TestTaskStore(TempDirFixture):
+
+    def test_restore(self):
+        store = TaskStore(self.path)
+        task = StoredTask('task')
+        state = get_state('s1', 's2')
+        store.add(task, state)
+
+        state.status = TaskStatus.finished
+        state.subtask_states['s1'].stderr = 'error'
+        store.update(task, state, {'s1'})
+
+        other = StoredTask('other')
+        store.add(other, get_state())
+        store.remove('other')
+        store.flush({'task': state}, force=True)
+        store.close()
+
+        store = TaskStore(self.path)
+        states = store.restore()
+        assert list(states) == ['task']
+        assert states['task'].status == TaskStatus.finished
+        assert sorted(states['task'].subtask_states) == ['s1', 's2']
+        assert states['task'].subtask_states['s1'].stderr == 'error'
+        assert store.load_task('task').header.task_id == 'task'
+        assert store.load_task('other') is None
+
+    def test_bodies_written_behind(self):
+        store = TaskStore(self.path, body_sync_interval=3600)
+        task = StoredTask('task')
+        state = get_state()
+        store.add(task, state)
+
+        task.counter = 1
+        store.update(task, state)
+        store.flush({'task': state})
+        assert self._restored_counter() == 0
+
+        store.flush({'task': state}, force=True)
+        assert self._restored_counter() == 1
+
+    def test_states_match_bodies(self):
+        store = TaskStore(self.path, body_sync_interval=3600)
+        task = StoredTask('task')
+        state = get_state('s1', 's2')
+        store.add(task, state)
+
+        task.counter = 1
+        state.subtask_states['s1'].stdout = 'out'
+        store.update(task, state, {'s1'})
+        state.status = TaskStatus.finished
+        store.update(task, state)
+        store.close()
+
+        # Body with the update wasn't written before the crash
+        store = TaskStore(self.path)
+        states = store.restore()
+        assert states['task'].status == TaskStatus.computing
+        assert states['task'].subtask_states['s1'].stdout == ''
+        assert store.load_task('task').counter == 0
+
+        store.update(task, state, {'s1'})
+        store.update(task, state)
+        store.flush(states, force=True)
+        store.close()
+
+        store = TaskStore(self.path)
+        states = store.restore()
+        assert states['task'].status == TaskStatus.finished
+        assert states['task'].subtask_states['s1'].stdout == 'out'
+        assert store.load_task('task').counter == 1
+        # Subtask records before the last full state are overwritten
+        assert store._subtask_sizes['task'] == {}
+
+    def test_dropped_states_not_restored_later(self):
+        store = TaskStore(self.path, body_sync_interval=3600)
+        task = StoredTask('task')
+        state = get_state('a', 'b')
+        store.add(task, state)
+        state.subtask_states['c'] = get_state('c').subtask_states['c']
+        store.update(task, state, {'c'})
+        store.close()
+
+        store = TaskStore(self.path, body_sync_interval=3600)
+        states = store.restore()
+        assert sorted(states['task'].subtask_states) == ['a', 'b']
+        states['task'].subtask_states['a'].stdout = 'out'
+        store.update(task, states['task'], {'a'})
+        store.flush(states, force=True)
+        store.close()
+
+        store = TaskStore(self.path)
+        states = store.restore()
+        assert sorted(states['task'].subtask_states) == ['a', 'b']
+        assert states['task'].subtask_states['a'].stdout == 'out'
+
+    def _restored_counter(self):
+        # Restoring may compact the journal, which is still open
+        copy_dir = os.path.join(self.path, 'copy')
+        os.makedirs(copy_dir, exist_ok=True)
+        shutil.copy(os.path.join(self.path, TaskStore.JOURNAL_NAME),
+                    copy_dir)
+        store = TaskStore(copy_dir)
+        store.restore()
+        return store.load_task('task').counter
+
+    def test_incomplete_record(self):
+        store = TaskStore(self.path)
+        store.add(StoredTask('task'), get_state('s1'))
+        store.close()
+        size = store.path.stat().st_size
+        with store.path.open('ab') as f:
+            f.write(b'\x02\x00\x04tas')
+
+        store = TaskStore(self.path)
+        assert list(store.restore()) == ['task']
+        assert store.path.stat().st_size == size
+
+    def test_compact(self):
+        store = TaskStore(self.path, body_sync_interval=0, compact_ratio=2,
+                          compact_min_size=0)
+        task = StoredTask('task')
+        state = get_state('s1')
+        store.add(task, state)
+        size = store.path.stat().st_size
+
+        for i in range(10):
+            task.counter = i
+            state.subtask_states['s1'].stdout = str(i)
+            store.update(task, state, {'s1'})
+            store.flush({'task': state})
+        assert store.path.stat().st_size <= 2 * size + 512
+
+        store = TaskStore(self.path)
+        states = store.restore()
+        assert states['task'].subtask_states['s1'].stdout == '9'
+        assert store.load_task('task').counter == 9
@@ -0,0 +1,70 @@
+import unittest
+
+from golem.task.taskupdates import TaskUpdates
+
+
+class TestTaskUpdates(unittest.TestCase):
+
+    def setUp(self):
+        self.dicts = {
+            'a': {'id': 'a', 'status': 'waiting'},
+            'b': {'id': 'b', 'status': 'waiting'},
+        }
+        self.built = []
+
+        def get_task_dict(task_id):
+            self.built.append(task_id)
+            return dict(self.dicts[task_id])  # KeyError if unreadable
+
+        self.updates = TaskUpdates(get_task_dict)
+
+    def test_collect(self):
+        updated, changes, full = self.updates.collect(['a', 'b'])
+        assert updated == []
+        assert changes == self.dicts
+        assert full
+        assert sorted(self.built) == ['a', 'b']
+
+        # Updates are coalesced and only updated tasks are rebuilt
+        self.built = []
+        self.dicts['a']['status'] = 'computing'
+        for _ in range(5):
+            self.updates.mark('a')
+        updated, changes, full = self.updates.collect(['a', 'b'])
+        assert updated == ['a']
+        assert changes == {'a': {'status': 'computing'}}
+        assert not full
+        assert self.built == ['a']
+
+        # Nothing has changed
+        self.updates.mark('b')
+        assert self.updates.collect(['a', 'b']) == (['b'], {}, False)
+        assert self.updates.collect(['a', 'b']) == ([], {}, False)
+
+        # New tasks are rebuilt only when they're marked
+        self.built = []
+        self.dicts['c'] = {'id': 'c', 'status': 'waiting'}
+        assert self.updates.collect(['a', 'b', 'c']) == ([], {}, False)
+        assert self.built == []
+
+        # Removed task
+        updated, changes, _ = self.updates.collect(['a'])
+        assert changes == {'b': None}
+        assert self.updates.task_list() == [self.dicts['a']]
+
+    def test_unreadable_task(self):
+        self.updates.collect(['a', 'b'])
+        del self.dicts['b']
+        self.updates.mark('a')
+        self.updates.mark('b')
+        updated, changes, _ = self.updates.collect(['a', 'b'])
+        assert updated == ['a', 'b']
+        assert changes == {'b': None}
+        assert self.updates.task_list() == [self.dicts['a']]
+
+    def test_reset(self):
+        self.updates.collect(['a', 'b'])
+        self.updates.reset()
+        updated, changes, full = self.updates.collect(['a', 'b'])
+        assert changes == self.dicts
+        assert full
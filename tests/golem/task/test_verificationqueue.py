@@ -0,0 +1,102 @@
+import unittest
+
+from mock import Mock, patch
+from twisted.internet.defer import Deferred, CancelledError
+
+from golem.diag.service import DiagnosticsOutputFormat
+from golem.task.verificationqueue import VerificationQueue
+
+
+class TestVerificationQueue(unittest.TestCase):
+
+    def test_sync_when_not_started(self):
+        queue = VerificationQueue()
+        method = Mock(return_value='result')
+        results = []
+
+        queue.submit('task', method, 'subtask', option=1).addCallback(
+            results.append)
+
+        method.assert_called_once_with('subtask', option=1)
+        assert results == ['result']
+        assert queue.processed == 1
+        assert queue.queue_depth == 0
+
+    def test_failure(self):
+        queue = VerificationQueue()
+        errors = []
+
+        queue.submit('task', Mock(side_effect=ValueError)).addErrback(
+            errors.append)
+
+        assert len(errors) == 1
+        assert errors[0].check(ValueError)
+        assert queue.failed == 1
+
+    @patch('golem.task.verificationqueue.ThreadPool')
+    @patch('golem.task.verificationqueue.threads.deferToThreadPool')
+    def test_bounded_and_serialized_per_key(self, defer_mock, _):
+        started = []
+
+        def run(_reactor, _pool, method, *args, **kwargs):
+            deferred = Deferred()
+            started.append((args[0], deferred))
+            return deferred
+
+        defer_mock.side_effect = run
+
+        queue = VerificationQueue(max_workers=2)
+        queue.start()
+
+        results = [queue.submit(key, Mock(), key + str(i))
+                   for i, key in enumerate(['a', 'a', 'b', 'c'])]
+
+        # second 'a' job waits for the first one; 'c' waits for a free worker
+        assert [s[0] for s in started] == ['a0', 'b2']
+        assert queue.queue_depth == 2
+
+        # the next 'a' job starts after callbacks of the first one
+        jobs_started = []
+        results[0].addCallback(lambda _: jobs_started.append(len(started)))
+        started[0][1].callback('a0 done')
+        assert jobs_started == [2]
+        assert [s[0] for s in started] == ['a0', 'b2', 'a1']
+        assert queue.queue_depth == 1
+
+        started[1][1].callback('b2 done')
+        assert [s[0] for s in started] == ['a0', 'b2', 'a1', 'c3']
+        assert queue.queue_depth == 0
+
+        for _, deferred in started[2:]:
+            deferred.callback(None)
+        assert all(r.called for r in results)
+        assert queue.processed == 4
+
+    @patch('golem.task.verificationqueue.ThreadPool')
+    @patch('golem.task.verificationqueue.threads.deferToThreadPool')
+    def test_stop_cancels_pending(self, defer_mock, pool_mock):
+        defer_mock.return_value = Deferred()
+
+        queue = VerificationQueue(max_workers=1)
+        queue.start()
+        queue.submit('a', Mock())
+        errors = []
+        queue.submit('b', Mock()).addErrback(errors.append)
+
+        queue.stop()
+        assert not queue.running
+        assert pool_mock.return_value.stop.called
+        assert len(errors) == 1
+        assert errors[0].check(CancelledError)
+
+    def test_diagnostics(self):
+        queue = VerificationQueue()
+        queue.submit('task', Mock())
+
+        data = queue.get_diagnostics(DiagnosticsOutputFormat.data)
+        assert data['queued'] == 0
+        assert data['running'] == 0
+        assert data['processed'] == 1
+        assert data['failed'] == 0
+        assert data['avg_run_time'] >= 0.0
+        assert data['max_wait_time'] >= 0.0
@@ -20,6 +20,7 @@ from golem.network.p2p.peersession import PeerSessionInfo
 from golem.report import StatusPublisher
 from golem.resource.dirmanager import DirManager
 from golem.resource.resourceserver import ResourceServer
+from golem.rpc.mapping import aliases
 from golem.rpc.mapping.aliases import UI, Environment
 from golem.task.taskbase import Task, TaskHeader, ResourceType
 from golem.task.taskcomputer import TaskComputer
@@ -400,6 +401,9 @@ class TestClient(TestWithDatabase, TestWithReactor):
 
         c.task_server = Mock()
         c.task_server.task_sessions = {str(uuid.uuid4()): Mock()}
+        c.task_server.task_manager.tasks = {'xyz': Mock()}
+        c.task_server.task_manager.get_task_dict = \
+            lambda task_id: {'id': task_id}
 
         c.task_server.task_computer = TaskComputer.__new__(TaskComputer)
         c.task_server.task_computer.current_computations = []
@@ -418,6 +422,12 @@ class TestClient(TestWithDatabase, TestWithReactor):
         past_time = time.time() - 10**10
         future_time = time.time() + 10**10
 
+        # Task updates are not collected without a client
+        c.last_tasks_time = past_time
+        c._Client__publish_events()  # pylint: disable=no-member
+        assert not c.task_updates._published
+        c.rpc_publisher = Mock()
+
         c.last_nss_time = future_time
         c.last_net_check_time = future_time
         c.last_balance_time = future_time
@@ -442,7 +452,11 @@ class TestClient(TestWithDatabase, TestWithReactor):
 
         assert not log.debug.called
         assert send.call_count == 2
-        assert c._publish.call_count == 3
+        assert c._publish.call_count == 4
+        c._publish.assert_any_call(aliases.Task.evt_task_list_changes,
+                                   {'xyz': {'id': 'xyz'}})
+        c._publish.assert_any_call(aliases.Task.evt_task_list,
+                                   [{'id': 'xyz'}])
 
         def raise_exc(*_):
             raise Exception('Test exception')
@@ -451,6 +465,14 @@ class TestClient(TestWithDatabase, TestWithReactor):
         c._publish = Mock()
         send.call_count = 0
 
+        # Updates of a task are published once, with changed fields only
+        c.task_server.task_manager.get_task_dict = \
+            lambda task_id: {'id': task_id, 'status': 'computing'}
+        for _ in range(3):
+            c.taskmanager_listener(None, 'golem.taskmanager',
+                                   event='task_status_updated',
+                                   task_id='xyz')
+
         c.last_nss_time = past_time
         c.last_net_check_time = past_time
         c.last_balance_time = past_time
@@ -462,7 +484,13 @@ class TestClient(TestWithDatabase, TestWithReactor):
 
         assert log.debug.called
         assert send.call_count == 2
-        assert c._publish.call_count == 2
+        assert c._publish.call_count == 3
+        c._publish.assert_any_call(aliases.Task.evt_task_status, 'xyz')
+        c._publish.assert_any_call(aliases.Task.evt_task_list_changes,
+                                   {'xyz': {'status': 'computing'}})
+        # The full list is published for a newly connected client only
+        assert not any(call[0][0] == aliases.Task.evt_task_list
+                       for call in c._publish.call_args_list)
 
     def test_activate_hw_preset(self, *_):
         self.client = Client(
@@ -27,6 +27,24 @@ class TestDatabase(TempDirFixture, PEP8MixIn):
         self.assertEqual(db._get_user_version(), db.SCHEMA_VERSION)
         db.db.close()
 
+    def test_pragmas(self):
+        db = m.Database(self.path)
+        self.assertEqual(db.db.journal_mode[0], 'wal')
+        # NORMAL
+        self.assertEqual(db.db.synchronous[0], 1)
+        db.db.close()
+
+    def test_missing_indexes_created(self):
+        db = m.Database(self.path)
+        index = 'expectedincome_modified_date'
+        db.db.execute_sql('DROP INDEX "{}"'.format(index))
+
+        db = m.Database(self.path)
+        indexes = [i.name for i in db.db.get_indexes('expectedincome')]
+        self.assertIn(index, indexes)
+        self.assertIn('expectedincome_sender_node_subtask', indexes)
+        db.db.close()
+
 
 class TestPayment(DatabaseFixture):
     def test_default_fields(self):